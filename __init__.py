@@ -12,14 +12,39 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # includes: KFPDetection Packages
-from visualizes import *
-from loggers import *
-from vdlrecords import *
-from datasets import *
+# 按需导入: 各子包在首次访问时才导入，子包内的模块同样按需导入
+# (不会因为导入本包而加载paddle, visualdl, matplotlib等依赖)
+import importlib
+
+from typing import Any, List
 
 __all__ = [
     'visualizes', # 可视化
     'loggers', # 字节流日志记录
     'vdlrecords', # 可视化日志记录
     'datasets' # 数据集加载/解析
-]
\ No newline at end of file
+]
+
+# 子包 --> 导出的名称(与子包的__all__一致)；查找名称时只导入对应的子包
+_LAZY_IMPORTS = {
+    'visualizes': ['visualize_img', 'visualize_bbox', 'visualize_det', 'colormap'],
+    'loggers': ['create_logger', 'get_created_logger_names', '_read_file_line', 'error_traceback'],
+    'vdlrecords': ['clear_vdlrecord_dir', 'VDLCallback', 'ScalarVDL'],
+    'datasets': ['det', 'voc', 'coco', 'reader', 'dataset', 'line_index', 'sampler']
+}
+_ATTR_TO_MODULE = {attr: module for module, attrs in _LAZY_IMPORTS.items() for attr in attrs}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_IMPORTS:
+        return importlib.import_module(name)
+    # 子包导出的名称(如visualize_det, create_logger)
+    if name in _ATTR_TO_MODULE:
+        value = getattr(importlib.import_module(_ATTR_TO_MODULE[name]), name)
+        globals()[name] = value # 之后直接从模块字典读取
+        return value
+    raise AttributeError("module '{0}' has no attribute '{1}'".format(__name__, name))
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_IMPORTS) | set(_ATTR_TO_MODULE))
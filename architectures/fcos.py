@@ -11,3 +11,111 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# includes: fcos architecture
+import paddle
+import paddle.nn as nn
+
+from typing import Any, Callable, Dict, List, Union
+
+from backbones import build_backbone, fuse_conv_norm
+from necks import FPN
+from heads import FCOSHead
+from losses import FCOSLoss
+from loggers import create_logger
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['FCOS', 'build_fcos']
+
+
+class FCOS(nn.Layer):
+    def __init__(self,
+                 backbone: nn.Layer,
+                 neck: nn.Layer,
+                 head: nn.Layer,
+                 loss: Union[Callable, None]=None) -> None:
+        """FCOS检测模型
+            desc:
+                Parameters:
+                    backbone: 骨干网络(nn.Layer)——输出各阶段特征list
+                    neck: Neck(nn.Layer)——如FPN
+                    head: 检测头(nn.Layer)——如FCOSHead
+                    loss: 损失函数(Callable)——loss(head_outputs, inputs)，None时训练模式只返回head输出
+                Returns:
+                    None
+                Others:
+                    - 训练模式: 返回损失(或head的各层级输出)
+                    - 推理模式: 返回head.predict的输出，不计算训练分支
+                    - deploy(): 切换到推理模式并将BatchNorm折叠进卷积
+        """
+        super(FCOS, self).__init__()
+        self.backbone = backbone
+        self.neck = neck
+        self.head = head
+        self.loss = loss
+
+    def forward(self,
+                inputs: Union[paddle.Tensor, Dict[str, Any]]) -> Dict[str, Any]:
+        """前向计算
+            desc:
+                Parameters:
+                    inputs: 输入图像(paddle.Tensor)——[B, 3, H, W]，或包含image字段的batch数据(dict)
+                Returns:
+                    (Dict[str, Any])训练模式为损失/head输出，推理模式为预测输出
+        """
+        image = inputs['image'] if isinstance(inputs, dict) else inputs
+        feats = self.neck(self.backbone(image))
+        if not self.training:
+            return self.head.predict(feats)
+        outputs = self.head(feats)
+        if self.loss is None:
+            return outputs
+        return self.loss(outputs, inputs)
+
+    def deploy(self) -> 'FCOS':
+        """切换为推理模型: eval模式，BatchNorm折叠进卷积
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (FCOS)当前模型
+                Others:
+                    - 折叠后不能再训练
+                    - GroupNorm(FCOSHead默认)不能折叠，CPU推理建议使用norm_type='bn'的head
+        """
+        self.eval()
+        num_fused = fuse_conv_norm(self)
+        logger.info("FCOS deploy: fused {0} BatchNorm layers into convolutions.".format(num_fused))
+        return self
+
+
+def build_fcos(config: Dict[str, Any]) -> FCOS:
+    """按配置构建FCOS模型
+        desc:
+            Parameters:
+                config: 模型配置(dict)
+                    - num_classes: 类别数(int)
+                    - backbone: 骨干网络名称(str)或配置(dict)——见backbones.build_backbone
+                    - neck: FPN的构建参数(dict)——输入通道数与步长由骨干网络决定
+                    - head: FCOSHead的构建参数(dict)——输入通道数与各层级步长由FPN决定
+                    - loss: FCOSLoss的构建参数(dict)——None表示不构建损失
+            Returns:
+                (FCOS)FCOS模型
+            Others:
+                - 例: {'num_classes': 20, 'backbone': 'mobilenetv3_large',
+                       'neck': {'out_channel': 128}, 'head': {'norm_type': 'bn'}}
+    """
+    num_classes = config.get('num_classes', 80)
+    backbone = build_backbone(config.get('backbone', 'resnet50'))
+    neck = FPN(backbone.out_channels, backbone.out_strides, **config.get('neck', {}))
+    head_config = dict(config.get('head', {}))
+    head_config.setdefault('feat_channel', neck.out_channel)
+    head = FCOSHead(num_classes=num_classes,
+                    in_channel=neck.out_channel,
+                    fpn_strides=neck.out_strides,
+                    **head_config)
+    loss = None
+    if config.get('loss', {}) is not None:
+        loss = FCOSLoss(num_classes=num_classes,
+                        num_levels=len(neck.out_strides),
+                        **config.get('loss', {}))
+    return FCOS(backbone, neck, head, loss=loss)
@@ -11,3 +11,18 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from .layers import *
+from .registry import *
+from .resnet import *
+from .mobilenet_v3 import *
+from .shufflenet_v2 import *
+from .latency import *
+
+__all__ = [
+    'layers', # 卷积+归一化层, BatchNorm折叠
+    'registry', # 骨干网络注册表
+    'resnet',
+    'mobilenet_v3',
+    'shufflenet_v2',
+    'latency' # 骨干网络耗时表
+]
@@ -0,0 +1,215 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: backbone latency table
+# 骨干网络在本机CPU上的推理耗时表: 测量结果按机器缓存为json，
+# 之后按输入尺寸、batch大小与精度预算直接查表选择骨干网络
+import os
+import sys
+import json
+import time
+import platform
+import numpy as np
+import paddle
+
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from .layers import fuse_conv_norm
+from .registry import BACKBONE_REGISTRY, build_backbone, list_backbones
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['machine_key', 'measure_backbone_latency', 'BackboneLatencyTable']
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'kfpdetection', 'backbone_latency.json')
+
+
+def machine_key() -> str:
+    """当前机器的标识: 耗时表按机器分别记录
+        desc:
+            Parameters:
+                None
+            Returns:
+                (str)处理器型号-逻辑核数-paddle版本
+    """
+    processor = platform.processor() or platform.machine()
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    processor = line.split(':', 1)[1].strip()
+                    break
+    return '{0}|{1}cpu|paddle-{2}'.format(processor, os.cpu_count(), paddle.__version__)
+
+
+@paddle.no_grad()
+def measure_backbone_latency(name: str,
+                             input_size: Sequence[int],
+                             batch_size: int=1,
+                             num_iters: int=10,
+                             num_warmup: int=2) -> Dict[str, float]:
+    """测量骨干网络的推理耗时(eval模式，BatchNorm已折叠)
+        desc:
+            Parameters:
+                name: 骨干网络名称(str)
+                input_size: 输入尺寸(list(int))——[h, w]
+                batch_size: batch大小(int)
+                num_iters: 计时次数(int)
+                num_warmup: 预热次数(int)
+            Returns:
+                (Dict[str, float])latency_ms(中位数), images_per_sec
+    """
+    backbone = build_backbone(name)
+    backbone.eval()
+    fuse_conv_norm(backbone)
+    image = paddle.randn([batch_size, 3] + list(input_size))
+    for _ in range(num_warmup):
+        backbone(image)
+    times = []
+    for _ in range(num_iters):
+        start = time.perf_counter()
+        backbone(image)
+        times.append(time.perf_counter() - start)
+    latency = float(np.median(times))
+    return {'latency_ms': latency * 1e3, 'images_per_sec': batch_size / latency}
+
+
+class BackboneLatencyTable(object):
+    def __init__(self,
+                 path: Union[str, None]=DEFAULT_TABLE_PATH) -> None:
+        """骨干网络耗时表
+            desc:
+                Parameters:
+                    path: json缓存路径(str)——None表示不缓存
+                Returns:
+                    None
+                Others:
+                    - json结构: {机器标识: {骨干网络名称: {"HxW@B": {latency_ms, images_per_sec}}}}
+                    - 只使用当前机器的记录，已测量的配置不重复测量
+        """
+        super(BackboneLatencyTable, self).__init__()
+        self.path = path
+        self.machine = machine_key()
+        self.records = {}
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.records = json.load(f)
+
+    @staticmethod
+    def _config_key(input_size: Sequence[int],
+                    batch_size: int) -> str:
+        return '{0}x{1}@{2}'.format(input_size[0], input_size[1], batch_size)
+
+    def _entries(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        return self.records.setdefault(self.machine, {})
+
+    def lookup(self,
+               name: str,
+               input_size: Sequence[int],
+               batch_size: int=1) -> Union[Dict[str, float], None]:
+        return self._entries().get(name, {}).get(self._config_key(input_size, batch_size), None)
+
+    def measure(self,
+                names: Union[List[str], None]=None,
+                input_sizes: List[Sequence[int]]=[(320, 320), (512, 512), (800, 1344)],
+                batch_sizes: List[int]=[1],
+                num_iters: int=10,
+                overwrite: bool=False) -> None:
+        """测量骨干网络耗时并写入缓存
+            desc:
+                Parameters:
+                    names: 骨干网络名称(list(str))——None表示所有已注册的骨干网络
+                    input_sizes: 输入尺寸(list)——[(h, w)]
+                    batch_sizes: batch大小(list(int))
+                    num_iters: 每个配置的计时次数(int)
+                    overwrite: 是否重新测量已有记录(bool)
+                Returns:
+                    None
+        """
+        names = list_backbones() if names is None else names
+        entries = self._entries()
+        for name in names:
+            for input_size in input_sizes:
+                for batch_size in batch_sizes:
+                    if not overwrite and self.lookup(name, input_size, batch_size) is not None:
+                        continue
+                    result = measure_backbone_latency(name, input_size, batch_size, num_iters=num_iters)
+                    entries.setdefault(name, {})[self._config_key(input_size, batch_size)] = result
+                    logger.info("{0} {1}: {2:.1f} ms".format(
+                        name, self._config_key(input_size, batch_size), result['latency_ms']))
+            self.save() # 每个骨干网络测量完成后保存，中断后可以继续
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.records, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def rows(self,
+             input_size: Sequence[int],
+             batch_size: int=1) -> List[Dict[str, Any]]:
+        """耗时表(按耗时升序)
+            desc:
+                Parameters:
+                    input_size: 输入尺寸(list(int))——[h, w]
+                    batch_size: batch大小(int)
+                Returns:
+                    (List[Dict[str, Any]])每行: name, top1, latency_ms, images_per_sec
+        """
+        rows = []
+        for name in self._entries():
+            result = self.lookup(name, input_size, batch_size)
+            if result is None:
+                continue
+            top1 = BACKBONE_REGISTRY[name]['top1'] if name in BACKBONE_REGISTRY else None
+            rows.append(dict(name=name, top1=top1, **result))
+        return sorted(rows, key=lambda row: row['latency_ms'])
+
+    def select(self,
+               input_size: Sequence[int],
+               batch_size: int=1,
+               min_top1: Union[float, None]=None,
+               max_latency_ms: Union[float, None]=None) -> Union[str, None]:
+        """在精度预算内选择最快的骨干网络
+            desc:
+                Parameters:
+                    input_size: 输入尺寸(list(int))——[h, w]
+                    batch_size: batch大小(int)
+                    min_top1: 最低参考精度(float)——None表示不限制；限制时跳过参考精度未知的骨干网络
+                    max_latency_ms: 最大耗时(float)——None表示不限制
+                Returns:
+                    (str or None)骨干网络名称——没有满足条件的骨干网络时返回None
+                Others:
+                    - 须先对该输入尺寸与batch大小调用measure
+        """
+        rows = self.rows(input_size, batch_size)
+        if len(rows) == 0:
+            try:
+                raise KeyError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: No latency records for input size {0} and batch size {1}, "
+                             "please call measure() first.".format(list(input_size), batch_size))
+                sys.exit(1)
+        for row in rows:
+            if min_top1 is not None and (row['top1'] is None or row['top1'] < min_top1):
+                continue
+            if max_latency_ms is not None and row['latency_ms'] > max_latency_ms:
+                continue
+            return row['name']
+        return None
@@ -0,0 +1,198 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: conv + norm layer, bn folding
+# 骨干网络、Neck与Head共用的卷积+归一化层:
+# 推理时BatchNorm折叠进前面的卷积(卷积加偏置)，省去归一化的逐元素计算
+import sys
+import paddle
+import paddle.nn as nn
+import paddle.nn.functional as F
+from paddle.distributed.fleet.utils import recompute as paddle_recompute
+
+from typing import Any, Callable, Union
+
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['ConvNormLayer', 'fuse_conv_norm', 'recompute_function', 'recompute_layer']
+
+
+class ConvNormLayer(nn.Layer):
+    def __init__(self,
+                 ch_in: int,
+                 ch_out: int,
+                 filter_size: int,
+                 stride: int=1,
+                 groups: int=1,
+                 norm_type: Union[str, None]='bn',
+                 norm_groups: int=32,
+                 act: Union[str, None]=None) -> None:
+        """卷积 + 归一化 + 激活
+            desc:
+                Parameters:
+                    ch_in: 输入通道数(int)
+                    ch_out: 输出通道数(int)
+                    filter_size: 卷积核大小(int)
+                    stride: 步长(int)
+                    groups: 分组数(int)
+                    norm_type: 归一化类型(str)——'bn', 'gn'或None(带偏置)
+                    norm_groups: GroupNorm的分组数(int)
+                    act: 激活函数名(str)——paddle.nn.functional中的函数名，如'relu', 'hardswish'
+                Returns:
+                    None
+                Others:
+                    - fuse_norm(): eval模式下将BatchNorm折叠进卷积
+                    - GroupNorm的统计量依赖输入，不能折叠
+        """
+        super(ConvNormLayer, self).__init__()
+        self.norm_type = norm_type
+        self.act = act
+        self.conv = nn.Conv2D(ch_in,
+                              ch_out,
+                              kernel_size=filter_size,
+                              stride=stride,
+                              padding=(filter_size - 1) // 2,
+                              groups=groups,
+                              bias_attr=False)
+        if norm_type == 'bn':
+            self.norm = nn.BatchNorm2D(ch_out)
+        elif norm_type == 'gn':
+            self.norm = nn.GroupNorm(num_groups=norm_groups, num_channels=ch_out)
+        else:
+            self.norm = None
+        # 无归一化(或BatchNorm折叠后)的偏置按[C, 1, 1]保存: paddle在CPU上对该形状的广播加法
+        # 比卷积自带偏置([1, C, 1, 1])的加法快数倍
+        self.bias = None
+        if norm_type is None:
+            self.bias = self.create_parameter(shape=[ch_out, 1, 1], is_bias=True)
+
+    def forward(self, x: paddle.Tensor) -> paddle.Tensor:
+        x = self.conv(x)
+        if self.norm is not None:
+            x = self.norm(x)
+        elif self.bias is not None:
+            x = x + self.bias
+        if self.act is not None:
+            x = getattr(F, self.act)(x)
+        return x
+
+    @paddle.no_grad()
+    def fuse_norm(self) -> bool:
+        """将BatchNorm折叠进卷积
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (bool)是否完成折叠——非BatchNorm时返回False
+                Others:
+                    - w' = w * gamma / sqrt(var + eps)
+                    - b' = beta - mean * gamma / sqrt(var + eps)
+        """
+        if not isinstance(self.norm, nn.BatchNorm2D):
+            return False
+        conv, norm = self.conv, self.norm
+        scale = norm.weight / paddle.sqrt(norm._variance + norm._epsilon)
+        conv.weight.set_value(conv.weight * scale.reshape([-1, 1, 1, 1]))
+        self.bias = self.create_parameter(shape=[conv._out_channels, 1, 1], is_bias=True)
+        self.bias.set_value((norm.bias - norm._mean * scale).reshape([-1, 1, 1]))
+        self.norm = None
+        self.norm_type = None
+        return True
+
+
+def fuse_conv_norm(model: nn.Layer) -> int:
+    """将模型中所有ConvNormLayer的BatchNorm折叠进卷积
+        desc:
+            Parameters:
+                model: 模型(nn.Layer)——须处于eval模式
+            Returns:
+                (int)完成折叠的层数
+            Others:
+                - 折叠后的模型不能再训练(BatchNorm的统计量已固化)
+    """
+    if model.training:
+        try:
+            raise RuntimeError()
+        except:
+            error_traceback(logger=logger,
+                            lasterrorline_offset=6,
+                            num_lines=1)
+            logger.error("Summary: The model should be in eval mode (model.eval()) before folding BatchNorm.")
+            sys.exit(1)
+    return sum([int(layer.fuse_norm()) for layer in model.sublayers(include_self=True)
+                if isinstance(layer, ConvNormLayer)])
+
+
+def recompute_function(function: Callable[..., Any],
+                       layer: nn.Layer,
+                       *args: paddle.Tensor) -> Any:
+    """训练时重计算执行function，重计算时不再更新BatchNorm的滑动统计量
+        desc:
+            Parameters:
+                function: 前向函数(Callable)——只使用layer中的参数
+                layer: function所属的网络(nn.Layer)——用于查找其中的BatchNorm
+                *args: function的输入(paddle.Tensor)
+            Returns:
+                (Any)function的输出
+            Others:
+                - 使用hook实现(use_reentrant=False)，在CPU上反向峰值低于PyLayer实现
+                - 反向时的重计算与前向的输入相同，BatchNorm使用同样的批统计量；
+                  重计算前保存滑动均值/方差，重计算后恢复，
+                  每个训练步只更新一次，与不重计算时一致
+    """
+    norms = [sublayer for sublayer in layer.sublayers(include_self=True)
+             if isinstance(sublayer, nn.layer.norm._BatchNormBase)]
+    num_calls = [0]
+
+    def run(*inputs: paddle.Tensor) -> Any:
+        num_calls[0] += 1
+        if num_calls[0] == 1 or len(norms) == 0: # 前向
+            return function(*inputs)
+        # 反向时的重计算: 滑动统计量已在前向中更新过
+        with paddle.no_grad():
+            saved = [(norm._mean.clone(), norm._variance.clone()) for norm in norms]
+        outputs = function(*inputs)
+        with paddle.no_grad():
+            for norm, (mean, variance) in zip(norms, saved):
+                norm._mean.set_value(mean)
+                norm._variance.set_value(variance)
+        return outputs
+
+    return paddle_recompute(run, *args, use_reentrant=False)
+
+
+def recompute_layer(layer: nn.Layer,
+                    x: paddle.Tensor,
+                    enabled: bool=False) -> paddle.Tensor:
+    """执行一个子网络(阶段)，训练时可选择重计算
+        desc:
+            Parameters:
+                layer: 子网络(nn.Layer)
+                x: 输入(paddle.Tensor)
+                enabled: 是否重计算(bool)——eval模式下不生效
+            Returns:
+                (paddle.Tensor)子网络输出
+            Others:
+                - 重计算: 前向时只保留子网络的输入，内部激活在反向时重新计算；
+                  以一次额外的前向计算换取训练时的激活内存
+                - 子网络中BatchNorm的滑动统计量每步只更新一次(见recompute_function)
+    """
+    if enabled and layer.training and len(layer.parameters()) > 0:
+        if x.stop_gradient:
+            # paddle的recompute在所有输入都不需要梯度时不记录反向(如stem的输入图像)，
+            # 此时子网络参数得不到梯度；令输入需要梯度(只多算一次对输入的梯度)
+            x = x.detach()
+            x.stop_gradient = False
+        return recompute_function(layer, layer, x)
+    return layer(x)
@@ -0,0 +1,202 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: mobilenetv3 backbone
+import sys
+import paddle
+import paddle.nn as nn
+import paddle.nn.functional as F
+
+from typing import List
+
+from .layers import ConvNormLayer, recompute_layer
+from .registry import register_backbone
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['SEModule', 'InvertedResidual', 'MobileNetV3']
+
+# 每个倒残差块的配置: 卷积核大小, 扩展通道数, 输出通道数, 是否使用SE, 激活函数, 步长
+MOBILENETV3_CONFIGS = {
+    'large': [
+        [3, 16, 16, False, 'relu', 1],
+        [3, 64, 24, False, 'relu', 2],
+        [3, 72, 24, False, 'relu', 1],
+        [5, 72, 40, True, 'relu', 2],
+        [5, 120, 40, True, 'relu', 1],
+        [5, 120, 40, True, 'relu', 1],
+        [3, 240, 80, False, 'hardswish', 2],
+        [3, 200, 80, False, 'hardswish', 1],
+        [3, 184, 80, False, 'hardswish', 1],
+        [3, 184, 80, False, 'hardswish', 1],
+        [3, 480, 112, True, 'hardswish', 1],
+        [3, 672, 112, True, 'hardswish', 1],
+        [5, 672, 160, True, 'hardswish', 2],
+        [5, 960, 160, True, 'hardswish', 1],
+        [5, 960, 160, True, 'hardswish', 1]
+    ],
+    'small': [
+        [3, 16, 16, True, 'relu', 2],
+        [3, 72, 24, False, 'relu', 2],
+        [3, 88, 24, False, 'relu', 1],
+        [5, 96, 40, True, 'hardswish', 2],
+        [5, 240, 40, True, 'hardswish', 1],
+        [5, 240, 40, True, 'hardswish', 1],
+        [5, 120, 48, True, 'hardswish', 1],
+        [5, 144, 48, True, 'hardswish', 1],
+        [5, 288, 96, True, 'hardswish', 2],
+        [5, 576, 96, True, 'hardswish', 1],
+        [5, 576, 96, True, 'hardswish', 1]
+    ]
+}
+
+
+def make_divisible(value: float,
+                   divisor: int=8) -> int:
+    # 通道数取divisor的整数倍，且不低于原值的90%
+    new_value = max(divisor, int(value + divisor / 2) // divisor * divisor)
+    if new_value < 0.9 * value:
+        new_value += divisor
+    return new_value
+
+
+class SEModule(nn.Layer):
+    def __init__(self,
+                 channel: int,
+                 reduction: int=4) -> None:
+        super(SEModule, self).__init__()
+        mid_channel = make_divisible(channel // reduction)
+        self.conv1 = ConvNormLayer(channel, mid_channel, 1, norm_type=None, act='relu')
+        self.conv2 = ConvNormLayer(mid_channel, channel, 1, norm_type=None, act='hardsigmoid')
+
+    def forward(self, x: paddle.Tensor) -> paddle.Tensor:
+        return x * self.conv2(self.conv1(F.adaptive_avg_pool2d(x, 1)))
+
+
+class InvertedResidual(nn.Layer):
+    def __init__(self,
+                 ch_in: int,
+                 mid_channel: int,
+                 ch_out: int,
+                 filter_size: int,
+                 stride: int,
+                 use_se: bool,
+                 act: str,
+                 norm_type: str='bn') -> None:
+        super(InvertedResidual, self).__init__()
+        self.use_shortcut = stride == 1 and ch_in == ch_out
+        self.expand_conv = None
+        if mid_channel != ch_in:
+            self.expand_conv = ConvNormLayer(ch_in, mid_channel, 1, norm_type=norm_type, act=act)
+        self.depthwise_conv = ConvNormLayer(mid_channel, mid_channel, filter_size, stride=stride,
+                                            groups=mid_channel, norm_type=norm_type, act=act)
+        self.se = SEModule(mid_channel) if use_se else None
+        self.linear_conv = ConvNormLayer(mid_channel, ch_out, 1, norm_type=norm_type)
+
+    def forward(self, x: paddle.Tensor) -> paddle.Tensor:
+        y = x if self.expand_conv is None else self.expand_conv(x)
+        y = self.depthwise_conv(y)
+        if self.se is not None:
+            y = self.se(y)
+        y = self.linear_conv(y)
+        return x + y if self.use_shortcut else y
+
+
+class MobileNetV3(nn.Layer):
+    def __init__(self,
+                 model_name: str='large',
+                 scale: float=1.0,
+                 return_idx: List[int]=[2, 3, 4],
+                 norm_type: str='bn',
+                 recompute_stem: bool=False,
+                 recompute_stages: List[int]=[]) -> None:
+        """MobileNetV3骨干网络
+            desc:
+                Parameters:
+                    model_name: 结构名称(str)——'large', 'small'
+                    scale: 通道缩放系数(float)
+                    return_idx: 输出的阶段序号(list(int))——0~4，分别对应步长2, 4, 8, 16, 32
+                    norm_type: 归一化类型(str)
+                    recompute_stem: 训练时是否重计算stem(bool)
+                    recompute_stages: 训练时重计算的阶段序号(list(int))——0~4
+                Returns:
+                    None
+                Others:
+                    - 重计算见recompute_layer
+                    - 每个阶段从一个步长为2的倒残差块开始，最后一个阶段末尾接1x1卷积(扩展通道)；
+                      small的第一个块步长为2，步长2的阶段只有stem
+                    - out_channels / out_strides: 各输出阶段的通道数与步长
+        """
+        super(MobileNetV3, self).__init__()
+        if model_name not in MOBILENETV3_CONFIGS:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The MobileNetV3 model_name only supports {0}, but now is {1}.".format(
+                    list(MOBILENETV3_CONFIGS.keys()), model_name))
+                sys.exit(1)
+        self.return_idx = return_idx
+        self.recompute_stem = recompute_stem
+        self.recompute_stages = recompute_stages
+        config = MOBILENETV3_CONFIGS[model_name]
+
+        ch_in = make_divisible(16 * scale)
+        self.stem = ConvNormLayer(3, ch_in, 3, stride=2, norm_type=norm_type, act='hardswish')
+        stages, blocks = [], []
+        stage_channels = []
+        for filter_size, mid_channel, ch_out, use_se, act, stride in config:
+            if stride == 2:
+                stages.append(blocks)
+                stage_channels.append(ch_in)
+                blocks = []
+            mid_channel = make_divisible(scale * mid_channel)
+            ch_out = make_divisible(scale * ch_out)
+            blocks.append(InvertedResidual(ch_in, mid_channel, ch_out, filter_size, stride,
+                                           use_se, act, norm_type=norm_type))
+            ch_in = ch_out
+        last_channel = make_divisible(scale * config[-1][1])
+        blocks.append(ConvNormLayer(ch_in, last_channel, 1, norm_type=norm_type, act='hardswish'))
+        stages.append(blocks)
+        stage_channels.append(last_channel)
+        self.stages = nn.LayerList([nn.Sequential(*blocks) for blocks in stages])
+
+        self.out_channels = [stage_channels[idx] for idx in return_idx]
+        self.out_strides = [2 ** (idx + 1) for idx in return_idx]
+
+    def forward(self, x: paddle.Tensor) -> List[paddle.Tensor]:
+        x = recompute_layer(self.stem, x, self.recompute_stem)
+        outs = []
+        for stage_idx, stage in enumerate(self.stages):
+            x = recompute_layer(stage, x, stage_idx in self.recompute_stages)
+            if stage_idx in self.return_idx:
+                outs.append(x)
+        return outs
+
+
+# 参考精度: ImageNet top-1(%)
+@register_backbone('mobilenetv3_large', top1=75.2)
+def mobilenetv3_large(**kwargs) -> MobileNetV3:
+    return MobileNetV3(model_name='large', **kwargs)
+
+
+@register_backbone('mobilenetv3_large_x0_5', top1=69.2)
+def mobilenetv3_large_x0_5(**kwargs) -> MobileNetV3:
+    return MobileNetV3(model_name='large', scale=0.5, **kwargs)
+
+
+@register_backbone('mobilenetv3_small', top1=67.4)
+def mobilenetv3_small(**kwargs) -> MobileNetV3:
+    return MobileNetV3(model_name='small', **kwargs)
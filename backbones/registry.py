@@ -0,0 +1,75 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: backbone registry
+# 骨干网络注册表: 按名称从配置构建骨干网络，并记录参考精度用于按精度预算选择骨干网络
+import sys
+import paddle.nn as nn
+
+from typing import Any, Callable, Dict, List, Union
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['BACKBONE_REGISTRY', 'register_backbone', 'build_backbone', 'list_backbones']
+
+# 骨干网络注册表: 名称 --> {'builder': 构建函数, 'top1': 参考精度}
+BACKBONE_REGISTRY = {}
+
+
+def register_backbone(name: str,
+                      top1: Union[float, None]=None) -> Callable:
+    """注册骨干网络构建函数(装饰器)
+        desc:
+            Parameters:
+                name: 骨干网络名称(str)
+                top1: 参考精度(float)——ImageNet top-1(%)，None表示未知
+            Returns:
+                (Callable)装饰器
+            Others:
+                - 构建函数的关键字参数会透传给骨干网络类
+                - 构建出的骨干网络须提供out_channels与out_strides属性
+    """
+    def decorator(builder: Callable) -> Callable:
+        if name in BACKBONE_REGISTRY and BACKBONE_REGISTRY[name]['builder'] is not builder:
+            logger.warning("The backbone '{0}' has been registered, it will be replaced by {1}.".format(
+                name, builder.__module__))
+        BACKBONE_REGISTRY[name] = {'builder': builder, 'top1': top1}
+        return builder
+    return decorator
+
+
+def build_backbone(config: Union[str, Dict[str, Any]]) -> nn.Layer:
+    """按名称构建骨干网络
+        desc:
+            Parameters:
+                config: 骨干网络名称(str)，或配置(dict)——{'name': 名称, 其余为构建参数}
+            Returns:
+                (nn.Layer)骨干网络
+    """
+    config = {'name': config} if isinstance(config, str) else dict(config)
+    name = config.pop('name', None)
+    if name not in BACKBONE_REGISTRY:
+        try:
+            raise KeyError()
+        except:
+            error_traceback(logger=logger,
+                            lasterrorline_offset=6,
+                            num_lines=1)
+            logger.error("Summary: The backbone '{0}' is not registered, please choose from {1}.".format(
+                name, list_backbones()))
+            sys.exit(1)
+    return BACKBONE_REGISTRY[name]['builder'](**config)
+
+
+def list_backbones() -> List[str]:
+    return sorted(BACKBONE_REGISTRY.keys())
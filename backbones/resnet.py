@@ -0,0 +1,167 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: resnet backbone
+import sys
+import paddle
+import paddle.nn as nn
+import paddle.nn.functional as F
+
+from typing import List, Union
+
+from .layers import ConvNormLayer, recompute_layer
+from .registry import register_backbone
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['BasicBlock', 'BottleneckBlock', 'ResNet']
+
+# 各深度每个阶段的残差块数
+RESNET_DEPTHS = {
+    18: [2, 2, 2, 2],
+    34: [3, 4, 6, 3],
+    50: [3, 4, 6, 3],
+    101: [3, 4, 23, 3]
+}
+
+
+class BasicBlock(nn.Layer):
+    expansion = 1
+
+    def __init__(self,
+                 ch_in: int,
+                 ch_out: int,
+                 stride: int=1,
+                 norm_type: str='bn') -> None:
+        super(BasicBlock, self).__init__()
+        self.conv1 = ConvNormLayer(ch_in, ch_out, 3, stride=stride, norm_type=norm_type, act='relu')
+        self.conv2 = ConvNormLayer(ch_out, ch_out, 3, norm_type=norm_type)
+        self.short = None
+        if stride != 1 or ch_in != ch_out:
+            self.short = ConvNormLayer(ch_in, ch_out, 1, stride=stride, norm_type=norm_type)
+
+    def forward(self, x: paddle.Tensor) -> paddle.Tensor:
+        short = x if self.short is None else self.short(x)
+        return F.relu(self.conv2(self.conv1(x)) + short)
+
+
+class BottleneckBlock(nn.Layer):
+    expansion = 4
+
+    def __init__(self,
+                 ch_in: int,
+                 ch_out: int,
+                 stride: int=1,
+                 norm_type: str='bn') -> None:
+        super(BottleneckBlock, self).__init__()
+        width = ch_out // self.expansion
+        self.conv1 = ConvNormLayer(ch_in, width, 1, norm_type=norm_type, act='relu')
+        self.conv2 = ConvNormLayer(width, width, 3, stride=stride, norm_type=norm_type, act='relu')
+        self.conv3 = ConvNormLayer(width, ch_out, 1, norm_type=norm_type)
+        self.short = None
+        if stride != 1 or ch_in != ch_out:
+            self.short = ConvNormLayer(ch_in, ch_out, 1, stride=stride, norm_type=norm_type)
+
+    def forward(self, x: paddle.Tensor) -> paddle.Tensor:
+        short = x if self.short is None else self.short(x)
+        return F.relu(self.conv3(self.conv2(self.conv1(x))) + short)
+
+
+class ResNet(nn.Layer):
+    def __init__(self,
+                 depth: int=50,
+                 base_channels: int=64,
+                 return_idx: List[int]=[1, 2, 3],
+                 norm_type: str='bn',
+                 recompute_stem: bool=False,
+                 recompute_stages: List[int]=[]) -> None:
+        """ResNet骨干网络
+            desc:
+                Parameters:
+                    depth: 网络深度(int)——18, 34, 50, 101
+                    base_channels: 第一阶段的基础通道数(int)——小于64时为窄版ResNet
+                    return_idx: 输出的阶段序号(list(int))——0~3，分别对应步长4, 8, 16, 32
+                    norm_type: 归一化类型(str)
+                    recompute_stem: 训练时是否重计算stem(bool)
+                    recompute_stages: 训练时重计算的阶段序号(list(int))——0~3
+                Returns:
+                    None
+                Others:
+                    - out_channels / out_strides: 各输出阶段的通道数与步长，供Neck构建使用
+                    - 重计算见recompute_layer: stem与第一阶段的激活最大，优先重计算
+        """
+        super(ResNet, self).__init__()
+        if depth not in RESNET_DEPTHS:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The ResNet depth only supports {0}, but now is {1}.".format(
+                    list(RESNET_DEPTHS.keys()), depth))
+                sys.exit(1)
+        self.depth = depth
+        self.return_idx = return_idx
+        self.recompute_stem = recompute_stem
+        self.recompute_stages = recompute_stages
+        block = BasicBlock if depth < 50 else BottleneckBlock
+
+        self.stem = nn.Sequential(ConvNormLayer(3, base_channels, 7, stride=2, norm_type=norm_type, act='relu'),
+                                  nn.MaxPool2D(kernel_size=3, stride=2, padding=1))
+        self.stages = nn.LayerList()
+        ch_in = base_channels
+        stage_channels = []
+        for stage_idx, num_blocks in enumerate(RESNET_DEPTHS[depth]):
+            ch_out = base_channels * (2 ** stage_idx) * block.expansion
+            blocks = []
+            for block_idx in range(num_blocks):
+                stride = 2 if (block_idx == 0 and stage_idx > 0) else 1
+                blocks.append(block(ch_in, ch_out, stride=stride, norm_type=norm_type))
+                ch_in = ch_out
+            self.stages.append(nn.Sequential(*blocks))
+            stage_channels.append(ch_out)
+
+        self.out_channels = [stage_channels[idx] for idx in return_idx]
+        self.out_strides = [4 * (2 ** idx) for idx in return_idx]
+
+    def forward(self, x: paddle.Tensor) -> List[paddle.Tensor]:
+        x = recompute_layer(self.stem, x, self.recompute_stem)
+        outs = []
+        for stage_idx, stage in enumerate(self.stages):
+            x = recompute_layer(stage, x, stage_idx in self.recompute_stages)
+            if stage_idx in self.return_idx:
+                outs.append(x)
+        return outs
+
+
+# 参考精度: ImageNet top-1(%)，窄版ResNet没有公开的参考精度
+@register_backbone('resnet18', top1=69.8)
+def resnet18(**kwargs) -> ResNet:
+    return ResNet(depth=18, **kwargs)
+
+
+@register_backbone('resnet18_narrow')
+def resnet18_narrow(**kwargs) -> ResNet:
+    kwargs.setdefault('base_channels', 32)
+    return ResNet(depth=18, **kwargs)
+
+
+@register_backbone('resnet34', top1=73.3)
+def resnet34(**kwargs) -> ResNet:
+    return ResNet(depth=34, **kwargs)
+
+
+@register_backbone('resnet50', top1=76.1)
+def resnet50(**kwargs) -> ResNet:
+    return ResNet(depth=50, **kwargs)
@@ -0,0 +1,141 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: shufflenetv2 backbone
+import sys
+import paddle
+import paddle.nn as nn
+
+from typing import List
+
+from .layers import ConvNormLayer, recompute_layer
+from .registry import register_backbone
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['ShuffleUnit', 'ShuffleNetV2']
+
+# 各缩放系数下stage2~stage4的输出通道数
+SHUFFLENETV2_CHANNELS = {
+    0.5: [48, 96, 192],
+    1.0: [116, 232, 464],
+    1.5: [176, 352, 704],
+    2.0: [244, 488, 976]
+}
+
+
+def channel_shuffle(x: paddle.Tensor,
+                    groups: int) -> paddle.Tensor:
+    batch_size, channels, height, width = x.shape
+    x = x.reshape([batch_size, groups, channels // groups, height, width])
+    return x.transpose([0, 2, 1, 3, 4]).reshape([batch_size, channels, height, width])
+
+
+class ShuffleUnit(nn.Layer):
+    def __init__(self,
+                 ch_in: int,
+                 ch_out: int,
+                 stride: int,
+                 norm_type: str='bn') -> None:
+        super(ShuffleUnit, self).__init__()
+        self.stride = stride
+        branch_channel = ch_out // 2
+        self.branch1 = None
+        if stride == 2:
+            self.branch1 = nn.Sequential(
+                ConvNormLayer(ch_in, ch_in, 3, stride=2, groups=ch_in, norm_type=norm_type),
+                ConvNormLayer(ch_in, branch_channel, 1, norm_type=norm_type, act='relu'))
+        branch2_in = ch_in if stride == 2 else branch_channel
+        self.branch2 = nn.Sequential(
+            ConvNormLayer(branch2_in, branch_channel, 1, norm_type=norm_type, act='relu'),
+            ConvNormLayer(branch_channel, branch_channel, 3, stride=stride,
+                          groups=branch_channel, norm_type=norm_type),
+            ConvNormLayer(branch_channel, branch_channel, 1, norm_type=norm_type, act='relu'))
+
+    def forward(self, x: paddle.Tensor) -> paddle.Tensor:
+        if self.stride == 1:
+            x1, x2 = paddle.split(x, 2, axis=1)
+            out = paddle.concat([x1, self.branch2(x2)], axis=1)
+        else:
+            out = paddle.concat([self.branch1(x), self.branch2(x)], axis=1)
+        return channel_shuffle(out, 2)
+
+
+class ShuffleNetV2(nn.Layer):
+    def __init__(self,
+                 scale: float=1.0,
+                 return_idx: List[int]=[0, 1, 2],
+                 norm_type: str='bn',
+                 recompute_stem: bool=False,
+                 recompute_stages: List[int]=[]) -> None:
+        """ShuffleNetV2骨干网络
+            desc:
+                Parameters:
+                    scale: 通道缩放系数(float)——0.5, 1.0, 1.5, 2.0
+                    return_idx: 输出的阶段序号(list(int))——0~2，分别对应步长8, 16, 32
+                    norm_type: 归一化类型(str)
+                    recompute_stem: 训练时是否重计算stem(bool)
+                    recompute_stages: 训练时重计算的阶段序号(list(int))——0~2
+                Returns:
+                    None
+                Others:
+                    - out_channels / out_strides: 各输出阶段的通道数与步长
+                    - 重计算见recompute_layer
+        """
+        super(ShuffleNetV2, self).__init__()
+        if scale not in SHUFFLENETV2_CHANNELS:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The ShuffleNetV2 scale only supports {0}, but now is {1}.".format(
+                    list(SHUFFLENETV2_CHANNELS.keys()), scale))
+                sys.exit(1)
+        self.return_idx = return_idx
+        self.recompute_stem = recompute_stem
+        self.recompute_stages = recompute_stages
+        self.stem = nn.Sequential(ConvNormLayer(3, 24, 3, stride=2, norm_type=norm_type, act='relu'),
+                                  nn.MaxPool2D(kernel_size=3, stride=2, padding=1))
+        self.stages = nn.LayerList()
+        ch_in = 24
+        stage_channels = SHUFFLENETV2_CHANNELS[scale]
+        for num_units, ch_out in zip([4, 8, 4], stage_channels):
+            units = [ShuffleUnit(ch_in, ch_out, 2, norm_type=norm_type)]
+            units += [ShuffleUnit(ch_out, ch_out, 1, norm_type=norm_type) for _ in range(num_units - 1)]
+            self.stages.append(nn.Sequential(*units))
+            ch_in = ch_out
+
+        self.out_channels = [stage_channels[idx] for idx in return_idx]
+        self.out_strides = [8 * (2 ** idx) for idx in return_idx]
+
+    def forward(self, x: paddle.Tensor) -> List[paddle.Tensor]:
+        x = recompute_layer(self.stem, x, self.recompute_stem)
+        outs = []
+        for stage_idx, stage in enumerate(self.stages):
+            x = recompute_layer(stage, x, stage_idx in self.recompute_stages)
+            if stage_idx in self.return_idx:
+                outs.append(x)
+        return outs
+
+
+# 参考精度: ImageNet top-1(%)
+@register_backbone('shufflenetv2_x0_5', top1=60.3)
+def shufflenetv2_x0_5(**kwargs) -> ShuffleNetV2:
+    return ShuffleNetV2(scale=0.5, **kwargs)
+
+
+@register_backbone('shufflenetv2_x1_0', top1=69.4)
+def shufflenetv2_x1_0(**kwargs) -> ShuffleNetV2:
+    return ShuffleNetV2(scale=1.0, **kwargs)
@@ -11,16 +11,44 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from .det import *
-from .voc import *
-from .coco import *
-from .reader import *
-from .dataset import *
+# 按需导入: 子模块在首次访问其导出名称时才导入
+# (det/voc依赖paddle，只使用采样器/行索引时不导入paddle)
+import importlib
+
+from typing import Any, List
+
+# 子模块 --> 导出的名称
+_LAZY_IMPORTS = {
+    'det': ['check_img_endswith', 'DetDataset', 'ImageFolder'],
+    'voc': ['generate_Vocdataset_and_Voclable', 'VOCDataset'],
+    'coco': ['voc2coco'],
+    'reader': [],
+    'dataset': [],
+    'line_index': ['build_line_index', 'LineIndexedFile'],
+    'sampler': ['AspectRatioBatchSampler']
+}
+_ATTR_TO_MODULE = {attr: module for module, attrs in _LAZY_IMPORTS.items() for attr in attrs}
 
 __all__ = [
     'det',
     'voc',
     'coco',
     'reader',
-    'dataset'
-]
\ No newline at end of file
+    'dataset',
+    'line_index',
+    'sampler'
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_IMPORTS:
+        return importlib.import_module('.' + name, __name__)
+    if name in _ATTR_TO_MODULE:
+        value = getattr(importlib.import_module('.' + _ATTR_TO_MODULE[name], __name__), name)
+        globals()[name] = value # 之后直接从模块字典读取
+        return value
+    raise AttributeError("module '{0}' has no attribute '{1}'".format(__name__, name))
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_IMPORTS) | set(_ATTR_TO_MODULE))
@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os, sys
-from symbol import with_item
 import shutil
 import json
 from xml.etree import ElementTree as ET
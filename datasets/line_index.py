@@ -0,0 +1,268 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: line index of annotation list files
+# 标注说明文件(train_list.txt等)的行偏移索引:
+# 索引文件与标注说明文件同目录，命名为: 文件名 + '.idx.npy'
+# 内容为uint64数组: [行0起始偏移, 行1起始偏移, ..., 文件字节长度]
+import os, sys
+import mmap
+import numpy as np
+
+from typing import Iterator, Tuple, Union
+
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['build_line_index', 'LineIndexedFile']
+
+INDEX_SUFFIX = '.idx.npy'
+
+
+def _scan_line_offsets(buffer: Union[mmap.mmap, bytes],
+                       file_size: int,
+                       chunk_size: int=1<<26) -> np.ndarray:
+    """向量化扫描换行符，得到每一行的起始偏移
+        desc:
+            Parameters:
+                buffer: 文件内容缓冲(mmap.mmap or bytes)
+                file_size: 文件字节长度(int)
+                chunk_size: 单次扫描的字节数(int)——限制临时内存
+            Returns:
+                (np.ndarray)uint64行偏移数组，末尾追加文件长度作为哨兵
+    """
+    offsets = [np.zeros((1,), dtype=np.uint64)] # 第一行起始于0
+    for start in range(0, file_size, chunk_size):
+        end = min(start + chunk_size, file_size)
+        chunk = np.frombuffer(buffer, dtype=np.uint8,
+                              count=end - start, offset=start)
+        # 换行符的下一个字节即为下一行的起始
+        newlines = np.flatnonzero(chunk == ord('\n')).astype(np.uint64)
+        offsets.append(newlines + np.uint64(start + 1))
+        del chunk # 及时释放对mmap的引用
+    offsets = np.concatenate(offsets)
+    # 文件以换行结尾时，最后一个起始偏移等于文件长度，不构成新行
+    if offsets[-1] != file_size:
+        offsets = np.append(offsets, np.uint64(file_size))
+    return offsets
+
+
+def build_line_index(file_path: str,
+                     index_path: Union[str, None]=None,
+                     save: bool=True) -> np.ndarray:
+    """为标注说明文件构建行偏移索引，并保存到文件旁
+        desc:
+            Parameters:
+                file_path: 标注说明文件路径(str)
+                index_path: 索引保存路径(str)——None则为file_path+'.idx.npy'
+                save: 是否保存索引文件(bool)
+            Returns:
+                (np.ndarray)uint64行偏移数组，长度为行数+1
+    """
+    if not os.path.isfile(file_path):
+        try:
+            raise ValueError()
+        except:
+            error_traceback(logger=logger,
+                            lasterrorline_offset=6,
+                            num_lines=1)
+            logger.error("Summary: The file_path should be a existed file.(path at: {0})".format(
+                file_path))
+            sys.exit(1)
+    if index_path is None:
+        index_path = file_path + INDEX_SUFFIX
+
+    file_size = os.path.getsize(file_path)
+    if file_size == 0: # 空文件无法mmap
+        offsets = np.zeros((1,), dtype=np.uint64)
+    else:
+        with open(file_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                offsets = _scan_line_offsets(mm, file_size)
+
+    if save:
+        try:
+            np.save(index_path, offsets)
+        except OSError:
+            # 只读目录等情况下仅在内存中使用索引
+            logger.warning("The line index can't be saved.(path at: {0})".format(
+                index_path))
+    return offsets
+
+
+class LineIndexedFile(object):
+    def __init__(self,
+                 file_path: str,
+                 index_path: Union[str, None]=None,
+                 rebuild: bool=False,
+                 encoding: str='utf-8') -> None:
+        """基于行偏移索引与mmap的标注说明文件读取类
+            desc:
+                Parameters:
+                    file_path: 标注说明文件路径(str)
+                    index_path: 索引文件路径(str)——None则为file_path+'.idx.npy'
+                    rebuild: 是否强制重建索引(bool)
+                    encoding: 行文本的解码格式(str)
+                Returns:
+                    None
+                Others:
+                    - 索引只构建一次，之后通过np.load(mmap_mode='r')直接加载
+                    - 索引比标注文件旧或长度不匹配时自动重建
+                    - 任意行/行范围的定位为O(1)，不需要读取整个文件
+                    - 支持pickle，进程间传递时只传递路径，子进程中重新mmap
+        """
+        super(LineIndexedFile, self).__init__()
+        self.file_path = file_path
+        self.index_path = index_path if index_path is not None \
+            else file_path + INDEX_SUFFIX
+        self.encoding = encoding
+        self._offsets = self._load_index(rebuild=rebuild)
+        self._file = None
+        self._mm = None
+
+    def _load_index(self, rebuild: bool=False) -> np.ndarray:
+        """加载行偏移索引(不存在或过期则重建)
+            desc:
+                Parameters:
+                    rebuild: 是否强制重建索引(bool)
+                Returns:
+                    (np.ndarray)uint64行偏移数组
+        """
+        if not rebuild and os.path.isfile(self.index_path) and \
+                os.path.getmtime(self.index_path) >= os.path.getmtime(self.file_path):
+            offsets = np.load(self.index_path, mmap_mode='r')
+            # 哨兵(文件长度)一致才认为索引有效
+            if offsets.dtype == np.uint64 and len(offsets) > 0 and \
+                    int(offsets[-1]) == os.path.getsize(self.file_path):
+                return offsets
+            logger.warning("The line index is out of date, it will be rebuilt.(path at: {0})".format(
+                self.index_path))
+        return build_line_index(self.file_path, index_path=self.index_path)
+
+    def _open(self) -> None:
+        """按需打开文件的只读mmap
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        if self._mm is not None or len(self) == 0:
+            return
+        self._file = open(self.file_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        """关闭mmap与文件句柄
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'LineIndexedFile':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict:
+        # mmap与文件句柄不能跨进程传递，子进程中按需重新打开
+        state = self.__dict__.copy()
+        state['_file'] = None
+        state['_mm'] = None
+        state['_offsets'] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._offsets = self._load_index()
+
+    def __len__(self) -> int:
+        """返回文件行数
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (int)行数
+        """
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        """获取指定行(去除行尾换行符)
+            desc:
+                Parameters:
+                    index: 行号(int)
+                Returns:
+                    (str)行文本
+        """
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("The line index({0}) is out of range.".format(index))
+        self._open()
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._mm[start:end].decode(self.encoding).rstrip('\r\n')
+
+    def lines(self,
+              start: int=0,
+              end: Union[int, None]=None) -> Iterator[str]:
+        """按行遍历[start, end)范围内的文本
+            desc:
+                Parameters:
+                    start: 起始行号(int)
+                    end: 结束行号(int)——None表示到文件末尾
+                Returns:
+                    (Iterator[str])行文本迭代器
+        """
+        end = len(self) if end is None else min(end, len(self))
+        if start >= end:
+            return
+        self._open()
+        for idx in range(start, end):
+            line_start = int(self._offsets[idx])
+            line_end = int(self._offsets[idx + 1])
+            yield self._mm[line_start:line_end].decode(self.encoding).rstrip('\r\n')
+
+    def shard_range(self,
+                    num_shards: int=1,
+                    shard_id: int=0) -> Tuple[int, int]:
+        """计算均匀分片后指定分片的行范围
+            desc:
+                Parameters:
+                    num_shards: 分片总数(int)
+                    shard_id: 当前分片序号(int: [0, num_shards))
+                Returns:
+                    (Tuple[int, int])分片行范围[start, end)
+        """
+        if num_shards <= 0 or shard_id < 0 or shard_id >= num_shards:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The shard_id should be in [0, num_shards)"
+                    ".(num_shards: {0}, shard_id: {1})".format(num_shards, shard_id))
+                sys.exit(1)
+        num_lines = len(self)
+        start = num_lines * shard_id // num_shards
+        end = num_lines * (shard_id + 1) // num_shards
+        return start, end
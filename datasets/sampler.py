@@ -0,0 +1,111 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: aspect ratio batch sampler
+import sys
+import numpy as np
+
+from typing import Iterator, List, Sequence, Union
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['AspectRatioBatchSampler']
+
+
+class AspectRatioBatchSampler(object):
+    def __init__(self,
+                 aspect_ratios: Sequence[float],
+                 batch_size: int=1,
+                 boundaries: List[float]=[1.],
+                 shuffle: bool=True,
+                 drop_last: bool=False,
+                 seed: Union[int, None]=None) -> None:
+        """按宽高比分桶的批量采样器: 同一批量内的样本宽高比位于同一区间
+            desc:
+                Parameters:
+                    aspect_ratios: 每个样本的宽高比w/h(Sequence[float])
+                    batch_size: 批量大小(int)
+                    boundaries: 分桶边界(list(float))——[1.]表示横向图与纵向图分开
+                    shuffle: 是否打乱(桶内样本与批量顺序)(bool)
+                    drop_last: 是否丢弃每个桶中不足一个批量的样本(bool)
+                    seed: 随机种子(int)——每个epoch在此基础上递增
+                Returns:
+                    None
+                Others:
+                    - 可以直接作为paddle.io.DataLoader的batch_sampler使用
+                    - 与批量级缩放(BatchRandomResize)配合，批内图像尺寸接近，补零像素少
+        """
+        super(AspectRatioBatchSampler, self).__init__()
+        if batch_size < 1:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The batch_size should be more than 0.(batch_size: {0})".format(batch_size))
+                sys.exit(1)
+        self.aspect_ratios = np.asarray(aspect_ratios, dtype=np.float32)
+        self.batch_size = batch_size
+        self.boundaries = boundaries
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        # 每个样本所在的桶
+        self.bucket_ids = np.searchsorted(np.asarray(boundaries, dtype=np.float32),
+                                          self.aspect_ratios, side='right')
+
+    @classmethod
+    def from_samples(cls,
+                     samples: Sequence[dict],
+                     **kwargs) -> 'AspectRatioBatchSampler':
+        """根据数据集解析得到的样本记录(含h、w字段)创建采样器
+            desc:
+                Parameters:
+                    samples: 样本记录(list(dict))——h: 图像高, w: 图像宽
+                    **kwargs: 其余参数同__init__
+                Returns:
+                    (AspectRatioBatchSampler)采样器
+        """
+        return cls([float(s['w']) / float(s['h']) for s in samples], **kwargs)
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def _batches(self) -> List[List[int]]:
+        rng = np.random.default_rng(None if self.seed is None else self.seed + self.epoch)
+        batches = []
+        for bucket in np.unique(self.bucket_ids):
+            indexes = np.flatnonzero(self.bucket_ids == bucket)
+            if self.shuffle:
+                indexes = rng.permutation(indexes)
+            for start in range(0, len(indexes), self.batch_size):
+                batch = indexes[start:start + self.batch_size]
+                if len(batch) < self.batch_size and self.drop_last:
+                    continue
+                batches.append(batch.tolist())
+        if self.shuffle:
+            batches = [batches[idx] for idx in rng.permutation(len(batches))]
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self._batches()
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self) -> int:
+        counts = np.bincount(self.bucket_ids)
+        if self.drop_last:
+            return int((counts // self.batch_size).sum())
+        return int(np.ceil(counts[counts > 0] / self.batch_size).sum())
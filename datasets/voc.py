@@ -20,6 +20,7 @@ from xml.etree import ElementTree as ET
 from typing import List, Dict, Any
 
 from .det import DetDataset, check_img_endswith
+from .line_index import LineIndexedFile
 from loggers import create_logger, error_traceback
 logger = create_logger(logger_name=__name__)
 
@@ -154,6 +155,8 @@ class VOCDataset(DetDataset):
                  sample_num=-1,
                  allow_empty=False,
                  empty_ratio=1.,
+                 num_shards=1,
+                 shard_id=0,
                  **kwargs):
         """VOC检测数据集解析加载类
             desc:
@@ -185,6 +188,8 @@ class VOCDataset(DetDataset):
                     allow_empty: 支持采集没有一个目标的样本(bool)——空样本
                     empty_ratio: 空样本占有目标样本的数量比例(float: [0., 1.])
                                  在allow_empty为True时有效
+                    num_shards: 标注说明文件按行均匀划分的分片数(int)
+                    shard_id: 当前解析的分片序号(int: [0, num_shards))
                 Returns:
                     None
                 Others:
@@ -210,6 +215,10 @@ class VOCDataset(DetDataset):
                                         label2
                                         ...
                                         ```
+                    - 标注说明文件通过行偏移索引(标注说明文件+'.idx.npy')与mmap读取，
+                      索引首次解析时构建，分片解析时直接定位到分片的行范围
+                    - 图片id(im_id)从分片的起始行开始编号，各分片的图片id互不重叠；
+                      所有行均为有效样本时，各分片的图片id合起来与不分片时一致
         """
         super(VOCDataset, self).__init__(
             dataset_dir=dataset_dir,
@@ -222,6 +231,8 @@ class VOCDataset(DetDataset):
         self.lable_list = label_list
         self.allow_empty = allow_empty
         self.empty_ratio = empty_ratio
+        self.num_shards = num_shards
+        self.shard_id = shard_id
     
     def _sample_empty(self,
                       records: Dict[str, Any],
@@ -293,8 +304,13 @@ class VOCDataset(DetDataset):
         
         # 打开标注说明文件(train_list.txt等)
         # 其中每一行都表示一个样本的图片+' '+标注文件
-        with open(anno_path, 'r') as f:
-            for line in f.readlines():
+        # 通过行偏移索引+mmap按行读取，不再一次性读入所有行
+        with LineIndexedFile(anno_path) as f:
+            start, end = f.shard_range(num_shards=self.num_shards,
+                                       shard_id=self.shard_id)
+            for line in f.lines(start, end):
+                if not line.strip(): # 跳过空行
+                    continue
                 # 解析出图片、标注文件的真实路径
                 img_file, xml_file = [
                     os.path.join(image_dir, x) \
@@ -374,7 +390,7 @@ class VOCDataset(DetDataset):
                 # voc样本的基本参数记录(当解析需要包含图片信息时的模板)
                 voc_record = {
                     'im_file': img_file, # 样本图片路径
-                    'im_id': count, # 分配的图片id
+                    'im_id': start + count, # 分配的图片id
                     'h': im_h, # 图片高
                     'w': im_w, # 图片宽
                 } if 'image' in self.data_fields else {}
@@ -427,8 +443,9 @@ class VOCDataset(DetDataset):
             logger.info("Finished collect {0} sample to use.".format(len(records)))
 
             # 遍历样本并重置图片id
+            # 从分片的起始行开始编号，保证不同分片的图片id互不重叠
             for idx, _record in enumerate(records):
-                _record['im_id'] = idx
+                _record['im_id'] = start + idx
             self.samples = records
             self.cls2id = cls2id
             self.length = len(self.samples)
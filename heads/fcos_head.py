@@ -11,3 +11,195 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# includes: fcos head
+import math
+import numpy as np
+import paddle
+import paddle.nn as nn
+import paddle.nn.functional as F
+
+from typing import Dict, List, Tuple, Union
+
+from backbones import ConvNormLayer
+
+__all__ = ['ScaleReg', 'FCOSHead']
+
+
+class ScaleReg(nn.Layer):
+    def __init__(self) -> None:
+        """各层级回归输出的可学习缩放系数(初始为1)
+        """
+        super(ScaleReg, self).__init__()
+        self.scale = self.create_parameter(shape=[1],
+                                           default_initializer=nn.initializer.Constant(1.))
+
+    def forward(self, x: paddle.Tensor) -> paddle.Tensor:
+        return x * self.scale
+
+
+class FCOSHead(nn.Layer):
+    def __init__(self,
+                 num_classes: int=80,
+                 in_channel: int=256,
+                 feat_channel: int=256,
+                 num_convs: int=4,
+                 fpn_strides: List[int]=[8, 16, 32, 64, 128],
+                 norm_type: Union[str, None]='gn',
+                 prior_prob: float=0.01,
+                 norm_reg_targets: bool=True,
+                 centerness_on_reg: bool=True,
+                 pack_levels: int=0) -> None:
+        """FCOS检测头(各层级共享)
+            desc:
+                Parameters:
+                    num_classes: 类别数(int)
+                    in_channel: 输入通道数(int)
+                    feat_channel: 分类/回归分支的通道数(int)
+                    num_convs: 分类/回归分支的卷积层数(int)
+                    fpn_strides: 各层级的步长(list(int))
+                    norm_type: 分支卷积的归一化类型(str)——'gn', 'bn'或None;
+                               CPU推理建议使用'bn'(可折叠进卷积)
+                    prior_prob: 分类输出的初始先验概率(float)
+                    norm_reg_targets: 回归目标是否按步长归一化(bool)——与FCOSTarget保持一致
+                    centerness_on_reg: centerness是否接在回归分支上(bool)
+                    pack_levels: 推理时打包为一次卷积的最小层级数(int)——0表示逐层级计算
+                Returns:
+                    None
+                Others:
+                    - 训练模式(forward): 返回各层级的cls_logits, bbox_reg, centerness(NCHW)，供损失计算
+                    - 推理模式(predict): 不保留各层级的中间输出，直接返回拼接后的
+                      scores[B, P, C](分类概率 * centerness)与ltrb[B, P, 4](像素距离)
+                    - pack_levels > 0时，最小的pack_levels个层级在宽度方向拼接(层级间隔一列0)，
+                      分支卷积只计算一次，每层卷积后用掩码将间隔与填充区域置0；
+                      GroupNorm的统计量按层级计算，使用GN时不打包
+        """
+        super(FCOSHead, self).__init__()
+        self.num_classes = num_classes
+        self.fpn_strides = fpn_strides
+        self.norm_reg_targets = norm_reg_targets
+        self.centerness_on_reg = centerness_on_reg
+        self.pack_levels = pack_levels
+
+        self.cls_tower = nn.LayerList()
+        self.reg_tower = nn.LayerList()
+        for idx in range(num_convs):
+            ch_in = in_channel if idx == 0 else feat_channel
+            self.cls_tower.append(ConvNormLayer(ch_in, feat_channel, 3, norm_type=norm_type, act='relu'))
+            self.reg_tower.append(ConvNormLayer(ch_in, feat_channel, 3, norm_type=norm_type, act='relu'))
+
+        bias_init = -math.log((1 - prior_prob) / prior_prob)
+        self.fcos_head_cls = nn.Conv2D(feat_channel, num_classes, 3, padding=1,
+                                       bias_attr=paddle.ParamAttr(
+                                           initializer=nn.initializer.Constant(bias_init)))
+        self.fcos_head_reg = nn.Conv2D(feat_channel, 4, 3, padding=1)
+        self.fcos_head_centerness = nn.Conv2D(feat_channel, 1, 3, padding=1)
+        self.scales = nn.LayerList([ScaleReg() for _ in fpn_strides])
+        self._pack_masks = {} # 打包布局 --> 掩码
+
+    def _towers(self,
+                x: paddle.Tensor,
+                mask: Union[paddle.Tensor, None]=None) -> Tuple[paddle.Tensor, paddle.Tensor, paddle.Tensor]:
+        cls_feat, reg_feat = x, x
+        for cls_conv, reg_conv in zip(self.cls_tower, self.reg_tower):
+            cls_feat = cls_conv(cls_feat)
+            reg_feat = reg_conv(reg_feat)
+            if mask is not None:
+                cls_feat = cls_feat * mask
+                reg_feat = reg_feat * mask
+        cls_logits = self.fcos_head_cls(cls_feat)
+        bbox_reg = self.fcos_head_reg(reg_feat)
+        centerness = self.fcos_head_centerness(reg_feat if self.centerness_on_reg else cls_feat)
+        return cls_logits, bbox_reg, centerness
+
+    def _packable(self) -> bool:
+        return (self.pack_levels > 1 and not self.training and
+                not any([isinstance(conv.norm, nn.GroupNorm) for conv in self.cls_tower]))
+
+    def _pack_mask(self,
+                   shapes: Tuple[Tuple[int, int], ...]) -> paddle.Tensor:
+        mask = self._pack_masks.get(shapes, None)
+        if mask is None:
+            pack_h = max([h for h, _ in shapes])
+            mask = np.zeros((1, 1, pack_h, sum([w + 1 for _, w in shapes])), dtype=np.float32)
+            x = 0
+            for h, w in shapes:
+                mask[:, :, :h, x:x + w] = 1.
+                x += w + 1
+            mask = paddle.to_tensor(mask)
+            self._pack_masks[shapes] = mask
+        return mask
+
+    def _packed_towers(self,
+                       feats: List[paddle.Tensor]) -> List[Tuple[paddle.Tensor, paddle.Tensor, paddle.Tensor]]:
+        # 各层级在宽度方向拼接为一张特征图，分支卷积只计算一次，再按层级切分
+        shapes = tuple([tuple(feat.shape[2:]) for feat in feats])
+        pack_h = max([h for h, _ in shapes])
+        x = paddle.concat([F.pad(feat, [0, 1, 0, pack_h - h]) for feat, (h, _) in zip(feats, shapes)],
+                          axis=3)
+        packed = self._towers(x, mask=self._pack_mask(shapes))
+        outs, x = [], 0
+        for h, w in shapes:
+            outs.append(tuple([out[:, :, :h, x:x + w] for out in packed]))
+            x += w + 1
+        return outs
+
+    def _level_outputs(self,
+                       feats: List[paddle.Tensor]) -> List[Tuple[paddle.Tensor, paddle.Tensor, paddle.Tensor]]:
+        if not self._packable():
+            return [self._towers(feat) for feat in feats]
+        num_single = max(len(feats) - self.pack_levels, 0)
+        return ([self._towers(feat) for feat in feats[:num_single]] +
+                self._packed_towers(feats[num_single:]))
+
+    def forward(self,
+                feats: List[paddle.Tensor]) -> Dict[str, List[paddle.Tensor]]:
+        """训练输出
+            desc:
+                Parameters:
+                    feats: 各层级特征(list(paddle.Tensor))——[B, C, h, w]
+                Returns:
+                    (Dict[str, List[paddle.Tensor]])各层级输出:
+                        - cls_logits: [B, num_classes, h, w]
+                        - bbox_reg: [B, 4, h, w]——norm_reg_targets时为按步长归一化的距离
+                        - centerness: [B, 1, h, w]
+        """
+        cls_logits, bbox_reg, centerness = [], [], []
+        for level, (cls_out, reg_out, ctr_out) in enumerate(self._level_outputs(feats)):
+            reg_out = self.scales[level](reg_out)
+            reg_out = F.relu(reg_out) if self.norm_reg_targets else paddle.exp(reg_out)
+            cls_logits.append(cls_out)
+            bbox_reg.append(reg_out)
+            centerness.append(ctr_out)
+        return {'cls_logits': cls_logits, 'bbox_reg': bbox_reg, 'centerness': centerness}
+
+    @paddle.no_grad()
+    def predict(self,
+                feats: List[paddle.Tensor]) -> Dict[str, paddle.Tensor]:
+        """推理输出(不计算/保留训练分支)
+            desc:
+                Parameters:
+                    feats: 各层级特征(list(paddle.Tensor))——[B, C, h, w]
+                Returns:
+                    (Dict[str, paddle.Tensor])所有层级拼接后的输出:
+                        - scores: [B, P, num_classes]——sigmoid(cls) * sigmoid(centerness)
+                        - ltrb: [B, P, 4]——位置点到框四边的像素距离
+                        - feature_sizes: 各层级特征图尺寸(tuple)——用于恢复位置点(fcos_location_cache)
+                Others:
+                    - 位置点顺序与fcos_locations一致: 层级优先，层级内按行优先
+        """
+        scores, ltrb = [], []
+        for level, (cls_out, reg_out, ctr_out) in enumerate(self._level_outputs(feats)):
+            # 缩放系数与步长合并为一个常数
+            scale = self.scales[level].scale.item()
+            stride = self.fpn_strides[level]
+            if self.norm_reg_targets:
+                reg_out = (F.relu(reg_out * scale) * stride if scale <= 0 else
+                           F.relu(reg_out) * (scale * stride))
+            else:
+                reg_out = paddle.exp(reg_out * scale)
+            score = F.sigmoid(cls_out) * F.sigmoid(ctr_out)
+            scores.append(score.flatten(start_axis=2))
+            ltrb.append(reg_out.flatten(start_axis=2))
+        return {'scores': paddle.concat(scores, axis=2).transpose([0, 2, 1]),
+                'ltrb': paddle.concat(ltrb, axis=2).transpose([0, 2, 1]),
+                'feature_sizes': tuple([tuple(feat.shape[2:]) for feat in feats])}
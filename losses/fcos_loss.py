@@ -11,3 +11,184 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# includes: fcos loss
+# 分类focal loss、回归GIoU loss与centerness BCE均在整个batch、所有层级拼接后的张量上一次计算，
+# 正样本点由一个索引张量一次取出；
+# focal loss先按全部为负样本计算(不生成one-hot)，再在正样本点的对应类别上修正
+import numpy as np
+import paddle
+import paddle.nn as nn
+import paddle.nn.functional as F
+
+from typing import Any, Dict, List, Union
+
+__all__ = ['flatten_levels', 'sigmoid_focal_loss', 'giou_loss', 'FCOSLoss']
+
+
+def flatten_levels(level_outputs: List[paddle.Tensor],
+                   channels_last: bool=False) -> paddle.Tensor:
+    """将各层级的输出/目标拼接为[B * P, C]
+        desc:
+            Parameters:
+                level_outputs: 各层级张量(list(paddle.Tensor))——[B, C, h, w]，channels_last时为[B, h, w, C]
+                channels_last: 通道是否在最后一维(bool)——FCOSTarget输出的目标为channels_last
+            Returns:
+                (paddle.Tensor)[B * P, C]——P为所有层级的位置点数，位置点顺序与fcos_locations一致
+    """
+    if not channels_last:
+        level_outputs = [output.transpose([0, 2, 3, 1]) for output in level_outputs]
+    flat = paddle.concat([output.reshape([output.shape[0], -1, output.shape[-1]])
+                          for output in level_outputs], axis=1)
+    return flat.reshape([-1, flat.shape[-1]])
+
+
+def _focal_term(logit: paddle.Tensor,
+                alpha: float,
+                gamma: float) -> paddle.Tensor:
+    # 负样本项: (1 - alpha) * p^gamma * BCE(x, 0)，其中BCE(x, 0) = softplus(x)
+    prob = F.sigmoid(logit)
+    modulator = prob * prob if gamma == 2. else paddle.pow(prob, gamma)
+    return (1. - alpha) * modulator * F.softplus(logit)
+
+
+def sigmoid_focal_loss(logits: paddle.Tensor,
+                       pos_index: paddle.Tensor,
+                       alpha: float=0.25,
+                       gamma: float=2.0) -> paddle.Tensor:
+    """稀疏正样本的sigmoid focal loss(求和)
+        desc:
+            Parameters:
+                logits: 分类输出(paddle.Tensor)——任意形状
+                pos_index: 正样本元素在logits中的索引(paddle.Tensor)——[N, logits.ndim]
+                alpha: 正样本权重(float)
+                gamma: 难易样本调制系数(float)
+            Returns:
+                (paddle.Tensor)所有元素的focal loss之和
+            Others:
+                - 与one-hot标签的F.sigmoid_focal_loss(reduction='sum')相等，
+                  但稠密部分只计算负样本项，不生成one-hot标签
+    """
+    loss = _focal_term(logits, alpha, gamma).sum()
+    if pos_index.shape[0] == 0:
+        return loss
+    pos_logit = paddle.gather_nd(logits, pos_index)
+    # 正样本项: alpha * (1 - p)^gamma * BCE(x, 1)，其中1 - p = sigmoid(-x)，BCE(x, 1) = softplus(-x)
+    pos_loss = _focal_term(-pos_logit, 1. - alpha, gamma)
+    return loss + (pos_loss - _focal_term(pos_logit, alpha, gamma)).sum()
+
+
+def giou_loss(pred: paddle.Tensor,
+              target: paddle.Tensor) -> paddle.Tensor:
+    """位置点到四边距离(l, t, r, b)形式的GIoU loss
+        desc:
+            Parameters:
+                pred: 预测距离(paddle.Tensor)——[N, 4]，非负
+                target: 目标距离(paddle.Tensor)——[N, 4]
+            Returns:
+                (paddle.Tensor)每个点的损失 1 - GIoU——[N]
+    """
+    pred_area = (pred[:, 0] + pred[:, 2]) * (pred[:, 1] + pred[:, 3])
+    target_area = (target[:, 0] + target[:, 2]) * (target[:, 1] + target[:, 3])
+    inter_lt = paddle.minimum(pred, target)
+    outer_lt = paddle.maximum(pred, target)
+    inter = (inter_lt[:, 0] + inter_lt[:, 2]) * (inter_lt[:, 1] + inter_lt[:, 3])
+    enclose = (outer_lt[:, 0] + outer_lt[:, 2]) * (outer_lt[:, 1] + outer_lt[:, 3]) + 1e-7
+    union = pred_area + target_area - inter + 1e-7
+    giou = inter / union - (enclose - union) / enclose
+    return 1. - giou
+
+
+class FCOSLoss(nn.Layer):
+    def __init__(self,
+                 num_classes: int=80,
+                 num_levels: int=5,
+                 loss_alpha: float=0.25,
+                 loss_gamma: float=2.0,
+                 reg_weight: float=1.0,
+                 centerness_weight: float=1.0) -> None:
+        """FCOS损失
+            desc:
+                Parameters:
+                    num_classes: 类别数(int)
+                    num_levels: FPN层级数(int)
+                    loss_alpha: focal loss的alpha(float)
+                    loss_gamma: focal loss的gamma(float)
+                    reg_weight: 回归损失权重(float)
+                    centerness_weight: centerness损失权重(float)
+                Returns:
+                    None
+                Others:
+                    - 输入: FCOSHead的训练输出 + FCOSTarget生成的batch目标
+                      (labels{i}: [B, h, w, 1], reg_target{i}: [B, h, w, 4], centerness{i}: [B, h, w, 1])
+                    - 分类损失按整个batch的正样本数归一化；
+                      回归损失以centerness目标加权，并按centerness目标之和归一化
+        """
+        super(FCOSLoss, self).__init__()
+        self.num_classes = num_classes
+        self.num_levels = num_levels
+        self.loss_alpha = loss_alpha
+        self.loss_gamma = loss_gamma
+        self.reg_weight = reg_weight
+        self.centerness_weight = centerness_weight
+
+    def _targets(self,
+                 inputs: Dict[str, Any],
+                 name: str) -> paddle.Tensor:
+        targets = []
+        for level in range(self.num_levels):
+            target = inputs['{0}{1}'.format(name, level)]
+            if isinstance(target, np.ndarray):
+                target = paddle.to_tensor(target)
+            targets.append(target)
+        return flatten_levels(targets, channels_last=True)
+
+    def forward(self,
+                outputs: Dict[str, List[paddle.Tensor]],
+                inputs: Dict[str, Any]) -> Dict[str, paddle.Tensor]:
+        """计算损失
+            desc:
+                Parameters:
+                    outputs: FCOSHead的训练输出(dict)——cls_logits, bbox_reg, centerness
+                    inputs: batch数据(dict)——包含各层级的labels{i}, reg_target{i}, centerness{i}
+                Returns:
+                    (Dict[str, paddle.Tensor])loss_cls, loss_box, loss_centerness, loss
+        """
+        # 分类输出不转置: [B, C, P]
+        batch_size = outputs['cls_logits'][0].shape[0]
+        cls_logits = paddle.concat([output.reshape([batch_size, self.num_classes, -1])
+                                    for output in outputs['cls_logits']], axis=2)
+        num_points = cls_logits.shape[2]
+        bbox_reg = flatten_levels(outputs['bbox_reg'])               # [B*P, 4]
+        centerness = flatten_levels(outputs['centerness'])           # [B*P, 1]
+        labels = self._targets(inputs, 'labels').reshape([-1])       # [B*P]
+        reg_target = self._targets(inputs, 'reg_target')             # [B*P, 4]
+        ctr_target = self._targets(inputs, 'centerness').reshape([-1])
+
+        # 正样本点索引: 回归与centerness损失只在正样本上计算
+        pos_index = paddle.nonzero(labels > 0).reshape([-1])
+        num_pos = paddle.clip(paddle.to_tensor(pos_index.shape[0], dtype='float32'), min=1.)
+
+        pos_class = paddle.gather(labels, pos_index).astype('int64') - 1
+        pos_cls_index = paddle.stack([pos_index // num_points, pos_class, pos_index % num_points], axis=1)
+        loss_cls = sigmoid_focal_loss(cls_logits, pos_cls_index,
+                                      alpha=self.loss_alpha,
+                                      gamma=self.loss_gamma) / num_pos
+
+        if pos_index.shape[0] == 0:
+            zero = (bbox_reg.sum() + centerness.sum()) * 0.
+            loss_box, loss_centerness = zero, zero
+        else:
+            pos_reg = paddle.gather(bbox_reg, pos_index)
+            pos_reg_target = paddle.gather(reg_target, pos_index)
+            pos_ctr = paddle.gather(centerness, pos_index).reshape([-1])
+            pos_ctr_target = paddle.gather(ctr_target, pos_index)
+            loss_box = (giou_loss(pos_reg, pos_reg_target) * pos_ctr_target).sum() / \
+                paddle.clip(pos_ctr_target.sum(), min=1e-6)
+            loss_centerness = F.binary_cross_entropy_with_logits(pos_ctr, pos_ctr_target,
+                                                                 reduction='sum') / num_pos
+        loss_box = loss_box * self.reg_weight
+        loss_centerness = loss_centerness * self.centerness_weight
+        return {'loss_cls': loss_cls,
+                'loss_box': loss_box,
+                'loss_centerness': loss_centerness,
+                'loss': loss_cls + loss_box + loss_centerness}
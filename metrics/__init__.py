@@ -11,3 +11,14 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from .ap_utils import *
+from .coco_eval import *
+from .voc_eval import *
+from .parallel_ap import *
+
+__all__ = [
+    'ap_utils', # 评估共用函数: 拼接/分组, 按类别分段的PR曲线与AP
+    'coco_eval', # 流式COCO评估(mAP@0.5:0.95, small/medium/large)
+    'voc_eval', # VOC评估(mAP@0.5, 11点/面积AP, difficult)
+    'parallel_ap' # 按类别分块并行计算AP(共享内存 + 进程池)
+]
@@ -0,0 +1,325 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: ap utils
+# 检测评估共用的函数:
+# 拼接一个batch的检测结果与真实框、按(图像, 类别)分组并补齐为矩阵(各组同时匹配)，
+# 以及按类别分段的精度/召回率计算(所有类别一次累加，不逐类别循环)
+import numpy as np
+
+from typing import Dict, List, Sequence, Tuple, Union
+
+__all__ = ['RecordBuffer', 'concat_detections', 'concat_ground_truths', 'group_index',
+           'segment_sum', 'segment_bounds', 'precision_recall', 'monotone_precision',
+           'sample_precision', 'area_under_pr']
+
+
+class RecordBuffer(object):
+    def __init__(self,
+                 columns: Dict[str, Tuple[Tuple[int, ...], type]],
+                 capacity: int=1024) -> None:
+        """按列保存定长记录的可增长缓冲区(容量不足时按2倍扩容)
+            desc:
+                Parameters:
+                    columns: 列名 --> (每条记录的形状, 数据类型)(dict)
+                    capacity: 初始容量(int, 记录数)
+                Returns:
+                    None
+                Others:
+                    - 每个batch追加一次，均摊复制开销为O(1)，不保留逐batch的数组列表
+        """
+        super(RecordBuffer, self).__init__()
+        self.columns = columns
+        self.capacity = capacity
+        self.size = 0
+        self._data = {name: np.empty((capacity, ) + tuple(shape), dtype=dtype)
+                      for name, (shape, dtype) in columns.items()}
+
+    def append(self,
+               **values: np.ndarray) -> None:
+        """追加一批记录
+            desc:
+                Parameters:
+                    values: 列名 --> 数组(np.ndarray)——[n, ...]，各列的记录数须相同
+                Returns:
+                    None
+        """
+        num = next(iter(values.values())).shape[0]
+        if self.size + num > self.capacity:
+            self.capacity = max(2 * self.capacity, self.size + num)
+            for name, data in self._data.items():
+                grown = np.empty((self.capacity, ) + data.shape[1:], dtype=data.dtype)
+                grown[:self.size] = data[:self.size]
+                self._data[name] = grown
+        for name, value in values.items():
+            self._data[name][self.size:self.size + num] = value
+        self.size += num
+
+    def __getitem__(self,
+                    name: str) -> np.ndarray:
+        return self._data[name][:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return sum([data.nbytes for data in self._data.values()])
+
+
+def _as_list(x: Union[np.ndarray, Sequence[np.ndarray], None],
+             ndim: int) -> Union[List[np.ndarray], None]:
+    # 单张图像的数组视为只有一张图像的batch
+    if x is None:
+        return None
+    if isinstance(x, np.ndarray) and x.ndim == ndim:
+        return [x]
+    return list(x)
+
+
+def concat_detections(detections: Union[np.ndarray, Sequence[np.ndarray]]
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """拼接一个batch的检测结果
+        desc:
+            Parameters:
+                detections: 每张图像的检测结果(list(np.ndarray))——[K, 6](class, score, x1, y1, x2, y2)，
+                            即postprocesses的输出；单个[K, 6]数组视为一张图像
+            Returns:
+                (Tuple)图像序号[N], 类别[N], 得分[N], 边界框[N, 4]
+    """
+    detections = [np.asarray(d, dtype=np.float32).reshape(-1, 6)
+                  for d in _as_list(detections, 2)]
+    counts = [d.shape[0] for d in detections]
+    dets = np.concatenate(detections, axis=0) if len(detections) > 0 \
+        else np.zeros((0, 6), dtype=np.float32)
+    images = np.repeat(np.arange(len(counts)), counts)
+    return images, dets[:, 0].astype(np.int64), dets[:, 1], dets[:, 2:6]
+
+
+def concat_ground_truths(gt_bbox: Union[np.ndarray, Sequence[np.ndarray]],
+                         gt_class: Union[np.ndarray, Sequence[np.ndarray]],
+                         *fields: Union[np.ndarray, Sequence[np.ndarray], None]
+                         ) -> Tuple[np.ndarray, ...]:
+    """拼接一个batch的真实框
+        desc:
+            Parameters:
+                gt_bbox: 每张图像的真实框(list(np.ndarray))——[G, 4](x1, y1, x2, y2)
+                gt_class: 每张图像的真实框类别(list(np.ndarray))——[G]或[G, 1]
+                fields: 每张图像真实框的其它字段(list(np.ndarray))——[G]或[G, 1]，
+                        如is_crowd, difficult；None表示没有该字段(返回None)
+            Returns:
+                (Tuple)图像序号[G], 类别[G], 真实框[G, 4], 其它字段[G]...
+            Others:
+                - 单张图像的gt_bbox([G, 4]数组)视为只有一张图像的batch，其它字段同样处理
+    """
+    single = isinstance(gt_bbox, np.ndarray) and gt_bbox.ndim == 2
+    gt_bbox = [np.asarray(b, dtype=np.float32).reshape(-1, 4)
+               for b in ([gt_bbox] if single else gt_bbox)]
+    counts = [b.shape[0] for b in gt_bbox]
+    images = np.repeat(np.arange(len(counts)), counts)
+
+    def _concat(values, dtype):
+        values = [values] if single else values
+        values = [np.asarray(v).reshape(-1) for v in values]
+        return np.concatenate(values, axis=0).astype(dtype) if len(values) > 0 \
+            else np.zeros((0, ), dtype=dtype)
+
+    boxes = np.concatenate(gt_bbox, axis=0) if len(gt_bbox) > 0 \
+        else np.zeros((0, 4), dtype=np.float32)
+    outputs = [images, _concat(gt_class, np.int64), boxes]
+    for field in fields:
+        outputs.append(None if field is None else _concat(field, np.float64))
+    return tuple(outputs)
+
+
+def group_index(keys: np.ndarray,
+                group_keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """将排好序的元素按分组键补齐为矩阵
+        desc:
+            Parameters:
+                keys: 元素的分组键(np.ndarray)——[N]，从小到大排列
+                group_keys: 分组键(np.ndarray)——[G]
+            Returns:
+                (Tuple)元素序号[G, W], 有效位置[G, W]——W为最大的组内元素数，
+                组内保持元素的顺序，补齐位置的元素序号为0
+    """
+    start = np.searchsorted(keys, group_keys, side='left')
+    counts = np.searchsorted(keys, group_keys, side='right') - start
+    width = int(counts.max()) if counts.shape[0] > 0 else 0
+    offsets = np.arange(width)
+    valid = offsets[None, :] < counts[:, None]
+    index = np.where(valid, start[:, None] + offsets[None, :], 0)
+    return index, valid
+
+
+def segment_sum(keys: np.ndarray,
+                values: np.ndarray,
+                out: np.ndarray) -> np.ndarray:
+    """按键累加到out(np.add.at的排序 + reduceat实现)
+        desc:
+            Parameters:
+                keys: 每个元素的键(np.ndarray)——[N]，取值[0, out.shape[0])
+                values: 元素的值(np.ndarray)——[N, ...]
+                out: 累加结果(np.ndarray)——[S, ...]，原地累加
+            Returns:
+                (np.ndarray)out
+            Others:
+                - 只访问出现的键，out很大(如得分直方图)时每次累加的开销与N成正比
+    """
+    if keys.shape[0] > 0:
+        order = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        out[unique_keys] += np.add.reduceat(values[order], starts, axis=0, dtype=out.dtype)
+    return out
+
+
+def segment_bounds(labels: np.ndarray,
+                   num_classes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """各类别在按类别排列的数组中的起止位置
+        desc:
+            Parameters:
+                labels: 类别(np.ndarray)——[N]，从小到大排列
+                num_classes: 类别数(int)
+            Returns:
+                (Tuple)起始位置[C], 结束位置[C]
+    """
+    classes = np.arange(num_classes)
+    return (np.searchsorted(labels, classes, side='left'),
+            np.searchsorted(labels, classes, side='right'))
+
+
+def precision_recall(tp: np.ndarray,
+                     fp: np.ndarray,
+                     starts: np.ndarray,
+                     ends: np.ndarray,
+                     num_gts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按类别分段累加TP/FP，计算每个位置的精度与召回率
+        desc:
+            Parameters:
+                tp: TP数(np.ndarray)——[N, K]，按(类别, 得分从高到低)排列，
+                    K为评估设置数(如面积范围 x IoU阈值)
+                fp: FP数(np.ndarray)——[N, K]
+                starts: 各类别的起始位置(np.ndarray)——[C]，见segment_bounds
+                ends: 各类别的结束位置(np.ndarray)——[C]
+                num_gts: 各类别各评估设置的真实框数(np.ndarray)——[C, K]
+            Returns:
+                (Tuple)精度[N, K], 召回率[N, K]
+            Others:
+                - 所有类别一次累加，再逐类别减去该类别之前的累加值(从后往前，原地计算)
+                - 与pycocotools逐位一致: 精度 = tp / (fp + tp + eps)，召回率 = tp / 真实框数；
+                  真实框数为0的类别召回率为inf/nan(调用方应排除这些类别)
+    """
+    tp_sum = tp.astype(np.float64) # 整数累加在float64中是精确的
+    fp_sum = fp.astype(np.float64)
+    np.cumsum(tp_sum, axis=0, out=tp_sum)
+    np.cumsum(fp_sum, axis=0, out=fp_sum)
+    for start, end in zip(starts[::-1], ends[::-1]):
+        if start > 0 and end > start:
+            tp_sum[start:end] -= tp_sum[start - 1]
+            fp_sum[start:end] -= fp_sum[start - 1]
+    precision = fp_sum
+    precision += tp_sum
+    precision += np.spacing(1)
+    np.divide(tp_sum, precision, out=precision)
+    recall = tp_sum
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for c, (start, end) in enumerate(zip(starts, ends)):
+            recall[start:end] /= num_gts[c]
+    return precision, recall
+
+
+def monotone_precision(precision: np.ndarray,
+                       starts: np.ndarray,
+                       ends: np.ndarray) -> np.ndarray:
+    """将各类别的精度变为单调不增(每个位置取其后的最大精度)
+        desc:
+            Parameters:
+                precision: 精度(np.ndarray)——[N, K]，见precision_recall
+                starts: 各类别的起始位置(np.ndarray)——[C]
+                ends: 各类别的结束位置(np.ndarray)——[C]
+            Returns:
+                (np.ndarray)单调的精度——[N, K]，原地修改precision
+            Others:
+                - 每个类别一次反向累积最大值(所有评估设置同时计算)
+    """
+    for start, end in zip(starts, ends):
+        if end > start:
+            segment = precision[start:end][::-1]
+            precision[start:end] = np.maximum.accumulate(segment, axis=0)[::-1]
+    return precision
+
+
+def sample_precision(precision: np.ndarray,
+                     recall: np.ndarray,
+                     labels: np.ndarray,
+                     starts: np.ndarray,
+                     ends: np.ndarray,
+                     rec_thresholds: np.ndarray) -> np.ndarray:
+    """在各召回率阈值处采样单调精度(插值精度)
+        desc:
+            Parameters:
+                precision: 单调的精度(np.ndarray)——[N, K]，见monotone_precision
+                recall: 召回率(np.ndarray)——[N, K]
+                labels: 类别(np.ndarray)——[N]
+                starts: 各类别的起始位置(np.ndarray)——[C]
+                ends: 各类别的结束位置(np.ndarray)——[C]
+                rec_thresholds: 召回率阈值(np.ndarray)——[R]，从小到大排列
+            Returns:
+                (np.ndarray)插值精度——[C, R, K]，达不到召回率阈值的位置为0
+            Others:
+                - 与pycocotools的np.searchsorted(rc, recThrs, side='left')逐位一致:
+                  每个位置先求其召回率达到的阈值数u(rc >= thr的阈值个数)，
+                  阈值i对应类内第一个u > i的位置 = 类别起始位置 + 类内u <= i的位置数，
+                  用一次bincount对所有类别、评估设置同时统计
+    """
+    num_classes, num_thr = starts.shape[0], rec_thresholds.shape[0]
+    num_settings = precision.shape[1]
+    # u: 每个位置召回率达到的阈值数[N, K]
+    reached = np.searchsorted(rec_thresholds, recall, side='right')
+    reached = np.minimum(reached, num_thr) # nan(无真实框)计为达到全部阈值，结果由调用方排除
+    bins = (labels[:, None] * num_settings + np.arange(num_settings)[None, :]) * (num_thr + 1) + reached
+    counts = np.bincount(bins.reshape(-1), minlength=num_classes * num_settings * (num_thr + 1))
+    counts = counts.reshape(num_classes, num_settings, num_thr + 1)
+    below = np.cumsum(counts, axis=2)[:, :, :num_thr] # 类内u <= i的位置数[C, K, R]
+    index = starts[:, None, None] + below
+    valid = index < ends[:, None, None]
+    columns = np.broadcast_to(np.arange(num_settings)[None, :, None], index.shape)
+    sampled = np.zeros(index.shape, dtype=np.float64)
+    if precision.shape[0] > 0:
+        sampled = np.where(valid, precision[np.minimum(index, precision.shape[0] - 1), columns], 0.)
+    return sampled.transpose(0, 2, 1)
+
+
+def area_under_pr(precision: np.ndarray,
+                  recall: np.ndarray,
+                  labels: np.ndarray,
+                  num_classes: int) -> np.ndarray:
+    """按类别计算PR曲线下面积(召回率增量 x 单调精度之和)
+        desc:
+            Parameters:
+                precision: 单调的精度(np.ndarray)——[N, K]，见monotone_precision
+                recall: 召回率(np.ndarray)——[N, K]
+                labels: 类别(np.ndarray)——[N]
+                num_classes: 类别数(int)
+            Returns:
+                (np.ndarray)各类别的面积AP——[C, K]
+            Others:
+                - 与VOC2010之后的AP一致: 召回率不变的位置增量为0，
+                  最后一个召回率之后的精度为0
+    """
+    delta = recall.copy()
+    if labels.shape[0] > 1:
+        same = (labels[1:] == labels[:-1])[:, None]
+        delta[1:] -= np.where(same, recall[:-1], 0.)
+    return segment_sum(labels, np.nan_to_num(delta) * precision,
+                       np.zeros((num_classes, precision.shape[1]), dtype=np.float64))
@@ -0,0 +1,430 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: coco evaluator
+# 流式COCO评估(bbox mAP, IoU阈值0.5:0.95, small/medium/large面积范围):
+# 每个batch到达时即与真实框匹配(同一batch内所有(图像, 类别)组在补齐的IoU矩阵上同步贪心匹配)，
+# 只保留每个检测的得分、类别与按位压缩的TP/FP标记(或固定大小的得分直方图)，
+# 最后一次排序后对所有类别向量化计算PR曲线与101点插值AP，结果与pycocotools的COCOeval一致
+import sys
+import numpy as np
+
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from nmses import box_area
+from .ap_utils import RecordBuffer, concat_detections, concat_ground_truths, group_index, segment_sum
+from .ap_utils import segment_bounds, precision_recall, monotone_precision, sample_precision
+from .parallel_ap import class_blocks, map_class_blocks
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['COCOEvaluator', 'coco_match', 'accumulate_coco_block']
+
+
+def _box_overlaps(det_boxes: np.ndarray,
+                  gt_boxes: np.ndarray,
+                  gt_crowd: np.ndarray) -> np.ndarray:
+    # 与pycocotools一致: 普通真实框为IoU，crowd真实框为交集 / 检测框面积
+    det_boxes, gt_boxes = det_boxes.astype(np.float64), gt_boxes.astype(np.float64)
+    b1, b2 = det_boxes[..., :, None, :], gt_boxes[..., None, :, :]
+    inter_w = np.minimum(b1[..., 2], b2[..., 2]) - np.maximum(b1[..., 0], b2[..., 0])
+    inter_h = np.minimum(b1[..., 3], b2[..., 3]) - np.maximum(b1[..., 1], b2[..., 1])
+    inter = np.maximum(inter_w, 0.) * np.maximum(inter_h, 0.)
+    det_area = box_area(det_boxes)[..., :, None]
+    union = np.where(gt_crowd[..., None, :], det_area, det_area + box_area(gt_boxes)[..., None, :] - inter)
+    return inter / np.maximum(union, 1e-12)
+
+
+def coco_match(det_boxes: np.ndarray,
+               det_valid: np.ndarray,
+               det_out_area: np.ndarray,
+               gt_boxes: np.ndarray,
+               gt_valid: np.ndarray,
+               gt_crowd: np.ndarray,
+               gt_ignore: np.ndarray,
+               iou_thresholds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """多个(图像, 类别)组同时进行COCO贪心匹配
+        desc:
+            Parameters:
+                det_boxes: 检测框(np.ndarray)——[G, D, 4]，组内按得分从高到低排列
+                det_valid: 有效检测框(np.ndarray)——[G, D]，各组的检测框数须从大到小排列
+                det_out_area: 检测框面积是否在各面积范围外(np.ndarray)——[G, D, A]
+                gt_boxes: 真实框(np.ndarray)——[G, M, 4]
+                gt_valid: 有效真实框(np.ndarray)——[G, M]
+                gt_crowd: 是否为crowd真实框(np.ndarray)——[G, M]
+                gt_ignore: 各面积范围下是否忽略真实框(np.ndarray)——[G, M, A]
+                iou_thresholds: IoU阈值(np.ndarray)——[T]
+            Returns:
+                (Tuple)TP标记[G, D, A, T], 忽略标记[G, D, A, T]——既非TP也未忽略的为FP
+            Others:
+                - 与pycocotools的evaluateImg一致: 按得分顺序，每个检测框在未匹配的真实框
+                  (crowd真实框可重复匹配)中选IoU >= 阈值且最大的一个，优先匹配未忽略的真实框；
+                  匹配到忽略的真实框，或未匹配且面积在范围外的检测框被忽略
+                - 检测框逐个名次处理，每一步所有组、面积范围、IoU阈值同时计算；
+                  只有检测框数大于当前名次的组(前缀)参与计算
+                - 候选真实框的优先级预先编码为整数: IoU在组内的名次(IoU相同时序号大的优先，
+                  与pycocotools逐个比较的结果相同) + 未忽略的真实框加M，每一步只需一次argmax
+    """
+    num_groups, num_dets = det_valid.shape
+    num_gts, num_areas = gt_ignore.shape[1], gt_ignore.shape[2]
+    num_thr = iou_thresholds.shape[0]
+    tp = np.zeros((num_groups, num_dets, num_areas, num_thr), dtype=bool)
+    ignore = np.broadcast_to(det_out_area[..., None], tp.shape).copy()
+    if num_groups == 0 or num_gts == 0:
+        ignore &= det_valid[..., None, None]
+        return tp, ignore
+
+    ious = _box_overlaps(det_boxes, gt_boxes, gt_crowd) # [G, D, M]
+    above = (ious[:, :, None, :] >= iou_thresholds[:, None])[:, :, None] # [G, D, 1, T, M]
+    rank = np.argsort(np.argsort(ious, axis=2, kind='stable'), axis=2, kind='stable')
+    priority = rank[:, :, None, :] + num_gts * ~gt_ignore.transpose(0, 2, 1)[:, None] # [G, D, A, M]
+    priority = priority[:, :, :, None, :] # [G, D, A, 1, M]
+    available = np.broadcast_to(gt_valid[:, None, None, :], (num_groups, num_areas, num_thr, num_gts)).copy()
+    reusable = gt_crowd[:, None, None, :]
+    active = det_valid.sum(axis=0) # 第d步参与计算的组数
+    gt_range = np.arange(num_gts)
+    for d in range(num_dets):
+        n = active[d]
+        score = np.where(available[:n] & above[:n, d], priority[:n, d], -1) # [n, A, T, M]
+        best = np.argmax(score, axis=-1)
+        value = np.max(score, axis=-1) # [n, A, T]
+        tp[:n, d] = value >= num_gts
+        ignore[:n, d] = np.where(value >= 0, value < num_gts, ignore[:n, d])
+        # 匹配的真实框不再参与之后的匹配(crowd真实框除外)
+        available[:n] &= (gt_range != np.where(value >= 0, best, num_gts)[..., None]) | reusable[:n]
+    ignore &= det_valid[..., None, None]
+    return tp, ignore
+
+
+def accumulate_coco_block(scores: np.ndarray,
+                          labels: np.ndarray,
+                          tp: np.ndarray,
+                          fp: np.ndarray,
+                          num_gts: np.ndarray,
+                          rec_thresholds: np.ndarray) -> np.ndarray:
+    """计算一组类别的插值精度
+        desc:
+            Parameters:
+                scores: 得分(np.ndarray)——[N]
+                labels: 类别(np.ndarray)——[N]，从0开始的块内类别
+                tp: TP数(np.ndarray)——[N, K]，K为评估设置数(面积范围 x IoU阈值)
+                fp: FP数(np.ndarray)——[N, K]
+                num_gts: 各类别各评估设置未忽略的真实框数(np.ndarray)——[C, K]
+                rec_thresholds: 召回率阈值(np.ndarray)——[R]
+            Returns:
+                (np.ndarray)插值精度——[C, R, K]，没有真实框的位置为-1
+            Others:
+                - 按(类别, 得分从高到低)稳定排序(得分相同时保持追加顺序，与pycocotools一致)，
+                  所有类别一次累加与采样
+    """
+    order = np.lexsort((-scores, labels))
+    labels, tp, fp = labels[order], tp[order], fp[order]
+    starts, ends = segment_bounds(labels, num_gts.shape[0])
+    precision, recall = precision_recall(tp, fp, starts, ends, num_gts)
+    monotone_precision(precision, starts, ends)
+    sampled = sample_precision(precision, recall, labels, starts, ends, rec_thresholds)
+    sampled[np.broadcast_to((num_gts == 0)[:, None, :], sampled.shape)] = -1.
+    return sampled
+
+
+def _records_task(arrays: Dict[str, np.ndarray],
+                  start: int,
+                  end: int,
+                  class_start: int,
+                  num_gts: np.ndarray,
+                  rec_thresholds: np.ndarray) -> np.ndarray:
+    # 一组类别(检测记录[start, end))的插值精度: 解压TP/FP标记后计算
+    num_settings = num_gts.shape[1]
+    tp = np.unpackbits(arrays['tp'][start:end], axis=1, count=num_settings)
+    fp = np.unpackbits(arrays['fp'][start:end], axis=1, count=num_settings)
+    return accumulate_coco_block(arrays['score'][start:end], arrays['label'][start:end] - class_start,
+                                 tp, fp, num_gts, rec_thresholds)
+
+
+def _hist_task(arrays: Dict[str, np.ndarray],
+               class_start: int,
+               class_end: int,
+               num_gts: np.ndarray,
+               rec_thresholds: np.ndarray) -> np.ndarray:
+    # 一组类别的插值精度(得分直方图): 每个得分区间作为一条记录，从高分区间到低分区间排列
+    num_classes, num_bins = class_end - class_start, arrays['tp_hist'].shape[1]
+    num_settings = num_gts.shape[1]
+    scores = np.tile(np.arange(num_bins, dtype=np.float32)[::-1], num_classes)
+    labels = np.repeat(np.arange(num_classes), num_bins)
+    tp = arrays['tp_hist'][class_start:class_end, ::-1].reshape(-1, num_settings)
+    fp = arrays['fp_hist'][class_start:class_end, ::-1].reshape(-1, num_settings)
+    return accumulate_coco_block(scores, labels, tp, fp, num_gts, rec_thresholds)
+
+
+class COCOEvaluator(object):
+    def __init__(self,
+                 num_classes: int,
+                 iou_thresholds: Union[List[float], None]=None,
+                 area_ranges: Dict[str, List[float]]={'all': [0., 1e10],
+                                                      'small': [0., 32. ** 2],
+                                                      'medium': [32. ** 2, 96. ** 2],
+                                                      'large': [96. ** 2, 1e10]},
+                 max_dets: List[int]=[1, 10, 100],
+                 score_bins: int=0,
+                 chunk_size: int=1 << 12,
+                 num_workers: int=0) -> None:
+        """流式COCO检测评估
+            desc:
+                Parameters:
+                    num_classes: 类别数(int)
+                    iou_thresholds: IoU阈值(list(float))——None表示0.5:0.05:0.95
+                    area_ranges: 面积范围名称 --> [最小面积, 最大面积](dict)——第一个为全部面积
+                    max_dets: 每张图像每个类别最多评估的检测框数(list(int))——
+                              AP使用最后一个，AR对每个值分别计算
+                    score_bins: 得分直方图的区间数(int)——0表示保留每个检测的得分与TP/FP标记(精确)，
+                                大于0表示按得分区间累加TP/FP数(内存固定，AP为近似值)
+                    chunk_size: 计算AP时每次处理的最大检测数(int)——按整个类别分块，限制解压TP/FP标记的内存
+                    num_workers: 计算AP的进程数(int)——大于1时各类别块在进程池中计算，
+                                 评估数据通过共享内存传递(见parallel_ap)
+                Returns:
+                    None
+                Others:
+                    - 每个batch调用update(检测结果即postprocesses的输出)，最后调用accumulate与summarize
+                    - 精确模式每个检测保存得分(4字节)、类别(4字节)与按位压缩的TP/FP标记
+                      (各2 x ceil(面积范围数 x IoU阈值数 / 8)字节，默认共18字节)，不保存边界框
+                    - 直方图模式占用2 x 类别数 x score_bins x 面积范围数 x IoU阈值数 x 4字节，
+                      与评估的图像数无关；同一得分区间内的检测视为同分
+                    - 图像按图像id顺序送入时，结果与pycocotools的COCOeval(bbox)一致
+        """
+        super(COCOEvaluator, self).__init__()
+        if iou_thresholds is None:
+            iou_thresholds = np.linspace(.5, .95, 10)
+        self.num_classes = num_classes
+        self.iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+        self.area_names = list(area_ranges.keys())
+        self.area_ranges = np.asarray([area_ranges[name] for name in self.area_names], dtype=np.float64)
+        self.max_dets = list(max_dets)
+        self.rec_thresholds = np.linspace(.0, 1.00, 101)
+        self.score_bins = score_bins
+        self.chunk_size = chunk_size
+        self.num_workers = num_workers
+        self.num_settings = self.area_ranges.shape[0] * self.iou_thresholds.shape[0]
+        self.reset()
+
+    def reset(self) -> None:
+        """清空累加的评估数据
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        num_areas, num_thr = self.area_ranges.shape[0], self.iou_thresholds.shape[0]
+        num_bytes = (self.num_settings + 7) // 8
+        self.num_images = 0
+        self.num_gts = np.zeros((self.num_classes, num_areas), dtype=np.int64)
+        # AR只需要各max_dets下的TP总数
+        self.tp_counts = np.zeros((self.num_classes, num_areas, num_thr, len(self.max_dets)), dtype=np.int64)
+        if self.score_bins > 0:
+            self.records = None
+            self.tp_hist = np.zeros((self.num_classes, self.score_bins, self.num_settings), dtype=np.int32)
+            self.fp_hist = np.zeros_like(self.tp_hist)
+        else:
+            self.records = RecordBuffer({'score': ((), np.float32),
+                                         'label': ((), np.int32),
+                                         'tp': ((num_bytes, ), np.uint8),
+                                         'fp': ((num_bytes, ), np.uint8)})
+        self.precision = None
+        self.recall = None
+
+    def _check_classes(self,
+                       labels: np.ndarray,
+                       name: str) -> None:
+        if labels.shape[0] > 0 and (labels.min() < 0 or labels.max() >= self.num_classes):
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The {0} class should be in [0, {1}), but got [{2}, {3}].".format(
+                    name, self.num_classes, labels.min(), labels.max()))
+                sys.exit(1)
+
+    def update(self,
+               detections: Union[np.ndarray, Sequence[np.ndarray]],
+               gt_bbox: Union[np.ndarray, Sequence[np.ndarray]],
+               gt_class: Union[np.ndarray, Sequence[np.ndarray]],
+               is_crowd: Union[np.ndarray, Sequence[np.ndarray], None]=None,
+               gt_area: Union[np.ndarray, Sequence[np.ndarray], None]=None) -> None:
+        """匹配一个batch的检测结果并累加
+            desc:
+                Parameters:
+                    detections: 每张图像的检测结果(list(np.ndarray))——[K, 6](class, score, x1, y1, x2, y2)
+                    gt_bbox: 每张图像的真实框(list(np.ndarray))——[G, 4](x1, y1, x2, y2)，与检测框同一坐标系
+                    gt_class: 每张图像的真实框类别(list(np.ndarray))——[G]或[G, 1]
+                    is_crowd: 每张图像真实框的crowd标记(list(np.ndarray))——None表示没有crowd真实框
+                    gt_area: 每张图像真实框的面积(list(np.ndarray))——None表示使用真实框的面积
+                Returns:
+                    None
+                Others:
+                    - 单张图像可直接传入数组(detections为[K, 6], gt_bbox为[G, 4])
+        """
+        images, labels, scores, boxes = concat_detections(detections)
+        g_images, g_labels, g_boxes, g_crowd, g_area = concat_ground_truths(gt_bbox, gt_class,
+                                                                           is_crowd, gt_area)
+        self._check_classes(labels, 'detection')
+        self._check_classes(g_labels, 'ground truth')
+        self.precision, self.recall = None, None # 之前的accumulate结果失效
+        self.num_images += 1 if isinstance(gt_bbox, np.ndarray) and gt_bbox.ndim == 2 else len(gt_bbox)
+        num_areas, num_thr = self.area_ranges.shape[0], self.iou_thresholds.shape[0]
+        low, high = self.area_ranges[:, 0], self.area_ranges[:, 1]
+
+        # 真实框: 按(图像, 类别)排列，统计各面积范围未忽略的真实框数
+        g_crowd = g_crowd > 0 if g_crowd is not None else np.zeros(g_labels.shape, dtype=bool)
+        g_area = g_area if g_area is not None else box_area(g_boxes.astype(np.float64))
+        g_ignore = g_crowd[:, None] | (g_area[:, None] < low) | (g_area[:, None] > high) # [G, A]
+        counted = np.nonzero(~g_ignore)
+        self.num_gts += np.bincount(g_labels[counted[0]] * num_areas + counted[1],
+                                    minlength=self.num_classes * num_areas).reshape(self.num_classes, num_areas)
+        g_order = np.lexsort((g_labels, g_images))
+        g_keys = (g_images * self.num_classes + g_labels)[g_order]
+
+        # 检测框: 按(图像, 类别, 得分从高到低)排列，只保留每组前max_dets[-1]个
+        order = np.lexsort((-scores, labels, images))
+        keys = (images * self.num_classes + labels)[order]
+        group_keys, group_start, group_counts = np.unique(keys, return_index=True, return_counts=True)
+        rank = np.arange(keys.shape[0]) - np.repeat(group_start, group_counts)
+        keep = rank < self.max_dets[-1]
+        order, keys, rank = order[keep], keys[keep], rank[keep]
+        labels, scores, boxes = labels[order], scores[order], boxes[order]
+
+        # 各组按检测框数从多到少排列，补齐后同时匹配
+        group_order = np.argsort(-np.minimum(group_counts, self.max_dets[-1]), kind='stable')
+        group_keys = group_keys[group_order]
+        det_index, det_valid = group_index(keys, group_keys)
+        gt_index, gt_valid = group_index(g_keys, group_keys)
+        gt_index = g_order[gt_index]
+        det_area = box_area(boxes.astype(np.float64))
+        det_out_area = (det_area[:, None] < low) | (det_area[:, None] > high) # [N, A]
+        tp, ignore = coco_match(boxes[det_index], det_valid, det_out_area[det_index],
+                                g_boxes[gt_index], gt_valid, g_crowd[gt_index] & gt_valid,
+                                g_ignore[gt_index], self.iou_thresholds)
+        # 补齐的矩阵 --> 检测框顺序
+        rows, cols = np.nonzero(det_valid)
+        det_rows = det_index[rows, cols]
+        tp_flags = np.zeros((labels.shape[0], num_areas, num_thr), dtype=bool)
+        ig_flags = np.zeros_like(tp_flags)
+        tp_flags[det_rows], ig_flags[det_rows] = tp[rows, cols], ignore[rows, cols]
+        fp_flags = ~tp_flags & ~ig_flags
+
+        max_dets = np.asarray(self.max_dets)
+        segment_sum(labels, tp_flags[..., None] & (rank[:, None, None, None] < max_dets), self.tp_counts)
+        tp_flags = tp_flags.reshape(-1, self.num_settings)
+        fp_flags = fp_flags.reshape(-1, self.num_settings)
+        if self.score_bins > 0:
+            bins = np.clip((scores * self.score_bins).astype(np.int64), 0, self.score_bins - 1)
+            keys = labels * self.score_bins + bins
+            segment_sum(keys, tp_flags, self.tp_hist.reshape(-1, self.num_settings))
+            segment_sum(keys, fp_flags, self.fp_hist.reshape(-1, self.num_settings))
+        else:
+            self.records.append(score=scores, label=labels,
+                                tp=np.packbits(tp_flags, axis=1), fp=np.packbits(fp_flags, axis=1))
+
+    def accumulate(self) -> None:
+        """计算各IoU阈值、召回率阈值、类别、面积范围的插值精度与召回率
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+                Others:
+                    - self.precision: [T, R, C, A]，self.recall: [T, C, A, M]，
+                      与COCOeval.eval['precision'/'recall']的布局一致(AP只计算最后一个max_dets)，
+                      没有真实框的位置为-1
+        """
+        num_areas, num_thr = self.area_ranges.shape[0], self.iou_thresholds.shape[0]
+        num_gts = np.repeat(self.num_gts, num_thr, axis=1) # [C, A * T]
+        if self.score_bins > 0:
+            arrays = {'tp_hist': self.tp_hist, 'fp_hist': self.fp_hist}
+            blocks = class_blocks(np.full((self.num_classes, ), self.score_bins),
+                                  self.chunk_size, self.num_workers)
+            tasks = [(start, end, num_gts[start:end], self.rec_thresholds) for start, end in blocks]
+            task_fn = _hist_task
+        else:
+            # 按类别连续排列(类内保持追加顺序)
+            labels = self.records['label']
+            order = np.argsort(labels, kind='stable')
+            arrays = {name: self.records[name][order] for name in ['score', 'label', 'tp', 'fp']}
+            counts = np.bincount(labels, minlength=self.num_classes)
+            ends = np.cumsum(counts)
+            blocks = class_blocks(counts, self.chunk_size, self.num_workers)
+            tasks = [(ends[start] - counts[start], ends[end - 1], start, num_gts[start:end], self.rec_thresholds)
+                     for start, end in blocks]
+            task_fn = _records_task
+        results = map_class_blocks(task_fn, arrays, tasks, self.num_workers)
+        sampled = np.concatenate(results, axis=0) # [C, R, A * T]
+        self.precision = sampled.reshape(self.num_classes, -1, num_areas, num_thr).transpose(3, 1, 0, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            recall = self.tp_counts / self.num_gts[:, :, None, None]
+        recall[self.num_gts == 0] = -1.
+        self.recall = recall.transpose(2, 0, 1, 3)
+
+    def _mean(self,
+              values: np.ndarray) -> float:
+        values = values[values > -1]
+        return float(np.mean(values)) if values.shape[0] > 0 else -1.
+
+    def summarize(self) -> Dict[str, float]:
+        """汇总评估指标(未调用accumulate时先调用)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (Dict[str, float])指标名 --> 值: AP, AP50, AP75, AP_<面积范围>,
+                    AR<max_dets>, AR_<面积范围>——与COCOeval.stats的12个值对应，没有真实框时为-1
+        """
+        if self.precision is None:
+            self.accumulate()
+        stats = {'AP': self._mean(self.precision[:, :, :, 0])}
+        for iou in [.5, .75]:
+            t = np.nonzero(np.isclose(self.iou_thresholds, iou))[0]
+            if t.shape[0] > 0:
+                stats['AP{0}'.format(int(iou * 100))] = self._mean(self.precision[t[0], :, :, 0])
+        for a, name in enumerate(self.area_names[1:], 1):
+            stats['AP_' + name] = self._mean(self.precision[:, :, :, a])
+        for m, max_det in enumerate(self.max_dets):
+            stats['AR{0}'.format(max_det)] = self._mean(self.recall[:, :, 0, m])
+        for a, name in enumerate(self.area_names[1:], 1):
+            stats['AR_' + name] = self._mean(self.recall[:, :, a, -1])
+        for name, value in stats.items():
+            logger.info("{0:>10}: {1:.4f}".format(name, value))
+        return stats
+
+    def class_ap(self) -> np.ndarray:
+        """各类别的AP(全部面积，IoU阈值平均)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (np.ndarray)各类别的AP——[C]，没有真实框的类别为-1
+        """
+        if self.precision is None:
+            self.accumulate()
+        precision = self.precision[:, :, :, 0]
+        valid = precision > -1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ap = np.where(valid, precision, 0.).sum(axis=(0, 1)) / valid.sum(axis=(0, 1))
+        return np.where(valid.any(axis=(0, 1)), ap, -1.)
+
+    @property
+    def nbytes(self) -> int:
+        """累加的评估数据占用的字节数"""
+        if self.score_bins > 0:
+            return self.tp_hist.nbytes + self.fp_hist.nbytes
+        return self.records.nbytes
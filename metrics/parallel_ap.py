@@ -0,0 +1,103 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: parallel per-class ap
+# 按类别分块并行计算AP:
+# 按类别连续排列的评估数据(得分、类别、TP/FP标记)复制到共享内存，
+# 进程池中的worker进程在初始化时映射共享内存(不通过pickle传递)，每个任务计算一组类别，只返回该组的结果
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+__all__ = ['class_blocks', 'map_class_blocks']
+
+# worker进程中映射的共享数组: 名称 --> np.ndarray
+_SHARED_ARRAYS = {}
+_SHARED_MEMORIES = []
+
+
+def class_blocks(counts: np.ndarray,
+                 chunk_size: int=1 << 22,
+                 num_workers: int=0) -> List[Tuple[int, int]]:
+    """按整个类别分块
+        desc:
+            Parameters:
+                counts: 各类别的数据条数(np.ndarray)——[C]
+                chunk_size: 每块的最大条数(int)——单个类别超过时单独成块
+                num_workers: 并行的进程数(int)——大于1时每个进程约分到4块(负载均衡)
+            Returns:
+                (list(Tuple[int, int]))各块的类别范围[start, end)
+    """
+    if num_workers > 1:
+        chunk_size = min(chunk_size, max(int(np.sum(counts)) // (4 * num_workers), 1))
+    blocks, start, total = [], 0, 0
+    for c, count in enumerate(counts):
+        if c > start and total + count > chunk_size:
+            blocks.append((start, c))
+            start, total = c, 0
+        total += count
+    blocks.append((start, len(counts)))
+    return blocks
+
+
+def _attach(specs: Dict[str, Tuple[str, Tuple[int, ...], str]]) -> None:
+    # worker进程初始化: 映射共享内存
+    for name, (shm_name, shape, dtype) in specs.items():
+        # worker与主进程使用同一个resource_tracker，共享内存由主进程释放
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _SHARED_MEMORIES.append(shm)
+        _SHARED_ARRAYS[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _run(task: Tuple[Callable, Tuple]) -> Any:
+    fn, args = task
+    return fn(_SHARED_ARRAYS, *args)
+
+
+def map_class_blocks(fn: Callable,
+                     arrays: Dict[str, np.ndarray],
+                     tasks: Sequence[Tuple],
+                     num_workers: int=0) -> List[Any]:
+    """对每组类别执行fn(arrays, *task)，num_workers大于1时在进程池中执行
+        desc:
+            Parameters:
+                fn: 计算一组类别的函数(模块级函数，可pickle)——fn(arrays, *task)
+                arrays: 按类别连续排列的评估数据(Dict[str, np.ndarray])
+                tasks: 每组类别的参数(list(tuple))——如该组在arrays中的范围、真实框数等(应较小)
+                num_workers: 进程数(int)——小于等于1时在当前进程中顺序执行
+            Returns:
+                (list)各任务的结果，与tasks的顺序相同
+            Others:
+                - arrays复制到共享内存一次，worker进程初始化时映射，任务参数与结果通过pickle传递
+                - 使用multiprocessing的默认启动方式；spawn/forkserver启动时调用方须有
+                  if __name__ == '__main__'保护
+    """
+    if num_workers <= 1 or len(tasks) <= 1:
+        return [fn(arrays, *args) for args in tasks]
+    memories, specs = [], {}
+    try:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            memories.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            specs[name] = (shm.name, array.shape, array.dtype.str)
+        context = multiprocessing.get_context()
+        with context.Pool(min(num_workers, len(tasks)), initializer=_attach, initargs=(specs, )) as pool:
+            return pool.map(_run, [(fn, args) for args in tasks], chunksize=1)
+    finally:
+        for shm in memories:
+            shm.close()
+            shm.unlink()
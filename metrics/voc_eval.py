@@ -0,0 +1,313 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: voc evaluator
+# VOC评估(mAP@IoU 0.5, 11点插值与PR曲线下面积两种AP):
+# difficult真实框不计入真实框数，匹配到difficult真实框的检测既不是TP也不是FP；
+# 每个batch一次计算所有同(图像, 类别)的(检测框, 真实框)对的IoU(不补齐)，匹配不需要逐检测框循环:
+# 检测框与IoU最大的真实框对应，超过阈值时同一真实框上得分最高的检测为TP，其余为FP
+import sys
+import numpy as np
+
+from typing import Dict, Sequence, Tuple, Union
+
+from .ap_utils import RecordBuffer, concat_detections, concat_ground_truths
+from .ap_utils import segment_bounds, precision_recall, monotone_precision, sample_precision, area_under_pr
+from .parallel_ap import class_blocks, map_class_blocks
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['VOCEvaluator', 'voc_match', 'accumulate_voc_block']
+
+
+def _pixel_iou(det_boxes: np.ndarray,
+               gt_boxes: np.ndarray,
+               pixel_offset: float) -> np.ndarray:
+    # 逐对计算IoU，与VOC devkit一致: 像素坐标的宽 = x2 - x1 + 1
+    det_boxes, gt_boxes = det_boxes.astype(np.float64), gt_boxes.astype(np.float64)
+    inter_w = np.minimum(det_boxes[:, 2], gt_boxes[:, 2]) - np.maximum(det_boxes[:, 0], gt_boxes[:, 0])
+    inter_h = np.minimum(det_boxes[:, 3], gt_boxes[:, 3]) - np.maximum(det_boxes[:, 1], gt_boxes[:, 1])
+    inter = np.maximum(inter_w + pixel_offset, 0.) * np.maximum(inter_h + pixel_offset, 0.)
+    area1 = (det_boxes[:, 2] - det_boxes[:, 0] + pixel_offset) * (det_boxes[:, 3] - det_boxes[:, 1] + pixel_offset)
+    area2 = (gt_boxes[:, 2] - gt_boxes[:, 0] + pixel_offset) * (gt_boxes[:, 3] - gt_boxes[:, 1] + pixel_offset)
+    return inter / np.maximum(area1 + area2 - inter, 1e-12)
+
+
+def voc_match(det_boxes: np.ndarray,
+              gt_start: np.ndarray,
+              gt_count: np.ndarray,
+              gt_boxes: np.ndarray,
+              gt_difficult: np.ndarray,
+              iou_threshold: float=0.5,
+              pixel_offset: float=1.) -> Tuple[np.ndarray, np.ndarray]:
+    """一个batch的所有检测框同时进行VOC匹配
+        desc:
+            Parameters:
+                det_boxes: 检测框(np.ndarray)——[N, 4]，按(图像, 类别, 得分从高到低)排列
+                gt_start: 每个检测框同(图像, 类别)的真实框的起始位置(np.ndarray)——[N]
+                gt_count: 每个检测框同(图像, 类别)的真实框数(np.ndarray)——[N]
+                gt_boxes: 真实框(np.ndarray)——[G, 4]，按(图像, 类别)排列
+                gt_difficult: 是否忽略真实框(np.ndarray)——[G]
+                iou_threshold: IoU阈值(float)——IoU大于该值才能匹配
+                pixel_offset: 宽高的像素偏移(float)——1表示VOC的像素坐标(宽 = x2 - x1 + 1)
+            Returns:
+                (Tuple)TP标记[N], 忽略标记[N]——两者都不是的为FP
+            Others:
+                - 与VOC devkit一致: 检测框对应同组IoU最大的真实框(包括difficult，相同时取第一个)，
+                  IoU超过阈值时: difficult真实框 --> 忽略；该真实框上第一个(得分最高的)检测 --> TP；
+                  否则为FP
+                - 对应关系与之前的匹配结果无关，因此TP即每个真实框对应的第一个检测框，
+                  一次np.unique完成，不需要逐检测框循环
+                - 只计算同组的(检测框, 真实框)对(IoU矩阵中同组的块，不补齐)，按检测框分段求最大值
+    """
+    num_dets = det_boxes.shape[0]
+    tp = np.zeros((num_dets, ), dtype=bool)
+    ignore = np.zeros_like(tp)
+    has_gt = np.nonzero(gt_count > 0)[0]
+    if has_gt.shape[0] == 0:
+        return tp, ignore
+    # 展开(检测框, 真实框)对: 每个检测框的真实框连续排列
+    counts = gt_count[has_gt]
+    pair_det = np.repeat(has_gt, counts)
+    pair_start = np.cumsum(counts) - counts
+    pair_gt = gt_start[pair_det] + np.arange(pair_det.shape[0]) - np.repeat(pair_start, counts)
+    ious = _pixel_iou(det_boxes[pair_det], gt_boxes[pair_gt], pixel_offset)
+    max_iou = np.maximum.reduceat(ious, pair_start)
+    # 每个检测框第一个取到最大IoU的真实框
+    max_pairs = np.nonzero(ious == np.repeat(max_iou, counts))[0]
+    _, first = np.unique(pair_det[max_pairs], return_index=True)
+    best_gt = pair_gt[max_pairs[first]]
+    hit = max_iou > iou_threshold
+    dets, best_gt = has_gt[hit], best_gt[hit]
+    difficult = gt_difficult[best_gt]
+    ignore[dets[difficult]] = True
+    dets, best_gt = dets[~difficult], best_gt[~difficult]
+    _, first = np.unique(best_gt, return_index=True) # 检测框按得分顺序，第一个即得分最高
+    tp[dets[first]] = True
+    return tp, ignore
+
+
+def accumulate_voc_block(scores: np.ndarray,
+                         labels: np.ndarray,
+                         tp: np.ndarray,
+                         num_gts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """计算一组类别的11点AP与面积AP
+        desc:
+            Parameters:
+                scores: 得分(np.ndarray)——[N]
+                labels: 类别(np.ndarray)——[N]，从0开始的块内类别
+                tp: TP标记(np.ndarray)——[N]，其余为FP(忽略的检测不保存)
+                num_gts: 各类别非difficult的真实框数(np.ndarray)——[C]
+            Returns:
+                (Tuple)11点AP[C], 面积AP[C]——没有真实框的类别为-1
+            Others:
+                - 11点AP: 召回率0, 0.1, ..., 1处(召回率不小于该值的位置的)最大精度的平均
+                - 面积AP: 单调精度曲线下的面积(VOC2010之后的定义)
+    """
+    order = np.lexsort((-scores, labels))
+    labels, tp = labels[order], tp[order, None]
+    starts, ends = segment_bounds(labels, num_gts.shape[0])
+    precision, recall = precision_recall(tp, ~tp, starts, ends, num_gts[:, None])
+    monotone_precision(precision, starts, ends)
+    # 与VOC devkit的阈值逐位一致(np.arange的0.30000000000000004等)
+    sampled = sample_precision(precision, recall, labels, starts, ends, np.arange(0., 1.1, 0.1))
+    ap_11point = sampled[:, :, 0].mean(axis=1)
+    ap_area = area_under_pr(precision, recall, labels, num_gts.shape[0])[:, 0]
+    return np.where(num_gts > 0, ap_11point, -1.), np.where(num_gts > 0, ap_area, -1.)
+
+
+def _records_task(arrays: Dict[str, np.ndarray],
+                  start: int,
+                  end: int,
+                  class_start: int,
+                  num_gts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # 一组类别(检测记录[start, end))的11点AP与面积AP
+    return accumulate_voc_block(arrays['score'][start:end], arrays['label'][start:end] - class_start,
+                                arrays['tp'][start:end], num_gts)
+
+
+class VOCEvaluator(object):
+    def __init__(self,
+                 num_classes: int,
+                 iou_threshold: float=0.5,
+                 ap_type: str='11point',
+                 evaluate_difficult: bool=False,
+                 pixel_offset: float=1.,
+                 chunk_size: int=1 << 12,
+                 num_workers: int=0) -> None:
+        """流式VOC检测评估
+            desc:
+                Parameters:
+                    num_classes: 类别数(int)
+                    iou_threshold: IoU阈值(float)
+                    ap_type: mAP使用的AP类型(str)——'11point'(VOC2007)或'area'(VOC2010之后)
+                    evaluate_difficult: 是否将difficult真实框作为普通真实框评估(bool)
+                    pixel_offset: 宽高的像素偏移(float)——1表示VOC的像素坐标，0表示连续坐标
+                    chunk_size: 计算AP时每次处理的最大检测数(int)——按整个类别分块
+                    num_workers: 计算AP的进程数(int)——大于1时各类别块在进程池中计算，
+                                 评估数据通过共享内存传递(见parallel_ap)
+                Returns:
+                    None
+                Others:
+                    - 每个batch调用update(检测结果即postprocesses的输出，difficult即VOCDataset的difficult)，
+                      最后调用summarize；两种AP都会计算
+                    - 每个检测保存得分(4字节)、类别(4字节)与TP标记(1字节)，匹配到difficult的检测不保存
+        """
+        super(VOCEvaluator, self).__init__()
+        if ap_type not in ['11point', 'area']:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The ap_type should be '11point' or 'area', but got '{0}'.".format(ap_type))
+                sys.exit(1)
+        self.num_classes = num_classes
+        self.iou_threshold = iou_threshold
+        self.ap_type = ap_type
+        self.evaluate_difficult = evaluate_difficult
+        self.pixel_offset = pixel_offset
+        self.chunk_size = chunk_size
+        self.num_workers = num_workers
+        self.reset()
+
+    def reset(self) -> None:
+        """清空累加的评估数据
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        self.num_images = 0
+        self.num_gts = np.zeros((self.num_classes, ), dtype=np.int64)
+        self.records = RecordBuffer({'score': ((), np.float32),
+                                     'label': ((), np.int32),
+                                     'tp': ((), bool)})
+        self.ap_11point = None
+        self.ap_area = None
+
+    def _check_classes(self,
+                       labels: np.ndarray,
+                       name: str) -> None:
+        if labels.shape[0] > 0 and (labels.min() < 0 or labels.max() >= self.num_classes):
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The {0} class should be in [0, {1}), but got [{2}, {3}].".format(
+                    name, self.num_classes, labels.min(), labels.max()))
+                sys.exit(1)
+
+    def update(self,
+               detections: Union[np.ndarray, Sequence[np.ndarray]],
+               gt_bbox: Union[np.ndarray, Sequence[np.ndarray]],
+               gt_class: Union[np.ndarray, Sequence[np.ndarray]],
+               difficult: Union[np.ndarray, Sequence[np.ndarray], None]=None) -> None:
+        """匹配一个batch的检测结果并累加
+            desc:
+                Parameters:
+                    detections: 每张图像的检测结果(list(np.ndarray))——[K, 6](class, score, x1, y1, x2, y2)
+                    gt_bbox: 每张图像的真实框(list(np.ndarray))——[G, 4](x1, y1, x2, y2)，与检测框同一坐标系
+                    gt_class: 每张图像的真实框类别(list(np.ndarray))——[G]或[G, 1]
+                    difficult: 每张图像真实框的difficult标记(list(np.ndarray))——None表示没有difficult真实框
+                Returns:
+                    None
+                Others:
+                    - 单张图像可直接传入数组(detections为[K, 6], gt_bbox为[G, 4])
+        """
+        images, labels, scores, boxes = concat_detections(detections)
+        g_images, g_labels, g_boxes, g_difficult = concat_ground_truths(gt_bbox, gt_class, difficult)
+        self._check_classes(labels, 'detection')
+        self._check_classes(g_labels, 'ground truth')
+        self.ap_11point, self.ap_area = None, None # 之前的accumulate结果失效
+        self.num_images += 1 if isinstance(gt_bbox, np.ndarray) and gt_bbox.ndim == 2 else len(gt_bbox)
+
+        g_difficult = g_difficult > 0 if g_difficult is not None and not self.evaluate_difficult \
+            else np.zeros(g_labels.shape, dtype=bool)
+        self.num_gts += np.bincount(g_labels[~g_difficult], minlength=self.num_classes)
+
+        # 检测框按(图像, 类别, 得分从高到低)排列，真实框按(图像, 类别)排列
+        order = np.lexsort((-scores, labels, images))
+        labels, scores, boxes = labels[order], scores[order], boxes[order]
+        keys = images[order] * self.num_classes + labels
+        g_order = np.lexsort((g_labels, g_images))
+        g_keys = (g_images * self.num_classes + g_labels)[g_order]
+        gt_start = np.searchsorted(g_keys, keys, side='left')
+        gt_count = np.searchsorted(g_keys, keys, side='right') - gt_start
+        tp, ignore = voc_match(boxes, gt_start, gt_count, g_boxes[g_order], g_difficult[g_order],
+                               self.iou_threshold, self.pixel_offset)
+        self.records.append(score=scores[~ignore], label=labels[~ignore], tp=tp[~ignore])
+
+    def accumulate(self) -> None:
+        """计算各类别的11点AP与面积AP
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+                Others:
+                    - self.ap_11point, self.ap_area: [C]，没有真实框的类别为-1
+        """
+        # 按类别连续排列(类内保持追加顺序)
+        labels = self.records['label']
+        order = np.argsort(labels, kind='stable')
+        arrays = {name: self.records[name][order] for name in ['score', 'label', 'tp']}
+        counts = np.bincount(labels, minlength=self.num_classes)
+        ends = np.cumsum(counts)
+        blocks = class_blocks(counts, self.chunk_size, self.num_workers)
+        tasks = [(ends[start] - counts[start], ends[end - 1], start, self.num_gts[start:end])
+                 for start, end in blocks]
+        results = map_class_blocks(_records_task, arrays, tasks, self.num_workers)
+        self.ap_11point = np.concatenate([r[0] for r in results])
+        self.ap_area = np.concatenate([r[1] for r in results])
+
+    def summarize(self) -> Dict[str, float]:
+        """汇总评估指标(未调用accumulate时先调用)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (Dict[str, float])指标名 --> 值: mAP(ap_type指定的AP), mAP_11point, mAP_area——
+                    有真实框的类别的平均，没有真实框时为-1
+        """
+        if self.ap_11point is None:
+            self.accumulate()
+        valid = self.num_gts > 0
+        stats = {}
+        for name, ap in [('11point', self.ap_11point), ('area', self.ap_area)]:
+            stats['mAP_' + name] = float(ap[valid].mean()) if valid.any() else -1.
+        stats['mAP'] = stats['mAP_' + self.ap_type]
+        for name, value in stats.items():
+            logger.info("{0:>12}: {1:.4f}".format(name, value))
+        return stats
+
+    def class_ap(self) -> np.ndarray:
+        """各类别的AP(ap_type指定的AP)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (np.ndarray)各类别的AP——[C]，没有真实框的类别为-1
+        """
+        if self.ap_11point is None:
+            self.accumulate()
+        return self.ap_11point if self.ap_type == '11point' else self.ap_area
+
+    @property
+    def nbytes(self) -> int:
+        """累加的评估数据占用的字节数"""
+        return self.records.nbytes
@@ -11,3 +11,102 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# includes: fpn neck
+import paddle
+import paddle.nn as nn
+import paddle.nn.functional as F
+
+from typing import List, Tuple, Union
+
+from backbones import ConvNormLayer, recompute_function
+
+__all__ = ['FPN']
+
+
+class FPN(nn.Layer):
+    def __init__(self,
+                 in_channels: List[int],
+                 in_strides: List[int]=[8, 16, 32],
+                 out_channel: int=256,
+                 num_extra_levels: int=2,
+                 extra_on_input: bool=False,
+                 relu_before_extra: bool=True,
+                 norm_type: Union[str, None]=None,
+                 fuse_upsample_add: bool=True,
+                 recompute: bool=False) -> None:
+        """特征金字塔Neck
+            desc:
+                Parameters:
+                    in_channels: 输入各层级的通道数(list(int))——通常为backbone.out_channels
+                    in_strides: 输入各层级的步长(list(int))——通常为backbone.out_strides
+                    out_channel: 输出通道数(int)
+                    num_extra_levels: 最高层之上额外添加的层级数(int)——步长为2的3x3卷积逐级下采样
+                    extra_on_input: 第一个额外层级是否由最高层输入(C5)生成(bool)——否则由P5生成
+                    relu_before_extra: 第二个及之后的额外层级在卷积前是否使用relu(bool)
+                    norm_type: 归一化类型(str)——None表示卷积带偏置
+                    fuse_upsample_add: 自顶向下融合时是否将上采样结果原地累加到横向分支(bool)
+                    recompute: 训练时是否重计算横向分支与自顶向下分支(bool)
+                Returns:
+                    None
+                Others:
+                    - FCOS: 输入C3~C5，输出P3~P7(步长8~128)
+                    - out_strides: 各输出层级的步长
+                    - fuse_upsample_add: 不再为每个层级分配新的求和张量，上采样张量用完即释放；
+                      加法的反向不需要保存输入，原地累加不影响梯度；
+                      只在横向分支的反向不需要其输出时生效(norm_type为None或'bn')，
+                      GroupNorm的反向需要保存其输出，norm_type='gn'时退化为非原地相加
+                    - recompute: 横向卷积、自顶向下融合与输出卷积在前向时不保存中间激活
+                      (融合后的特征)，反向时重新计算，只保留输入特征与输出特征；
+                      以一次额外的前向计算换取训练时的激活内存；eval模式下不生效；
+                      分支中BatchNorm的滑动统计量每步只更新一次(见recompute_function)
+        """
+        super(FPN, self).__init__()
+        self.num_extra_levels = num_extra_levels
+        self.extra_on_input = extra_on_input
+        self.relu_before_extra = relu_before_extra
+        self.fuse_upsample_add = fuse_upsample_add
+        # 原地累加会覆盖横向分支的输出: 只在其反向不需要该输出时使用
+        self._inplace_add = fuse_upsample_add and norm_type in (None, 'bn')
+        self.recompute = recompute
+        self.lateral_convs = nn.LayerList([ConvNormLayer(ch_in, out_channel, 1, norm_type=norm_type)
+                                           for ch_in in in_channels])
+        self.fpn_convs = nn.LayerList([ConvNormLayer(out_channel, out_channel, 3, norm_type=norm_type)
+                                       for _ in in_channels])
+        self.extra_convs = nn.LayerList()
+        for level in range(num_extra_levels):
+            ch_in = in_channels[-1] if (level == 0 and extra_on_input) else out_channel
+            self.extra_convs.append(ConvNormLayer(ch_in, out_channel, 3, stride=2, norm_type=norm_type))
+
+        self.out_channel = out_channel
+        self.out_strides = list(in_strides) + [in_strides[-1] * (2 ** (level + 1))
+                                               for level in range(num_extra_levels)]
+
+    def _top_down(self, *feats: paddle.Tensor) -> Tuple[paddle.Tensor, ...]:
+        laterals = [conv(feat) for conv, feat in zip(self.lateral_convs, feats)]
+        # 自顶向下: 上一层级最近邻上采样到当前层级尺寸后相加
+        for idx in range(len(laterals) - 1, 0, -1):
+            upsampled = F.interpolate(laterals[idx],
+                                      size=laterals[idx - 1].shape[2:],
+                                      mode='nearest')
+            if self._inplace_add:
+                laterals[idx - 1].add_(upsampled)
+            else:
+                laterals[idx - 1] = laterals[idx - 1] + upsampled
+            del upsampled
+        return tuple([conv(lateral) for conv, lateral in zip(self.fpn_convs, laterals)])
+
+    def forward(self, feats: List[paddle.Tensor]) -> List[paddle.Tensor]:
+        if self.recompute and self.training:
+            # hook实现(use_reentrant=False)在反向时才重建中间激活；
+            # PyLayer实现在CPU上的反向峰值反而高于不重计算
+            outs = list(recompute_function(self._top_down, self, *feats))
+        else:
+            outs = list(self._top_down(*feats))
+
+        for level, conv in enumerate(self.extra_convs):
+            if level == 0:
+                x = feats[-1] if self.extra_on_input else outs[-1]
+            else:
+                x = F.relu(outs[-1]) if self.relu_before_extra else outs[-1]
+            outs.append(conv(x))
+        return outs
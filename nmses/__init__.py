@@ -11,3 +11,18 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from .box_utils import *
+from .hard_nms import *
+from .matrix_nms import *
+from .soft_nms import *
+from .grid_nms import *
+from .registry import *
+
+__all__ = [
+    'box_utils', # 面积/IoU, 候选框筛选, 按类别分组
+    'hard_nms', # 多类别硬NMS
+    'matrix_nms', # Matrix NMS
+    'soft_nms', # Soft-NMS
+    'grid_nms', # 空间索引的硬NMS(超大候选集)
+    'registry' # NMS注册表: 按配置切换NMS方法
+]
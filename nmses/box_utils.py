@@ -0,0 +1,110 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: nms box utils
+# NMS共用的边界框工具: 面积/IoU计算、候选框筛选(得分阈值 + 每类nms_top_k)与按类别分组
+import numpy as np
+
+from typing import Tuple
+
+__all__ = ['box_area', 'box_iou', 'select_candidates', 'group_by_class']
+
+
+def box_area(boxes: np.ndarray) -> np.ndarray:
+    """计算边界框面积
+        desc:
+            Parameters:
+                boxes: 边界框(np.ndarray)——[..., 4](x1, y1, x2, y2)
+            Returns:
+                (np.ndarray)面积——[...]
+    """
+    return (boxes[..., 2] - boxes[..., 0]) * (boxes[..., 3] - boxes[..., 1])
+
+
+def box_iou(boxes1: np.ndarray,
+            boxes2: np.ndarray) -> np.ndarray:
+    """计算两组边界框两两之间的IoU
+        desc:
+            Parameters:
+                boxes1: 边界框(np.ndarray)——[..., N, 4](x1, y1, x2, y2)
+                boxes2: 边界框(np.ndarray)——[..., M, 4](x1, y1, x2, y2)
+            Returns:
+                (np.ndarray)IoU——[..., N, M]
+            Others:
+                - 使用连续坐标(宽 = x2 - x1)，面积为0的边界框与任何边界框的IoU为0
+                - 前面的维度按广播规则批量计算
+    """
+    area1, area2 = box_area(boxes1), box_area(boxes2)
+    b1, b2 = boxes1[..., :, None, :], boxes2[..., None, :, :]
+    inter_w = np.minimum(b1[..., 2], b2[..., 2]) - np.maximum(b1[..., 0], b2[..., 0])
+    inter_h = np.minimum(b1[..., 3], b2[..., 3]) - np.maximum(b1[..., 1], b2[..., 1])
+    inter = np.maximum(inter_w, 0.) * np.maximum(inter_h, 0.)
+    union = area1[..., :, None] + area2[..., None, :] - inter
+    return inter / np.maximum(union, 1e-10)
+
+
+def select_candidates(scores: np.ndarray,
+                      score_threshold: float=0.05,
+                      nms_top_k: int=1000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """筛选NMS的候选(框, 类别)对
+        desc:
+            Parameters:
+                scores: 各框各类别的得分(np.ndarray)——[N, C]
+                score_threshold: 得分阈值(float)——只保留得分大于该值的候选
+                nms_top_k: 每个类别最多保留的候选数(int)——小于等于0表示不限制
+            Returns:
+                (Tuple)候选的框序号[M], 类别[M], 得分[M]，按得分从高到低排列
+            Others:
+                - 得分相同时按(框序号, 类别)的先后顺序排列，结果是确定的
+                - 每类nms_top_k在所有类别上一次完成: 按(类别, 得分)排序后计算类内名次
+    """
+    box_idx, class_idx = np.nonzero(scores > score_threshold)
+    cand_scores = scores[box_idx, class_idx]
+    num_classes = scores.shape[1]
+    if nms_top_k > 0 and cand_scores.shape[0] > nms_top_k:
+        order = np.lexsort((-cand_scores, class_idx)) # 按类别, 类内按得分从高到低
+        sorted_class = class_idx[order]
+        counts = np.bincount(sorted_class, minlength=num_classes)
+        starts = np.cumsum(counts) - counts
+        rank = np.arange(order.shape[0]) - starts[sorted_class]
+        order = np.sort(order[rank < nms_top_k]) # 恢复(框序号, 类别)的顺序
+        box_idx, class_idx, cand_scores = box_idx[order], class_idx[order], cand_scores[order]
+    order = np.argsort(-cand_scores, kind='stable')
+    return box_idx[order], class_idx[order], cand_scores[order]
+
+
+def group_by_class(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """将按得分排列的候选按类别分组并补齐为矩阵
+        desc:
+            Parameters:
+                labels: 候选的类别(np.ndarray)——[M]，候选按得分从高到低排列
+            Returns:
+                (Tuple)类别[C'], 候选序号[C', T], 有效位置[C', T]——
+                C'为出现的类别数，T为最大的类内候选数，每行按得分从高到低排列，
+                补齐位置的候选序号为0
+            Others:
+                - 各类别在补齐后的矩阵上同时计算，不需要逐类别循环
+    """
+    if labels.shape[0] == 0:
+        return (np.zeros((0, ), dtype=np.int64), np.zeros((0, 0), dtype=np.int64),
+                np.zeros((0, 0), dtype=bool))
+    order = np.argsort(labels, kind='stable') # 类内保持得分顺序
+    sorted_labels = labels[order]
+    class_ids, row, counts = np.unique(sorted_labels, return_inverse=True, return_counts=True)
+    starts = np.cumsum(counts) - counts
+    col = np.arange(order.shape[0]) - starts[row]
+    index = np.zeros((class_ids.shape[0], counts.max()), dtype=np.int64)
+    valid = np.zeros(index.shape, dtype=bool)
+    index[row, col] = order
+    valid[row, col] = True
+    return class_ids, index, valid
@@ -0,0 +1,280 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: grid nms
+# 空间索引的精确NMS(超大候选集，如大图切片推理):
+# 候选框按尺寸分到多级均匀网格(每级网格的单元边长不小于该级所有框的边长)，
+# 只有同类别、相邻单元中的框才可能相交——通过单元键的向量化连接一次生成所有候选框对，
+# 用与硬NMS完全相同的表达式计算抑制关系，最后按得分顺序在稀疏的抑制关系上完成贪心选择
+import numpy as np
+
+from typing import List, Tuple, Union
+
+from .box_utils import box_area, select_candidates
+from .hard_nms import format_detections
+
+__all__ = ['grid_suppression_edges', 'grid_nms', 'batched_grid_nms', 'multiclass_grid_nms']
+
+# 相邻单元的偏移(包括自身)
+_NEIGHBORS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+# 同级网格: 自身与前向的一半相邻单元，每对相邻单元只连接一次
+_FORWARD_NEIGHBORS = [(0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+def _grid_levels(boxes: np.ndarray,
+                 cell_size: Union[float, None]) -> Tuple[np.ndarray, float]:
+    """按框的最长边分配网格层级: 第l级网格的单元边长为cell_size * 2^l，不小于该级所有框的边长"""
+    sides = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    if cell_size is None:
+        cell_size = float(np.median(sides)) if sides.shape[0] > 0 else 1.
+    cell_size = max(cell_size, 1e-6)
+    levels = np.ceil(np.log2(np.maximum(sides, 1e-12) / cell_size)).clip(0, None).astype(np.int64)
+    levels[sides > cell_size * 2. ** levels] += 1 # 修正log2的舍入误差
+    return levels, cell_size
+
+
+def _cell_keys(x: np.ndarray,
+               y: np.ndarray,
+               labels: np.ndarray,
+               size: float) -> Tuple[np.ndarray, int]:
+    """计算(类别, 单元行, 单元列)的整数键——单元列相邻的键相差1，单元行相邻的键相差row_stride"""
+    cx = np.floor(x / size).astype(np.int64)
+    cy = np.floor(y / size).astype(np.int64)
+    cx -= cx.min() - 1
+    cy -= cy.min() - 1 # 留出-1的邻居，避免键在类别之间重叠
+    row_stride = int(cx.max()) + 2
+    class_stride = (int(cy.max()) + 2) * row_stride
+    return (labels.astype(np.int64) * class_stride + cy * row_stride + cx), row_stride
+
+
+def _pairs_in_cells(keys_a: np.ndarray,
+                    keys_b: np.ndarray,
+                    row_stride: int,
+                    chunk_pairs: int,
+                    same: bool=False):
+    """生成A中每个框与B中位于相邻单元的框组成的框对(分块生成)
+        desc:
+            Parameters:
+                keys_a: A的单元键(np.ndarray)——[Na]，升序
+                keys_b: B的单元键(np.ndarray)——[Nb]，升序
+                row_stride: 单元行相邻的键差(int)
+                chunk_pairs: 每块最多的框对数(int)
+                same: A与B是否为同一组框(bool)——是则每个无序框对只生成一次
+            Returns:
+                (Generator)每块的(A中的位置[n], B中的位置[n])
+    """
+    cell_starts = np.flatnonzero(np.concatenate([[True], keys_b[1:] != keys_b[:-1]]))
+    cell_keys = keys_b[cell_starts]
+    cell_counts = np.diff(np.append(cell_starts, keys_b.shape[0]))
+    for dx, dy in (_FORWARD_NEIGHBORS if same else _NEIGHBORS):
+        target = keys_a + dy * row_stride + dx
+        pos = np.searchsorted(cell_keys, target).clip(0, cell_keys.shape[0] - 1)
+        found = np.nonzero(cell_keys[pos] == target)[0]
+        if found.shape[0] == 0:
+            continue
+        cells = pos[found]
+        counts = cell_counts[cells]
+        ends = np.cumsum(counts)
+        # 按框对数切分A中的框
+        bounds = np.searchsorted(ends, np.arange(chunk_pairs, ends[-1], chunk_pairs), side='right')
+        for sel in np.split(np.arange(found.shape[0]), bounds):
+            if sel.shape[0] == 0:
+                continue
+            sel_counts = counts[sel]
+            total = int(sel_counts.sum())
+            owner = np.repeat(np.arange(sel.shape[0]), sel_counts)
+            local = np.arange(total) - np.repeat(np.cumsum(sel_counts) - sel_counts, sel_counts)
+            pa, pb = found[sel][owner], cell_starts[cells[sel]][owner] + local
+            if same and dx == 0 and dy == 0: # 同一单元内的框对保留一次
+                mask = pa < pb
+                pa, pb = pa[mask], pb[mask]
+            yield pa, pb
+
+
+def grid_suppression_edges(boxes: np.ndarray,
+                           labels: np.ndarray,
+                           iou_threshold: float=0.5,
+                           cell_size: Union[float, None]=None,
+                           chunk_pairs: int=1 << 15) -> Tuple[np.ndarray, np.ndarray]:
+    """计算所有抑制关系: 同类别、IoU大于阈值的框对
+        desc:
+            Parameters:
+                boxes: 按得分从高到低排列的边界框(np.ndarray)——[N, 4]
+                labels: 类别(np.ndarray)——[N]
+                iou_threshold: IoU阈值(float)
+                cell_size: 第0级网格的单元边长(float)——None表示使用框最长边的中位数
+                chunk_pairs: 分块计算时每块的候选框对数(int)——中间数组保持在缓存内
+            Returns:
+                (Tuple)抑制关系的(得分高的框序号[E], 得分低的框序号[E])，按得分高的框序号排列
+            Others:
+                - 两个框相交时，它们左上角所在的单元(在两者中较大一级的网格上)行列均相差不超过1
+                - 抑制判断与硬NMS使用相同的float64表达式(inter > threshold * union)，结果完全一致
+                - 框的坐标按单元键重新排列后再计算，相邻单元的框在内存中相邻
+    """
+    boxes = boxes.astype(np.float64)
+    # x1, y1, x2, y2, 面积(分别连续存储)
+    coords = [np.ascontiguousarray(boxes[:, i]) for i in range(4)] + [box_area(boxes)]
+    levels, cell_size = _grid_levels(boxes, cell_size)
+    level_ids = np.unique(levels)
+    sources, targets = [], []
+    for i, level_a in enumerate(level_ids):
+        idx_a = np.nonzero(levels == level_a)[0]
+        for level_b in level_ids[i:]:
+            same = level_b == level_a
+            idx_b = idx_a if same else np.nonzero(levels == level_b)[0]
+            # 在较大一级的网格上连接
+            size = cell_size * 2. ** level_b
+            idx_ab = idx_a if same else np.concatenate([idx_a, idx_b])
+            keys, row_stride = _cell_keys(coords[0][idx_ab], coords[1][idx_ab], labels[idx_ab], size)
+            keys_a, keys_b = keys[:idx_a.shape[0]], keys[idx_a.shape[0]:]
+            order_a = np.argsort(keys_a)
+            keys_a, sorted_a = keys_a[order_a], idx_a[order_a]
+            if same:
+                keys_b, sorted_b = keys_a, sorted_a
+            else:
+                order_b = np.argsort(keys_b)
+                keys_b, sorted_b = keys_b[order_b], idx_b[order_b]
+            coords_a = [np.take(c, sorted_a) for c in coords]
+            coords_b = coords_a if same else [np.take(c, sorted_b) for c in coords]
+            for pa, pb in _pairs_in_cells(keys_a, keys_b, row_stride, chunk_pairs, same=same):
+                ca = [np.take(c, pa) for c in coords_a]
+                cb = [np.take(c, pb) for c in coords_b]
+                # 与hard_nms._suppress相同的表达式(min/max与加法可交换，与框的先后无关)
+                inter_w = np.minimum(cb[2], ca[2]) - np.maximum(cb[0], ca[0])
+                inter_h = np.minimum(cb[3], ca[3]) - np.maximum(cb[1], ca[1])
+                inter = np.maximum(inter_w, 0.) * np.maximum(inter_h, 0.)
+                union = cb[4] + ca[4] - inter
+                suppress = np.nonzero(inter > iou_threshold * union)[0]
+                a, b = sorted_a[pa[suppress]], sorted_b[pb[suppress]]
+                sources.append(np.minimum(a, b))
+                targets.append(np.maximum(a, b))
+    if len(sources) == 0:
+        return np.zeros((0, ), dtype=np.int64), np.zeros((0, ), dtype=np.int64)
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    order = np.argsort(sources, kind='stable')
+    return sources[order], targets[order]
+
+
+def _greedy_select(num_boxes: int,
+                   sources: np.ndarray,
+                   targets: np.ndarray,
+                   top_k: int) -> np.ndarray:
+    """按得分顺序在稀疏的抑制关系上完成贪心选择"""
+    starts = np.searchsorted(sources, np.arange(num_boxes + 1)).tolist()
+    has_edges = np.diff(starts) > 0
+    suppressed = np.zeros(num_boxes, dtype=bool)
+    keep = []
+    for idx in range(num_boxes):
+        if suppressed[idx]:
+            continue
+        keep.append(idx)
+        if len(keep) == top_k:
+            break
+        if has_edges[idx]:
+            suppressed[targets[starts[idx]:starts[idx + 1]]] = True
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_grid_nms(boxes: np.ndarray,
+                     scores: np.ndarray,
+                     labels: np.ndarray,
+                     iou_threshold: float=0.5,
+                     top_k: int=-1,
+                     cell_size: Union[float, None]=None,
+                     chunk_pairs: int=1 << 15) -> np.ndarray:
+    """空间索引的多类别NMS，结果与hard_nms.batched_nms完全一致
+        desc:
+            Parameters:
+                boxes: 边界框(np.ndarray)——[N, 4]
+                scores: 得分(np.ndarray)——[N]
+                labels: 类别(np.ndarray)——[N]
+                iou_threshold: IoU阈值(float)
+                top_k: 所有类别合计最多保留的框数(int)——小于等于0表示不限制
+                cell_size: 第0级网格的单元边长(float)——None表示使用框最长边的中位数
+                chunk_pairs: 分块计算时每块的候选框对数(int)
+            Returns:
+                (np.ndarray)保留的框序号(int64)——按得分从高到低排列
+            Others:
+                - 计算量与相邻框对数成正比而不是框数的平方，框数较少时直接使用batched_nms更快
+    """
+    order = np.argsort(-scores, kind='stable')
+    sources, targets = grid_suppression_edges(boxes[order], labels[order],
+                                              iou_threshold=iou_threshold,
+                                              cell_size=cell_size,
+                                              chunk_pairs=chunk_pairs)
+    return order[_greedy_select(order.shape[0], sources, targets, top_k)]
+
+
+def grid_nms(boxes: np.ndarray,
+             scores: np.ndarray,
+             iou_threshold: float=0.5,
+             top_k: int=-1,
+             cell_size: Union[float, None]=None) -> np.ndarray:
+    """空间索引的单类别NMS，结果与hard_nms.nms完全一致
+        desc:
+            Parameters:
+                boxes: 边界框(np.ndarray)——[N, 4]
+                scores: 得分(np.ndarray)——[N]
+                iou_threshold: IoU阈值(float)
+                top_k: 最多保留的框数(int)——小于等于0表示不限制
+                cell_size: 第0级网格的单元边长(float)——None表示使用框最长边的中位数
+            Returns:
+                (np.ndarray)保留的框序号(int64)——按得分从高到低排列
+    """
+    return batched_grid_nms(boxes, scores, np.zeros(boxes.shape[0], dtype=np.int64),
+                            iou_threshold=iou_threshold, top_k=top_k, cell_size=cell_size)
+
+
+def _multiclass_grid_nms_single(boxes: np.ndarray,
+                                scores: np.ndarray,
+                                score_threshold: float,
+                                nms_top_k: int,
+                                keep_top_k: int,
+                                iou_threshold: float,
+                                cell_size: Union[float, None]) -> np.ndarray:
+    box_idx, labels, cand_scores = select_candidates(scores, score_threshold, nms_top_k)
+    cand_boxes = boxes[box_idx]
+    keep = batched_grid_nms(cand_boxes, cand_scores, labels, iou_threshold=iou_threshold,
+                            top_k=keep_top_k, cell_size=cell_size)
+    return format_detections(cand_boxes[keep], cand_scores[keep], labels[keep])
+
+
+def multiclass_grid_nms(bboxes: np.ndarray,
+                        scores: np.ndarray,
+                        score_threshold: float=0.05,
+                        nms_top_k: int=1000,
+                        keep_top_k: int=100,
+                        iou_threshold: float=0.6,
+                        cell_size: Union[float, None]=None) -> Union[np.ndarray, List[np.ndarray]]:
+    """空间索引的多类别硬NMS，结果与hard_nms.multiclass_nms完全一致
+        desc:
+            Parameters:
+                bboxes: 边界框(np.ndarray)——[N, 4]或批量[B, N, 4](x1, y1, x2, y2)，各类别共用
+                scores: 各框各类别的得分(np.ndarray)——[N, C]或批量[B, N, C]
+                score_threshold: 得分阈值(float)——得分不大于该值的候选不参与NMS
+                nms_top_k: NMS之前每个类别最多保留的候选数(int)——小于等于0表示不限制
+                keep_top_k: NMS之后每张图像最多保留的检测数(int)——小于等于0表示不限制
+                iou_threshold: IoU阈值(float)
+                cell_size: 第0级网格的单元边长(float)——None表示使用框最长边的中位数
+            Returns:
+                (np.ndarray or list(np.ndarray))检测结果[K, 6](class, score, x1, y1, x2, y2)，
+                按得分从高到低排列——批量输入时返回每张图像的检测结果列表
+            Others:
+                - 用于大图切片推理等候选数很大(数十万以上)的场景，
+                  通常需要设置nms_top_k与keep_top_k为-1(不限制)
+    """
+    args = (score_threshold, nms_top_k, keep_top_k, iou_threshold, cell_size)
+    if bboxes.ndim == 2:
+        return _multiclass_grid_nms_single(bboxes, scores, *args)
+    return [_multiclass_grid_nms_single(bboxes[i], scores[i], *args)
+            for i in range(bboxes.shape[0])]
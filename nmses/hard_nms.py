@@ -0,0 +1,184 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: hard nms
+# 多类别硬NMS:
+# 所有类别的候选按得分从高到低一次遍历完成(不存在逐类别的循环)，每个类别维护自己的剩余框；
+# 保留一个框时，与同类别的所有剩余框一次计算IoU并压缩移除被抑制的框
+import numpy as np
+
+from typing import List, Union
+
+from .box_utils import box_area, select_candidates
+
+__all__ = ['nms', 'batched_nms', 'multiclass_nms', 'format_detections']
+
+
+def _pack_boxes(boxes: np.ndarray,
+                order: np.ndarray) -> np.ndarray:
+    # [6, M]: x1, y1, x2, y2, 面积, 序号——每次迭代一次布尔索引即可压缩所有字段
+    rest = np.empty((6, order.shape[0]), dtype=np.float64)
+    rest[:4] = boxes[order].T
+    rest[4] = box_area(rest[:4].T)
+    rest[5] = order
+    return rest
+
+
+def _suppress(rest: np.ndarray,
+              iou_threshold: float) -> np.ndarray:
+    """保留rest的第一个框，移除其余框中与它的IoU大于阈值的框
+        desc:
+            Parameters:
+                rest: 剩余框(np.ndarray)——[6, M]，第一个框为得分最高的剩余框
+                iou_threshold: IoU阈值(float)
+            Returns:
+                (np.ndarray)压缩后的剩余框(不含第一个框)——[6, M']
+    """
+    box, rest = rest[:, 0], rest[:, 1:]
+    inter_w = np.minimum(rest[2], box[2]) - np.maximum(rest[0], box[0])
+    inter_h = np.minimum(rest[3], box[3]) - np.maximum(rest[1], box[1])
+    inter = np.maximum(inter_w, 0.) * np.maximum(inter_h, 0.)
+    # iou <= threshold 等价于 inter <= threshold * union(避免除法)
+    union = rest[4] + box[4] - inter
+    return rest[:, inter <= iou_threshold * union]
+
+
+def nms(boxes: np.ndarray,
+        scores: np.ndarray,
+        iou_threshold: float=0.5,
+        top_k: int=-1) -> np.ndarray:
+    """单类别贪心NMS
+        desc:
+            Parameters:
+                boxes: 边界框(np.ndarray)——[N, 4](x1, y1, x2, y2)
+                scores: 得分(np.ndarray)——[N]
+                iou_threshold: IoU阈值(float)——与已保留框的IoU大于该值的框被抑制
+                top_k: 最多保留的框数(int)——小于等于0表示不限制
+            Returns:
+                (np.ndarray)保留的框序号(int64)——按得分从高到低排列
+            Others:
+                - 得分相同时序号小者优先
+                - 保留的框按得分顺序产生，达到top_k时直接结束
+    """
+    rest = _pack_boxes(boxes, np.argsort(-scores, kind='stable'))
+    keep = []
+    while rest.shape[1] > 0:
+        keep.append(int(rest[5, 0]))
+        if len(keep) == top_k:
+            break
+        rest = _suppress(rest, iou_threshold)
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_nms(boxes: np.ndarray,
+                scores: np.ndarray,
+                labels: np.ndarray,
+                iou_threshold: float=0.5,
+                top_k: int=-1) -> np.ndarray:
+    """多类别NMS: 每个类别分别做NMS，所有类别在一次按得分顺序的遍历中完成
+        desc:
+            Parameters:
+                boxes: 边界框(np.ndarray)——[N, 4]
+                scores: 得分(np.ndarray)——[N]
+                labels: 类别(np.ndarray)——[N]
+                iou_threshold: IoU阈值(float)
+                top_k: 所有类别合计最多保留的框数(int)——小于等于0表示不限制
+            Returns:
+                (np.ndarray)保留的框序号(int64)——按得分从高到低排列
+            Others:
+                - 按得分从高到低遍历所有类别的框，每个类别只维护自己的剩余框:
+                  一个框仍是其类别剩余框中的第一个时保留，并只与同类别的剩余框计算IoU
+                - 合计达到top_k时直接结束(结果等于逐类别NMS后按得分取前top_k)
+    """
+    order = np.argsort(-scores, kind='stable')
+    class_order = order[np.argsort(labels[order], kind='stable')] # 按类别分组，组内按得分排列
+    sorted_labels = labels[class_order]
+    bounds = np.flatnonzero(sorted_labels[1:] != sorted_labels[:-1]) + 1
+    segments = np.split(_pack_boxes(boxes, class_order), bounds, axis=1)
+    class_ids = sorted_labels[np.concatenate([[0], bounds])].tolist() if order.shape[0] > 0 else []
+    alive = dict(zip(class_ids, segments)) # 类别 --> 剩余框
+    heads = {c: int(segment[5, 0]) for c, segment in alive.items()} # 类别 --> 剩余框中得分最高的框序号
+
+    keep = []
+    labels_list = labels.tolist()
+    for idx in order.tolist():
+        c = labels_list[idx]
+        if heads[c] != idx: # 已被同类别的框抑制
+            continue
+        keep.append(idx)
+        if len(keep) == top_k:
+            break
+        rest = _suppress(alive[c], iou_threshold)
+        alive[c] = rest
+        heads[c] = int(rest[5, 0]) if rest.shape[1] > 0 else -1
+    return np.asarray(keep, dtype=np.int64)
+
+
+def format_detections(boxes: np.ndarray,
+                      scores: np.ndarray,
+                      labels: np.ndarray) -> np.ndarray:
+    """拼接为检测结果
+        desc:
+            Parameters:
+                boxes: 边界框(np.ndarray)——[K, 4]
+                scores: 得分(np.ndarray)——[K]
+                labels: 类别(np.ndarray)——[K]
+            Returns:
+                (np.ndarray)检测结果(float32)——[K, 6](class, score, x1, y1, x2, y2)，
+                可直接用于visualizes.visualize_det
+    """
+    out = np.empty((boxes.shape[0], 6), dtype=np.float32)
+    out[:, 0] = labels
+    out[:, 1] = scores
+    out[:, 2:] = boxes
+    return out
+
+
+def _multiclass_nms_single(boxes: np.ndarray,
+                           scores: np.ndarray,
+                           score_threshold: float,
+                           nms_top_k: int,
+                           keep_top_k: int,
+                           iou_threshold: float) -> np.ndarray:
+    box_idx, labels, cand_scores = select_candidates(scores, score_threshold, nms_top_k)
+    cand_boxes = boxes[box_idx]
+    keep = batched_nms(cand_boxes, cand_scores, labels,
+                       iou_threshold=iou_threshold, top_k=keep_top_k)
+    return format_detections(cand_boxes[keep], cand_scores[keep], labels[keep])
+
+
+def multiclass_nms(bboxes: np.ndarray,
+                   scores: np.ndarray,
+                   score_threshold: float=0.05,
+                   nms_top_k: int=1000,
+                   keep_top_k: int=100,
+                   iou_threshold: float=0.6) -> Union[np.ndarray, List[np.ndarray]]:
+    """多类别硬NMS
+        desc:
+            Parameters:
+                bboxes: 边界框(np.ndarray)——[N, 4]或批量[B, N, 4](x1, y1, x2, y2)，各类别共用
+                scores: 各框各类别的得分(np.ndarray)——[N, C]或批量[B, N, C]
+                score_threshold: 得分阈值(float)——得分不大于该值的候选不参与NMS
+                nms_top_k: NMS之前每个类别最多保留的候选数(int)——小于等于0表示不限制
+                keep_top_k: NMS之后每张图像最多保留的检测数(int)——小于等于0表示不限制
+                iou_threshold: IoU阈值(float)
+            Returns:
+                (np.ndarray or list(np.ndarray))检测结果[K, 6](class, score, x1, y1, x2, y2)，
+                按得分从高到低排列——批量输入时返回每张图像的检测结果列表
+    """
+    if bboxes.ndim == 2:
+        return _multiclass_nms_single(bboxes, scores, score_threshold,
+                                      nms_top_k, keep_top_k, iou_threshold)
+    return [_multiclass_nms_single(bboxes[i], scores[i], score_threshold,
+                                   nms_top_k, keep_top_k, iou_threshold)
+            for i in range(bboxes.shape[0])]
@@ -0,0 +1,125 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: matrix nms
+# Matrix NMS(SOLOv2):
+# 每个候选的衰减系数由同类别候选两两之间的IoU矩阵一次计算得到，不存在顺序依赖；
+# 所有类别补齐为[C', T, T]的IoU张量后同时计算(候选数相近的类别分为一块，按块控制内存)
+import numpy as np
+
+from typing import List, Union
+
+from .box_utils import box_iou, select_candidates, group_by_class
+from .hard_nms import format_detections
+
+__all__ = ['matrix_nms_decay', 'multiclass_matrix_nms']
+
+
+def matrix_nms_decay(boxes: np.ndarray,
+                     valid: np.ndarray,
+                     use_gaussian: bool=False,
+                     gaussian_sigma: float=2.) -> np.ndarray:
+    """计算Matrix NMS的衰减系数
+        desc:
+            Parameters:
+                boxes: 各类别的候选框(np.ndarray)——[C', T, 4]，每行按得分从高到低排列
+                valid: 有效位置(np.ndarray)——[C', T]
+                use_gaussian: 是否使用高斯衰减(bool)——否则使用线性衰减
+                gaussian_sigma: 高斯衰减系数(float)
+            Returns:
+                (np.ndarray)衰减系数——[C', T]，取值(0, 1]
+            Others:
+                - 候选j的衰减: min_{i<j} f(iou_ij) / f(max_{k<i} iou_ki)，
+                  高斯: f(x) = exp(-sigma * x^2)，线性: f(x) = 1 - x
+    """
+    num_rows = boxes.shape[1]
+    # 补齐位置置为面积为0的框，与任何框的IoU为0
+    boxes = np.where(valid[:, :, None], boxes, 0.).astype(np.float32)
+    iou = box_iou(boxes, boxes)
+    # 只保留得分更高的候选对得分更低的候选的IoU(上三角)
+    iou *= np.triu(np.ones((num_rows, num_rows), dtype=np.float32), k=1)
+    compensate = iou.max(axis=1)[:, :, None] # [C', T, 1]: 每个候选被得分更高的候选覆盖的最大IoU
+    # 非上三角位置的IoU为0，衰减不小于1，不影响与1比较后的最小值
+    if use_gaussian:
+        # exp单调: 先在指数上取最小值，只对[C', T]计算exp
+        exponent = (compensate * compensate - iou * iou).min(axis=1)
+        return np.minimum(np.exp(exponent * gaussian_sigma), 1.)
+    decay = (1. - iou) / np.maximum(1. - compensate, 1e-10)
+    return np.minimum(decay.min(axis=1), 1.)
+
+
+def _multiclass_matrix_nms_single(boxes: np.ndarray,
+                                  scores: np.ndarray,
+                                  score_threshold: float,
+                                  post_threshold: float,
+                                  nms_top_k: int,
+                                  keep_top_k: int,
+                                  use_gaussian: bool,
+                                  gaussian_sigma: float,
+                                  chunk_bytes: int) -> np.ndarray:
+    box_idx, labels, cand_scores = select_candidates(scores, score_threshold, nms_top_k)
+    class_ids, index, valid = group_by_class(labels)
+    decay = np.ones(index.shape, dtype=np.float32)
+    counts = valid.sum(axis=1)
+    row_order = np.argsort(-counts, kind='stable') # 候选数相近的类别分在同一块，减少补齐
+    start = 0
+    while start < row_order.shape[0]:
+        num_cols = counts[row_order[start]]
+        # 每个类别的[T, T]中间张量约为6个float32矩阵
+        chunk = max(1, chunk_bytes // (num_cols * num_cols * 4 * 6))
+        rows = row_order[start:start + chunk]
+        decay[rows, :num_cols] = matrix_nms_decay(boxes[box_idx[index[rows, :num_cols]]],
+                                                  valid[rows, :num_cols],
+                                                  use_gaussian=use_gaussian,
+                                                  gaussian_sigma=gaussian_sigma)
+        start += chunk
+    decayed = np.zeros(labels.shape[0], dtype=np.float32)
+    decayed[index[valid]] = cand_scores[index[valid]] * decay[valid]
+    keep = np.nonzero(decayed > post_threshold)[0]
+    keep = keep[np.argsort(-decayed[keep], kind='stable')]
+    if keep_top_k > 0:
+        keep = keep[:keep_top_k]
+    return format_detections(boxes[box_idx[keep]], decayed[keep], labels[keep])
+
+
+def multiclass_matrix_nms(bboxes: np.ndarray,
+                          scores: np.ndarray,
+                          score_threshold: float=0.05,
+                          nms_top_k: int=1000,
+                          keep_top_k: int=100,
+                          post_threshold: float=0.05,
+                          use_gaussian: bool=False,
+                          gaussian_sigma: float=2.,
+                          chunk_bytes: int=1 << 26) -> Union[np.ndarray, List[np.ndarray]]:
+    """多类别Matrix NMS
+        desc:
+            Parameters:
+                bboxes: 边界框(np.ndarray)——[N, 4]或批量[B, N, 4](x1, y1, x2, y2)，各类别共用
+                scores: 各框各类别的得分(np.ndarray)——[N, C]或批量[B, N, C]
+                score_threshold: 得分阈值(float)——得分不大于该值的候选不参与NMS
+                nms_top_k: NMS之前每个类别最多保留的候选数(int)——小于等于0表示不限制
+                keep_top_k: NMS之后每张图像最多保留的检测数(int)——小于等于0表示不限制
+                post_threshold: 衰减后的得分阈值(float)——衰减后得分不大于该值的检测被移除
+                use_gaussian: 是否使用高斯衰减(bool)——否则使用线性衰减
+                gaussian_sigma: 高斯衰减系数(float)
+                chunk_bytes: 分块计算时IoU等中间张量的总字节上限(int)——超出时至少计算一个类别
+            Returns:
+                (np.ndarray or list(np.ndarray))检测结果[K, 6](class, score, x1, y1, x2, y2)，
+                score为衰减后的得分，按得分从高到低排列——批量输入时返回每张图像的检测结果列表
+    """
+    args = (score_threshold, post_threshold, nms_top_k, keep_top_k,
+            use_gaussian, gaussian_sigma, chunk_bytes)
+    if bboxes.ndim == 2:
+        return _multiclass_matrix_nms_single(bboxes, scores, *args)
+    return [_multiclass_matrix_nms_single(bboxes[i], scores[i], *args)
+            for i in range(bboxes.shape[0])]
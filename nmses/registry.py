@@ -0,0 +1,69 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: nms registry
+# NMS注册表: 各NMS方法的输入输出一致，后处理通过配置中的名称切换
+import sys
+import functools
+
+from typing import Any, Callable, Dict, List, Union
+
+from .hard_nms import multiclass_nms
+from .matrix_nms import multiclass_matrix_nms
+from .soft_nms import multiclass_soft_nms
+from .grid_nms import multiclass_grid_nms
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['NMS_REGISTRY', 'build_nms', 'list_nms']
+
+# NMS注册表: 名称 --> 多类别NMS函数
+# 函数签名: fn(bboxes, scores, score_threshold, nms_top_k, keep_top_k, **方法参数)
+#          --> [K, 6](class, score, x1, y1, x2, y2)或批量输入时的列表
+NMS_REGISTRY = {
+    'hard': multiclass_nms,
+    'matrix': multiclass_matrix_nms,
+    'soft': multiclass_soft_nms,
+    'grid': multiclass_grid_nms
+}
+
+
+def build_nms(config: Union[str, Dict[str, Any]]) -> Callable:
+    """按名称构建NMS
+        desc:
+            Parameters:
+                config: NMS名称(str)，或配置(dict)——{'name': 名称, 其余为NMS参数}
+            Returns:
+                (Callable)NMS函数——fn(bboxes, scores)
+            Others:
+                - 名称: 'hard'(硬NMS), 'matrix'(Matrix NMS), 'soft'(Soft-NMS),
+                  'grid'(空间索引的硬NMS，结果与'hard'一致，用于候选数很大的场景)
+                - 返回functools.partial，可被pickle传递到worker进程
+    """
+    config = {'name': config} if isinstance(config, str) else dict(config)
+    name = config.pop('name', 'hard')
+    if name not in NMS_REGISTRY:
+        try:
+            raise KeyError()
+        except:
+            error_traceback(logger=logger,
+                            lasterrorline_offset=6,
+                            num_lines=1)
+            logger.error("Summary: The nms '{0}' is not registered, please choose from {1}.".format(
+                name, list_nms()))
+            sys.exit(1)
+    return functools.partial(NMS_REGISTRY[name], **config)
+
+
+def list_nms() -> List[str]:
+    return sorted(NMS_REGISTRY.keys())
@@ -0,0 +1,143 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: soft nms
+# Soft-NMS:
+# 选取与衰减是顺序过程，但所有类别在补齐后的[C', T]矩阵上同步进行——
+# 每一步同时为每个类别选出当前得分最高的候选，并一次衰减所有类别的剩余候选，
+# 迭代次数为最大的类内候选数而不是候选总数
+import sys
+import numpy as np
+
+from typing import List, Union
+
+from .box_utils import box_area, select_candidates, group_by_class
+from .hard_nms import format_detections
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['soft_nms_step', 'multiclass_soft_nms']
+
+
+def soft_nms_step(boxes: np.ndarray,
+                  areas: np.ndarray,
+                  pick: np.ndarray,
+                  method: str='gaussian',
+                  iou_threshold: float=0.3,
+                  sigma: float=0.5) -> np.ndarray:
+    """Soft-NMS的一步: 计算各类别选出的候选对同类别所有候选的衰减系数
+        desc:
+            Parameters:
+                boxes: 各类别的候选框(np.ndarray)——[C', T, 4]
+                areas: 候选框面积(np.ndarray)——[C', T]
+                pick: 各类别选出的候选位置(np.ndarray)——[C']
+                method: 衰减方式(str)——'gaussian'或'linear'
+                iou_threshold: 线性衰减的IoU阈值(float)——IoU大于该值时得分乘以(1 - IoU)
+                sigma: 高斯衰减系数(float)——得分乘以exp(-IoU^2 / sigma)
+            Returns:
+                (np.ndarray)衰减系数——[C', T]
+    """
+    rows = np.arange(boxes.shape[0])
+    box = boxes[rows, pick][:, None, :] # [C', 1, 4]
+    inter_w = np.minimum(boxes[..., 2], box[..., 2]) - np.maximum(boxes[..., 0], box[..., 0])
+    inter_h = np.minimum(boxes[..., 3], box[..., 3]) - np.maximum(boxes[..., 1], box[..., 1])
+    inter = np.maximum(inter_w, 0.) * np.maximum(inter_h, 0.)
+    iou = inter / np.maximum(areas + areas[rows, pick][:, None] - inter, 1e-10)
+    if method == 'gaussian':
+        return np.exp(-(iou * iou) / sigma)
+    return np.where(iou > iou_threshold, 1. - iou, 1.)
+
+
+def _multiclass_soft_nms_single(boxes: np.ndarray,
+                                scores: np.ndarray,
+                                score_threshold: float,
+                                post_threshold: float,
+                                nms_top_k: int,
+                                keep_top_k: int,
+                                method: str,
+                                iou_threshold: float,
+                                sigma: float) -> np.ndarray:
+    box_idx, labels, cand_scores = select_candidates(scores, score_threshold, nms_top_k)
+    class_ids, index, valid = group_by_class(labels)
+    cand_boxes = boxes[box_idx[index]].astype(np.float32) # [C', T, 4]
+    areas = box_area(cand_boxes)
+    current = np.where(valid, cand_scores[index], 0.).astype(np.float32) # 当前(衰减后)得分
+    active = valid.copy()
+    picks, picked_scores = [], []
+    while active.any():
+        # 移除已结束的类别(没有剩余候选)，之后的迭代只计算剩余的类别
+        alive = active.any(axis=1)
+        if alive.sum() <= alive.shape[0] * 3 // 4:
+            index, cand_boxes, areas = index[alive], cand_boxes[alive], areas[alive]
+            current, active = current[alive], active[alive]
+        rows = np.arange(index.shape[0])
+        # 每个类别选出当前得分最高的剩余候选(得分相同时取原得分更高者)
+        pick = np.argmax(np.where(active, current, -1.), axis=1)
+        has_pick = active[rows, pick]
+        picks.append(index[rows[has_pick], pick[has_pick]])
+        picked_scores.append(current[rows[has_pick], pick[has_pick]])
+        active[rows, pick] = False
+        current *= soft_nms_step(cand_boxes, areas, pick, method=method,
+                                 iou_threshold=iou_threshold, sigma=sigma)
+        active &= current > post_threshold
+    if len(picks) == 0:
+        return format_detections(boxes[:0], scores[:0, 0], labels[:0])
+    keep = np.concatenate(picks)
+    keep_scores = np.concatenate(picked_scores)
+    order = np.argsort(-keep_scores, kind='stable')
+    if keep_top_k > 0:
+        order = order[:keep_top_k]
+    keep = keep[order]
+    return format_detections(boxes[box_idx[keep]], keep_scores[order], labels[keep])
+
+
+def multiclass_soft_nms(bboxes: np.ndarray,
+                        scores: np.ndarray,
+                        score_threshold: float=0.05,
+                        nms_top_k: int=1000,
+                        keep_top_k: int=100,
+                        post_threshold: float=0.001,
+                        method: str='gaussian',
+                        iou_threshold: float=0.3,
+                        sigma: float=0.5) -> Union[np.ndarray, List[np.ndarray]]:
+    """多类别Soft-NMS
+        desc:
+            Parameters:
+                bboxes: 边界框(np.ndarray)——[N, 4]或批量[B, N, 4](x1, y1, x2, y2)，各类别共用
+                scores: 各框各类别的得分(np.ndarray)——[N, C]或批量[B, N, C]
+                score_threshold: 得分阈值(float)——得分不大于该值的候选不参与NMS
+                nms_top_k: NMS之前每个类别最多保留的候选数(int)——小于等于0表示不限制
+                keep_top_k: NMS之后每张图像最多保留的检测数(int)——小于等于0表示不限制
+                post_threshold: 衰减后的得分阈值(float)——衰减后得分不大于该值的候选被移除
+                method: 衰减方式(str)——'gaussian'或'linear'
+                iou_threshold: 线性衰减的IoU阈值(float)
+                sigma: 高斯衰减系数(float)
+            Returns:
+                (np.ndarray or list(np.ndarray))检测结果[K, 6](class, score, x1, y1, x2, y2)，
+                score为选出时的(衰减后)得分，按得分从高到低排列——批量输入时返回每张图像的检测结果列表
+    """
+    if method not in ['gaussian', 'linear']:
+        try:
+            raise ValueError()
+        except:
+            error_traceback(logger=logger,
+                            lasterrorline_offset=6,
+                            num_lines=1)
+            logger.error("Summary: The soft nms method should be 'gaussian' or 'linear', but got '{0}'.".format(method))
+            sys.exit(1)
+    args = (score_threshold, post_threshold, nms_top_k, keep_top_k,
+            method, iou_threshold, sigma)
+    if bboxes.ndim == 2:
+        return _multiclass_soft_nms_single(bboxes, scores, *args)
+    return [_multiclass_soft_nms_single(bboxes[i], scores[i], *args)
+            for i in range(bboxes.shape[0])]
@@ -11,3 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from .fcos_postprocess import *
+
+__all__ = [
+    'fcos_postprocess' # FCOS后处理: 按层级筛选, 解码, NMS
+]
@@ -0,0 +1,182 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: fcos postprocess
+# FCOS后处理:
+# 解码前先按层级做得分阈值与top-k筛选(整个batch一次阈值比较，超出top-k的图像用argpartition)，
+# 只对筛选出的(位置点, 类别)候选解码: 位置点到框、裁剪到图像范围与缩放回原图在整个batch上一次完成，
+# 之后每张图像交给nmses中的NMS
+import numpy as np
+
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from nmses import build_nms
+from transforms import FCOSLocationCache, fcos_location_cache
+
+__all__ = ['FCOSPostProcess']
+
+
+def _to_numpy(x: Any) -> np.ndarray:
+    if x is None or isinstance(x, np.ndarray):
+        return x
+    return x.numpy() if hasattr(x, 'numpy') else np.asarray(x)
+
+
+class FCOSPostProcess(object):
+    def __init__(self,
+                 fpn_strides: List[int]=[8, 16, 32, 64, 128],
+                 score_threshold: float=0.05,
+                 pre_nms_top_k: int=1000,
+                 nms: Union[str, Dict[str, Any]]={'name': 'hard', 'nms_top_k': 1000,
+                                                  'keep_top_k': 100, 'iou_threshold': 0.6},
+                 clip_bbox: bool=True,
+                 location_cache: Union[FCOSLocationCache, None]=None) -> None:
+        """FCOS后处理: 得分筛选, 解码, NMS
+            desc:
+                Parameters:
+                    fpn_strides: 各层级的步长(list(int))——与FCOSHead一致
+                    score_threshold: 得分阈值(float)——得分不大于该值的候选不解码
+                    pre_nms_top_k: 每张图像每个层级最多保留的(位置点, 类别)候选数(int)——小于等于0表示不限制
+                    nms: NMS名称(str)或配置(dict)——见nmses.build_nms，未设置score_threshold时使用本阈值
+                    clip_bbox: 是否将边界框裁剪到输入图像范围内(bool)
+                    location_cache: 位置点缓存(FCOSLocationCache)——None表示使用全局缓存
+                Returns:
+                    None
+                Others:
+                    - 输入为FCOSHead.predict(或推理模式FCOS)的输出，得分已按centerness加权
+                    - 输出每张图像的检测结果[K, 6](class, score, x1, y1, x2, y2)，
+                      可直接用于visualizes.visualize_det
+        """
+        super(FCOSPostProcess, self).__init__()
+        self.fpn_strides = fpn_strides
+        self.score_threshold = score_threshold
+        self.pre_nms_top_k = pre_nms_top_k
+        nms = {'name': nms} if isinstance(nms, str) else dict(nms)
+        nms.setdefault('score_threshold', score_threshold)
+        self.nms = build_nms(nms)
+        self.clip_bbox = clip_bbox
+        self.location_cache = location_cache
+        # 后处理只使用位置点坐标，回归范围无关
+        self._scale_ranges = np.zeros((len(fpn_strides), 2), dtype=np.float32)
+
+    def get_locations(self,
+                      feature_sizes: Sequence[Tuple[int, int]]) -> np.ndarray:
+        """获取所有层级的位置点坐标(从位置点缓存中读取)
+            desc:
+                Parameters:
+                    feature_sizes: 各层级特征图尺寸(tuple)——FCOSHead.predict输出的feature_sizes
+                Returns:
+                    (np.ndarray)只读的位置点坐标——[P, 2]: x, y
+        """
+        cache = self.location_cache if self.location_cache is not None else fcos_location_cache
+        return cache.get(feature_sizes, self.fpn_strides, self._scale_ranges)[0]
+
+    def select(self,
+               scores: np.ndarray,
+               feature_sizes: Sequence[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray,
+                                                                   np.ndarray, np.ndarray]:
+        """按层级筛选候选: 得分阈值 + 每个层级top-k
+            desc:
+                Parameters:
+                    scores: 得分(np.ndarray)——[B, P, C]
+                    feature_sizes: 各层级特征图尺寸(tuple)
+                Returns:
+                    (Tuple)候选的图像序号[M], 位置点序号[M], 类别[M], 得分[M]——按图像序号排列
+                Others:
+                    - 每个层级对整个batch做一次阈值比较，只有候选数超过pre_nms_top_k的图像
+                      才用argpartition选出得分最高的pre_nms_top_k个
+        """
+        batch_size, _, num_classes = scores.shape
+        batch_idx, flat_idx = [], []
+        start = 0
+        for feat_h, feat_w in feature_sizes:
+            end = start + feat_h * feat_w
+            level_scores = scores[:, start:end, :].reshape(batch_size, -1) # [B, P_l * C]
+            b, j = np.nonzero(level_scores > self.score_threshold)
+            counts = np.bincount(b, minlength=batch_size)
+            if self.pre_nms_top_k > 0 and counts.max(initial=0) > self.pre_nms_top_k:
+                bounds = np.concatenate([[0], np.cumsum(counts)])
+                keep = np.ones(b.shape[0], dtype=bool)
+                for i in np.nonzero(counts > self.pre_nms_top_k)[0]:
+                    seg = slice(bounds[i], bounds[i + 1])
+                    seg_scores = level_scores[i, j[seg]]
+                    top = np.argpartition(-seg_scores, self.pre_nms_top_k - 1)[:self.pre_nms_top_k]
+                    seg_keep = np.zeros(seg_scores.shape[0], dtype=bool)
+                    seg_keep[top] = True
+                    keep[seg] = seg_keep
+                b, j = b[keep], j[keep]
+            batch_idx.append(b)
+            flat_idx.append(j + start * num_classes)
+            start = end
+        batch_idx, flat_idx = np.concatenate(batch_idx), np.concatenate(flat_idx)
+        order = np.argsort(batch_idx, kind='stable')
+        batch_idx, flat_idx = batch_idx[order], flat_idx[order]
+        point_idx, labels = np.divmod(flat_idx, num_classes)
+        return batch_idx, point_idx, labels, scores[batch_idx, point_idx, labels]
+
+    def decode(self,
+               ltrb: np.ndarray,
+               locations: np.ndarray,
+               batch_idx: np.ndarray,
+               point_idx: np.ndarray,
+               im_shape: Union[np.ndarray, None]=None,
+               scale_factor: Union[np.ndarray, None]=None) -> np.ndarray:
+        """解码候选的边界框(整个batch一次计算)
+            desc:
+                Parameters:
+                    ltrb: 位置点到框四边的距离(np.ndarray)——[B, P, 4]
+                    locations: 位置点坐标(np.ndarray)——[P, 2]
+                    batch_idx: 候选的图像序号(np.ndarray)——[M]
+                    point_idx: 候选的位置点序号(np.ndarray)——[M]
+                    im_shape: 各图像的输入尺寸(np.ndarray)——[B, 2]: h, w，None表示不裁剪
+                    scale_factor: 各图像的缩放系数(np.ndarray)——[B, 2]: scale_y, scale_x，
+                                  None表示不缩放回原图
+                Returns:
+                    (np.ndarray)原图上的边界框——[M, 4](x1, y1, x2, y2)
+        """
+        xy = np.tile(locations[point_idx], (1, 2)) # [M, 4]: x, y, x, y
+        boxes = xy + ltrb[batch_idx, point_idx] * np.asarray([-1., -1., 1., 1.], dtype=np.float32)
+        if self.clip_bbox and im_shape is not None:
+            hw = im_shape[batch_idx][:, ::-1] # [M, 2]: w, h
+            boxes = np.clip(boxes, 0., np.tile(hw, (1, 2)))
+        if scale_factor is not None:
+            boxes = boxes / np.tile(scale_factor[batch_idx][:, ::-1], (1, 2))
+        return boxes.astype(np.float32)
+
+    def __call__(self,
+                 outputs: Dict[str, Any],
+                 im_shape: Any=None,
+                 scale_factor: Any=None) -> List[np.ndarray]:
+        """后处理
+            desc:
+                Parameters:
+                    outputs: FCOSHead.predict的输出(dict)——scores: [B, P, C], ltrb: [B, P, 4], feature_sizes
+                    im_shape: 各图像的输入尺寸(np.ndarray or paddle.Tensor)——[B, 2]: h, w(缩放后、填充前)
+                    scale_factor: 各图像的缩放系数(np.ndarray or paddle.Tensor)——[B, 2]: scale_y, scale_x
+                Returns:
+                    (list(np.ndarray))每张图像的检测结果[K, 6](class, score, x1, y1, x2, y2)，坐标为原图坐标
+        """
+        scores, ltrb = _to_numpy(outputs['scores']), _to_numpy(outputs['ltrb'])
+        im_shape, scale_factor = _to_numpy(im_shape), _to_numpy(scale_factor)
+        feature_sizes = outputs['feature_sizes']
+        batch_size, _, num_classes = scores.shape
+
+        batch_idx, point_idx, labels, cand_scores = self.select(scores, feature_sizes)
+        boxes = self.decode(ltrb, self.get_locations(feature_sizes), batch_idx, point_idx,
+                            im_shape=im_shape, scale_factor=scale_factor)
+        # 每个候选一行(只有所属类别的得分)，交给NMS
+        rows = np.zeros((labels.shape[0], num_classes), dtype=np.float32)
+        rows[np.arange(labels.shape[0]), labels] = cand_scores
+        bounds = np.searchsorted(batch_idx, np.arange(batch_size + 1))
+        return [self.nms(boxes[bounds[i]:bounds[i + 1]], rows[bounds[i]:bounds[i + 1]])
+                for i in range(batch_size)]
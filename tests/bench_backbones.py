@@ -0,0 +1,41 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark backbone latency on the local CPU and pick the fastest one within an accuracy budget
+# 用法: python tests/bench_backbones.py [最低参考精度(top1)] [耗时表json路径]
+import os
+import sys
+
+# 设置当前KFPDetection包路径:
+# 保证backbones正常调用
+sys.path.append( os.getcwd() )
+
+from backbones import BackboneLatencyTable, list_backbones
+
+INPUT_SIZES = [(320, 320), (512, 512), (800, 1344)]
+
+
+if __name__ == "__main__":
+    min_top1 = float(sys.argv[1]) if len(sys.argv) > 1 else 70.
+    table = BackboneLatencyTable(sys.argv[2]) if len(sys.argv) > 2 else BackboneLatencyTable()
+    # 已缓存的配置不重复测量
+    table.measure(list_backbones(), input_sizes=INPUT_SIZES, batch_sizes=[1], num_iters=5)
+    print("latency table: {0} ({1})".format(table.path, table.machine))
+    for input_size in INPUT_SIZES:
+        print("{0}x{1} batch=1".format(*input_size))
+        for row in table.rows(input_size):
+            top1 = '  -  ' if row['top1'] is None else '{0:5.1f}'.format(row['top1'])
+            print("  {0:<24s} top1 {1} | {2:8.1f} ms | {3:7.1f} images/s".format(
+                row['name'], top1, row['latency_ms'], row['images_per_sec']))
+        print("  fastest: {0} | fastest with top1 >= {1}: {2}".format(
+            table.select(input_size), min_top1, table.select(input_size, min_top1=min_top1)))
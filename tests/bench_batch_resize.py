@@ -0,0 +1,69 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark batch-level multi-scale resize with aspect ratio bucketing
+import os
+import sys
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms、datasets正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import RandomResize, BatchRandomResize, PadBatch, stack_samples
+from datasets import AspectRatioBatchSampler
+
+SHAPES = [(480, 640), (640, 480), (427, 640), (640, 427), (375, 500), (500, 375), (360, 640)]
+TARGET_SIZES = list(range(320, 641, 32))
+
+
+def make_records(num_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    images = dict([(shape, rng.integers(0, 256, shape + (3,), dtype=np.uint8)) for shape in SHAPES])
+    records = []
+    for idx in rng.integers(0, len(SHAPES), num_samples):
+        im_h, im_w = SHAPES[idx]
+        records.append({'image': images[(im_h, im_w)], 'h': im_h, 'w': im_w,
+                        'gt_bbox': np.array([[0, 0, im_w, im_h]], dtype=np.float32)})
+    return records
+
+
+def random_batches(num_samples, batch_size, seed=0):
+    indexes = np.random.default_rng(seed).permutation(num_samples)
+    return [indexes[i:i + batch_size].tolist() for i in range(0, num_samples, batch_size)]
+
+
+def run(records, batches, resize):
+    pad = PadBatch(size_divisor=32)
+    start = time.perf_counter()
+    for batch in batches:
+        samples = resize([dict(records[idx]) for idx in batch])
+        stack_samples(pad(samples))
+    elapsed = time.perf_counter() - start
+    return len(records) / elapsed, pad.padded_ratio()
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    num_samples, batch_size = 512, 8
+    records = make_records(num_samples)
+    sampler = AspectRatioBatchSampler.from_samples(records, batch_size=batch_size, seed=0)
+    cases = [
+        ('per-sample RandomResize', RandomResize(TARGET_SIZES), random_batches(num_samples, batch_size)),
+        ('BatchRandomResize', BatchRandomResize(TARGET_SIZES), random_batches(num_samples, batch_size)),
+        ('BatchRandomResize+bucket', BatchRandomResize(TARGET_SIZES), list(sampler)),
+    ]
+    for name, resize, batches in cases:
+        speed, ratio = run(records, batches, resize)
+        print("{0:<26s}: padded pixels {1:5.1f}% | {2:7.1f} samples/s".format(name, ratio * 100, speed))
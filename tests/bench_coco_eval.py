@@ -0,0 +1,101 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark streaming coco evaluator: per-image matching, accumulate, and stored bytes per detection
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证metrics正常调用
+sys.path.append( os.getcwd() )
+
+from metrics import COCOEvaluator
+from test_coco_eval import reference_cocoeval
+
+
+def make_images(num_images, num_classes=80, num_dets=100, seed=0):
+    """COCO规模的合成数据: 每张图像约7个真实框，100个检测框(抖动的真实框 + 误检)"""
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in range(num_images):
+        num_gt = rng.randint(1, 15)
+        ctr = rng.uniform(0, 640, (num_gt, 2))
+        wh = np.exp(rng.uniform(np.log(8), np.log(400), (num_gt, 2)))
+        gt_bbox = np.concatenate([ctr - wh / 2, ctr + wh / 2], axis=1).astype(np.float32)
+        gt_class = rng.randint(0, num_classes, (num_gt, 1))
+        src = rng.randint(0, num_gt, num_dets)
+        boxes = gt_bbox[src] + rng.normal(0, 0.15, (num_dets, 4)) * np.tile(wh[src], 2)
+        labels = np.where(rng.uniform(size=num_dets) < 0.7, gt_class[src, 0], rng.randint(0, num_classes, num_dets))
+        dets = np.concatenate([labels[:, None], rng.uniform(0.05, 1., (num_dets, 1)), boxes], axis=1)
+        images.append((dets.astype(np.float32), gt_bbox, gt_class, np.zeros((num_gt, 1))))
+    return images
+
+
+def run(images, batch_size=8, **kwargs):
+    evaluator = COCOEvaluator(80, **kwargs)
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        evaluator.update([b[0] for b in batch], [b[1] for b in batch], [b[2] for b in batch])
+    update = time.perf_counter() - start
+    start = time.perf_counter()
+    evaluator.accumulate()
+    accumulate = time.perf_counter() - start
+    return evaluator, update, accumulate
+
+
+def coco_dict_bytes(images):
+    """对照: COCOeval为每个检测保存的dict(loadRes后的bbox结果)占用的内存"""
+    tracemalloc.start()
+    anns = []
+    for i, (dets, _, _, _) in enumerate(images):
+        for d in dets.tolist():
+            anns.append({'image_id': i, 'category_id': int(d[0]), 'score': d[1],
+                         'bbox': [d[2], d[3], d[4] - d[2], d[5] - d[3]],
+                         'area': (d[4] - d[2]) * (d[5] - d[3]), 'id': len(anns) + 1, 'iscrowd': 0})
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(anns)
+
+
+def main():
+    images = make_images(5000)
+    num_dets = sum([b[0].shape[0] for b in images])
+    print('5000 images, 80 classes, {0} detections'.format(num_dets))
+    for name, kwargs in [('exact', {}), ('score_bins=1000', {'score_bins': 1000})]:
+        evaluator, update, accumulate = run(images, **kwargs)
+        stats = {k: v for k, v in evaluator.summarize().items()}
+        print('{0:>16}: update {1:.2f} s ({2:.2f} ms/image), accumulate {3:.2f} s, '
+              'stored {4:.1f} MB, AP {5:.4f}'.format(name, update, update / len(images) * 1e3, accumulate,
+                                                     evaluator.nbytes / 2 ** 20, stats['AP']))
+    evaluator, _, _ = run(images)
+    print('stored bytes per detection: exact {0:.1f} (records {1}), COCOeval dict {2:.0f}'.format(
+        evaluator.nbytes / evaluator.records.capacity, len(evaluator.records),
+        coco_dict_bytes(images[:500])))
+
+    # 对照: 逐(类别, 面积范围, 图像, IoU阈值, 检测框)循环的COCOeval参考实现(200张图像)
+    subset = images[:200]
+    start = time.perf_counter()
+    precision, _ = reference_cocoeval(subset, 80)
+    loop = time.perf_counter() - start
+    evaluator, update, accumulate = run(subset)
+    np.testing.assert_allclose(evaluator.precision, precision, atol=1e-12)
+    print('200 images: reference loop {0:.2f} s, streaming {1:.3f} s (x{2:.0f}), results identical'.format(
+        loop, update + accumulate, loop / (update + accumulate)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark vectorized FCOS loss vs per-image/per-level loop (forward + backward)
+import os
+import sys
+import time
+import paddle
+
+# 设置当前KFPDetection包路径:
+# 保证losses/transforms正常调用
+sys.path.append( os.getcwd() )
+
+import test_fcos_loss
+from losses import FCOSLoss
+from test_fcos_loss import make_batch, loop_fcos_loss
+
+
+def bench(func, outputs, inputs, num_iters):
+    times = []
+    for _ in range(num_iters):
+        start = time.perf_counter()
+        func(outputs, inputs)['loss'].backward()
+        times.append(time.perf_counter() - start)
+        for outs in outputs.values():
+            for out in outs:
+                out.clear_gradient()
+    return min(times) * 1e3
+
+
+if __name__ == "__main__":
+    paddle.set_device('cpu')
+    test_fcos_loss.NUM_CLASSES = 80
+    loss_op = FCOSLoss(num_classes=80)
+    for batch_size, im_size, num_bbox in [(2, (512, 512), 20), (8, (512, 512), 20), (8, (800, 1344), 50)]:
+        outputs, inputs = make_batch(batch_size, im_size, num_bbox)
+        vec_ms, loop_ms = [], []
+        for _ in range(2): # 交替运行
+            vec_ms.append(bench(loss_op, outputs, inputs, 3))
+            loop_ms.append(bench(lambda o, i: loop_fcos_loss(loss_op, o, i), outputs, inputs, 2))
+        print("{0}x{1} batch={2:<2d}: vectorized {3:8.1f} ms | per-image loop {4:8.1f} ms | speedup x{5:.1f}".format(
+            im_size[0], im_size[1], batch_size, min(vec_ms), min(loop_ms), min(loop_ms) / min(vec_ms)))
@@ -0,0 +1,71 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark FCOS CPU inference: eval vs deploy(BN folding) vs packed head
+import os
+import sys
+import time
+import numpy as np
+import paddle
+
+# 设置当前KFPDetection包路径:
+# 保证backbones/necks/heads/architectures正常调用
+sys.path.append( os.getcwd() )
+
+from backbones import ResNet
+from necks import FPN
+from heads import FCOSHead
+from architectures import FCOS
+
+
+def build(head_norm, channel=128):
+    paddle.seed(0)
+    backbone = ResNet(depth=18)
+    neck = FPN(backbone.out_channels, backbone.out_strides, out_channel=channel)
+    head = FCOSHead(num_classes=80, in_channel=channel, feat_channel=channel, norm_type=head_norm)
+    return FCOS(backbone, neck, head)
+
+
+def bench(model, image, num_iters):
+    model(image)
+    times = []
+    for _ in range(num_iters):
+        start = time.perf_counter()
+        model(image)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+if __name__ == "__main__":
+    paddle.set_device('cpu')
+    gn_model = build('gn')
+    gn_model.eval()
+    bn_model = build('bn')
+    bn_model.eval()
+    deploy_model = build('bn').deploy()
+    packed_model = build('bn').deploy()
+    packed_model.head.pack_levels = 3
+    models = [('eval  gn-head', gn_model), ('eval  bn-head', bn_model),
+              ('deploy', deploy_model), ('deploy+pack3', packed_model)]
+    for im_size in [320, 512]:
+        for batch_size in [1, 8]:
+            image = paddle.randn([batch_size, 3, im_size, im_size])
+            num_iters = 5 if batch_size == 1 else 2
+            results = {name: [] for name, _ in models}
+            for _ in range(2): # 交替运行，减小机器负载波动的影响
+                for name, model in models:
+                    results[name].append(bench(model, image, num_iters))
+            for name, _ in models:
+                latency = min(results[name])
+                print("{0}x{0} batch={1}  {2:<14s}: latency {3:8.1f} ms | {4:6.2f} images/s".format(
+                    im_size, batch_size, name, latency * 1e3, batch_size / latency))
@@ -0,0 +1,95 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark FCOS postprocess share of end-to-end CPU latency: decode-all vs per-level top-k pre-filter
+# 模型前向使用真实的推理模型(随机初始化)；后处理输入为相同形状的模拟输出(训练后的得分分布)，
+# 随机初始化的head得分都低于阈值，不能反映后处理的真实开销
+import os
+import sys
+import time
+import numpy as np
+import paddle
+
+# 设置当前KFPDetection包路径:
+# 保证architectures/postprocesses/nmses正常调用
+sys.path.append( os.getcwd() )
+
+from architectures import build_fcos
+from postprocesses import FCOSPostProcess
+from nmses import multiclass_nms
+from transforms import fcos_locations
+
+
+def make_trained_outputs(outputs, num_objects=20, seed=0):
+    """模拟训练后的head输出: 目标附近的位置点在目标类别上得分较高，其余得分很低"""
+    rng = np.random.RandomState(seed)
+    batch_size, num_points, num_classes = outputs['scores'].shape
+    scores = (rng.uniform(0, 1, (batch_size, num_points, num_classes)) ** 16).astype(np.float32) * 0.2
+    for i in range(batch_size):
+        points = rng.randint(0, num_points, (num_objects, 200)) # 每个目标约200个位置点
+        classes = rng.randint(0, num_classes, num_objects)
+        scores[i, points, classes[:, None]] = rng.uniform(0.05, 0.9, points.shape)
+    ltrb = rng.uniform(4, 200, (batch_size, num_points, 4)).astype(np.float32)
+    return {'scores': scores, 'ltrb': ltrb, 'feature_sizes': outputs['feature_sizes']}
+
+
+def decode_all_postprocess(outputs, im_shape, fpn_strides=[8, 16, 32, 64, 128]):
+    """对照: 解码所有位置点后，每张图像在完整的[P, C]得分上做NMS"""
+    locations = fcos_locations(outputs['feature_sizes'], fpn_strides,
+                               np.zeros((len(fpn_strides), 2), dtype=np.float32))[0]
+    xy = np.tile(locations, (1, 2))[None]
+    boxes = xy + outputs['ltrb'] * np.asarray([-1., -1., 1., 1.], dtype=np.float32)
+    hw = np.tile(im_shape[:, ::-1], (1, 2))[:, None, :]
+    boxes = np.clip(boxes, 0., hw).astype(np.float32)
+    return [multiclass_nms(boxes[i], outputs['scores'][i]) for i in range(boxes.shape[0])]
+
+
+def main(repeats=10):
+    paddle.seed(0)
+    model = build_fcos({'num_classes': 80, 'backbone': 'mobilenetv3_large',
+                        'neck': {'out_channel': 128},
+                        'head': {'feat_channel': 128, 'norm_type': 'bn'},
+                        'loss': None}).deploy()
+    postprocess = FCOSPostProcess()
+    for im_h, im_w in [(512, 512), (800, 1344)]:
+        image = paddle.randn([1, 3, im_h, im_w])
+        im_shape = np.asarray([[im_h, im_w]], dtype=np.float32)
+        with paddle.no_grad():
+            outputs = model(image) # 预热
+        fake = make_trained_outputs({'scores': outputs['scores'].numpy(),
+                                     'feature_sizes': outputs['feature_sizes']})
+        times = {'model': [], 'decode-all': [], 'top-k': []}
+        for _ in range(repeats): # 交替执行
+            start = time.perf_counter()
+            with paddle.no_grad():
+                outputs = model(image)
+            outputs['scores'].numpy()
+            times['model'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            ref = decode_all_postprocess(fake, im_shape)
+            times['decode-all'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            out = postprocess(fake, im_shape=im_shape)
+            times['top-k'].append(time.perf_counter() - start)
+        assert out[0].shape == ref[0].shape
+        model_ms = np.median(times['model']) * 1000.
+        print('{0}x{1}: {2} points, {3} candidates above threshold, model {4:.1f} ms'.format(
+            im_h, im_w, fake['scores'].shape[1], int((fake['scores'] > 0.05).sum()), model_ms))
+        for name in ['decode-all', 'top-k']:
+            post_ms = np.median(times[name]) * 1000.
+            print('  {0:<11s} postprocess {1:>7.1f} ms, share of end-to-end {2:>5.1f}%'.format(
+                name, post_ms, 100. * post_ms / (post_ms + model_ms)))
+
+
+if __name__ == "__main__":
+    main()
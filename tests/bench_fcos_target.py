@@ -0,0 +1,51 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark vectorized FCOS target assignment
+import os
+import sys
+import copy
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import FCOSTarget
+from test_fcos_target import make_sample, loop_fcos_target
+
+
+def bench(func, sample, num_iters):
+    start = time.perf_counter()
+    for _ in range(num_iters):
+        func(copy.deepcopy(sample))
+    return (time.perf_counter() - start) / num_iters * 1e3
+
+
+if __name__ == "__main__":
+    op = FCOSTarget()
+    # 1.与逐点逐框循环对比
+    for num_bbox in [20, 100]:
+        sample = make_sample(num_bbox=num_bbox, im_size=(512, 512))
+        vec_ms = bench(op, sample, 10)
+        loop_ms = bench(lambda s: loop_fcos_target(op, s), sample, 1)
+        print("512x512   boxes={0:<4d}: vectorized {1:8.2f} ms | loop {2:9.1f} ms | speedup x{3:.0f}".format(
+            num_bbox, vec_ms, loop_ms, loop_ms / vec_ms))
+    # 2.大尺寸、密集目标下分块大小对耗时的影响(分块较小时中间张量可以留在缓存中)
+    for num_bbox in [100, 300]:
+        sample = make_sample(num_bbox=num_bbox, im_size=(800, 1344))
+        for chunk_bytes in [1 << 18, 1 << 20, 1 << 24]:
+            chunk_op = FCOSTarget(chunk_bytes=chunk_bytes)
+            print("800x1344  boxes={0:<4d}: chunk {1:>5d} KB {2:8.2f} ms".format(
+                num_bbox, chunk_bytes >> 10, bench(chunk_op, sample, 3)))
@@ -0,0 +1,88 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark FPN activation memory (CPU training step, 1333x800)
+# 模型: ResNet18 + FPN(256) + 窄FCOS head；内存为paddle的host内存统计(已分配的张量字节数)
+import os
+import sys
+import time
+import paddle
+from paddle.base import core
+
+# 设置当前KFPDetection包路径:
+# 保证backbones/necks/heads正常调用
+sys.path.append( os.getcwd() )
+
+from backbones import ResNet
+from necks import FPN
+from heads import FCOSHead
+
+CONFIGS = [('baseline', False, False),
+           ('fused upsample+add', True, False),
+           ('recompute', False, True),
+           ('fused + recompute', True, True)]
+
+
+def allocated_mb():
+    return core.host_memory_stat_current_value("Allocated", 0) / 2. ** 20
+
+
+def peak_mb():
+    return core.host_memory_stat_peak_value("Allocated", 0) / 2. ** 20
+
+
+def train_step(backbone, fpn, head, image):
+    core.host_memory_stat_reset_peak_value("Allocated", 0)
+    base = allocated_mb()
+    start = time.perf_counter()
+    feats = backbone(image)
+    # FPN前向的临时峰值(相对FPN输入)
+    core.host_memory_stat_reset_peak_value("Allocated", 0)
+    fpn_base = allocated_mb()
+    outs = fpn(feats)
+    fpn_peak = peak_mb() - fpn_base
+    del feats
+    outputs = head(outs)
+    del outs
+    # 反向开始前保留的激活(backbone + FPN + head)
+    retained = allocated_mb() - base
+    loss = sum([(out * out).mean() for outs in outputs.values() for out in outs])
+    loss.backward()
+    step_time = time.perf_counter() - start
+    for layer in [backbone, fpn, head]:
+        layer.clear_gradients()
+    return fpn_peak, retained, max(peak_mb() - base, retained), step_time
+
+
+if __name__ == "__main__":
+    paddle.set_device('cpu')
+    paddle.seed(0)
+    batch_size = 1
+    backbone = ResNet(depth=18)
+    head = FCOSHead(num_classes=80, in_channel=256, feat_channel=64, num_convs=2, norm_type='bn')
+    fpns = [FPN(backbone.out_channels, backbone.out_strides, out_channel=256,
+                fuse_upsample_add=fuse_upsample_add, recompute=recompute)
+            for _, fuse_upsample_add, recompute in CONFIGS]
+    image = paddle.randn([batch_size, 3, 800, 1333])
+    for layer in [backbone, head] + fpns:
+        layer.train()
+    results = {name: [] for name, _, _ in CONFIGS}
+    for _ in range(2): # 交替运行
+        for (name, _, _), fpn in zip(CONFIGS, fpns):
+            results[name].append(train_step(backbone, fpn, head, image))
+    for name, _, _ in CONFIGS:
+        fpn_peak, retained, peak, _ = results[name][-1]
+        step_time = min([r[-1] for r in results[name]])
+        print("1333x800 {0:<20s}: FPN forward peak {1:6.1f} MB | retained {2:6.1f} MB | "
+              "step peak {3:6.1f} MB/image | step {4:6.2f} s".format(
+                  name, fpn_peak / batch_size, retained / batch_size, peak / batch_size, step_time))
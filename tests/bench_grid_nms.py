@@ -0,0 +1,53 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark grid nms vs exact hard nms on large tiled-inference candidate sets
+import os
+import sys
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证nmses正常调用
+sys.path.append( os.getcwd() )
+
+from nmses import batched_nms, batched_grid_nms
+from test_nms import make_tiled_detections
+
+
+def main():
+    print('{0:>9s} {1:>9s} {2:>12s} {3:>12s} {4:>8s}'.format('boxes', 'kept', 'exact ms', 'grid ms', 'speedup'))
+    crossover = None
+    for num_boxes in [1000, 3000, 10000, 30000, 100000, 300000, 1000000]:
+        # 10k x 10k的大图切片推理，15类
+        boxes, scores, labels = make_tiled_detections(num_boxes, num_classes=15, im_size=10000)
+        repeats = 5 if num_boxes <= 30000 else 1
+        times = {'exact': [], 'grid': []}
+        for _ in range(repeats): # 交替执行
+            start = time.perf_counter()
+            ref = batched_nms(boxes, scores, labels, 0.5)
+            times['exact'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            keep = batched_grid_nms(boxes, scores, labels, 0.5)
+            times['grid'].append(time.perf_counter() - start)
+            assert np.array_equal(keep, ref)
+        exact, grid = np.median(times['exact']) * 1000., np.median(times['grid']) * 1000.
+        if crossover is None and grid < exact:
+            crossover = num_boxes
+        print('{0:>9d} {1:>9d} {2:>12.1f} {3:>12.1f} {4:>7.1f}x'.format(
+            num_boxes, keep.shape[0], exact, grid, exact / grid))
+    print('grid nms is faster from {0} boxes'.format(crossover))
+
+
+if __name__ == "__main__":
+    main()
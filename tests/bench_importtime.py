@@ -0,0 +1,60 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark package import time (python -X importtime)
+import os
+import sys
+import subprocess
+import numpy as np
+
+# 设置当前KFPDetection包路径
+sys.path.append( os.getcwd() )
+
+STATEMENTS = [
+    'import datasets',
+    'import datasets; datasets.AspectRatioBatchSampler; datasets.LineIndexedFile',
+    'import vdlrecords',
+    'import visualizes',
+    'import visualizes; visualizes.colormap',
+    'import datasets; datasets.VOCDataset', # 需要paddle的路径(对照)
+]
+
+
+def importtime(code):
+    """返回(语句耗时ms, -X importtime记录的模块数)
+       (importlib.import_module触发的导入不出现在-X importtime的输出中，因此耗时在进程内计时)"""
+    script = ('import sys, time; sys.path.insert(0, {0!r}); t = time.perf_counter(); '.format(os.getcwd()) +
+              code + '; print((time.perf_counter() - t) * 1000.)')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                            cwd=os.getcwd(), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr[-2000:]
+    num_modules = sum([1 for line in result.stderr.splitlines()
+                       if line.startswith('import time:') and 'cumulative' not in line])
+    return float(result.stdout.split()[-1]), num_modules
+
+
+def main(repeats=5):
+    times = {code: [] for code in STATEMENTS}
+    modules = {}
+    for _ in range(repeats): # 交替执行，减少系统负载波动的影响
+        for code in STATEMENTS:
+            elapsed, num_modules = importtime(code)
+            times[code].append(elapsed)
+            modules[code] = num_modules
+    print('{0:<80s} {1:>10s} {2:>8s}'.format('statement', 'ms(med)', 'modules'))
+    for code in STATEMENTS:
+        print('{0:<80s} {1:>10.1f} {2:>8d}'.format(code, np.median(times[code]), modules[code]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark multi-class hard nms: single pass over all classes vs per-class loop
+import os
+import sys
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证nmses正常调用
+sys.path.append( os.getcwd() )
+
+from nmses import nms, multiclass_nms, format_detections
+from test_nms import make_detections
+
+
+def per_class_multiclass_nms(boxes, scores, score_threshold=0.05, nms_top_k=1000,
+                             keep_top_k=100, iou_threshold=0.6):
+    """对照: 逐类别循环，每个类别单独做NMS后合并"""
+    outs = []
+    for c in range(scores.shape[1]):
+        idx = np.nonzero(scores[:, c] > score_threshold)[0]
+        if idx.shape[0] == 0:
+            continue
+        idx = idx[np.argsort(-scores[idx, c], kind='stable')]
+        if nms_top_k > 0:
+            idx = idx[:nms_top_k]
+        keep = idx[nms(boxes[idx], scores[idx, c], iou_threshold)]
+        outs.append(format_detections(boxes[keep], scores[keep, c], np.full(keep.shape[0], c)))
+    out = np.concatenate(outs, axis=0)
+    out = out[np.argsort(-out[:, 1], kind='stable')]
+    return out[:keep_top_k] if keep_top_k > 0 else out
+
+
+def sort_rows(dets):
+    # 得分相同时两种实现的排列顺序可能不同，按行排序后比较
+    return dets[np.lexsort(dets.T[::-1])]
+
+
+def timeit(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000., out
+
+
+def main():
+    print('{0:>8s} {1:>8s} {2:>10s} {3:>12s} {4:>12s} {5:>8s}'.format(
+        'boxes', 'keep', 'kept', 'per-class ms', 'single ms', 'speedup'))
+    for num_boxes in [1000, 10000, 100000]:
+        boxes, scores = make_detections(num_boxes, num_classes=80, num_objects=max(20, num_boxes // 500))
+        repeats = 20 if num_boxes <= 10000 else 3
+        for keep_top_k in [100, -1]:
+            kwargs = dict(nms_top_k=-1, keep_top_k=keep_top_k)
+            times = {'per-class': [], 'single': []}
+            for _ in range(repeats): # 交替执行
+                t, ref = timeit(lambda: per_class_multiclass_nms(boxes, scores, **kwargs), 1)
+                times['per-class'].append(t)
+                t, out = timeit(lambda: multiclass_nms(boxes, scores, **kwargs), 1)
+                times['single'].append(t)
+            assert np.array_equal(sort_rows(out), sort_rows(ref))
+            base, fast = np.median(times['per-class']), np.median(times['single'])
+            print('{0:>8d} {1:>8d} {2:>10d} {3:>12.2f} {4:>12.2f} {5:>7.1f}x'.format(
+                num_boxes, keep_top_k, out.shape[0], base, fast, base / fast))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark matrix nms and soft nms on dense outputs: all classes at once vs per-class loop
+import os
+import sys
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证nmses正常调用
+sys.path.append( os.getcwd() )
+
+from nmses import build_nms
+from test_nms import make_detections
+
+
+def per_class(fn, boxes, scores):
+    """对照: 逐类别调用同一NMS后合并(每次只有一个类别)"""
+    outs = []
+    for c in range(scores.shape[1]):
+        if not (scores[:, c] > 0.05).any():
+            continue
+        out = fn(boxes, scores[:, c:c + 1])
+        out[:, 0] = c
+        outs.append(out)
+    out = np.concatenate(outs, axis=0)
+    return out[np.argsort(-out[:, 1], kind='stable')][:100]
+
+
+def main(repeats=5):
+    # 稠密输出: 800x1344输入的FCOS约2万个位置点，80类
+    boxes, scores = make_detections(20000, num_classes=80, num_objects=40)
+    configs = [('hard', {'name': 'hard'}),
+               ('matrix linear', {'name': 'matrix'}),
+               ('matrix gaussian', {'name': 'matrix', 'use_gaussian': True}),
+               ('soft gaussian', {'name': 'soft'}),
+               ('soft linear', {'name': 'soft', 'method': 'linear'})]
+    for nms_top_k in [100, 1000]:
+        times = {name: {'all': [], 'per-class': []} for name, _ in configs}
+        for _ in range(repeats): # 交替执行
+            for name, config in configs:
+                fn = build_nms(dict(config, nms_top_k=nms_top_k))
+                start = time.perf_counter()
+                out = fn(boxes, scores)
+                times[name]['all'].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                ref = per_class(fn, boxes, scores)
+                times[name]['per-class'].append(time.perf_counter() - start)
+                assert np.allclose(np.sort(out[:, 1]), np.sort(ref[:, 1]), rtol=1e-4)
+        print('nms_top_k={0}, candidates={1}'.format(nms_top_k, int((scores > 0.05).sum())))
+        print('  {0:<16s} {1:>14s} {2:>14s} {3:>8s}'.format('method', 'per-class ms', 'all-class ms', 'speedup'))
+        for name, _ in configs:
+            base = np.median(times[name]['per-class']) * 1000.
+            fast = np.median(times[name]['all']) * 1000.
+            print('  {0:<16s} {1:>14.1f} {2:>14.1f} {3:>7.1f}x'.format(name, base, fast, base / fast))
+
+
+if __name__ == "__main__":
+    main()
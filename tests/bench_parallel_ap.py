@@ -0,0 +1,78 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark per-class ap on a large vocabulary: class-by-class vs class blocks vs process pool (core scaling)
+import os
+import sys
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证metrics正常调用
+sys.path.append( os.getcwd() )
+
+from metrics import COCOEvaluator, VOCEvaluator
+
+
+def fill_records(evaluator, num_dets, seed=0):
+    """直接填充评估记录(LVIS规模: 长尾的类别分布)，只测量accumulate"""
+    rng = np.random.RandomState(seed)
+    num_classes = evaluator.num_classes
+    freq = 1. / np.arange(1, num_classes + 1) ** 0.8
+    labels = rng.choice(num_classes, num_dets, p=freq / freq.sum()).astype(np.int32)
+    scores = rng.uniform(0.01, 1., num_dets).astype(np.float32)
+    counts = np.bincount(labels, minlength=num_classes)
+    if isinstance(evaluator, COCOEvaluator):
+        tp = rng.uniform(size=(num_dets, evaluator.num_settings)) < 0.3
+        evaluator.records.append(score=scores, label=labels,
+                                 tp=np.packbits(tp, axis=1), fp=np.packbits(~tp, axis=1))
+        evaluator.num_gts[:] = np.maximum(counts // 2, 1)[:, None]
+    else:
+        evaluator.records.append(score=scores, label=labels, tp=rng.uniform(size=num_dets) < 0.3)
+        evaluator.num_gts[:] = np.maximum(counts // 2, 1)
+    return evaluator
+
+
+def result(evaluator):
+    return evaluator.precision if isinstance(evaluator, COCOEvaluator) else evaluator.ap_11point
+
+
+def main(repeats=3):
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    workers = sorted(set([2, 4] + [w for w in [8, 16, 32] if w <= cpus]))
+    print('available cpu cores: {0}'.format(cpus))
+    for name, evaluator, num_dets in [('COCO', COCOEvaluator(1203), 2000000),
+                                      ('VOC', VOCEvaluator(1203), 5000000)]:
+        fill_records(evaluator, num_dets)
+        configs = [('class by class', {'chunk_size': 1, 'num_workers': 0}),
+                   ('class blocks', {'chunk_size': evaluator.chunk_size, 'num_workers': 0})] + \
+                  [('{0} workers'.format(w), {'chunk_size': evaluator.chunk_size, 'num_workers': w})
+                   for w in workers]
+        times, reference = {label: [] for label, _ in configs}, None
+        for _ in range(repeats): # 交替执行
+            for label, config in configs:
+                evaluator.chunk_size, evaluator.num_workers = config['chunk_size'], config['num_workers']
+                start = time.perf_counter()
+                evaluator.accumulate()
+                times[label].append(time.perf_counter() - start)
+                if reference is None:
+                    reference = result(evaluator)
+                assert np.array_equal(result(evaluator), reference)
+        base = min(times['class blocks'])
+        print('{0}: 1203 classes, {1} detections'.format(name, num_dets))
+        for label, _ in configs:
+            print('  {0:>15}: {1:7.2f} s  x{2:.2f}'.format(label, min(times[label]), base / min(times[label])))
+
+
+if __name__ == "__main__":
+    main()
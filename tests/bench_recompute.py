@@ -0,0 +1,79 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark per-stage recompute: peak training memory vs step time (CPU, 1333x800)
+# 模型: ResNet18 + FPN(256) + 窄FCOS head；内存为paddle的host内存统计(已分配的张量字节数)
+import os
+import sys
+import time
+import paddle
+from paddle.base import core
+
+# 设置当前KFPDetection包路径:
+# 保证architectures正常调用
+sys.path.append( os.getcwd() )
+
+from architectures import build_fcos
+
+# 配置名称, 是否重计算stem, 重计算的阶段, FPN是否重计算
+SETTINGS = [('none', False, [], False),
+            ('stem', True, [], False),
+            ('stem+stage0', True, [0], False),
+            ('stem+stage0-1', True, [0, 1], False),
+            ('stem+all stages', True, [0, 1, 2, 3], False),
+            ('all stages+FPN', True, [0, 1, 2, 3], True)]
+
+
+def build(recompute_stem, recompute_stages, recompute_fpn):
+    paddle.seed(0)
+    model = build_fcos({'num_classes': 80,
+                        'backbone': {'name': 'resnet18',
+                                     'recompute_stem': recompute_stem,
+                                     'recompute_stages': recompute_stages},
+                        'neck': {'out_channel': 256, 'recompute': recompute_fpn},
+                        'head': {'feat_channel': 64, 'num_convs': 2, 'norm_type': 'bn'},
+                        'loss': None})
+    model.train()
+    return model
+
+
+def train_step(model, image):
+    core.host_memory_stat_reset_peak_value("Allocated", 0)
+    base = core.host_memory_stat_current_value("Allocated", 0)
+    start = time.perf_counter()
+    outputs = model(image)
+    loss = sum([(out * out).mean() for outs in outputs.values() for out in outs])
+    loss.backward()
+    step_time = time.perf_counter() - start
+    model.clear_gradients()
+    peak = (core.host_memory_stat_peak_value("Allocated", 0) - base) / 2. ** 20
+    return peak, step_time
+
+
+if __name__ == "__main__":
+    paddle.set_device('cpu')
+    batch_size = 1
+    image = paddle.randn([batch_size, 3, 800, 1333])
+    models = [(name, build(*setting)) for name, *setting in SETTINGS]
+    results = {name: [] for name, _ in models}
+    for _ in range(2): # 交替运行
+        for name, model in models:
+            results[name].append(train_step(model, image))
+    base_peak, base_time = results['none'][-1][0], min([r[1] for r in results['none']])
+    for name, _ in models:
+        peak = results[name][-1][0] / batch_size
+        step_time = min([r[1] for r in results[name]])
+        print("1333x800 recompute {0:<16s}: peak {1:6.1f} MB/image ({2:+5.1f}%) | "
+              "step {3:5.2f} s/image ({4:+5.1f}%) | batch 16: {5:5.2f} GB".format(
+                  name, peak, (peak / base_peak - 1.) * 100., step_time / batch_size,
+                  (step_time / base_time - 1.) * 100., peak * 16 / 1024.))
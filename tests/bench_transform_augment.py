@@ -0,0 +1,89 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark geometric augment ops on dense samples
+import os
+import sys
+import copy
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import RandomFlip, RandomResize, RandomExpand, RandomCrop
+from test_transform_augment import make_dense_sample
+
+
+def loop_random_crop(sample, op):
+    """逐个候选、逐个边界框计算的随机裁剪(对照实现)"""
+    gt_bbox = sample['gt_bbox']
+    im_h, im_w = sample['image'].shape[:2]
+    thresholds = list(op.thresholds)
+    np.random.shuffle(thresholds)
+    for thresh in thresholds:
+        for _ in range(op.num_attempts):
+            crop = op._sample_crops(1, im_h, im_w)[0]
+            ious, inside = [], []
+            for box in gt_bbox:
+                iw = max(0., min(crop[2], box[2]) - max(crop[0], box[0]))
+                ih = max(0., min(crop[3], box[3]) - max(crop[1], box[1]))
+                inter = iw * ih
+                union = (crop[2] - crop[0]) * (crop[3] - crop[1]) + \
+                        (box[2] - box[0]) * (box[3] - box[1]) - inter
+                ious.append(inter / union)
+                cx, cy = (box[0] + box[2]) / 2., (box[1] + box[3]) / 2.
+                inside.append(crop[0] <= cx < crop[2] and crop[1] <= cy < crop[3])
+            if max(ious) < thresh or not any(inside):
+                continue
+            keep = [i for i in range(len(gt_bbox)) if inside[i]]
+            for key in ['gt_bbox', 'gt_class', 'difficult']:
+                sample[key] = np.stack([sample[key][i] for i in keep])
+            x1, y1, x2, y2 = [int(v) for v in crop]
+            boxes = []
+            for box in sample['gt_bbox']:
+                boxes.append([min(max(box[0] - x1, 0), x2 - x1), min(max(box[1] - y1, 0), y2 - y1),
+                              min(max(box[2] - x1, 0), x2 - x1), min(max(box[3] - y1, 0), y2 - y1)])
+            sample['gt_bbox'] = np.asarray(boxes, dtype=np.float32)
+            sample['image'] = sample['image'][y1:y2, x1:x2]
+            return sample
+    return sample
+
+
+def bench(func, samples):
+    start = time.perf_counter()
+    for sample in samples:
+        func(sample)
+    return len(samples) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    # 使用较高的IoU约束，使候选评估成为主要开销
+    crop = RandomCrop(thresholds=[.5, .7, .9], allow_no_crop=False)
+    ops = {
+        'RandomFlip': RandomFlip(prob=1.),
+        'RandomExpand': RandomExpand(prob=1.),
+        'RandomResize': RandomResize([[480, 800], [608, 1000], [800, 1333]]),
+        'RandomCrop': crop,
+    }
+    for num_bbox in [100, 300]:
+        base = [make_dense_sample(num_bbox=num_bbox, seed=i) for i in range(20)]
+        for name, op in ops.items():
+            speed = bench(op, copy.deepcopy(base))
+            print("boxes={0} {1:<14s}: {2:8.1f} samples/s".format(num_bbox, name, speed))
+        loop_speed = bench(lambda s: loop_random_crop(s, crop), copy.deepcopy(base))
+        vec_speed = bench(crop, copy.deepcopy(base))
+        print("boxes={0} RandomCrop vectorized {1:.1f} samples/s | per-box loop {2:.1f} samples/s"
+              " | speedup x{3:.1f}".format(num_bbox, vec_speed, loop_speed, vec_speed / loop_speed))
@@ -0,0 +1,69 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark per-sample apply vs batched apply_batch
+import os
+import sys
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import stack_samples
+from transforms import NormalizeImage, Permute, ClipBox
+
+
+def make_samples(batch_size, im_size, num_bbox=50):
+    rng = np.random.default_rng(0)
+    return [{
+        'im_id': idx,
+        'image': rng.integers(0, 256, im_size + (3,), dtype=np.uint8),
+        'gt_bbox': rng.uniform(-10, max(im_size) + 10, (num_bbox, 4)).astype(np.float32),
+        'gt_class': rng.integers(0, 80, (num_bbox, 1)).astype(np.int32)
+    } for idx in range(batch_size)]
+
+
+def run_per_sample(ops, samples):
+    for op in ops:
+        samples = op(samples)
+    return stack_samples(samples) # 最终同样需要组批
+
+
+def run_batched(ops, samples):
+    batch = stack_samples(samples)
+    for op in ops:
+        batch = op.apply_batch(batch)
+    return batch
+
+
+if __name__ == "__main__":
+    ops = [ClipBox(), NormalizeImage(), Permute()]
+    repeat = 20
+    for batch_size, im_size in [(32, (64, 64)), (16, (320, 320)), (8, (640, 640))]:
+        costs = {'per-sample': 0., 'batched': 0.}
+        funcs = {'per-sample': run_per_sample, 'batched': run_batched}
+        for _ in range(repeat):
+            # 两种方式交替运行，降低机器抖动对结果的影响
+            for name, func in funcs.items():
+                samples = make_samples(batch_size, im_size)
+                start = time.perf_counter()
+                func(ops, samples)
+                costs[name] += time.perf_counter() - start
+        print("batch={0:<3d} size={1}: per-sample {2:8.1f} samples/s | "
+              "batched {3:8.1f} samples/s | speedup x{4:.2f}".format(
+                  batch_size, im_size,
+                  batch_size * repeat / costs['per-sample'],
+                  batch_size * repeat / costs['batched'],
+                  costs['per-sample'] / costs['batched']))
@@ -0,0 +1,72 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark prefix cache of transform compose across epochs
+import os
+import sys
+import time
+import tempfile
+import cv2
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Compose, CacheBoundary
+from transforms import DecodeImage, Resize, RandomFlip, NormalizeImage, Permute
+
+
+def make_records(dir_path, num_files, im_size=(720, 1280)):
+    rng = np.random.default_rng(0)
+    records = []
+    for idx in range(num_files):
+        im_file = os.path.join(dir_path, '{0}.jpg'.format(idx))
+        image = cv2.GaussianBlur(rng.integers(0, 256, im_size + (3,), dtype=np.uint8), (9, 9), 3)
+        cv2.imwrite(im_file, image)
+        records.append({'im_id': idx, 'im_file': im_file,
+                        'gt_bbox': np.array([[10, 10, 200, 300]], dtype=np.float32)})
+    return records
+
+
+def build(boundary):
+    prefix = [DecodeImage(), Resize([608, 608], keep_ratio=False)]
+    suffix = [RandomFlip(), NormalizeImage(), Permute()]
+    return Compose(prefix + ([boundary] if boundary is not None else []) + suffix)
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    num_epochs = 3
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        records = make_records(tmp_dir, 32)
+        composes = {
+            'no cache': build(None),
+            'memory': build(CacheBoundary(max_bytes=1 << 30)),
+            'disk': build(CacheBoundary(max_bytes=1 << 30,
+                                        cache_dir=os.path.join(tmp_dir, 'cache'))),
+        }
+        for name, compose in composes.items():
+            times = []
+            for epoch in range(num_epochs):
+                start = time.perf_counter()
+                for record in records:
+                    compose(dict(record))
+                times.append(time.perf_counter() - start)
+            line = "{0:<9s}: ".format(name) + " | ".join(
+                ["epoch{0} {1:6.1f} samples/s".format(idx, len(records) / t)
+                 for idx, t in enumerate(times)])
+            if compose.cache is not None:
+                stats = compose.cache.stats()
+                line += " | hit_rate {0:.2f}, {1:.1f} MB".format(stats['hit_rate'], stats['nbytes'] / 2**20)
+            print(line)
@@ -0,0 +1,60 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark fused vs unfused transform compose
+import os
+import sys
+import time
+import tempfile
+import cv2
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Compose, DecodeImage, Resize, NormalizeImage, Permute
+
+
+def bench(compose, files, repeat=3):
+    cost = 0.
+    for _ in range(repeat):
+        for im_file in files:
+            sample = {'im_file': im_file}
+            start = time.perf_counter()
+            compose(sample)
+            cost += time.perf_counter() - start
+    return len(files) * repeat / cost
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = []
+        for idx in range(8):
+            image = cv2.GaussianBlur(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), (7, 7), 0)
+            files.append(os.path.join(tmp_dir, '{0}.jpg'.format(idx)))
+            cv2.imwrite(files[-1], image)
+
+        chains = {
+            'decode+resize+normalize+permute': [
+                DecodeImage(), Resize([800, 1333]), NormalizeImage(), Permute()],
+            'decode+resize+resize+normalize+permute': [
+                DecodeImage(), Resize([1024, 1024]), Resize([800, 1333]),
+                NormalizeImage(), Permute()],
+        }
+        for name, transforms in chains.items():
+            unfused = bench(Compose(transforms, fuse=False), files)
+            fused = bench(Compose(transforms, fuse=True), files)
+            print("{0}: unfused {1:.1f} images/s | fused {2:.1f} images/s | speedup x{3:.2f}".format(
+                name, unfused, fused, fused / unfused))
@@ -0,0 +1,98 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark mosaic with ring buffer vs. decoding partner images
+import os
+import sys
+import time
+import tempfile
+import cv2
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import DecodeImage, Mosaic
+
+
+def make_files(dir_path, num_files, im_size=(480, 640)):
+    rng = np.random.default_rng(0)
+    samples = []
+    for idx in range(num_files):
+        im_file = os.path.join(dir_path, '{0}.jpg'.format(idx))
+        image = cv2.GaussianBlur(rng.integers(0, 256, im_size + (3,), dtype=np.uint8), (9, 9), 3)
+        cv2.imwrite(im_file, image)
+        xy = rng.uniform(0, [im_size[1] - 40, im_size[0] - 40], (30, 2))
+        gt_bbox = np.concatenate([xy, xy + rng.uniform(8, 40, (30, 2))], axis=1)
+        samples.append({'im_file': im_file,
+                        'gt_bbox': gt_bbox.astype(np.float32),
+                        'gt_class': np.zeros((30, 1), dtype=np.int32)})
+    return samples
+
+
+def naive_mosaic(sample, records, decode, target_size=640):
+    """额外读取并解码3张图像、每次申请新画布的Mosaic(对照实现)"""
+    entries = [decode(sample)]
+    for idx in np.random.randint(0, len(records), size=3):
+        entries.append(decode(dict(records[idx])))
+    canvas = np.full((target_size, target_size, 3), 114, dtype=np.uint8)
+    xc, yc = [int(np.random.uniform(0.25, 0.75) * target_size) for _ in range(2)]
+    boxes = []
+    for position, entry in enumerate(entries):
+        im_h, im_w = entry['image'].shape[:2]
+        scale = min(target_size / 2. / im_h, target_size / 2. / im_w)
+        new_h, new_w = int(round(im_h * scale)), int(round(im_w * scale))
+        x1 = xc - new_w if position in (0, 2) else xc
+        y1 = yc - new_h if position in (0, 1) else yc
+        resized = cv2.resize(entry['image'], (new_w, new_h))
+        cx1, cy1 = max(x1, 0), max(y1, 0)
+        cx2, cy2 = min(x1 + new_w, target_size), min(y1 + new_h, target_size)
+        canvas[cy1:cy2, cx1:cx2] = resized[cy1 - y1:cy2 - y1, cx1 - x1:cx2 - x1]
+        for box in entry['gt_bbox']:
+            box = np.clip(box * scale + [x1, y1, x1, y1], 0, target_size)
+            if box[2] - box[0] > 1 and box[3] - box[1] > 1:
+                boxes.append(box)
+    sample['image'] = canvas
+    sample['gt_bbox'] = np.asarray(boxes, dtype=np.float32)
+    return sample
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    num_outputs = 200
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        records = make_files(tmp_dir, 32)
+        # DecodeImage.num_decodes记录实际解码的图像数
+        naive_decode, pooled_decode = DecodeImage(), DecodeImage()
+        mosaic = Mosaic(target_size=640)
+
+        results = {'naive': 0., 'pooled': 0.}
+        for idx in range(num_outputs):
+            # 交替运行两种实现，减小机器负载波动的影响
+            record = records[idx % len(records)]
+            start = time.perf_counter()
+            naive_mosaic(dict(record), records, naive_decode)
+            results['naive'] += time.perf_counter() - start
+            start = time.perf_counter()
+            mosaic(pooled_decode(dict(record)))
+            results['pooled'] += time.perf_counter() - start
+
+        stats = mosaic.stats()
+        print("naive  : {0:.2f} decodes/output, {1:7.1f} samples/s".format(
+            naive_decode.num_decodes / num_outputs, num_outputs / results['naive']))
+        print("pooled : {0:.2f} decodes/output, {1:7.1f} samples/s "
+              "({2:.1f} images/output, canvas allocs {3}, reuses {4})".format(
+            pooled_decode.num_decodes / num_outputs, num_outputs / results['pooled'],
+            stats['images_per_output'], stats['canvas_allocs'], stats['canvas_reuses']))
+        print("speedup: x{0:.2f}".format(results['naive'] / results['pooled']))
@@ -0,0 +1,59 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark lookup-table normalization vs. plain numpy expression
+import os
+import sys
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import NormalizeImage, LUTNormalizeImage
+
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def numpy_normalize(sample):
+    """直接的numpy表达式(对照实现): 转float、减均值、除标准差、转CHW"""
+    image = (sample['image'].astype(np.float32) / 255. - MEAN) / STD
+    sample['image'] = np.ascontiguousarray(image.transpose((2, 0, 1)))
+    return sample
+
+
+if __name__ == "__main__":
+    num_iters = 20
+    methods = {
+        'numpy expr (CHW)': numpy_normalize,
+        'NormalizeImage (HWC)': NormalizeImage(),
+        'LUT (HWC)': LUTNormalizeImage(),
+        'LUT (CHW)': LUTNormalizeImage(to_chw=True),
+        'LUT (CHW, inplace)': LUTNormalizeImage(to_chw=True, inplace=True),
+    }
+    for size in [640, 800, 1333]:
+        image = np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+        times = dict([(name, 0.) for name in methods])
+        for _ in range(num_iters):
+            # 交替运行各方法，减小机器负载波动的影响
+            for name, method in methods.items():
+                start = time.perf_counter()
+                out = method({'image': image})
+                times[name] += time.perf_counter() - start
+                del out
+        base = times['numpy expr (CHW)']
+        for name, elapsed in times.items():
+            print("{0:>4d}x{0:<4d} {1:<22s}: {2:7.2f} ms | x{3:.2f}".format(
+                size, name, elapsed / num_iters * 1e3, base / elapsed))
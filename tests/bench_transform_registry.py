@@ -0,0 +1,78 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark spawn worker start-up with config-serialized transforms
+import os
+import sys
+import time
+import pickle
+import multiprocessing
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Compose, DecodeImage, RandomResize, RandomFlip
+from transforms import NormalizeImage, Permute, FCOSTarget, dumps_transform, loads_transform
+
+
+def warm_pipeline():
+    """多尺度训练一段时间后的预处理: 归一化按宽度缓存了平铺系数(最多max_row_coeffs个宽度)"""
+    pipeline = Compose([DecodeImage(), RandomResize(list(range(320, 1345, 8))),
+                        RandomFlip(), NormalizeImage(), Permute(), FCOSTarget()], fuse=False)
+    normalize = pipeline.transforms[3]
+    for width in range(320, 1345, 8):
+        normalize._get_row_coeffs(width)
+    return pipeline
+
+
+_PIPELINE = None
+
+
+def _init_worker(payload):
+    # 按配置传递时在worker初始化函数中重建
+    global _PIPELINE
+    _PIPELINE = loads_transform(payload) if isinstance(payload, str) else pickle.loads(payload)
+
+
+def _probe(_):
+    time.sleep(0.05) # 保证每个worker都参与
+    return _PIPELINE is not None
+
+
+def startup_time(payload, num_workers):
+    ctx = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+    pool = ctx.Pool(num_workers, initializer=_init_worker, initargs=(payload, ))
+    assert all(pool.map(_probe, range(num_workers), chunksize=1))
+    elapsed = time.perf_counter() - start
+    pool.close()
+    pool.join()
+    return elapsed
+
+
+if __name__ == "__main__":
+    num_workers = 4
+    pipeline = warm_pipeline()
+    payloads = {
+        'state pickle': pickle.dumps(pipeline, protocol=pickle.HIGHEST_PROTOCOL),
+        'config': dumps_transform(pipeline),
+    }
+    times = dict([(name, []) for name in payloads])
+    for _ in range(3):
+        for name, payload in payloads.items():
+            times[name].append(startup_time(payload, num_workers))
+    for name, payload in payloads.items():
+        print("{0:<14s}: payload {1:9.1f} KB | {2} spawn workers ready in {3:6.3f} s (min of 3)".format(
+            name, len(payload) / 1024., num_workers, min(times[name])))
@@ -0,0 +1,79 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Benchmark voc evaluator: 5k images x 20 classes, vectorized matching vs VOC devkit loop
+import os
+import sys
+import time
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证metrics正常调用
+sys.path.append( os.getcwd() )
+
+from metrics import VOCEvaluator
+from test_voc_eval import reference_voc_eval
+
+
+def make_images(num_images, num_classes=20, num_dets=100, seed=0):
+    """VOC规模的合成数据: 每张图像1~6个真实框(约15%为difficult)，100个检测框"""
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in range(num_images):
+        num_gt = rng.randint(1, 7)
+        ctr = rng.uniform(0, 500, (num_gt, 2))
+        wh = rng.uniform(20, 300, (num_gt, 2))
+        gt_bbox = np.round(np.concatenate([ctr - wh / 2, ctr + wh / 2], axis=1)).astype(np.float32)
+        gt_class = rng.randint(0, num_classes, (num_gt, 1))
+        difficult = (rng.uniform(size=(num_gt, 1)) < 0.15).astype(np.int32)
+        src = rng.randint(0, num_gt, num_dets)
+        boxes = gt_bbox[src] + rng.normal(0, 0.15, (num_dets, 4)) * np.tile(wh[src], 2)
+        labels = np.where(rng.uniform(size=num_dets) < 0.7, gt_class[src, 0], rng.randint(0, num_classes, num_dets))
+        dets = np.concatenate([labels[:, None], rng.uniform(0.01, 1., (num_dets, 1)), boxes], axis=1)
+        images.append((dets.astype(np.float32), gt_bbox, gt_class, difficult))
+    return images
+
+
+def run(images, batch_size=8, **kwargs):
+    evaluator = VOCEvaluator(20, **kwargs)
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        evaluator.update([b[0] for b in batch], [b[1] for b in batch],
+                         [b[2] for b in batch], difficult=[b[3] for b in batch])
+    update = time.perf_counter() - start
+    start = time.perf_counter()
+    evaluator.accumulate()
+    return evaluator, update, time.perf_counter() - start
+
+
+def main(repeats=3):
+    images = make_images(5000)
+    print('5000 images, 20 classes, {0} detections'.format(sum([b[0].shape[0] for b in images])))
+    for batch_size in [1, 8, 32]:
+        times = []
+        for _ in range(repeats):
+            evaluator, update, accumulate = run(images, batch_size=batch_size)
+            times.append((update + accumulate, update, accumulate))
+        total, update, accumulate = min(times)
+        print('batch {0:>2}: total {1:.3f} s (update {2:.3f} s, accumulate {3:.3f} s)'.format(
+            batch_size, total, update, accumulate))
+    start = time.perf_counter()
+    reference = reference_voc_eval(images, 20, use_07_metric=True)
+    loop = time.perf_counter() - start
+    np.testing.assert_allclose(evaluator.ap_11point, reference, atol=1e-12)
+    print('VOC devkit loop {0:.2f} s, x{1:.0f} slower, 11-point APs identical'.format(loop, loop / total))
+
+
+if __name__ == "__main__":
+    main()
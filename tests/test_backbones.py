@@ -0,0 +1,126 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test backbone registry, lightweight backbones and latency table
+import os
+import sys
+import json
+import tempfile
+import numpy as np
+import paddle
+
+# 设置当前KFPDetection包路径:
+# 保证backbones/architectures正常调用
+sys.path.append( os.getcwd() )
+
+from backbones import BACKBONE_REGISTRY, build_backbone, list_backbones, BackboneLatencyTable
+from architectures import build_fcos
+from test_fcos_loss import make_batch
+
+
+def test_registered_backbones():
+    for name in ['resnet18', 'resnet18_narrow', 'mobilenetv3_large', 'mobilenetv3_small',
+                 'shufflenetv2_x0_5', 'shufflenetv2_x1_0']:
+        assert name in list_backbones()
+        backbone = build_backbone(name)
+        backbone.eval()
+        outs = backbone(paddle.randn([1, 3, 96, 128]))
+        assert backbone.out_strides == [8, 16, 32]
+        assert [out.shape[1] for out in outs] == backbone.out_channels
+        assert [tuple(out.shape[2:]) for out in outs] == [(12, 16), (6, 8), (3, 4)]
+    # 构建参数透传
+    narrow = build_backbone({'name': 'resnet18_narrow', 'base_channels': 16})
+    assert narrow.out_channels == [32, 64, 128]
+
+
+def test_backbone_recompute_matches():
+    image = paddle.randn([2, 3, 64, 96])
+    for name, num_stages in [('resnet18_narrow', 4), ('mobilenetv3_small', 5), ('shufflenetv2_x0_5', 3)]:
+        results = []
+        for recompute in [False, True]:
+            paddle.seed(0)
+            backbone = build_backbone({'name': name,
+                                       'recompute_stem': recompute,
+                                       'recompute_stages': list(range(num_stages)) if recompute else []})
+            backbone.train()
+            outs = backbone(image)
+            sum([(out * out).mean() for out in outs]).backward()
+            results.append(([out.numpy() for out in outs],
+                            [param.grad.numpy() for param in backbone.parameters() if param.grad is not None],
+                            [stat.numpy() for layer in backbone.sublayers() if isinstance(layer, paddle.nn.BatchNorm2D)
+                             for stat in [layer._mean, layer._variance]]))
+        (outs, grads, stats), (recompute_outs, recompute_grads, recompute_stats) = results
+        # BatchNorm的滑动统计量每步只更新一次，与不重计算一致
+        assert len(stats) == len(recompute_stats) > 0
+        for stat, expected in zip(recompute_stats, stats):
+            np.testing.assert_allclose(stat, expected, rtol=1e-5, atol=1e-6)
+        assert len(grads) == len(recompute_grads) == \
+            len([param for param in backbone.parameters() if not param.stop_gradient])
+        for out, expected in zip(recompute_outs, outs):
+            np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-5)
+        for grad, expected in zip(recompute_grads, grads):
+            np.testing.assert_allclose(grad, expected, rtol=1e-3, atol=1e-5)
+
+
+def test_build_fcos_from_config():
+    paddle.seed(0)
+    model = build_fcos({'num_classes': 20,
+                        'backbone': 'shufflenetv2_x0_5',
+                        'neck': {'out_channel': 32},
+                        'head': {'num_convs': 1, 'norm_type': 'bn'}})
+    model.train()
+    outputs, batch = make_batch(batch_size=2, im_size=(160, 224))
+    batch['image'] = paddle.randn([2, 3, 160, 224])
+    losses = model(batch)
+    assert np.isfinite(float(losses['loss']))
+    losses['loss'].backward()
+    model.deploy()
+    preds = model(batch['image'])
+    assert preds['scores'].shape[2] == 20
+
+
+def test_latency_table_select():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'latency.json')
+        table = BackboneLatencyTable(path)
+        table.measure(['shufflenetv2_x0_5', 'resnet18_narrow'], input_sizes=[(64, 64)], num_iters=1)
+        assert table.lookup('shufflenetv2_x0_5', (64, 64)) is not None
+        # 重新加载后直接使用缓存
+        table = BackboneLatencyTable(path)
+        assert table.lookup('resnet18_narrow', (64, 64)) is not None
+        with open(path) as f:
+            assert table.machine in json.load(f)
+
+        # 选择逻辑: 使用固定的耗时记录
+        table.records[table.machine] = {
+            'shufflenetv2_x0_5': {'64x64@1': {'latency_ms': 1., 'images_per_sec': 1000.}},
+            'mobilenetv3_large': {'64x64@1': {'latency_ms': 3., 'images_per_sec': 333.}},
+            'resnet18_narrow': {'64x64@1': {'latency_ms': 2., 'images_per_sec': 500.}},
+            'resnet50': {'64x64@1': {'latency_ms': 9., 'images_per_sec': 111.}}
+        }
+        assert [row['name'] for row in table.rows((64, 64))] == \
+            ['shufflenetv2_x0_5', 'resnet18_narrow', 'mobilenetv3_large', 'resnet50']
+        assert table.select((64, 64)) == 'shufflenetv2_x0_5'
+        # 参考精度未知的resnet18_narrow在有精度预算时跳过
+        assert table.select((64, 64), min_top1=70.) == 'mobilenetv3_large'
+        assert table.select((64, 64), min_top1=76.) == 'resnet50'
+        assert table.select((64, 64), min_top1=76., max_latency_ms=5.) is None
+        assert BACKBONE_REGISTRY['resnet18_narrow']['top1'] is None
+
+
+if __name__ == "__main__":
+    test_registered_backbones()
+    test_backbone_recompute_matches()
+    test_build_fcos_from_config()
+    test_latency_table_select()
+    print("Backbones passed.")
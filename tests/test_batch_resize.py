@@ -0,0 +1,93 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test batch-level resize, batch padding and aspect ratio bucketing
+import os
+import sys
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms、datasets正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import BatchRandomResize, PadBatch, Compose, stack_samples, transform_profiler
+from datasets import AspectRatioBatchSampler
+
+
+def make_sample(im_h, im_w):
+    return {'image': np.full((im_h, im_w, 3), 7, dtype=np.uint8),
+            'gt_bbox': np.array([[0, 0, im_w, im_h]], dtype=np.float32)}
+
+
+def test_batch_random_resize():
+    np.random.seed(0)
+    op = BatchRandomResize([320, 480, 640])
+    for _ in range(5):
+        batch = op([make_sample(480, 640), make_sample(240, 320), make_sample(300, 400)])
+        # 批内横向图像缩放到同一尺寸
+        shapes = set([s['image'].shape for s in batch])
+        assert len(shapes) == 1
+        im_h, im_w = batch[0]['image'].shape[:2]
+        assert im_w in (320, 480, 640) and im_h * 4 == im_w * 3
+        assert np.allclose(batch[1]['gt_bbox'], [[0, 0, im_w, im_h]])
+
+
+def test_pad_batch_ratio():
+    op = PadBatch(size_divisor=32)
+    batch = op([make_sample(100, 200), make_sample(64, 96)])
+    assert batch[0]['image'].shape == (128, 224, 3) and batch[1]['image'].shape == (128, 224, 3)
+    assert batch[1]['image'][63, 95, 0] == 7 and batch[1]['image'][64, 0, 0] == 0
+    assert np.isclose(op.padded_ratio(), 1. - (100 * 200 + 64 * 96) / (2 * 128 * 224))
+    # CHW图像(宽为3时也按data_format处理)
+    chw = [{'image': np.ones((3, 40, 50), dtype=np.float32)}, {'image': np.ones((3, 64, 3), dtype=np.float32)}]
+    out = stack_samples(PadBatch(size_divisor=1, data_format='CHW')(chw))
+    assert out['image'].shape == (2, 3, 64, 50)
+    # 单样本只补到size_divisor的整数倍
+    assert PadBatch(size_divisor=32)(make_sample(100, 3))['image'].shape == (128, 32, 3)
+
+
+def test_batch_ops_profiled():
+    # 批量预处理经由基类的调用接口，统计开启时被记录
+    np.random.seed(0)
+    compose = Compose([BatchRandomResize([64, 96]), PadBatch(size_divisor=32)])
+    transform_profiler.enable()
+    transform_profiler.reset()
+    try:
+        batch = compose([make_sample(480, 640), make_sample(300, 400)])
+        report = transform_profiler.report()
+    finally:
+        transform_profiler.disable()
+    assert len(set([s['image'].shape for s in batch])) == 1
+    assert report['BatchRandomResize']['calls'] == report['PadBatch']['calls'] == 2
+
+
+def test_aspect_ratio_sampler():
+    ratios = [1.33, 0.75, 1.5, 0.6, 1.33, 0.75, 1.78]
+    sampler = AspectRatioBatchSampler(ratios, batch_size=2, seed=0)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 4
+    assert sorted(sum(batches, [])) == list(range(len(ratios)))
+    for batch in batches:
+        # 批内样本同为横向或同为纵向
+        assert len(set([ratios[idx] >= 1. for idx in batch])) == 1
+    assert len(AspectRatioBatchSampler(ratios, batch_size=2, drop_last=True)) == 3
+    samples = [{'h': 480, 'w': 640}, {'h': 640, 'w': 480}]
+    assert AspectRatioBatchSampler.from_samples(samples).bucket_ids.tolist() == [1, 0]
+
+
+if __name__ == "__main__":
+    test_batch_random_resize()
+    test_pad_batch_ratio()
+    test_batch_ops_profiled()
+    test_aspect_ratio_sampler()
+    print('test_batch_resize passed.')
@@ -0,0 +1,260 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test streaming coco evaluator
+import os
+import sys
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证metrics正常调用
+sys.path.append( os.getcwd() )
+
+from metrics import COCOEvaluator
+
+
+def make_coco_set(num_images=60, num_classes=5, seed=0):
+    """生成真实框(含crowd, 覆盖small/medium/large)与检测结果: 抖动的真实框、重复框与误检"""
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in range(num_images):
+        num_gt = rng.randint(0, 12)
+        ctr = rng.uniform(0, 640, (num_gt, 2))
+        wh = np.exp(rng.uniform(np.log(8), np.log(300), (num_gt, 2)))
+        gt_bbox = np.concatenate([ctr - wh / 2, ctr + wh / 2], axis=1).astype(np.float32)
+        gt_class = rng.randint(0, num_classes, (num_gt, 1)).astype(np.int32)
+        is_crowd = (rng.uniform(size=(num_gt, 1)) < 0.1).astype(np.int32)
+        dets = []
+        for g in range(num_gt):
+            for _ in range(rng.randint(0, 4)): # 0~3个抖动框(重复框为FP)
+                jitter = rng.normal(0, 0.12, 4) * np.tile(wh[g], 2)
+                label = gt_class[g, 0] if rng.uniform() < 0.9 else rng.randint(0, num_classes)
+                dets.append([label, rng.uniform(0.05, 1.)] + (gt_bbox[g] + jitter).tolist())
+        for _ in range(rng.randint(0, 6)): # 误检
+            c, s = rng.uniform(0, 640, 2), rng.uniform(8, 200, 2)
+            dets.append([rng.randint(0, num_classes), rng.uniform(0.05, 0.6)] +
+                        [c[0] - s[0] / 2, c[1] - s[1] / 2, c[0] + s[0] / 2, c[1] + s[1] / 2])
+        dets = np.asarray(dets, dtype=np.float32).reshape(-1, 6)
+        # 量化得分，产生同分的检测
+        dets[:, 1] = np.round(dets[:, 1], 2)
+        images.append((dets, gt_bbox, gt_class, is_crowd))
+    return images
+
+
+def reference_iou(dt, gt, iscrowd):
+    """与pycocotools maskApi的bbIou一致(x1y1x2y2输入)"""
+    ious = np.zeros((len(dt), len(gt)))
+    for d in range(len(dt)):
+        for g in range(len(gt)):
+            w = min(dt[d][2], gt[g][2]) - max(dt[d][0], gt[g][0])
+            h = min(dt[d][3], gt[g][3]) - max(dt[d][1], gt[g][1])
+            if w <= 0 or h <= 0:
+                continue
+            da = (dt[d][2] - dt[d][0]) * (dt[d][3] - dt[d][1])
+            ga = (gt[g][2] - gt[g][0]) * (gt[g][3] - gt[g][1])
+            ious[d, g] = w * h / (da if iscrowd[g] else da + ga - w * h)
+    return ious
+
+
+def reference_cocoeval(images, num_classes, max_dets=[1, 10, 100]):
+    """逐图像、逐类别、逐检测框移植pycocotools COCOeval.evaluateImg/accumulate的参考实现"""
+    iou_thrs = np.linspace(.5, .95, 10)
+    rec_thrs = np.linspace(.0, 1.00, 101)
+    area_rngs = [[0, 1e10], [0, 32 ** 2], [32 ** 2, 96 ** 2], [96 ** 2, 1e10]]
+    T, R, K, A, M = len(iou_thrs), len(rec_thrs), num_classes, len(area_rngs), len(max_dets)
+    precision = -np.ones((T, R, K, A))
+    recall = -np.ones((T, K, A, M))
+    for k in range(K):
+        for a, rng in enumerate(area_rngs):
+            E = []
+            for dets, gt_bbox, gt_class, is_crowd in images:
+                dt = dets[dets[:, 0] == k]
+                gsel = gt_class[:, 0] == k
+                gt, crowd = gt_bbox[gsel].astype(np.float64), is_crowd[gsel, 0] > 0
+                if len(gt) == 0 and len(dt) == 0:
+                    continue
+                garea = (gt[:, 2] - gt[:, 0]) * (gt[:, 3] - gt[:, 1])
+                gt_ig = crowd | (garea < rng[0]) | (garea > rng[1])
+                gtind = np.argsort(gt_ig, kind='mergesort')
+                gt, crowd, gt_ig = gt[gtind], crowd[gtind], gt_ig[gtind]
+                dtind = np.argsort(-dt[:, 1], kind='mergesort')
+                dt = dt[dtind[:max_dets[-1]]]
+                ious = reference_iou(dt[:, 2:].astype(np.float64), gt, crowd)
+                gtm = np.zeros((T, len(gt)))
+                dtm = np.zeros((T, len(dt)))
+                dtIg = np.zeros((T, len(dt)))
+                for tind, t in enumerate(iou_thrs):
+                    for dind in range(len(dt)):
+                        iou = min([t, 1 - 1e-10])
+                        m = -1
+                        for gind in range(len(gt)):
+                            if gtm[tind, gind] > 0 and not crowd[gind]:
+                                continue
+                            if m > -1 and gt_ig[m] == 0 and gt_ig[gind] == 1:
+                                break
+                            if ious[dind, gind] < iou:
+                                continue
+                            iou = ious[dind, gind]
+                            m = gind
+                        if m == -1:
+                            continue
+                        dtIg[tind, dind] = gt_ig[m]
+                        dtm[tind, dind] = 1
+                        gtm[tind, m] = 1
+                box = dt[:, 2:].astype(np.float64)
+                darea = (box[:, 2] - box[:, 0]) * (box[:, 3] - box[:, 1])
+                out = (darea < rng[0]) | (darea > rng[1])
+                dtIg = np.logical_or(dtIg, np.logical_and(dtm == 0, out[None, :]))
+                E.append((dt[:, 1], dtm, dtIg, gt_ig))
+            if len(E) == 0:
+                continue
+            for m, maxDet in enumerate(max_dets):
+                dtScores = np.concatenate([e[0][0:maxDet] for e in E])
+                inds = np.argsort(-dtScores, kind='mergesort')
+                dtm = np.concatenate([e[1][:, 0:maxDet] for e in E], axis=1)[:, inds]
+                dtIg = np.concatenate([e[2][:, 0:maxDet] for e in E], axis=1)[:, inds]
+                npig = np.count_nonzero(np.concatenate([e[3] for e in E]) == 0)
+                if npig == 0:
+                    continue
+                tps = np.logical_and(dtm, np.logical_not(dtIg))
+                fps = np.logical_and(np.logical_not(dtm), np.logical_not(dtIg))
+                tp_sum = np.cumsum(tps, axis=1).astype(dtype=float)
+                fp_sum = np.cumsum(fps, axis=1).astype(dtype=float)
+                for t, (tp, fp) in enumerate(zip(tp_sum, fp_sum)):
+                    nd = len(tp)
+                    rc = tp / npig
+                    pr = tp / (fp + tp + np.spacing(1))
+                    q = np.zeros((R, ))
+                    recall[t, k, a, m] = rc[-1] if nd else 0
+                    pr = pr.tolist()
+                    for i in range(nd - 1, 0, -1):
+                        if pr[i] > pr[i - 1]:
+                            pr[i - 1] = pr[i]
+                    inds = np.searchsorted(rc, rec_thrs, side='left')
+                    for ri, pi in enumerate(inds):
+                        if pi < nd:
+                            q[ri] = pr[pi]
+                    if m == M - 1:
+                        precision[t, :, k, a] = q
+    return precision, recall
+
+
+def evaluate(images, num_classes, batch_size=4, **kwargs):
+    evaluator = COCOEvaluator(num_classes, **kwargs)
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        evaluator.update([b[0] for b in batch], [b[1] for b in batch],
+                         [b[2] for b in batch], is_crowd=[b[3] for b in batch])
+    evaluator.accumulate()
+    return evaluator
+
+
+def test_matches_reference():
+    images = make_coco_set()
+    precision, recall = reference_cocoeval(images, 5)
+    evaluator = evaluate(images, 5)
+    np.testing.assert_allclose(evaluator.precision, precision, atol=1e-12)
+    np.testing.assert_allclose(evaluator.recall, recall, atol=1e-12)
+    # 与batch大小无关
+    evaluator = evaluate(images, 5, batch_size=1)
+    np.testing.assert_allclose(evaluator.precision, precision, atol=1e-12)
+
+
+def test_max_dets_truncation():
+    images = make_coco_set(num_images=30, seed=1)
+    precision, recall = reference_cocoeval(images, 5, max_dets=[1, 2, 3])
+    evaluator = evaluate(images, 5, max_dets=[1, 2, 3])
+    np.testing.assert_allclose(evaluator.precision, precision, atol=1e-12)
+    np.testing.assert_allclose(evaluator.recall, recall, atol=1e-12)
+
+
+def test_known_values():
+    # 完全正确的检测: AP = AR = 1
+    gt_bbox = np.array([[0, 0, 100, 100], [200, 200, 220, 220]], dtype=np.float32)
+    gt_class = np.array([[0], [1]])
+    dets = np.array([[0, 0.9, 0, 0, 100, 100], [1, 0.8, 200, 200, 220, 220]], dtype=np.float32)
+    evaluator = COCOEvaluator(2)
+    evaluator.update(dets, gt_bbox, gt_class)
+    stats = evaluator.summarize()
+    # 与pycocotools相同，精度 = tp / (tp + fp + eps)
+    assert abs(stats['AP'] - 1.) < 1e-12 and abs(stats['AP_small'] - 1.) < 1e-12
+    assert stats['AR100'] == 1.
+    assert stats['AP_medium'] == -1. # 没有medium真实框
+
+    # TP(0.9), FP(0.8), TP(0.7)，2个真实框: 召回率<=0.5时精度1，之后2/3
+    gt_bbox = np.array([[0, 0, 100, 100], [300, 300, 400, 400]], dtype=np.float32)
+    dets = np.array([[0, 0.9, 0, 0, 100, 100],
+                     [0, 0.8, 500, 500, 600, 600],
+                     [0, 0.7, 300, 300, 400, 400]], dtype=np.float32)
+    evaluator = COCOEvaluator(1, iou_thresholds=[0.5])
+    evaluator.update(dets, gt_bbox, np.zeros((2, 1)))
+    stats = evaluator.summarize()
+    assert abs(stats['AP'] - (51 + 50 * 2. / 3) / 101) < 1e-12
+    assert stats['AR1'] == 0.5 and stats['AR10'] == 1.
+
+    # crowd真实框: 匹配到crowd的检测被忽略(可重复匹配)，不计FP
+    is_crowd = np.array([[0], [1]])
+    gt_bbox = np.array([[0, 0, 100, 100], [300, 300, 500, 500]], dtype=np.float32)
+    dets = np.array([[0, 0.9, 300, 300, 400, 400],
+                     [0, 0.8, 400, 400, 500, 500],
+                     [0, 0.7, 0, 0, 100, 100]], dtype=np.float32)
+    evaluator = COCOEvaluator(1)
+    evaluator.update(dets, gt_bbox, np.zeros((2, 1)), is_crowd=is_crowd)
+    assert abs(evaluator.summarize()['AP'] - 1.) < 1e-12
+
+
+def test_score_bins_bounded():
+    images = make_coco_set(seed=2)
+    exact = evaluate(images, 5).summarize()
+    evaluator = COCOEvaluator(5, score_bins=1000)
+    nbytes = evaluator.nbytes
+    for _ in range(3): # 重复评估同一数据集: 内存不变
+        for dets, gt_bbox, gt_class, is_crowd in images:
+            evaluator.update([dets], [gt_bbox], [gt_class], is_crowd=[is_crowd])
+    assert evaluator.nbytes == nbytes
+    approx = evaluator.summarize()
+    for name in exact:
+        assert abs(exact[name] - approx[name]) < 0.01, (name, exact[name], approx[name])
+    # 得分精确到0.01，区间宽度0.001时与精确模式相同(每个区间内只有同分的检测)
+    evaluator = evaluate(images, 5, score_bins=1000)
+    exact_eval = evaluate(images, 5)
+    np.testing.assert_allclose(evaluator.recall, exact_eval.recall)
+
+
+def test_class_blocks():
+    # 分块计算与整体计算一致
+    images = make_coco_set(seed=3)
+    whole = evaluate(images, 5)
+    blocks = evaluate(images, 5, chunk_size=16)
+    np.testing.assert_array_equal(whole.precision, blocks.precision)
+    assert whole.class_ap().shape == (5, )
+
+
+def test_empty():
+    evaluator = COCOEvaluator(3)
+    evaluator.update([np.zeros((0, 6))], [np.zeros((0, 4))], [np.zeros((0, 1))])
+    assert evaluator.summarize()['AP'] == -1.
+    # 只有检测框没有真实框 / 只有真实框没有检测框
+    evaluator.update([np.array([[0, 0.5, 0, 0, 10, 10]])], [np.array([[0, 0, 50, 50]])], [np.array([[1]])])
+    stats = evaluator.summarize()
+    assert stats['AP'] == 0. and stats['AR100'] == 0.
+
+
+if __name__ == "__main__":
+    test_matches_reference()
+    test_max_dets_truncation()
+    test_known_values()
+    test_score_bins_bounded()
+    test_class_blocks()
+    test_empty()
+    print("test_coco_eval passed.")
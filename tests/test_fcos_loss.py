@@ -0,0 +1,149 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test vectorized FCOS loss
+import os
+import sys
+import numpy as np
+import paddle
+import paddle.nn.functional as F
+
+# 设置当前KFPDetection包路径:
+# 保证losses/transforms正常调用
+sys.path.append( os.getcwd() )
+
+from losses import FCOSLoss, giou_loss, sigmoid_focal_loss
+from transforms import FCOSTarget
+
+NUM_CLASSES = 20
+
+
+def make_batch(batch_size=2, im_size=(160, 224), num_bbox=8, seed=0):
+    """FCOSTarget生成的batch目标 + 随机的head输出"""
+    rng = np.random.default_rng(seed)
+    im_h, im_w = im_size
+    xy = rng.uniform(0, [im_w - 20, im_h - 20], (batch_size, num_bbox, 2))
+    wh = rng.uniform(8, 150, (batch_size, num_bbox, 2))
+    gt_bbox = np.concatenate([xy, np.minimum(xy + wh, [im_w, im_h])], axis=2).astype(np.float32)
+    batch = {
+        'image': np.zeros((batch_size, 3) + im_size, dtype=np.float32),
+        'gt_bbox': gt_bbox,
+        'gt_class': rng.integers(0, NUM_CLASSES, (batch_size, num_bbox, 1)).astype(np.int32),
+        'gt_num': np.array([num_bbox] + [num_bbox // 2] * (batch_size - 1), dtype=np.int32)
+    }
+    op = FCOSTarget()
+    batch = op.apply_batch(batch)
+    sizes = [batch['labels{0}'.format(level)].shape[1:3] for level in range(5)]
+    outputs = {
+        'cls_logits': [rng.normal(-2, 1, (batch_size, NUM_CLASSES, h, w)) for h, w in sizes],
+        'bbox_reg': [rng.uniform(0.1, 8, (batch_size, 4, h, w)) for h, w in sizes],
+        'centerness': [rng.normal(0, 1, (batch_size, 1, h, w)) for h, w in sizes]
+    }
+    outputs = {k: [paddle.to_tensor(v.astype(np.float32), stop_gradient=False) for v in vs]
+               for k, vs in outputs.items()}
+    return outputs, batch
+
+
+def loop_fcos_loss(loss_op, outputs, inputs):
+    """逐图像、逐层级计算的FCOS损失(对照实现)"""
+    cls_sum, box_sum, ctr_sum, ctr_weight_sum, num_pos = 0., 0., 0., 0., 0
+    batch_size = outputs['cls_logits'][0].shape[0]
+    for idx in range(batch_size):
+        for level in range(loss_op.num_levels):
+            logits = outputs['cls_logits'][level][idx].transpose([1, 2, 0]).reshape([-1, loss_op.num_classes])
+            reg = outputs['bbox_reg'][level][idx].transpose([1, 2, 0]).reshape([-1, 4])
+            ctr = outputs['centerness'][level][idx].reshape([-1])
+            labels = paddle.to_tensor(inputs['labels{0}'.format(level)][idx].reshape(-1))
+            reg_target = paddle.to_tensor(inputs['reg_target{0}'.format(level)][idx].reshape(-1, 4))
+            ctr_target = paddle.to_tensor(inputs['centerness{0}'.format(level)][idx].reshape(-1))
+            one_hot = F.one_hot(labels.astype('int64'), loss_op.num_classes + 1)[:, 1:]
+            cls_sum = cls_sum + F.sigmoid_focal_loss(logits, one_hot, alpha=loss_op.loss_alpha,
+                                                     gamma=loss_op.loss_gamma, reduction='sum')
+            pos = paddle.nonzero(labels > 0).reshape([-1])
+            if pos.shape[0] == 0:
+                continue
+            num_pos += pos.shape[0]
+            pos_ctr_target = paddle.gather(ctr_target, pos)
+            box_sum = box_sum + (giou_loss(paddle.gather(reg, pos), paddle.gather(reg_target, pos)) *
+                                 pos_ctr_target).sum()
+            ctr_weight_sum = ctr_weight_sum + pos_ctr_target.sum()
+            ctr_sum = ctr_sum + F.binary_cross_entropy_with_logits(paddle.gather(ctr, pos), pos_ctr_target,
+                                                                   reduction='sum')
+    num_pos = max(num_pos, 1)
+    loss_cls = cls_sum / num_pos
+    loss_box = box_sum / ctr_weight_sum * loss_op.reg_weight
+    loss_centerness = ctr_sum / num_pos * loss_op.centerness_weight
+    return {'loss_cls': loss_cls,
+            'loss_box': loss_box,
+            'loss_centerness': loss_centerness,
+            'loss': loss_cls + loss_box + loss_centerness}
+
+
+def test_giou_loss():
+    pred = paddle.to_tensor([[1., 1., 1., 1.], [1., 1., 1., 1.], [0., 0., 1., 1.]])
+    target = paddle.to_tensor([[1., 1., 1., 1.], [2., 2., 2., 2.], [1., 1., 0., 0.]])
+    loss = giou_loss(pred, target).numpy()
+    # 完全重合; 包含(IoU=1/4); 不相交的对角(IoU=0, 外接框面积4, 并集2)
+    np.testing.assert_allclose(loss, [0., 0.75, 1.5], atol=1e-5)
+
+
+def test_sparse_focal_loss():
+    rng = np.random.default_rng(0)
+    logits = paddle.to_tensor(rng.normal(0, 2, (3, 7, 11)).astype(np.float32))
+    labels = (rng.uniform(size=(3, 7, 11)) < 0.1).astype(np.float32)
+    pos_index = paddle.to_tensor(np.stack(np.nonzero(labels), axis=1))
+    for gamma in [2.0, 1.5]:
+        expected = F.sigmoid_focal_loss(logits, paddle.to_tensor(labels), alpha=0.25,
+                                        gamma=gamma, reduction='sum')
+        np.testing.assert_allclose(float(sigmoid_focal_loss(logits, pos_index, 0.25, gamma)),
+                                   float(expected), rtol=1e-5)
+
+
+def test_fcos_loss_matches_loop():
+    loss_op = FCOSLoss(num_classes=NUM_CLASSES)
+    outputs, inputs = make_batch()
+    assert (inputs['labels0'] > 0).sum() > 0
+    losses = loss_op(outputs, inputs)
+    losses['loss'].backward()
+    grads = [out.grad.numpy().copy() for outs in outputs.values() for out in outs]
+    for outs in outputs.values():
+        for out in outs:
+            out.clear_gradient()
+
+    expected = loop_fcos_loss(loss_op, outputs, inputs)
+    expected['loss'].backward()
+    for name in ['loss_cls', 'loss_box', 'loss_centerness', 'loss']:
+        np.testing.assert_allclose(float(losses[name]), float(expected[name]), rtol=1e-4)
+    expected_grads = [out.grad.numpy() for outs in outputs.values() for out in outs]
+    for grad, expected_grad in zip(grads, expected_grads):
+        np.testing.assert_allclose(grad, expected_grad, rtol=1e-4, atol=1e-8)
+
+
+def test_fcos_loss_no_positive():
+    loss_op = FCOSLoss(num_classes=NUM_CLASSES)
+    outputs, inputs = make_batch()
+    for level in range(5):
+        inputs['labels{0}'.format(level)][:] = 0
+    losses = loss_op(outputs, inputs)
+    assert float(losses['loss_box']) == 0. and float(losses['loss_centerness']) == 0.
+    assert float(losses['loss_cls']) > 0.
+    losses['loss'].backward()
+    assert outputs['bbox_reg'][0].grad is not None
+
+
+if __name__ == "__main__":
+    test_giou_loss()
+    test_sparse_focal_loss()
+    test_fcos_loss_matches_loop()
+    test_fcos_loss_no_positive()
+    print("FCOS loss passed.")
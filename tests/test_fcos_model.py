@@ -0,0 +1,137 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test FCOS model
+import os
+import sys
+import numpy as np
+import paddle
+
+# 设置当前KFPDetection包路径:
+# 保证backbones/necks/heads/architectures正常调用
+sys.path.append( os.getcwd() )
+
+from backbones import ResNet, ConvNormLayer, fuse_conv_norm
+from necks import FPN
+from heads import FCOSHead
+from architectures import FCOS
+from transforms import fcos_feature_sizes
+
+
+def build_fcos(num_classes=5, channel=32, base_channels=16, head_norm='bn', pack_levels=0):
+    paddle.seed(0)
+    backbone = ResNet(depth=18, base_channels=base_channels)
+    neck = FPN(backbone.out_channels, backbone.out_strides, out_channel=channel)
+    head = FCOSHead(num_classes=num_classes, in_channel=channel, feat_channel=channel,
+                    num_convs=2, norm_type=head_norm, pack_levels=pack_levels)
+    return FCOS(backbone, neck, head)
+
+
+def warmup_norm(model, image, num_iters=3):
+    # 训练模式前向若干次，使BatchNorm的滑动统计量偏离初始值
+    model.train()
+    for _ in range(num_iters):
+        model(image)
+    model.eval()
+
+
+def test_fcos_train_outputs():
+    model = build_fcos()
+    model.train()
+    image = paddle.randn([2, 3, 100, 130])
+    outputs = model({'image': image})
+    sizes = fcos_feature_sizes(100, 130, model.neck.out_strides)
+    assert model.neck.out_strides == [8, 16, 32, 64, 128]
+    for level, (h, w) in enumerate(sizes):
+        assert outputs['cls_logits'][level].shape == [2, 5, h, w]
+        assert outputs['bbox_reg'][level].shape == [2, 4, h, w]
+        assert outputs['centerness'][level].shape == [2, 1, h, w]
+        assert float(outputs['bbox_reg'][level].min()) >= 0.
+
+
+def test_fcos_predict_outputs():
+    model = build_fcos()
+    model.eval()
+    image = paddle.randn([2, 3, 100, 130])
+    outputs = model(image)
+    sizes = fcos_feature_sizes(100, 130, model.neck.out_strides)
+    num_points = sum([h * w for h, w in sizes])
+    assert outputs['feature_sizes'] == sizes
+    assert outputs['scores'].shape == [2, num_points, 5]
+    assert outputs['ltrb'].shape == [2, num_points, 4]
+    scores = outputs['scores'].numpy()
+    assert scores.min() >= 0. and scores.max() <= 1.
+    # 推理不保留梯度
+    assert outputs['scores'].stop_gradient
+
+
+def test_fuse_conv_norm():
+    layer = ConvNormLayer(4, 8, 3, norm_type='bn', act='relu')
+    layer.norm._mean.set_value(paddle.rand([8]))
+    layer.norm._variance.set_value(paddle.rand([8]) + 0.5)
+    layer.norm.weight.set_value(paddle.rand([8]))
+    layer.norm.bias.set_value(paddle.rand([8]))
+    layer.eval()
+    x = paddle.randn([2, 4, 9, 9])
+    expected = layer(x).numpy()
+    assert fuse_conv_norm(layer) == 1
+    assert layer.norm is None and layer.bias is not None
+    np.testing.assert_allclose(layer(x).numpy(), expected, rtol=1e-4, atol=1e-5)
+    # 已折叠/GroupNorm的层不再折叠
+    assert fuse_conv_norm(layer) == 0
+    gn_layer = ConvNormLayer(4, 32, 3, norm_type='gn')
+    gn_layer.eval()
+    assert fuse_conv_norm(gn_layer) == 0
+
+
+def test_fcos_deploy_matches_eval():
+    model = build_fcos()
+    image = paddle.randn([1, 3, 96, 128])
+    warmup_norm(model, image)
+    expected = model(image)
+    model.deploy()
+    outputs = model(image)
+    num_norms = len([layer for layer in model.sublayers()
+                     if isinstance(layer, paddle.nn.BatchNorm2D)])
+    assert num_norms == 0
+    np.testing.assert_allclose(outputs['scores'].numpy(), expected['scores'].numpy(),
+                               rtol=1e-3, atol=1e-5)
+    np.testing.assert_allclose(outputs['ltrb'].numpy(), expected['ltrb'].numpy(),
+                               rtol=1e-3, atol=1e-2)
+
+
+def test_fcos_packed_head_matches():
+    model = build_fcos()
+    image = paddle.randn([2, 3, 100, 130])
+    warmup_norm(model, image)
+    expected = model(image)
+    for pack_levels in [2, 3, 5]:
+        model.head.pack_levels = pack_levels
+        outputs = model(image)
+        np.testing.assert_allclose(outputs['scores'].numpy(), expected['scores'].numpy(),
+                                   rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(outputs['ltrb'].numpy(), expected['ltrb'].numpy(),
+                                   rtol=1e-4, atol=1e-4)
+    # GroupNorm按层级统计，不打包
+    gn_model = build_fcos(head_norm='gn', pack_levels=3)
+    gn_model.eval()
+    assert not gn_model.head._packable()
+
+
+if __name__ == "__main__":
+    test_fcos_train_outputs()
+    test_fcos_predict_outputs()
+    test_fuse_conv_norm()
+    test_fcos_deploy_matches_eval()
+    test_fcos_packed_head_matches()
+    print("FCOS model passed.")
@@ -0,0 +1,117 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test FCOS postprocess
+import os
+import sys
+import numpy as np
+import paddle
+
+# 设置当前KFPDetection包路径:
+# 保证postprocesses/nmses/architectures正常调用
+sys.path.append( os.getcwd() )
+
+from postprocesses import FCOSPostProcess
+from nmses import multiclass_nms
+from transforms import fcos_feature_sizes, fcos_locations
+from test_fcos_model import build_fcos
+
+
+def make_outputs(batch_size=2, im_h=512, im_w=640, num_classes=20, seed=0):
+    """模拟训练后的head输出: 大部分得分很低，少量位置点的少数类别得分较高"""
+    rng = np.random.RandomState(seed)
+    feature_sizes = fcos_feature_sizes(im_h, im_w, [8, 16, 32, 64, 128])
+    num_points = sum([h * w for h, w in feature_sizes])
+    scores = (rng.uniform(0, 1, (batch_size, num_points, num_classes)) ** 12).astype(np.float32)
+    ltrb = rng.uniform(0, 120, (batch_size, num_points, 4)).astype(np.float32)
+    return {'scores': scores, 'ltrb': ltrb, 'feature_sizes': feature_sizes}
+
+
+def naive_postprocess(outputs, im_shape, scale_factor, score_threshold=0.05, pre_nms_top_k=1000,
+                      nms_top_k=1000, keep_top_k=100, iou_threshold=0.6):
+    """参考实现: 解码所有位置点，逐图像、逐层级排序筛选"""
+    scores, ltrb, feature_sizes = outputs['scores'], outputs['ltrb'], outputs['feature_sizes']
+    locations = fcos_locations(feature_sizes, [8, 16, 32, 64, 128], np.zeros((5, 2), dtype=np.float32))[0]
+    results = []
+    for i in range(scores.shape[0]):
+        x, y = locations[:, 0], locations[:, 1]
+        l, t, r, b = ltrb[i].T
+        h, w = im_shape[i]
+        boxes = np.stack([np.clip(x - l, 0, w), np.clip(y - t, 0, h),
+                          np.clip(x + r, 0, w), np.clip(y + b, 0, h)], axis=1)
+        boxes = boxes / np.asarray([scale_factor[i][1], scale_factor[i][0]] * 2)
+        selected = np.zeros(scores[i].shape, dtype=np.float32)
+        start = 0
+        for feat_h, feat_w in feature_sizes:
+            end = start + feat_h * feat_w
+            level = scores[i, start:end]
+            flat = np.where(level > score_threshold, level, 0.).reshape(-1)
+            top = np.argsort(-flat, kind='stable')[:pre_nms_top_k]
+            top = top[flat[top] > 0]
+            selected[start:end].reshape(-1)[top] = flat[top]
+            start = end
+        results.append(multiclass_nms(boxes.astype(np.float32), selected, score_threshold=score_threshold,
+                                      nms_top_k=nms_top_k, keep_top_k=keep_top_k,
+                                      iou_threshold=iou_threshold))
+    return results
+
+
+def test_postprocess_matches_naive():
+    outputs = make_outputs()
+    im_shape = np.asarray([[512, 640], [480, 600]], dtype=np.float32)
+    scale_factor = np.asarray([[1., 1.], [0.8, 0.5]], dtype=np.float32)
+    for pre_nms_top_k in [1000, 50]:
+        postprocess = FCOSPostProcess(pre_nms_top_k=pre_nms_top_k)
+        results = postprocess(outputs, im_shape=im_shape, scale_factor=scale_factor)
+        refs = naive_postprocess(outputs, im_shape, scale_factor, pre_nms_top_k=pre_nms_top_k)
+        for result, ref in zip(results, refs):
+            assert result.shape == ref.shape and result.shape[1] == 6
+            assert np.array_equal(result[:, :2], ref[:, :2])
+            assert np.allclose(result[:, 2:], ref[:, 2:], atol=1e-3)
+    # 原图坐标范围: 输入尺寸 / 缩放系数
+    assert results[1][:, [2, 4]].max() <= 600 / 0.5 + 1e-3
+    assert results[1][:, [3, 5]].max() <= 480 / 0.8 + 1e-3
+
+
+def test_select_top_k_per_level():
+    outputs = make_outputs(batch_size=3, im_h=256, im_w=256, seed=1)
+    postprocess = FCOSPostProcess(pre_nms_top_k=30)
+    batch_idx, point_idx, labels, scores = postprocess.select(outputs['scores'], outputs['feature_sizes'])
+    assert np.all(np.diff(batch_idx) >= 0) and np.all(scores > 0.05)
+    assert np.array_equal(scores, outputs['scores'][batch_idx, point_idx, labels])
+    bounds = np.cumsum([0] + [h * w for h, w in outputs['feature_sizes']])
+    for i in range(3):
+        level = np.searchsorted(bounds, point_idx[batch_idx == i], side='right') - 1
+        assert np.bincount(level).max() <= 30
+
+
+def test_postprocess_model_outputs():
+    # 推理模式FCOS的输出(paddle.Tensor)直接后处理
+    model = build_fcos(num_classes=5)
+    model.eval()
+    with paddle.no_grad():
+        outputs = model(paddle.randn([2, 3, 96, 128]))
+    postprocess = FCOSPostProcess(score_threshold=0., nms={'name': 'matrix', 'keep_top_k': 20, 'post_threshold': 0.})
+    results = postprocess(outputs, im_shape=paddle.to_tensor([[96., 128.], [90., 100.]]))
+    assert len(results) == 2
+    for result, (h, w) in zip(results, [(96, 128), (90, 100)]):
+        assert result.shape == (20, 6) and result.dtype == np.float32
+        assert np.all(result[:, 2:] >= 0.) and np.all(result[:, [2, 4]] <= w) and np.all(result[:, [3, 5]] <= h)
+        assert np.all(np.diff(result[:, 1]) <= 0.)
+
+
+if __name__ == "__main__":
+    test_postprocess_matches_naive()
+    test_select_top_k_per_level()
+    test_postprocess_model_outputs()
+    print("test_fcos_postprocess passed.")
@@ -0,0 +1,112 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test vectorized FCOS target assignment against a loop implementation
+import os
+import sys
+import copy
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import FCOSTarget, stack_samples
+
+
+def make_sample(num_bbox=40, im_size=(160, 224), seed=0):
+    rng = np.random.default_rng(seed)
+    im_h, im_w = im_size
+    xy = rng.uniform(0, [im_w - 20, im_h - 20], (num_bbox, 2))
+    wh = rng.uniform(4, 150, (num_bbox, 2))
+    gt_bbox = np.concatenate([xy, np.minimum(xy + wh, [im_w, im_h])], axis=1)
+    gt_bbox[1] = gt_bbox[0] # 面积相同的重复框: 取序号最小者
+    return {
+        'image': np.zeros((3, ) + im_size, dtype=np.float32),
+        'gt_bbox': gt_bbox.astype(np.float32),
+        'gt_class': rng.integers(0, 80, (num_bbox, 1)).astype(np.int32)
+    }
+
+
+def loop_fcos_target(op, sample):
+    """逐点、逐框分配的FCOS训练目标(对照实现)"""
+    im_h, im_w = sample['image'].shape[1:3]
+    locations, strides, ranges, _ = op.get_locations(im_h, im_w)
+    labels = np.zeros((len(locations), ), dtype=np.int32)
+    reg_target = np.zeros((len(locations), 4), dtype=np.float32)
+    centerness = np.zeros((len(locations), ), dtype=np.float32)
+    for p, (x, y) in enumerate(locations):
+        best, best_area = -1, None
+        for m, (x1, y1, x2, y2) in enumerate(sample['gt_bbox']):
+            ltrb = [x - x1, y - y1, x2 - x, y2 - y]
+            if op.center_sampling_radius > 0:
+                radius = strides[p] * op.center_sampling_radius
+                cx, cy = (x1 + x2) / 2., (y1 + y2) / 2.
+                inside = min(x - max(cx - radius, x1), y - max(cy - radius, y1),
+                             min(cx + radius, x2) - x, min(cy + radius, y2) - y) > 0
+            else:
+                inside = min(ltrb) > 0
+            if not inside or not (ranges[p, 0] <= max(ltrb) <= ranges[p, 1]):
+                continue
+            area = (x2 - x1) * (y2 - y1)
+            if best_area is None or area < best_area:
+                best, best_area = m, area
+        if best < 0:
+            continue
+        x1, y1, x2, y2 = sample['gt_bbox'][best]
+        l, t, r, b = x - x1, y - y1, x2 - x, y2 - y
+        labels[p] = sample['gt_class'][best, 0] + 1
+        centerness[p] = np.sqrt(min(l, r) / max(l, r) * min(t, b) / max(t, b))
+        reg_target[p] = np.array([l, t, r, b]) / (strides[p] if op.norm_reg_targets else 1.)
+    return labels, reg_target, centerness
+
+
+def flatten(sample, num_levels, key):
+    return np.concatenate([sample['{0}{1}'.format(key, level)].reshape(
+        -1, sample['{0}{1}'.format(key, level)].shape[-1]) for level in range(num_levels)], axis=0)
+
+
+def test_fcos_target_matches_loop():
+    for radius in [1.5, 0.]:
+        # 较小的分块上限，覆盖多块计算
+        op = FCOSTarget(center_sampling_radius=radius, chunk_bytes=1 << 14)
+        sample = make_sample()
+        labels, reg_target, centerness = loop_fcos_target(op, sample)
+        out = op(copy.deepcopy(sample))
+        assert out['labels0'].shape == (20, 28, 1) and out['reg_target4'].shape == (2, 2, 4)
+        assert np.array_equal(flatten(out, 5, 'labels')[:, 0], labels)
+        assert np.allclose(flatten(out, 5, 'reg_target'), reg_target, atol=1e-4)
+        assert np.allclose(flatten(out, 5, 'centerness')[:, 0], centerness, atol=1e-5)
+        assert (labels > 0).sum() > 50
+
+
+def test_fcos_target_batch_and_empty():
+    op = FCOSTarget()
+    samples = [make_sample(num_bbox=num, seed=num) for num in [5, 30]]
+    samples.append(make_sample(seed=3))
+    for key in ['gt_bbox', 'gt_class']:
+        samples[2][key] = samples[2][key][:0] # 没有边界框的样本
+    batch = op.apply_batch(stack_samples(copy.deepcopy(samples)))
+    for idx, sample in enumerate(samples):
+        out = op(copy.deepcopy(sample))
+        for level in range(5):
+            for key in ['labels', 'reg_target', 'centerness']:
+                name = '{0}{1}'.format(key, level)
+                assert np.allclose(batch[name][idx], out[name])
+    assert batch['labels2'][2].max() == 0
+
+
+if __name__ == "__main__":
+    test_fcos_target_matches_loop()
+    test_fcos_target_batch_and_empty()
+    print('test_fcos_target passed.')
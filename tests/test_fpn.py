@@ -0,0 +1,91 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test FPN neck: fused upsample+add and recompute
+import os
+import sys
+import numpy as np
+import paddle
+
+# 设置当前KFPDetection包路径:
+# 保证necks正常调用
+sys.path.append( os.getcwd() )
+
+from necks import FPN
+
+
+def run_fpn(fuse_upsample_add, recompute, norm_type=None, training=True, out_channel=8, stats=None):
+    paddle.seed(0)
+    fpn = FPN([16, 32, 64], out_channel=out_channel, norm_type=norm_type,
+              fuse_upsample_add=fuse_upsample_add, recompute=recompute)
+    fpn.train() if training else fpn.eval()
+    rng = np.random.RandomState(0)
+    # 奇数尺寸: 上一层级上采样后需要对齐到当前层级尺寸
+    feats = [paddle.to_tensor(rng.randn(2, c, h, w).astype(np.float32), stop_gradient=False)
+             for c, h, w in [(16, 25, 27), (32, 13, 14), (64, 7, 7)]]
+    outs = fpn(feats)
+    loss = sum([(out * out).mean() for out in outs])
+    loss.backward()
+    grads = [feat.grad.numpy() for feat in feats] + [fpn.lateral_convs[0].conv.weight.grad.numpy()]
+    if stats is not None: # 记录BatchNorm的滑动统计量
+        stats.extend([stat.numpy() for layer in fpn.sublayers() if isinstance(layer, paddle.nn.BatchNorm2D)
+                        for stat in [layer._mean, layer._variance]])
+    return [out.numpy() for out in outs], grads
+
+
+def test_fpn_shapes():
+    fpn = FPN([16, 32, 64], in_strides=[8, 16, 32], out_channel=8)
+    outs = fpn([paddle.randn([1, 16, 25, 27]), paddle.randn([1, 32, 13, 14]), paddle.randn([1, 64, 7, 7])])
+    assert fpn.out_strides == [8, 16, 32, 64, 128]
+    assert [out.shape for out in outs] == [[1, 8, 25, 27], [1, 8, 13, 14], [1, 8, 7, 7],
+                                           [1, 8, 4, 4], [1, 8, 2, 2]]
+
+
+def test_fpn_fused_and_recompute_match():
+    for norm_type in [None, 'bn']:
+        expected_outs, expected_grads = run_fpn(False, False, norm_type)
+        for fuse_upsample_add, recompute in [(True, False), (False, True), (True, True)]:
+            outs, grads = run_fpn(fuse_upsample_add, recompute, norm_type)
+            for out, expected in zip(outs, expected_outs):
+                np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-6)
+            for grad, expected in zip(grads, expected_grads):
+                np.testing.assert_allclose(grad, expected, rtol=1e-4, atol=1e-6)
+
+
+def test_fpn_recompute_bn_stats():
+    # 重计算时BatchNorm的滑动统计量只更新一次
+    expected, stats = [], []
+    run_fpn(True, False, 'bn', stats=expected)
+    run_fpn(True, True, 'bn', stats=stats)
+    assert len(stats) == len(expected) > 0
+    for stat, value in zip(stats, expected):
+        np.testing.assert_allclose(stat, value, rtol=1e-5, atol=1e-6)
+
+
+def test_fpn_gn_training_backward():
+    # GroupNorm的反向需要其输出: 融合时不能原地累加到横向分支
+    expected_outs, expected_grads = run_fpn(False, False, 'gn', out_channel=32)
+    for fuse_upsample_add, recompute in [(True, False), (True, True)]:
+        outs, grads = run_fpn(fuse_upsample_add, recompute, 'gn', out_channel=32)
+        for out, expected in zip(outs, expected_outs):
+            np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-6)
+        for grad, expected in zip(grads, expected_grads):
+            np.testing.assert_allclose(grad, expected, rtol=1e-4, atol=1e-6)
+
+
+if __name__ == "__main__":
+    test_fpn_shapes()
+    test_fpn_fused_and_recompute_match()
+    test_fpn_recompute_bn_stats()
+    test_fpn_gn_training_backward()
+    print("FPN passed.")
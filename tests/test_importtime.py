@@ -0,0 +1,90 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test lazy package imports
+import os
+import sys
+import subprocess
+
+# 设置当前KFPDetection包路径:
+# 保证datasets, vdlrecords, visualizes正常调用
+sys.path.append( os.getcwd() )
+
+
+def run_modules(code):
+    """在子进程中执行code，返回执行后已加载的模块集合
+       (importlib.import_module的导入不出现在-X importtime的输出中，因此直接检查sys.modules)"""
+    result = subprocess.run([sys.executable, '-c',
+                             'import sys; sys.path.insert(0, {0!r}); '.format(os.getcwd()) + code +
+                             '; print("\\n".join(sorted(sys.modules)))'],
+                            cwd=os.getcwd(), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr[-2000:]
+    return set(result.stdout.split())
+
+
+def test_datasets_lazy():
+    # 采样器/行索引只依赖numpy，不应加载paddle
+    modules = run_modules('import datasets; datasets.AspectRatioBatchSampler; datasets.LineIndexedFile')
+    assert 'datasets' in modules
+    assert 'datasets.sampler' in modules and 'datasets.line_index' in modules
+    assert 'paddle' not in modules
+    assert 'datasets.voc' not in modules
+
+
+def test_datasets_access():
+    modules = run_modules('import datasets; assert datasets.VOCDataset.__name__ == "VOCDataset"; '
+                                'assert datasets.voc.VOCDataset is datasets.VOCDataset')
+    assert 'datasets.voc' in modules
+    assert 'paddle' in modules
+
+
+def test_vdlrecords_lazy():
+    modules = run_modules('import vdlrecords; vdlrecords.ScalarVDL')
+    assert 'vdlrecords.vdlrecord' in modules
+    assert 'visualdl' not in modules
+
+
+def test_visualizes_lazy():
+    modules = run_modules('import visualizes; visualizes.colormap(rgb=True)')
+    assert 'visualizes.det_visualize' in modules
+    assert 'matplotlib' not in modules
+
+
+def test_star_import():
+    # from xxx import * 仍导出全部名称
+    modules = run_modules('from visualizes import *; from vdlrecords import *; '
+                                'visualize_det; ScalarVDL; VDLCallback')
+    assert 'visualdl' not in modules and 'matplotlib' not in modules
+
+
+def test_root_lazy():
+    # 根包按静态表查找名称: 只导入名称所在的子包，未知名称不导入任何子包
+    import_root = 'sys.path.insert(0, {0!r}); import {1} as root'.format(
+        os.path.dirname(os.getcwd()), os.path.basename(os.getcwd()))
+    modules = run_modules(import_root + '; root.create_logger; assert not hasattr(root, "no_such_name")')
+    assert 'loggers' in modules
+    assert 'datasets' not in modules and 'visualizes' not in modules and 'vdlrecords' not in modules
+    # 静态表与子包的__all__一致
+    run_modules(import_root + '; import importlib; '
+                'assert all([attrs == importlib.import_module(name).__all__ '
+                'for name, attrs in root._LAZY_IMPORTS.items()])')
+
+
+if __name__ == "__main__":
+    test_datasets_lazy()
+    test_datasets_access()
+    test_vdlrecords_lazy()
+    test_visualizes_lazy()
+    test_star_import()
+    test_root_lazy()
+    print("test_importtime passed.")
@@ -0,0 +1,128 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test line index of annotation list files
+import os
+import sys
+import time
+import pickle
+import tempfile
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证datasets正常调用
+sys.path.append( os.getcwd() )
+
+from datasets import build_line_index, LineIndexedFile, VOCDataset
+
+
+def _write_list_file(dir_path, num_lines, end_with_newline=True):
+    lines = ['JPEGImages/img{0}.jpg Annotations/img{0}.xml'.format(i)
+             for i in range(num_lines)]
+    list_path = os.path.join(dir_path, 'train_list.txt')
+    with open(list_path, 'w') as f:
+        f.write('\n'.join(lines) + ('\n' if end_with_newline else ''))
+    return list_path, lines
+
+
+def _write_voc_dataset(dir_path, num_lines):
+    # 图片只需存在(解析时不读取)，每个标注文件包含一个目标
+    os.makedirs(os.path.join(dir_path, 'JPEGImages'))
+    os.makedirs(os.path.join(dir_path, 'Annotations'))
+    for i in range(num_lines):
+        open(os.path.join(dir_path, 'JPEGImages', 'img{0}.jpg'.format(i)), 'w').close()
+        with open(os.path.join(dir_path, 'Annotations', 'img{0}.xml'.format(i)), 'w') as f:
+            f.write('<annotation><size><width>64</width><height>48</height></size>'
+                    '<object><name>cat</name><bndbox><xmin>1</xmin><ymin>2</ymin>'
+                    '<xmax>30</xmax><ymax>40</ymax></bndbox></object></annotation>')
+    with open(os.path.join(dir_path, 'label_list.txt'), 'w') as f:
+        f.write('cat\n')
+    return _write_list_file(dir_path, num_lines)
+
+
+def test_line_index_random_access():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 1.末尾有/无换行的文件都能得到正确的行数
+        for end_with_newline in [True, False]:
+            list_path, lines = _write_list_file(tmp_dir, 1000, end_with_newline)
+            with LineIndexedFile(list_path, rebuild=True) as f:
+                assert len(f) == len(lines)
+                assert f[0] == lines[0] and f[-1] == lines[-1]
+                assert f[517] == lines[517]
+                assert list(f.lines(100, 110)) == lines[100:110]
+        # 2.索引以uint64保存在标注说明文件旁
+        offsets = np.load(list_path + '.idx.npy')
+        assert offsets.dtype == np.uint64
+        assert int(offsets[-1]) == os.path.getsize(list_path)
+
+
+def test_line_index_shards_and_pickle():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        list_path, lines = _write_list_file(tmp_dir, 1001)
+        f = LineIndexedFile(list_path)
+        # 1.所有分片首尾相接，覆盖全部行
+        shard_lines = []
+        for shard_id in range(4):
+            start, end = f.shard_range(num_shards=4, shard_id=shard_id)
+            shard_lines += list(f.lines(start, end))
+        assert shard_lines == lines
+        # 2.跨进程传递时重新打开mmap
+        f2 = pickle.loads(pickle.dumps(f))
+        assert f2[1000] == lines[1000]
+        f.close()
+        f2.close()
+
+
+def test_voc_dataset_shards():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _, lines = _write_voc_dataset(tmp_dir, 23)
+
+        def parse(num_shards, shard_id):
+            dataset = VOCDataset(dataset_dir=tmp_dir,
+                                 label_list='label_list.txt',
+                                 anno_path='train_list.txt',
+                                 data_fields=['image', 'gt_bbox', 'gt_class'],
+                                 num_shards=num_shards,
+                                 shard_id=shard_id)
+            dataset.parse_dataset()
+            return {s['im_id']: s['im_file'] for s in dataset.samples}
+
+        full = parse(1, 0)
+        assert sorted(full.keys()) == list(range(len(lines)))
+        # 各分片的图片id互不重叠，合起来覆盖全部样本，且与不分片时一一对应
+        merged = {}
+        for shard_id in range(4):
+            shard = parse(4, shard_id)
+            assert len(set(shard.keys()) & set(merged.keys())) == 0
+            merged.update(shard)
+        assert merged == full
+
+
+def test_line_index_rebuild_when_stale():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        list_path, _ = _write_list_file(tmp_dir, 10)
+        build_line_index(list_path)
+        # 文件修改后，旧索引的哨兵与文件长度不一致，自动重建
+        time.sleep(0.01)
+        list_path, lines = _write_list_file(tmp_dir, 20)
+        with LineIndexedFile(list_path) as f:
+            assert len(f) == 20
+            assert f[19] == lines[19]
+
+
+if __name__ == "__main__":
+    test_line_index_random_access()
+    test_line_index_shards_and_pickle()
+    test_line_index_rebuild_when_stale()
+    test_voc_dataset_shards()
+    print('test_line_index passed.')
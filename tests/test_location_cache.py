@@ -0,0 +1,76 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test FPN location cache
+import os
+import sys
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import FCOSLocationCache, FCOSTarget, fcos_feature_sizes, fcos_locations
+
+STRIDES = [8, 16, 32, 64, 128]
+RANGES = np.array([[-1, 64], [64, 128], [128, 256], [256, 512], [512, 1e8]], dtype=np.float32)
+
+
+def test_location_cache_shared_readonly():
+    cache = FCOSLocationCache(max_entries=2)
+    sizes = fcos_feature_sizes(100, 130, STRIDES)
+    assert sizes == ((13, 17), (7, 9), (4, 5), (2, 3), (1, 2))
+    first = cache.get(sizes, STRIDES, RANGES)
+    second = cache.get(sizes, STRIDES, RANGES)
+    # 命中时返回同一份只读数组
+    assert all([a is b for a, b in zip(first, second)])
+    try:
+        first[0][0, 0] = 1.
+        assert False, 'cached locations should be read-only'
+    except ValueError:
+        pass
+    expected = fcos_locations(sizes, STRIDES, RANGES)
+    assert all([np.array_equal(a, b) for a, b in zip(first, expected)])
+    assert first[0].shape == (13 * 17 + 7 * 9 + 20 + 6 + 2, 2)
+    assert first[0][0].tolist() == [4., 4.] and first[1][-1] == 128
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['hit_rate'] == 0.5
+
+
+def test_location_cache_eviction():
+    cache = FCOSLocationCache(max_entries=2)
+    shapes = [(320, 320), (416, 416), (320, 320), (512, 512), (416, 416)]
+    for im_h, im_w in shapes:
+        cache.get(fcos_feature_sizes(im_h, im_w, STRIDES), STRIDES, RANGES)
+    # 416在512写入时被淘汰(320刚被访问过)
+    stats = cache.stats()
+    assert len(cache) == 2 and stats['evictions'] == 2
+    assert stats['hits'] == 1 and stats['misses'] == 4
+
+
+def test_fcos_target_uses_cache():
+    cache = FCOSLocationCache()
+    op = FCOSTarget(location_cache=cache)
+    sample = {'image': np.zeros((3, 96, 128), dtype=np.float32),
+              'gt_bbox': np.array([[10, 10, 60, 70]], dtype=np.float32),
+              'gt_class': np.array([[3]], dtype=np.int32)}
+    for _ in range(4):
+        out = op(dict(sample))
+    assert cache.stats()['hits'] == 3 and out['labels0'].max() == 4
+
+
+if __name__ == "__main__":
+    test_location_cache_shared_readonly()
+    test_location_cache_eviction()
+    test_fcos_target_uses_cache()
+    print('test_location_cache passed.')
@@ -0,0 +1,268 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test multi-class hard nms, matrix nms, soft nms and grid nms
+import os
+import sys
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证nmses正常调用
+sys.path.append( os.getcwd() )
+
+from nmses import box_iou, select_candidates, group_by_class, nms, batched_nms, multiclass_nms
+from nmses import multiclass_matrix_nms, multiclass_soft_nms, build_nms
+from nmses import grid_nms, batched_grid_nms, multiclass_grid_nms
+
+
+def make_detections(num_boxes, num_classes=80, num_objects=20, im_size=640, seed=0):
+    """生成聚集在若干目标周围的检测框与稀疏的类别得分——[N, 4], [N, C]"""
+    rng = np.random.RandomState(seed)
+    centers = rng.uniform(0, im_size, (num_objects, 2))
+    sizes = rng.uniform(16, im_size / 4, (num_objects, 2))
+    obj = rng.randint(0, num_objects, num_boxes)
+    ctr = centers[obj] + rng.normal(0, 0.15, (num_boxes, 2)) * sizes[obj]
+    wh = sizes[obj] * rng.uniform(0.7, 1.3, (num_boxes, 2))
+    boxes = np.concatenate([ctr - wh / 2, ctr + wh / 2], axis=1).astype(np.float32)
+    obj_class = rng.randint(0, num_classes, num_objects)
+    scores = np.zeros((num_boxes, num_classes), dtype=np.float32)
+    scores[np.arange(num_boxes), obj_class[obj]] = rng.uniform(0.01, 1., num_boxes)
+    # 少量其它类别的得分
+    extra = rng.randint(0, num_boxes, num_boxes // 4)
+    scores[extra, rng.randint(0, num_classes, extra.shape[0])] = rng.uniform(0.01, 0.5, extra.shape[0])
+    return boxes, scores
+
+
+def naive_multiclass_nms(boxes, scores, score_threshold=0.05, nms_top_k=1000,
+                         keep_top_k=100, iou_threshold=0.6):
+    """逐类别、逐框的参考实现"""
+    results = []
+    for c in range(scores.shape[1]):
+        idx = np.nonzero(scores[:, c] > score_threshold)[0]
+        idx = idx[np.argsort(-scores[idx, c], kind='stable')]
+        if nms_top_k > 0:
+            idx = idx[:nms_top_k]
+        keep = []
+        for i in idx:
+            if all(box_iou(boxes[i:i + 1], boxes[j:j + 1])[0, 0] <= iou_threshold for j in keep):
+                keep.append(i)
+        for i in keep:
+            results.append([c, scores[i, c]] + boxes[i].tolist())
+    results = np.asarray(results, dtype=np.float32).reshape(-1, 6)
+    results = results[np.argsort(-results[:, 1], kind='stable')]
+    return results[:keep_top_k] if keep_top_k > 0 else results
+
+
+def naive_matrix_nms(boxes, scores, score_threshold=0.05, nms_top_k=1000, keep_top_k=100,
+                     post_threshold=0.05, use_gaussian=False, gaussian_sigma=2.):
+    """逐类别、逐候选对的参考实现"""
+    results = []
+    for c in range(scores.shape[1]):
+        idx = np.nonzero(scores[:, c] > score_threshold)[0]
+        idx = idx[np.argsort(-scores[idx, c], kind='stable')]
+        if nms_top_k > 0:
+            idx = idx[:nms_top_k]
+        iou = box_iou(boxes[idx], boxes[idx])
+        compensate = [max([0.] + [iou[k, i] for k in range(i)]) for i in range(len(idx))]
+        for j in range(len(idx)):
+            min_decay = 1.
+            for i in range(j):
+                if use_gaussian:
+                    decay = np.exp((compensate[i] ** 2 - iou[i, j] ** 2) * gaussian_sigma)
+                else:
+                    decay = (1. - iou[i, j]) / (1. - compensate[i])
+                min_decay = min(min_decay, decay)
+            score = scores[idx[j], c] * min_decay
+            if score > post_threshold:
+                results.append([c, score] + boxes[idx[j]].tolist())
+    results = np.asarray(results, dtype=np.float32).reshape(-1, 6)
+    results = results[np.argsort(-results[:, 1], kind='stable')]
+    return results[:keep_top_k] if keep_top_k > 0 else results
+
+
+def naive_soft_nms(boxes, scores, score_threshold=0.05, nms_top_k=1000, keep_top_k=100,
+                   post_threshold=0.001, method='gaussian', iou_threshold=0.3, sigma=0.5):
+    """逐类别、逐框的参考实现"""
+    results = []
+    for c in range(scores.shape[1]):
+        idx = np.nonzero(scores[:, c] > score_threshold)[0]
+        idx = idx[np.argsort(-scores[idx, c], kind='stable')]
+        if nms_top_k > 0:
+            idx = idx[:nms_top_k]
+        current = {i: float(scores[i, c]) for i in idx}
+        remaining = list(idx)
+        while len(remaining) > 0:
+            m = max(remaining, key=lambda i: current[i]) # 得分相同时取先出现者
+            results.append([c, current[m]] + boxes[m].tolist())
+            remaining.remove(m)
+            for j in remaining:
+                iou = box_iou(boxes[m:m + 1], boxes[j:j + 1])[0, 0]
+                if method == 'gaussian':
+                    current[j] *= np.exp(-iou * iou / sigma)
+                elif iou > iou_threshold:
+                    current[j] *= 1. - iou
+            remaining = [j for j in remaining if current[j] > post_threshold]
+    results = np.asarray(results, dtype=np.float32).reshape(-1, 6)
+    results = results[np.argsort(-results[:, 1], kind='stable')]
+    return results[:keep_top_k] if keep_top_k > 0 else results
+
+
+def assert_detections_close(out, ref):
+    # 衰减得分存在浮点误差，按(类别, 坐标)排序后比较
+    assert out.shape == ref.shape and out.dtype == np.float32
+    out = out[np.lexsort(out[:, [5, 4, 3, 2, 0]].T)]
+    ref = ref[np.lexsort(ref[:, [5, 4, 3, 2, 0]].T)]
+    assert np.array_equal(out[:, [0, 2, 3, 4, 5]], ref[:, [0, 2, 3, 4, 5]])
+    assert np.allclose(out[:, 1], ref[:, 1], rtol=1e-4, atol=1e-6)
+
+
+def test_nms_single_class():
+    boxes = np.asarray([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30], [0, 0, 10, 9]], dtype=np.float32)
+    scores = np.asarray([0.9, 0.8, 0.7, 0.95], dtype=np.float32)
+    assert nms(boxes, scores, 0.5).tolist() == [3, 2]
+    assert nms(boxes, scores, 0.95).tolist() == [3, 0, 1, 2]
+    assert nms(boxes, scores, 0.5, top_k=1).tolist() == [3]
+    assert nms(boxes[:0], scores[:0]).shape == (0, )
+
+
+def test_batched_nms_classes_independent():
+    boxes = np.asarray([[0, 0, 10, 10], [1, 1, 11, 11], [-5, -5, 5, 5]], dtype=np.float32)
+    scores = np.asarray([0.9, 0.8, 0.7], dtype=np.float32)
+    # 同一位置的框类别不同时互不抑制(包括负坐标)
+    assert batched_nms(boxes, scores, np.asarray([0, 1, 0]), 0.5).tolist() == [0, 1, 2]
+    assert batched_nms(boxes, scores, np.asarray([0, 0, 0]), 0.5).tolist() == [0, 2]
+
+
+def test_select_candidates():
+    scores = np.asarray([[0.9, 0.1], [0.8, 0.7], [0.3, 0.01], [0.6, 0.2]], dtype=np.float32)
+    box_idx, labels, cand_scores = select_candidates(scores, score_threshold=0.05, nms_top_k=2)
+    assert box_idx.tolist() == [0, 1, 1, 3]
+    assert labels.tolist() == [0, 0, 1, 1]
+    assert np.allclose(cand_scores, [0.9, 0.8, 0.7, 0.2])
+
+
+def test_multiclass_nms_matches_naive():
+    for seed, (num_boxes, nms_top_k, keep_top_k) in enumerate([(300, 1000, 100), (500, 20, 100),
+                                                               (400, -1, -1), (200, 1000, 5)]):
+        boxes, scores = make_detections(num_boxes, num_classes=10, num_objects=8, seed=seed)
+        out = multiclass_nms(boxes, scores, nms_top_k=nms_top_k, keep_top_k=keep_top_k)
+        ref = naive_multiclass_nms(boxes, scores, nms_top_k=nms_top_k, keep_top_k=keep_top_k)
+        assert out.shape == ref.shape and out.dtype == np.float32
+        assert np.array_equal(out, ref)
+
+
+def test_multiclass_nms_batch():
+    boxes0, scores0 = make_detections(300, seed=1)
+    boxes1, scores1 = make_detections(300, seed=2)
+    outs = multiclass_nms(np.stack([boxes0, boxes1]), np.stack([scores0, scores1]))
+    assert isinstance(outs, list) and len(outs) == 2
+    assert np.array_equal(outs[0], multiclass_nms(boxes0, scores0))
+    assert np.array_equal(outs[1], multiclass_nms(boxes1, scores1))
+    # 没有候选时输出[0, 6]
+    empty = multiclass_nms(boxes0, np.zeros_like(scores0))
+    assert empty.shape == (0, 6)
+
+
+def test_group_by_class():
+    labels = np.asarray([2, 0, 2, 5, 2, 0])
+    class_ids, index, valid = group_by_class(labels)
+    assert class_ids.tolist() == [0, 2, 5]
+    assert index.tolist() == [[1, 5, 0], [0, 2, 4], [3, 0, 0]]
+    assert valid.tolist() == [[True, True, False], [True, True, True], [True, False, False]]
+    assert group_by_class(labels[:0])[1].shape == (0, 0)
+
+
+def test_matrix_nms_matches_naive():
+    for seed, use_gaussian in enumerate([False, True]):
+        boxes, scores = make_detections(200, num_classes=6, num_objects=6, seed=seed)
+        kwargs = dict(use_gaussian=use_gaussian, keep_top_k=-1)
+        assert_detections_close(multiclass_matrix_nms(boxes, scores, **kwargs),
+                                naive_matrix_nms(boxes, scores, **kwargs))
+    # 分块计算的结果与不分块一致
+    out = multiclass_matrix_nms(boxes, scores, keep_top_k=-1, chunk_bytes=1)
+    assert np.array_equal(out, multiclass_matrix_nms(boxes, scores, keep_top_k=-1))
+
+
+def test_soft_nms_matches_naive():
+    for seed, method in enumerate(['gaussian', 'linear']):
+        boxes, scores = make_detections(150, num_classes=6, num_objects=6, seed=seed)
+        kwargs = dict(method=method, keep_top_k=50, nms_top_k=40)
+        assert_detections_close(multiclass_soft_nms(boxes, scores, **kwargs),
+                                naive_soft_nms(boxes, scores, **kwargs))
+
+
+def test_build_nms():
+    boxes, scores = make_detections(300, seed=3)
+    assert np.array_equal(build_nms('hard')(boxes, scores), multiclass_nms(boxes, scores))
+    fn = build_nms({'name': 'matrix', 'use_gaussian': True, 'keep_top_k': 10})
+    assert np.array_equal(fn(boxes, scores), multiclass_matrix_nms(boxes, scores, use_gaussian=True, keep_top_k=10))
+    fn = build_nms({'name': 'soft', 'method': 'linear'})
+    outs = fn(np.stack([boxes, boxes]), np.stack([scores, scores]))
+    assert len(outs) == 2 and np.array_equal(outs[0], outs[1])
+    for name in ['hard', 'matrix', 'soft']: # 没有候选时输出[0, 6]
+        assert build_nms(name)(boxes, np.zeros_like(scores)).shape == (0, 6)
+
+
+def make_tiled_detections(num_boxes, num_classes=5, im_size=3000, seed=0):
+    """大图上的小目标检测框(少量大框、负坐标、面积为0的框、重复的框与相同的得分)"""
+    rng = np.random.RandomState(seed)
+    num_objects = max(1, num_boxes // 10)
+    centers = rng.uniform(-50, im_size, (num_objects, 2))
+    sizes = np.exp(rng.uniform(np.log(4), np.log(64), (num_objects, 2)))
+    sizes[rng.uniform(0, 1, num_objects) < 0.05] *= 10
+    obj = rng.randint(0, num_objects, num_boxes)
+    ctr = centers[obj] + rng.normal(0, 0.1, (num_boxes, 2)) * sizes[obj]
+    wh = sizes[obj] * rng.uniform(0.8, 1.2, (num_boxes, 2))
+    boxes = np.concatenate([ctr - wh / 2, ctr + wh / 2], axis=1).astype(np.float32)
+    k = num_boxes // 50
+    boxes[:k, 2:] = boxes[:k, :2] # 面积为0
+    boxes[num_boxes - k:] = boxes[k:2 * k] # 重复的框
+    scores = np.round(rng.uniform(0.05, 1., num_boxes), 2).astype(np.float32) # 存在相同的得分
+    labels = rng.randint(0, num_classes, num_objects)[obj]
+    return boxes, scores, labels
+
+
+def test_grid_nms_identical():
+    for seed, (num_boxes, iou_threshold) in enumerate([(2000, 0.5), (5000, 0.3), (3000, 0.7), (10, 0.5)]):
+        boxes, scores, labels = make_tiled_detections(num_boxes, seed=seed)
+        ref = batched_nms(boxes, scores, labels, iou_threshold)
+        assert np.array_equal(batched_grid_nms(boxes, scores, labels, iou_threshold), ref)
+        # 不同的网格单元边长与分块大小不影响结果
+        assert np.array_equal(batched_grid_nms(boxes, scores, labels, iou_threshold,
+                                               cell_size=3., chunk_pairs=100), ref)
+        assert np.array_equal(batched_grid_nms(boxes, scores, labels, iou_threshold, top_k=7), ref[:7])
+        assert np.array_equal(grid_nms(boxes, scores, iou_threshold), nms(boxes, scores, iou_threshold))
+    assert grid_nms(boxes[:0], scores[:0]).shape == (0, )
+
+
+def test_multiclass_grid_nms():
+    boxes, scores = make_detections(1000, num_classes=10, seed=4)
+    for kwargs in [dict(), dict(nms_top_k=-1, keep_top_k=-1), dict(nms_top_k=50, keep_top_k=30)]:
+        assert np.array_equal(multiclass_grid_nms(boxes, scores, **kwargs), multiclass_nms(boxes, scores, **kwargs))
+    fn = build_nms({'name': 'grid', 'keep_top_k': 100})
+    assert np.array_equal(fn(boxes, scores), multiclass_nms(boxes, scores))
+
+
+if __name__ == "__main__":
+    test_nms_single_class()
+    test_batched_nms_classes_independent()
+    test_select_candidates()
+    test_multiclass_nms_matches_naive()
+    test_multiclass_nms_batch()
+    test_group_by_class()
+    test_matrix_nms_matches_naive()
+    test_soft_nms_matches_naive()
+    test_build_nms()
+    test_grid_nms_identical()
+    test_multiclass_grid_nms()
+    print("test_nms passed.")
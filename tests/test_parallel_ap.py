@@ -0,0 +1,83 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test parallel per-class ap over shared memory
+import os
+import sys
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证metrics正常调用
+sys.path.append( os.getcwd() )
+
+from metrics import class_blocks, map_class_blocks
+from test_coco_eval import make_coco_set, evaluate as evaluate_coco
+from test_voc_eval import make_voc_set, evaluate as evaluate_voc
+
+
+def shm_segments():
+    return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+
+def block_sum(arrays, start, end):
+    return arrays['x'][start:end].sum(axis=0)
+
+
+def test_class_blocks():
+    counts = np.array([5, 0, 3, 9, 1, 1, 20, 2])
+    for chunk_size, num_workers in [(4, 0), (10, 0), (1 << 22, 2), (1 << 22, 8)]:
+        blocks = class_blocks(counts, chunk_size, num_workers)
+        assert blocks[0][0] == 0 and blocks[-1][1] == len(counts)
+        assert all(a[1] == b[0] and a[0] < a[1] for a, b in zip(blocks[:-1], blocks[1:]))
+        for start, end in blocks: # 超过chunk_size的块只有一个类别
+            limit = chunk_size if num_workers <= 1 else min(chunk_size, counts.sum() // (4 * num_workers))
+            assert counts[start:end].sum() <= max(limit, 1) or end - start == 1
+    assert len(class_blocks(counts, 1 << 22, 0)) == 1
+
+
+def test_map_class_blocks():
+    before = shm_segments()
+    x = np.arange(40, dtype=np.float64).reshape(20, 2)
+    tasks = [(0, 5), (5, 12), (12, 20)]
+    serial = map_class_blocks(block_sum, {'x': x}, tasks, num_workers=0)
+    parallel = map_class_blocks(block_sum, {'x': x}, tasks, num_workers=2)
+    for a, b in zip(serial, parallel):
+        np.testing.assert_array_equal(a, b)
+    assert shm_segments() == before # 共享内存已释放
+
+
+def test_coco_parallel():
+    images = make_coco_set(num_images=40, num_classes=30, seed=4)
+    serial = evaluate_coco(images, 30)
+    parallel = evaluate_coco(images, 30, num_workers=3)
+    np.testing.assert_array_equal(serial.precision, parallel.precision)
+    np.testing.assert_array_equal(serial.recall, parallel.recall)
+    serial = evaluate_coco(images, 30, score_bins=100)
+    parallel = evaluate_coco(images, 30, score_bins=100, num_workers=3)
+    np.testing.assert_array_equal(serial.precision, parallel.precision)
+
+
+def test_voc_parallel():
+    images = make_voc_set(num_images=60, num_classes=20, seed=5)
+    serial = evaluate_voc(images, 20)
+    parallel = evaluate_voc(images, 20, num_workers=3)
+    np.testing.assert_array_equal(serial.ap_11point, parallel.ap_11point)
+    np.testing.assert_array_equal(serial.ap_area, parallel.ap_area)
+
+
+if __name__ == "__main__":
+    test_class_blocks()
+    test_map_class_blocks()
+    test_coco_parallel()
+    test_voc_parallel()
+    print("test_parallel_ap passed.")
@@ -0,0 +1,99 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test geometric augment ops
+import os
+import sys
+import copy
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Compose, Resize, ClipBox
+from transforms import RandomFlip, RandomResize, RandomExpand, RandomCrop
+
+
+def make_dense_sample(num_bbox=120, im_size=(480, 640), seed=0):
+    rng = np.random.default_rng(seed)
+    im_h, im_w = im_size
+    xy = rng.uniform(0, [im_w - 40, im_h - 40], (num_bbox, 2))
+    wh = rng.uniform(8, 40, (num_bbox, 2))
+    return {
+        'image': rng.integers(0, 256, im_size + (3,), dtype=np.uint8),
+        'gt_bbox': np.concatenate([xy, xy + wh], axis=1).astype(np.float32),
+        'gt_class': np.arange(num_bbox, dtype=np.int32)[:, None],
+        'difficult': (np.arange(num_bbox) % 2).astype(np.int32)[:, None]
+    }
+
+
+def test_random_flip():
+    sample = make_dense_sample()
+    out = RandomFlip(prob=1.)(copy.deepcopy(sample))
+    assert np.array_equal(out['image'], sample['image'][:, ::-1])
+    assert np.allclose(out['gt_bbox'][:, 0], 640 - sample['gt_bbox'][:, 2])
+    assert np.allclose(out['gt_bbox'][:, 2], 640 - sample['gt_bbox'][:, 0])
+    twice = RandomFlip(prob=1.)(copy.deepcopy(out))
+    assert np.allclose(twice['gt_bbox'], sample['gt_bbox'])
+
+
+def test_random_expand():
+    np.random.seed(1)
+    sample = make_dense_sample()
+    out = RandomExpand(ratio=2., prob=1.)(copy.deepcopy(sample))
+    # 平移后边界框处的图像内容与原图一致
+    x1, y1 = out['gt_bbox'][0, :2] - sample['gt_bbox'][0, :2]
+    assert x1 == int(x1) and y1 == int(y1)
+    x1, y1 = int(x1), int(y1)
+    assert np.array_equal(out['image'][y1:y1 + 480, x1:x1 + 640], sample['image'])
+
+
+def test_random_crop_keeps_fields_aligned():
+    np.random.seed(2)
+    for seed in range(20):
+        sample = make_dense_sample(seed=seed)
+        out = RandomCrop(allow_no_crop=False)(copy.deepcopy(sample))
+        im_h, im_w = out['image'].shape[:2]
+        num = len(out['gt_bbox'])
+        assert num > 0
+        assert len(out['gt_class']) == num and len(out['difficult']) == num
+        # 类别序号记录了原始边界框位置，检查类别/困难标记与边界框同步筛选
+        idx = out['gt_class'][:, 0]
+        assert np.array_equal(out['difficult'][:, 0], idx % 2)
+        # 坐标范围与ClipBox一致: x: [0, w-1], y: [0, h-1]，且没有退化的边界框
+        assert (out['gt_bbox'][:, 0::2] <= im_w - 1).all() and (out['gt_bbox'][:, 1::2] <= im_h - 1).all()
+        assert (out['gt_bbox'] >= 0).all()
+        assert (out['gt_bbox'][:, 2:] > out['gt_bbox'][:, :2]).all()
+        assert np.array_equal(ClipBox()(copy.deepcopy(out))['gt_bbox'], out['gt_bbox'])
+
+
+def test_random_resize_and_fuse():
+    sizes = [[320, 480], [416, 640], [512, 768]]
+    np.random.seed(3)
+    out = RandomResize(sizes, keep_ratio=False)(make_dense_sample())
+    assert list(out['image'].shape[:2]) in sizes
+    # 翻转+缩放折叠后，边界框与逐个执行一致
+    transforms = [RandomFlip(prob=1.), Resize([320, 320], keep_ratio=False)]
+    ref = Compose(transforms, fuse=False)(make_dense_sample())
+    out = Compose(transforms, fuse=True)(make_dense_sample())
+    assert np.allclose(ref['gt_bbox'], out['gt_bbox'], atol=1e-3)
+    assert np.abs(ref['image'].astype(np.float32) - out['image']).mean() < 1.
+
+
+if __name__ == "__main__":
+    test_random_flip()
+    test_random_expand()
+    test_random_crop_keeps_fields_aligned()
+    test_random_resize_and_fuse()
+    print('test_transform_augment passed.')
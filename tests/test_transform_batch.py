@@ -0,0 +1,123 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test batched transform api
+import os
+import sys
+import copy
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Transform, stack_samples, unstack_batch, can_stack
+from transforms import Compose, NormalizeImage, Permute, ClipBox
+
+
+def _random_samples(batch_size=4, im_size=(48, 64)):
+    rng = np.random.default_rng(0)
+    samples = []
+    for idx in range(batch_size):
+        num_bbox = idx * 2 # 包含没有目标的样本
+        samples.append({
+            'im_id': idx,
+            'image': rng.integers(0, 256, im_size + (3,), dtype=np.uint8),
+            'gt_bbox': rng.uniform(-10, 80, (num_bbox, 4)).astype(np.float32),
+            'gt_class': rng.integers(0, 20, (num_bbox, 1)).astype(np.int32)
+        })
+    return samples
+
+
+class _FlipLabel(Transform):
+    # 只实现apply，用于测试apply_batch的默认逐样本回退
+    def apply(self, sample):
+        sample['gt_class'] = 19 - sample['gt_class']
+        return sample
+
+
+class _CountedClipBox(ClipBox):
+    # 记录apply_batch的调用次数，用于测试__call__的批量分派
+    num_batches = 0
+
+    def apply_batch(self, batch):
+        _CountedClipBox.num_batches += 1
+        return super(_CountedClipBox, self).apply_batch(batch)
+
+
+def test_stack_and_unstack():
+    samples = _random_samples()
+    batch = stack_samples(copy.deepcopy(samples))
+    assert batch['image'].shape == (4, 48, 64, 3)
+    assert batch['gt_bbox'].shape == (4, 6, 4)
+    assert batch['gt_num'].tolist() == [0, 2, 4, 6]
+    for sample, restored in zip(samples, unstack_batch(batch)):
+        for key in sample.keys():
+            assert np.array_equal(sample[key], restored[key])
+
+
+def test_apply_batch_matches_apply():
+    ops = [ClipBox(), _FlipLabel(), NormalizeImage(), Permute()]
+    samples = _random_samples()
+    batch = stack_samples(copy.deepcopy(samples))
+    for op in ops:
+        samples = op(samples)
+        batch = op.apply_batch(batch)
+    assert batch['image'].shape == (4, 3, 48, 64)
+    for sample, restored in zip(samples, unstack_batch(batch)):
+        assert np.allclose(sample['image'], restored['image'], atol=1e-6)
+        assert np.array_equal(sample['gt_bbox'], restored['gt_bbox'])
+        assert np.array_equal(sample['gt_class'], restored['gt_class'])
+
+
+def test_call_dispatches_to_apply_batch():
+    samples = _random_samples()
+    expected = [ClipBox().apply(copy.deepcopy(sample)) for sample in samples]
+    # 1.列表输入通过__call__分派到重载的apply_batch，结果原地写回列表
+    _CountedClipBox.num_batches = 0
+    inputs = copy.deepcopy(samples)
+    outputs = _CountedClipBox()(inputs)
+    assert outputs is inputs and _CountedClipBox.num_batches == 1
+    for sample, output in zip(expected, outputs):
+        assert sorted(sample.keys()) == sorted(output.keys())
+        assert np.array_equal(sample['gt_bbox'], output['gt_bbox'])
+    # 2.图像尺寸不一致时无法堆叠，逐样本调用apply
+    ragged = copy.deepcopy(samples)
+    ragged[0]['image'] = ragged[0]['image'][:32]
+    assert not can_stack(ragged) and can_stack(copy.deepcopy(samples))
+    _CountedClipBox()(ragged)
+    assert _CountedClipBox.num_batches == 1
+
+
+def test_compose_list_matches_single():
+    ops = [_CountedClipBox(), _FlipLabel(), NormalizeImage(), Permute()]
+    samples = _random_samples()
+    _CountedClipBox.num_batches = 0
+    singles = [Compose(ops)(copy.deepcopy(sample)) for sample in samples]
+    assert _CountedClipBox.num_batches == 0
+    # Compose以整个列表调用各预处理: 重载了apply_batch的ClipBox按批量执行
+    batched = Compose(ops)(copy.deepcopy(samples))
+    assert _CountedClipBox.num_batches == 1
+    for single, output in zip(singles, batched):
+        assert output['image'].shape == (3, 48, 64)
+        assert np.allclose(single['image'], output['image'], atol=1e-6)
+        assert np.array_equal(single['gt_bbox'], output['gt_bbox'])
+        assert np.array_equal(single['gt_class'], output['gt_class'])
+
+
+if __name__ == "__main__":
+    test_stack_and_unstack()
+    test_apply_batch_matches_apply()
+    test_call_dispatches_to_apply_batch()
+    test_compose_list_matches_single()
+    print('test_transform_batch passed.')
@@ -0,0 +1,153 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test prefix cache of transform compose
+import os
+import sys
+import tempfile
+import cv2
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Compose, CacheBoundary, SampleCache
+from transforms import DecodeImage, Resize, RandomFlip, ClipBox
+from transforms.cache import _cache_key
+
+
+class CountedDecode(DecodeImage):
+    def __init__(self):
+        super(CountedDecode, self).__init__()
+        self.num_calls = 0
+
+    def apply(self, sample):
+        self.num_calls += 1
+        return super(CountedDecode, self).apply(sample)
+
+
+def make_records(dir_path, num_files=4, seed=0):
+    rng = np.random.default_rng(seed)
+    records = []
+    for idx in range(num_files):
+        im_file = os.path.join(dir_path, '{0}.png'.format(idx))
+        cv2.imwrite(im_file, rng.integers(0, 256, (60, 80, 3), dtype=np.uint8))
+        records.append({'im_id': idx, 'im_file': im_file,
+                        'gt_bbox': np.array([[-5, 4, 30, 90]], dtype=np.float32)})
+    return records
+
+
+def run_epoch(compose, records):
+    return [compose({k: (v.copy() if isinstance(v, np.ndarray) else v)
+                     for k, v in record.items()}) for record in records]
+
+
+def test_memory_prefix_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        records = make_records(tmp_dir)
+        decode = CountedDecode()
+        compose = Compose([decode, Resize([40, 40], keep_ratio=False),
+                           CacheBoundary(), ClipBox()])
+        first = run_epoch(compose, records)
+        second = run_epoch(compose, records)
+        # 第二个epoch不再解码，结果一致
+        assert decode.num_calls == len(records)
+        assert compose.cache.stats()['hit_rate'] == 0.5
+        for a, b in zip(first, second):
+            assert np.array_equal(a['image'], b['image'])
+            assert np.array_equal(a['gt_bbox'], b['gt_bbox'])
+            assert np.allclose(b['gt_bbox'], [[0, 8. / 3, 15, 39]])
+        # 缓存中的边界框不受ClipBox原地裁剪的影响
+        assert compose.cache.get(_cache_key(records[0]))['gt_bbox'][0, 0] == -2.5
+
+
+def test_cache_byte_bound():
+    cache = SampleCache(max_bytes=2500)
+    for idx in range(4):
+        cache.put(str(idx), {'image': np.zeros((1000,), dtype=np.uint8)})
+    assert len(cache) == 2 and cache.nbytes == 2000
+    assert cache.get('0') is None and cache.get('3') is not None
+    # 最近访问的样本最后被淘汰
+    cache.get('2')
+    cache.put('4', {'image': np.zeros((1000,), dtype=np.uint8)})
+    assert cache.get('2') is not None and cache.get('3') is None
+
+
+def test_disk_prefix_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        records = make_records(tmp_dir)
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        decode = CountedDecode()
+        compose = Compose([decode, Resize([40, 40], keep_ratio=False),
+                           CacheBoundary(cache_dir=cache_dir), RandomFlip(prob=0.)])
+        first = run_epoch(compose, records)
+        # 新建的Compose(如另一个进程)直接读取磁盘缓存
+        decode2 = CountedDecode()
+        compose2 = Compose([decode2, Resize([40, 40], keep_ratio=False),
+                            CacheBoundary(cache_dir=cache_dir), RandomFlip(prob=0.)])
+        second = run_epoch(compose2, records)
+        assert decode2.num_calls == 0
+        for a, b in zip(first, second):
+            assert np.array_equal(a['image'], b['image'])
+            assert np.array_equal(a['scale_factor'], b['scale_factor'])
+        # 前缀预处理的参数改变时使用新的缓存目录
+        compose3 = Compose([DecodeImage(), Resize([48, 48], keep_ratio=False),
+                            CacheBoundary(cache_dir=cache_dir)])
+        assert compose3.cache.cache_dir != compose.cache.cache_dir
+        assert run_epoch(compose3, records[:1])[0]['image'].shape == (48, 48, 3)
+
+
+def test_shared_cache_dir_datasets():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 两个数据集(如训练集与验证集、两个分片)的im_id都从0开始编号
+        os.makedirs(os.path.join(tmp_dir, 'train'))
+        os.makedirs(os.path.join(tmp_dir, 'eval'))
+        train = make_records(os.path.join(tmp_dir, 'train'), seed=0)
+        evals = make_records(os.path.join(tmp_dir, 'eval'), seed=1)
+        evals[0]['gt_bbox'] = np.array([[1, 2, 3, 4]], dtype=np.float32)
+        assert [r['im_id'] for r in train] == [r['im_id'] for r in evals]
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        prefix = lambda: [DecodeImage(), Resize([40, 40], keep_ratio=False)]
+        run_epoch(Compose(prefix() + [CacheBoundary(cache_dir=cache_dir)]), train)
+        # 按图像路径缓存: 验证集不会读到训练集的图像与边界框
+        expected = run_epoch(Compose(prefix()), evals)
+        outputs = run_epoch(Compose(prefix() + [CacheBoundary(cache_dir=cache_dir)]), evals)
+        for a, b in zip(expected, outputs):
+            assert np.array_equal(a['image'], b['image'])
+            assert np.array_equal(a['gt_bbox'], b['gt_bbox'])
+        # 没有im_file时按im_id缓存，dataset_id隔离共用cache_dir的数据集
+        def without_file(records):
+            samples = run_epoch(Compose(prefix()), records)
+            for sample in samples:
+                sample.pop('im_file')
+            return samples
+        train_ops = Compose([Resize([20, 20], keep_ratio=False),
+                             CacheBoundary(cache_dir=cache_dir, dataset_id='train')])
+        eval_ops = Compose([Resize([20, 20], keep_ratio=False),
+                            CacheBoundary(cache_dir=cache_dir, dataset_id='eval')])
+        assert train_ops.cache.cache_dir != eval_ops.cache.cache_dir
+        run_epoch(train_ops, without_file(train))
+        expected = run_epoch(Compose([Resize([20, 20], keep_ratio=False)]), without_file(evals))
+        outputs = run_epoch(eval_ops, without_file(evals))
+        assert eval_ops.cache.hits == 0
+        for a, b in zip(expected, outputs):
+            assert np.array_equal(a['image'], b['image'])
+
+
+if __name__ == "__main__":
+    test_memory_prefix_cache()
+    test_cache_byte_bound()
+    test_disk_prefix_cache()
+    test_shared_cache_dir_datasets()
+    print('test_transform_cache passed.')
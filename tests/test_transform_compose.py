@@ -0,0 +1,69 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test fused transform compose
+import os
+import sys
+import copy
+import cv2
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Compose, Resize, NormalizeImage, Permute
+
+
+def _make_sample(im_size=(480, 640)):
+    rng = np.random.default_rng(0)
+    # 平滑后的随机图像，近似自然图像的局部连续性
+    image = cv2.GaussianBlur(rng.integers(0, 256, im_size + (3,), dtype=np.uint8), (7, 7), 0)
+    return {
+        'image': image,
+        'gt_bbox': np.array([[10, 20, 300, 400], [0, 0, 639, 479]], dtype=np.float32)
+    }
+
+
+def _run(transforms, fuse):
+    return Compose(transforms, fuse=fuse)(_make_sample())
+
+
+def test_fuse_normalize_permute():
+    transforms = [Resize([800, 1333]), NormalizeImage(), Permute()]
+    fused = Compose(transforms, fuse=True)
+    assert [op.name for op in fused.ops] == ['Resize', 'Fused[NormalizeImage+Permute]']
+    ref, out = _run(transforms, False), _run(transforms, True)
+    assert out['image'].dtype == np.float32 and out['image'].shape == (3, 800, 1067)
+    assert np.allclose(ref['image'], out['image'], atol=1e-5)
+    assert np.allclose(ref['gt_bbox'], out['gt_bbox'])
+
+
+def test_fuse_affine_chain():
+    transforms = [Resize([600, 1000]), Resize([320, 320], keep_ratio=False),
+                  NormalizeImage(), Permute()]
+    fused = Compose(transforms, fuse=True)
+    assert fused.ops[0].name == 'Fused[Resize+Resize]'
+    ref, out = _run(transforms, False), _run(transforms, True)
+    assert ref['image'].shape == out['image'].shape
+    # 一次重采样与两次重采样之间仅存在插值误差(归一化后的数值)
+    assert np.abs(ref['image'] - out['image']).mean() < 0.05
+    # 边界框与scale_factor使用同一个仿射矩阵，结果一致
+    assert np.allclose(ref['gt_bbox'], out['gt_bbox'], atol=1e-3)
+    assert np.allclose(ref['scale_factor'], out['scale_factor'])
+
+
+if __name__ == "__main__":
+    test_fuse_normalize_permute()
+    test_fuse_affine_chain()
+    print('test_transform_compose passed.')
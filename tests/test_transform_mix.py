@@ -0,0 +1,135 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test mosaic/mixup ops with ring buffer and canvas pool
+import os
+import sys
+import copy
+import pickle
+import cv2
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Compose, DecodeImage, Mosaic, MixUp, CanvasPool, SampleRingBuffer
+
+
+def make_sample(value, im_size=(200, 300)):
+    im_h, im_w = im_size
+    return {
+        'image': np.full(im_size + (3,), value, dtype=np.uint8),
+        'gt_bbox': np.array([[0, 0, im_w, im_h], [10, 10, 50, 40]], dtype=np.float32),
+        'gt_class': np.array([[value], [value]], dtype=np.int32)
+    }
+
+
+def test_canvas_pool_reuse():
+    pool = CanvasPool(max_size=2)
+    canvas = pool.acquire((4, 4, 3))
+    held = canvas[1:3].reshape(-1)[2:] # 视图的视图仍引用画布
+    del canvas
+    other = pool.acquire((4, 4, 3))
+    assert not np.shares_memory(held, other)
+    assert pool.num_allocs == 2 and pool.num_reuses == 0
+    del held
+    again = pool.acquire((4, 4, 3))
+    assert pool.num_reuses == 1 and not np.shares_memory(again, other)
+    # 池满且没有空闲画布时临时申请
+    extra = pool.acquire((4, 4, 3))
+    assert pool.num_allocs == 3 and not np.shares_memory(extra, again)
+    assert type(extra) is np.ndarray and type(again) is np.ndarray
+
+
+def test_mosaic_boxes():
+    np.random.seed(0)
+    op = Mosaic(target_size=[320, 480], center_range=[0.5, 0.5])
+    first = op(make_sample(1))
+    assert first['image'].shape == (200, 300, 3) # 缓冲区为空时不拼接
+    for value in [2, 3, 4]:
+        out = op(make_sample(value))
+    assert out['image'].shape == (320, 480, 3)
+    assert np.all(out['gt_bbox'][:, 0::2] >= 0) and np.all(out['gt_bbox'][:, 0::2] <= 480 - 1)
+    assert np.all(out['gt_bbox'][:, 1::2] >= 0) and np.all(out['gt_bbox'][:, 1::2] <= 320 - 1)
+    assert len(out['gt_bbox']) == 8 and len(out['gt_class']) == 8
+    # 整图边界框按缩放系数0.8贴靠中心(240, 160)，四个象限覆盖整张画布
+    assert np.allclose(out['gt_bbox'][0], [0, 0, 240, 160])
+    # 当前样本贴在左上象限，图像内容与边界框类别一致
+    assert out['image'][80, 120, 0] == 4 and out['gt_class'][0, 0] == 4
+    assert np.all(out['image'] != 114)
+    # 缓冲样本不少于3个时，3个混合对象互不相同且不包含当前样本
+    assert sorted(out['gt_class'][2::2, 0].tolist()) == [1, 2, 3]
+    stats = op.stats()
+    assert stats['mixed'] == 3 and stats['images_per_output'] == (4 + 3 * 3) / 4.
+
+
+def test_mosaic_decodes_per_output():
+    np.random.seed(0)
+    decode = DecodeImage()
+    pipeline = Compose([decode, Mosaic(target_size=128), MixUp(prob=1.)])
+    for value in range(20):
+        sample = make_sample(value)
+        sample['image'] = cv2.imencode('.png', sample['image'])[1].tobytes()
+        out = pipeline(sample)
+    assert out['image'].shape == (128, 128, 3)
+    # 混合对象取自缓冲区: 每个输出样本只解码一张图像
+    assert decode.num_decodes == 20
+
+
+def test_mosaic_canvas_reuse():
+    np.random.seed(0)
+    op = Mosaic(target_size=256)
+    for value in range(10):
+        # 输出样本不被保留时，画布在下一次调用中复用
+        op(make_sample(value))
+    assert op.pool.num_allocs == 1 and op.pool.num_reuses == 8
+    outputs = [op(make_sample(value)) for value in range(3)]
+    images = set([id(out['image']) for out in outputs])
+    assert len(images) == 3
+
+
+def test_mixup_scores():
+    np.random.seed(0)
+    op = MixUp(prob=1.)
+    first = op(make_sample(10))
+    assert first['image'].dtype == np.uint8 # 缓冲区为空时不混合
+    out = op(make_sample(200, im_size=(240, 280)))
+    assert out['image'].shape == (240, 300, 3) and out['image'].dtype == np.float32
+    scores = out['gt_score'][:, 0]
+    assert len(scores) == 4 and np.isclose(scores[0] + scores[2], 1.)
+    factor = scores[0]
+    assert np.isclose(out['image'][0, 0, 0], 200 * factor + 10 * (1. - factor))
+    assert np.isclose(out['image'][0, 290, 0], 10 * (1. - factor))
+
+
+def test_ring_buffer_pickle():
+    buffer = SampleRingBuffer(capacity=2)
+    for value in range(3):
+        buffer.push(make_sample(value))
+    assert len(buffer) == 2
+    # 最早写入的样本已被覆盖
+    assert min([entry['gt_class'][0, 0] for entry in buffer.draw(50)]) >= 1
+    # 缓冲样本足够时不放回抽取
+    assert sorted([entry['gt_class'][0, 0] for entry in buffer.draw(2)]) == [1, 2]
+    assert len(pickle.loads(pickle.dumps(buffer))) == 0
+
+
+if __name__ == "__main__":
+    test_canvas_pool_reuse()
+    test_mosaic_boxes()
+    test_mosaic_decodes_per_output()
+    test_mosaic_canvas_reuse()
+    test_mixup_scores()
+    test_ring_buffer_pickle()
+    print('test_transform_mix passed.')
@@ -0,0 +1,98 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test lookup-table normalization fast paths
+import os
+import sys
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import Compose, NormalizeImage, LUTNormalizeImage, Permute, stack_samples
+
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def reference(image):
+    return (image.astype(np.float32) / 255. - MEAN) / STD
+
+
+def make_image(seed=0, im_size=(37, 53)):
+    return np.random.default_rng(seed).integers(0, 256, im_size + (3,), dtype=np.uint8)
+
+
+def test_lut_normalize_paths():
+    image = make_image()
+    expected = reference(image)
+    # 1.uint8查表: HWC与CHW输出
+    out = LUTNormalizeImage()({'image': image})['image']
+    assert out.dtype == np.float32 and np.allclose(out, expected, atol=1e-5)
+    out = LUTNormalizeImage(to_chw=True)({'image': image})['image']
+    assert out.shape == (3, 37, 53) and np.allclose(out, expected.transpose((2, 0, 1)), atol=1e-5)
+    # 2.非uint8输入退化为乘加
+    out = LUTNormalizeImage(to_chw=True)({'image': image.astype(np.float32)})['image']
+    assert np.allclose(out, expected.transpose((2, 0, 1)), atol=1e-5)
+    # 3.批量数据
+    images = [make_image(seed) for seed in range(3)]
+    batch = stack_samples([{'image': im} for im in images])
+    out = LUTNormalizeImage(to_chw=True).apply_batch(batch)['image']
+    assert out.shape == (3, 3, 37, 53)
+    assert np.allclose(out, np.stack([reference(im) for im in images]).transpose((0, 3, 1, 2)), atol=1e-5)
+    batch = stack_samples([{'image': im} for im in images])
+    out = LUTNormalizeImage().apply_batch(batch)['image']
+    assert np.allclose(out, np.stack([reference(im) for im in images]), atol=1e-5)
+
+
+def test_lut_normalize_inplace():
+    op = LUTNormalizeImage(to_chw=True, inplace=True)
+    first = op({'image': make_image(0)})['image']
+    # 输出仍被引用时不会被覆盖
+    second = op({'image': make_image(1)})['image']
+    assert first is not second
+    assert np.allclose(first, reference(make_image(0)).transpose((2, 0, 1)), atol=1e-5)
+    del first, second
+    for seed in range(5):
+        out = op({'image': make_image(seed)})['image']
+        del out
+    assert op.pool.num_allocs == 2 and op.pool.num_reuses == 5
+
+
+def test_compose_fuse_lut_permute():
+    image = make_image()
+    compose = Compose([LUTNormalizeImage(), Permute()])
+    assert len(compose.ops) == 1 and compose.ops[0].to_chw
+    out = compose({'image': image})['image']
+    assert np.allclose(out, reference(image).transpose((2, 0, 1)), atol=1e-5)
+    # 原预处理不受折叠影响
+    assert not compose.transforms[0].to_chw
+
+
+def test_normalize_row_coeffs_bounded():
+    op = NormalizeImage(max_row_coeffs=4)
+    # 多尺度输入: 平铺系数按宽度LRU缓存，数量不超过max_row_coeffs
+    for width in list(range(40, 50)) + [47, 40]:
+        image = make_image(seed=width, im_size=(5, width))
+        out = op({'image': image})['image']
+        assert np.allclose(out, reference(image), atol=1e-5)
+    assert list(op._row_coeffs.keys()) == [48, 49, 47, 40]
+
+
+if __name__ == "__main__":
+    test_lut_normalize_paths()
+    test_lut_normalize_inplace()
+    test_compose_fuse_lut_permute()
+    test_normalize_row_coeffs_bounded()
+    print('test_transform_normalize passed.')
@@ -0,0 +1,79 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test transform profiler
+import os
+import sys
+import tempfile
+import multiprocessing
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+from transforms import transform_profiler
+from transforms import Compose, Resize, NormalizeImage, Permute
+
+
+def _make_sample(idx=0):
+    rng = np.random.default_rng(idx)
+    return {'image': rng.integers(0, 256, (64, 96, 3), dtype=np.uint8),
+            'gt_bbox': np.array([[1, 2, 30, 40]], dtype=np.float32)}
+
+
+def _worker(idx):
+    compose = Compose([Resize([32, 48]), NormalizeImage(), Permute()], fuse=False)
+    for i in range(5):
+        compose(_make_sample(idx * 10 + i))
+    return idx
+
+
+def test_profiler_single_process():
+    transform_profiler.enable()
+    transform_profiler.reset()
+    compose = Compose([Resize([32, 48]), NormalizeImage(), Permute()], fuse=False)
+    for idx in range(4):
+        compose(_make_sample(idx))
+    report = transform_profiler.report()
+    transform_profiler.disable()
+    assert report['Compose']['calls'] == 4
+    for name in ['Resize', 'NormalizeImage', 'Permute']:
+        assert report[name]['calls'] == 4
+        assert report[name]['avg_ms'] > 0
+    # NormalizeImage输出: 32x48x3的float32图像 + 1个边界框 + im_shape + scale_factor
+    assert abs(report['NormalizeImage']['avg_kb'] - (32 * 48 * 3 * 4 + 16 + 8 + 8) / 1024.) < 1e-6
+    assert abs(sum([v['time_ratio'] for v in report.values()]) - 1.) < 1e-6
+    print(transform_profiler.summary())
+
+
+def test_profiler_worker_processes():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        transform_profiler.enable(dump_dir=tmp_dir)
+        transform_profiler.reset()
+        pool = multiprocessing.get_context('fork').Pool(2)
+        pool.map(_worker, range(4))
+        pool.close()
+        pool.join()
+        report = transform_profiler.report()
+        transform_profiler.disable()
+        transform_profiler.dump_dir = None
+        # 4个任务x5个样本，分布在两个worker进程中
+        assert report['Resize']['calls'] == 20
+        assert report['Compose']['calls'] == 20
+
+
+if __name__ == "__main__":
+    test_profiler_single_process()
+    test_profiler_worker_processes()
+    print('test_transform_profiler passed.')
@@ -0,0 +1,137 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test transform serialization and registry
+import os
+import sys
+import copy
+import json
+import pickle
+import multiprocessing
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证transforms正常调用
+sys.path.append( os.getcwd() )
+
+import transforms
+from transforms import Compose, Transform, Resize, RandomFlip, RandomExpand, NormalizeImage, Permute, Mosaic
+from transforms import TRANSFORM_REGISTRY, transform_key, transform_to_config, transform_from_config
+from transforms import dumps_transform, loads_transform, transform_fingerprint
+
+
+class ScaleImage(Transform):
+    # 定义在transforms之外的预处理: worker进程需要按配置导入本模块
+    def __init__(self, scale: float=1.) -> None:
+        super(ScaleImage, self).__init__()
+        self.scale = scale
+
+    def apply(self, sample):
+        sample['image'] = sample['image'] * self.scale
+        return sample
+
+
+def build_pipeline(target_size=[96, 128]):
+    return Compose([RandomExpand(ratio=2., prob=0.), Resize(target_size),
+                    RandomFlip(prob=0.), NormalizeImage(), Permute()])
+
+
+def make_sample():
+    return {'image': np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8),
+            'gt_bbox': np.array([[5, 5, 40, 50]], dtype=np.float32)}
+
+
+def test_config_roundtrip():
+    pipeline = build_pipeline()
+    text = dumps_transform(pipeline)
+    rebuilt = loads_transform(text)
+    assert dumps_transform(rebuilt) == text
+    assert [op.name for op in rebuilt.ops] == [op.name for op in pipeline.ops]
+    assert np.allclose(rebuilt(make_sample())['image'], pipeline(make_sample())['image'])
+    # 指纹只与配置有关
+    assert transform_fingerprint(rebuilt) == transform_fingerprint(pipeline)
+    assert transform_fingerprint(build_pipeline([128, 128])) != transform_fingerprint(pipeline)
+    assert transform_key(Compose) in TRANSFORM_REGISTRY and transform_key(Mosaic) in TRANSFORM_REGISTRY
+    # 配置按"模块:类名"记录类型
+    assert transform_to_config(Resize([64, 64]))['type'] == transform_key(Resize) == \
+        '{0}:Resize'.format(Resize.__module__)
+    # 不含模块的类名在唯一匹配时仍可重建
+    assert isinstance(transform_from_config({'type': 'Resize', 'params': {'target_size': 64}}), Resize)
+
+
+def test_same_name_transforms():
+    class NormalizeImage(Transform):
+        def apply(self, sample):
+            return sample
+
+    local_key = transform_key(NormalizeImage)
+    try:
+        # 不同模块中的同名预处理互不覆盖
+        assert TRANSFORM_REGISTRY[local_key] is NormalizeImage
+        assert TRANSFORM_REGISTRY[transform_key(transforms.NormalizeImage)] is transforms.NormalizeImage
+        assert type(loads_transform(dumps_transform(build_pipeline())).transforms[3]) is transforms.NormalizeImage
+        assert type(loads_transform(dumps_transform(NormalizeImage()))) is NormalizeImage
+        # 不含模块的类名不唯一时报错
+        try:
+            transform_from_config({'type': 'NormalizeImage', 'params': {}})
+            assert False
+        except KeyError as e:
+            assert 'ambiguous' in str(e)
+    finally:
+        del TRANSFORM_REGISTRY[local_key]
+
+
+def test_pickle_keeps_state_config_ships_params():
+    op = NormalizeImage()
+    for width in range(32, 64):
+        op({'image': np.zeros((2, width, 3), dtype=np.uint8)})
+    assert len(op._row_coeffs) == 32
+    # 按配置序列化只传递构造参数，运行时缓存不传递
+    text = dumps_transform(op)
+    rebuilt = loads_transform(text)
+    assert len(rebuilt._row_coeffs) == 0 and rebuilt.mean == op.mean
+    assert len(text) < 512
+    mosaic = Mosaic(target_size=64, buffer_size=4)
+    mosaic.buffer.push(make_sample())
+    assert len(loads_transform(dumps_transform(mosaic)).buffer) == 0
+    # pickle与copy模块保持按状态复制
+    assert len(pickle.loads(pickle.dumps(op))._row_coeffs) == 32
+    assert len(copy.deepcopy(op)._row_coeffs) == 32
+    assert copy.copy(op)._row_coeffs is op._row_coeffs
+
+
+def test_spawn_worker_rebuild():
+    pipeline = Compose([build_pipeline(), ScaleImage(scale=0.5)])
+    expected = pipeline(make_sample())['image']
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        # worker只导入transforms.registry，ScaleImage所在模块按配置导入
+        rebuilt = pool.apply(loads_transform, (dumps_transform(pipeline), ))
+        assert type(rebuilt.ops[-1]) is ScaleImage
+        np.testing.assert_allclose(rebuilt(make_sample())['image'], expected)
+        # 找不到预处理时异常返回主进程，而不是使worker退出
+        for name, error in [('no_such_module:ScaleImage', ImportError),
+                            ('{0}:NoSuchImage'.format(ScaleImage.__module__), KeyError)]:
+            try:
+                pool.apply(loads_transform, (json.dumps({'type': name, 'params': {}}), ))
+                assert False
+            except error:
+                pass
+
+
+if __name__ == "__main__":
+    test_config_roundtrip()
+    test_same_name_transforms()
+    test_pickle_keeps_state_config_ships_params()
+    test_spawn_worker_rebuild()
+    print('test_transform_registry passed.')
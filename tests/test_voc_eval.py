@@ -0,0 +1,199 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# Test voc evaluator with difficult flags
+import os
+import sys
+import numpy as np
+
+# 设置当前KFPDetection包路径:
+# 保证metrics正常调用
+sys.path.append( os.getcwd() )
+
+from metrics import VOCEvaluator
+
+
+def make_voc_set(num_images=100, num_classes=20, seed=0):
+    """生成真实框(含difficult)与检测结果: 抖动的真实框、重复框与误检"""
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in range(num_images):
+        num_gt = rng.randint(0, 8)
+        ctr = rng.uniform(0, 500, (num_gt, 2))
+        wh = rng.uniform(10, 250, (num_gt, 2))
+        gt_bbox = np.round(np.concatenate([ctr - wh / 2, ctr + wh / 2], axis=1)).astype(np.float32)
+        gt_class = rng.randint(0, num_classes, (num_gt, 1)).astype(np.int32)
+        difficult = (rng.uniform(size=(num_gt, 1)) < 0.15).astype(np.int32)
+        dets = []
+        for g in range(num_gt):
+            for _ in range(rng.randint(0, 4)):
+                jitter = rng.normal(0, 0.1, 4) * np.tile(wh[g], 2)
+                label = gt_class[g, 0] if rng.uniform() < 0.9 else rng.randint(0, num_classes)
+                dets.append([label, rng.uniform(0.05, 1.)] + (gt_bbox[g] + jitter).tolist())
+        for _ in range(rng.randint(0, 5)):
+            c, s = rng.uniform(0, 500, 2), rng.uniform(10, 200, 2)
+            dets.append([rng.randint(0, num_classes), rng.uniform(0.05, 0.6)] +
+                        [c[0] - s[0] / 2, c[1] - s[1] / 2, c[0] + s[0] / 2, c[1] + s[1] / 2])
+        dets = np.asarray(dets, dtype=np.float32).reshape(-1, 6)
+        dets[:, 1] = np.round(dets[:, 1], 2) # 同分的检测
+        images.append((dets, gt_bbox, gt_class, difficult))
+    return images
+
+
+def reference_voc_ap(rec, prec, use_07_metric):
+    """VOC devkit(py-faster-rcnn voc_eval.py)的voc_ap"""
+    if use_07_metric:
+        ap = 0.
+        for t in np.arange(0., 1.1, 0.1):
+            p = 0 if np.sum(rec >= t) == 0 else np.max(prec[rec >= t])
+            ap = ap + p / 11.
+        return ap
+    mrec = np.concatenate(([0.], rec, [1.]))
+    mpre = np.concatenate(([0.], prec, [0.]))
+    for i in range(mpre.size - 1, 0, -1):
+        mpre[i - 1] = np.maximum(mpre[i - 1], mpre[i])
+    i = np.where(mrec[1:] != mrec[:-1])[0]
+    return np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1])
+
+
+def reference_voc_eval(images, num_classes, ovthresh=0.5, use_07_metric=True):
+    """逐类别、逐检测框移植VOC devkit voc_eval的参考实现(得分相同时按输入顺序)"""
+    aps = -np.ones((num_classes, ))
+    for c in range(num_classes):
+        class_recs, npos = [], 0
+        image_ids, confidence, BB = [], [], []
+        for i, (dets, gt_bbox, gt_class, difficult) in enumerate(images):
+            sel = gt_class[:, 0] == c
+            R = {'bbox': gt_bbox[sel].astype(np.float64), 'difficult': difficult[sel, 0].astype(bool),
+                 'det': [False] * int(sel.sum())}
+            npos += int((~R['difficult']).sum())
+            class_recs.append(R)
+            d = dets[dets[:, 0] == c]
+            image_ids += [i] * d.shape[0]
+            confidence.append(d[:, 1])
+            BB.append(d[:, 2:].astype(np.float64))
+        if npos == 0:
+            continue
+        confidence, BB = np.concatenate(confidence), np.concatenate(BB)
+        sorted_ind = np.argsort(-confidence, kind='stable')
+        BB = BB[sorted_ind]
+        image_ids = [image_ids[x] for x in sorted_ind]
+        nd = len(image_ids)
+        tp, fp = np.zeros(nd), np.zeros(nd)
+        for d in range(nd):
+            R = class_recs[image_ids[d]]
+            bb = BB[d, :]
+            ovmax = -np.inf
+            BBGT = R['bbox']
+            if BBGT.size > 0:
+                ixmin = np.maximum(BBGT[:, 0], bb[0])
+                iymin = np.maximum(BBGT[:, 1], bb[1])
+                ixmax = np.minimum(BBGT[:, 2], bb[2])
+                iymax = np.minimum(BBGT[:, 3], bb[3])
+                iw = np.maximum(ixmax - ixmin + 1., 0.)
+                ih = np.maximum(iymax - iymin + 1., 0.)
+                inters = iw * ih
+                uni = ((bb[2] - bb[0] + 1.) * (bb[3] - bb[1] + 1.) +
+                       (BBGT[:, 2] - BBGT[:, 0] + 1.) * (BBGT[:, 3] - BBGT[:, 1] + 1.) - inters)
+                overlaps = inters / uni
+                ovmax = np.max(overlaps)
+                jmax = np.argmax(overlaps)
+            if ovmax > ovthresh:
+                if not R['difficult'][jmax]:
+                    if not R['det'][jmax]:
+                        tp[d] = 1.
+                        R['det'][jmax] = 1
+                    else:
+                        fp[d] = 1.
+            else:
+                fp[d] = 1.
+        fp, tp = np.cumsum(fp), np.cumsum(tp)
+        rec = tp / float(npos)
+        prec = tp / np.maximum(tp + fp, np.finfo(np.float64).eps)
+        aps[c] = reference_voc_ap(rec, prec, use_07_metric)
+    return aps
+
+
+def evaluate(images, num_classes, batch_size=4, **kwargs):
+    evaluator = VOCEvaluator(num_classes, **kwargs)
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        evaluator.update([b[0] for b in batch], [b[1] for b in batch],
+                         [b[2] for b in batch], difficult=[b[3] for b in batch])
+    evaluator.accumulate()
+    return evaluator
+
+
+def test_matches_reference():
+    images = make_voc_set()
+    evaluator = evaluate(images, 20)
+    np.testing.assert_allclose(evaluator.ap_11point, reference_voc_eval(images, 20, use_07_metric=True),
+                               atol=1e-12)
+    np.testing.assert_allclose(evaluator.ap_area, reference_voc_eval(images, 20, use_07_metric=False),
+                               atol=1e-12)
+    for ovthresh in [0.3, 0.7]:
+        evaluator = evaluate(images, 20, batch_size=1, iou_threshold=ovthresh)
+        np.testing.assert_allclose(evaluator.ap_11point, reference_voc_eval(images, 20, ovthresh), atol=1e-12)
+
+
+def test_known_values():
+    # TP(0.9), FP(0.8), TP(0.7)，2个真实框
+    gt_bbox = np.array([[0, 0, 99, 99], [300, 300, 399, 399]], dtype=np.float32)
+    dets = np.array([[0, 0.9, 0, 0, 99, 99],
+                     [0, 0.8, 500, 500, 599, 599],
+                     [0, 0.7, 300, 300, 399, 399]], dtype=np.float32)
+    evaluator = VOCEvaluator(1)
+    evaluator.update(dets, gt_bbox, np.zeros((2, 1)))
+    stats = evaluator.summarize()
+    assert abs(stats['mAP_11point'] - (6 + 5 * 2. / 3) / 11) < 1e-12
+    assert abs(stats['mAP_area'] - (0.5 + 0.5 * 2. / 3)) < 1e-12
+    assert stats['mAP'] == stats['mAP_11point']
+
+
+def test_difficult_ignored():
+    gt_bbox = np.array([[0, 0, 99, 99], [300, 300, 399, 399]], dtype=np.float32)
+    difficult = np.array([[0], [1]])
+    # 匹配到difficult真实框的检测(0.95)既不是TP也不是FP
+    dets = np.array([[0, 0.95, 300, 300, 399, 399],
+                     [0, 0.9, 0, 0, 99, 99]], dtype=np.float32)
+    evaluator = VOCEvaluator(1, ap_type='area')
+    evaluator.update(dets, gt_bbox, np.zeros((2, 1)), difficult=difficult)
+    assert evaluator.num_gts[0] == 1 and len(evaluator.records) == 1
+    assert abs(evaluator.summarize()['mAP'] - 1.) < 1e-12
+    # evaluate_difficult: difficult真实框作为普通真实框
+    evaluator = VOCEvaluator(1, ap_type='area', evaluate_difficult=True)
+    evaluator.update(dets, gt_bbox, np.zeros((2, 1)), difficult=difficult)
+    assert evaluator.num_gts[0] == 2 and abs(evaluator.summarize()['mAP'] - 1.) < 1e-12
+    # 重复检测同一真实框: 得分最高的为TP，其余为FP
+    dets = np.array([[0, 0.5, 1, 1, 99, 99],
+                     [0, 0.9, 0, 0, 99, 99]], dtype=np.float32)
+    evaluator = VOCEvaluator(1)
+    evaluator.update(dets, gt_bbox[:1], np.zeros((1, 1)))
+    assert evaluator.records['tp'].tolist() == [True, False]
+
+
+def test_empty():
+    evaluator = VOCEvaluator(3)
+    evaluator.update([np.zeros((0, 6))], [np.zeros((0, 4))], [np.zeros((0, 1))])
+    assert evaluator.summarize()['mAP'] == -1.
+    evaluator.update([np.array([[0, 0.5, 0, 0, 10, 10]])], [np.array([[0, 0, 50, 50]])], [np.array([[1]])])
+    assert evaluator.summarize()['mAP'] == 0.
+    assert evaluator.class_ap().tolist() == [-1., 0., -1.]
+
+
+if __name__ == "__main__":
+    test_matches_reference()
+    test_known_values()
+    test_difficult_ignored()
+    test_empty()
+    print("test_voc_eval passed.")
@@ -11,6 +11,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from operator import *
+from .profiler import *
+from .registry import *
+from .operator import *
+from .transform_ops import *
+from .arch_transform_ops import *
+from .cache import *
+from .transform import *
 
-__all__ = ['operator']
\ No newline at end of file
+__all__ = ['profiler', 'registry', 'operator', 'transform_ops', 'arch_transform_ops', 'cache', 'transform']
\ No newline at end of file
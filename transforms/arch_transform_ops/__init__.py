@@ -11,3 +11,10 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# includes: architecture-specific transform ops init module
+from .location_cache import *
+from .fcos_ops import *
+from .batch_ops import *
+
+__all__ = ['fcos_feature_sizes', 'fcos_locations', 'FCOSLocationCache',
+           'fcos_location_cache', 'FCOSTarget', 'BatchRandomResize', 'PadBatch']
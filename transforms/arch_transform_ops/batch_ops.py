@@ -0,0 +1,204 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: batch-level resize/pad ops
+# 批量级多尺度缩放:
+# 每个批量只采样一次目标尺度，批内所有样本缩放到同一尺度，
+# 配合按宽高比分桶的批量采样(datasets.AspectRatioBatchSampler)减少补零像素
+import sys
+import cv2
+import numpy as np
+
+from typing import Dict, List, Union, Any
+
+from ..operator import Transform
+from ..transform_ops import Resize
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['BatchRandomResize', 'PadBatch']
+
+
+class BatchRandomResize(Transform):
+    def __init__(self,
+                 target_sizes: List[Union[int, List[int]]],
+                 keep_ratio: bool=True,
+                 interp: int=cv2.INTER_LINEAR) -> None:
+        """批量级多尺度随机缩放: 每个批量随机选择一个目标尺寸
+            desc:
+                Parameters:
+                    target_sizes: 候选目标尺寸(list(int or list(int)))
+                    keep_ratio: 是否保持宽高比(bool)
+                    interp: 插值方式(int)——cv2.INTER_*
+                Returns:
+                    None
+                Others:
+                    - 输入为样本列表(批量)时整个列表共用一个目标尺寸，
+                      输入为单个样本时每次随机选择
+                    - 缩放本身与Resize一致(更新边界框、im_shape与scale_factor)
+        """
+        super(BatchRandomResize, self).__init__()
+        if len(target_sizes) == 0:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The target_sizes should contain at least one size.")
+                sys.exit(1)
+        self.target_sizes = [[size, size] if isinstance(size, int) else size
+                             for size in target_sizes]
+        self.keep_ratio = keep_ratio
+        self.interp = interp
+        self.resize = Resize(target_size=self.target_sizes[0],
+                             keep_ratio=keep_ratio,
+                             interp=interp)
+
+    def _sample_size(self) -> None:
+        # 每次调用(一个批量或一个样本)只选择一次目标尺寸
+        self.resize.target_size = self.target_sizes[np.random.randint(len(self.target_sizes))]
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """随机选择目标尺寸缩放单样本
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        self._sample_size()
+        return self.resize.apply(sample)
+
+    def apply_samples(self,
+                      samples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """为整个批量选择一个目标尺寸后缩放
+            desc:
+                Parameters:
+                    samples: 批量样本数据(list(dict))
+                Returns:
+                    (List[Dict[str, Any]])处理后的样本数据列表
+        """
+        self._sample_size()
+        return self.resize.apply_samples(samples)
+
+
+class PadBatch(Transform):
+    def __init__(self,
+                 size_divisor: int=32,
+                 fill_value: float=0.,
+                 data_format: str='HWC') -> None:
+        """批量补零: 批内图像补到相同尺寸(右侧与下方补零)
+            desc:
+                Parameters:
+                    size_divisor: 补零后的高宽需要整除的数(int)——1表示不要求
+                    fill_value: 补零值(float)
+                    data_format: 图像格式(str)——'HWC'或'CHW'(位于Permute之后时)
+                Returns:
+                    None
+                Others:
+                    - 输入为样本列表时补到批内最大尺寸，单个样本只补到size_divisor的整数倍
+                    - 统计补零像素比例: padded_ratio()
+        """
+        super(PadBatch, self).__init__()
+        if data_format not in ('HWC', 'CHW'):
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The data_format should be 'HWC' or 'CHW'.(got '{0}')".format(data_format))
+                sys.exit(1)
+        self.size_divisor = size_divisor
+        self.fill_value = fill_value
+        self.data_format = data_format
+        self.num_pixels = 0 # 补零后的总像素数
+        self.num_padded = 0 # 其中补零的像素数
+
+    def apply_samples(self,
+                      samples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量补零: 补到批内最大尺寸(向上取size_divisor的整数倍)
+            desc:
+                Parameters:
+                    samples: 批量样本数据(list(dict))
+                Returns:
+                    (List[Dict[str, Any]])处理后的样本数据列表
+        """
+        if len(samples) == 0:
+            return samples
+        chw = self.data_format == 'CHW'
+        sizes = np.asarray([s['image'].shape[1:3] if chw else s['image'].shape[:2]
+                            for s in samples])
+        divisor = max(1, self.size_divisor)
+        max_h, max_w = (np.ceil(sizes.max(axis=0) / divisor) * divisor).astype(int)
+        samples = [self._pad(sample, int(max_h), int(max_w), chw) for sample in samples]
+        self.num_pixels += len(samples) * int(max_h) * int(max_w)
+        self.num_padded += len(samples) * int(max_h) * int(max_w) - int(np.prod(sizes, axis=1).sum())
+        return samples
+
+    def _pad(self,
+             sample: Dict[str, Any],
+             max_h: int,
+             max_w: int,
+             chw: bool) -> Dict[str, Any]:
+        """补零单样本图像
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)
+                    max_h: 补零后的高(int)
+                    max_w: 补零后的宽(int)
+                    chw: 图像是否为CHW格式(bool)
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        image = sample['image']
+        im_h, im_w = image.shape[1:3] if chw else image.shape[:2]
+        if (im_h, im_w) == (max_h, max_w):
+            return sample
+        if chw:
+            padded = np.full((image.shape[0], max_h, max_w), self.fill_value, dtype=image.dtype)
+            padded[:, :im_h, :im_w] = image
+        else:
+            padded = cv2.copyMakeBorder(image, 0, max_h - im_h, 0, max_w - im_w,
+                                        cv2.BORDER_CONSTANT, value=(self.fill_value, ) * 4)
+            if padded.ndim < image.ndim:
+                padded = padded[..., None]
+        sample['image'] = padded
+        return sample
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """单样本补零: 只补到size_divisor的整数倍
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        return self.apply_samples([sample])[0]
+
+    def padded_ratio(self) -> float:
+        """补零像素占补零后总像素的比例
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (float)补零像素比例
+        """
+        return self.num_padded / self.num_pixels if self.num_pixels > 0 else 0.
+
+    def reset(self) -> None:
+        self.num_pixels = 0
+        self.num_padded = 0
@@ -0,0 +1,246 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: fcos target assign ops
+# FCOS训练目标分配:
+# 所有FPN层级的位置点拼接后与所有边界框一次性计算[点数, 框数]的距离张量，
+# 通过掩码归约与argmin(最小面积)完成分配，不存在逐点/逐框的python循环
+import sys
+import numpy as np
+
+from typing import Dict, List, Tuple, Union, Any
+
+from ..operator import Transform
+from .location_cache import FCOSLocationCache, fcos_feature_sizes, fcos_location_cache
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['FCOSTarget']
+
+INF = 1e8
+
+
+class FCOSTarget(Transform):
+    def __init__(self,
+                 fpn_strides: List[int]=[8, 16, 32, 64, 128],
+                 object_sizes_boundary: List[float]=[64, 128, 256, 512],
+                 center_sampling_radius: float=1.5,
+                 norm_reg_targets: bool=True,
+                 chunk_bytes: int=1 << 20,
+                 location_cache: Union[FCOSLocationCache, None]=None) -> None:
+        """FCOS训练目标分配
+            desc:
+                Parameters:
+                    fpn_strides: 各FPN层级的步长(list(int))
+                    object_sizes_boundary: 相邻层级回归范围的分界(list(float))——长度为层级数-1
+                    center_sampling_radius: 中心采样半径(float, 以步长为单位)——0表示不使用中心采样
+                    norm_reg_targets: 回归目标是否除以所在层级的步长(bool)
+                    chunk_bytes: 分块计算时[点数, 框数]中间张量的总字节上限(int)
+                    location_cache: 位置点缓存(FCOSLocationCache)——None表示使用全局缓存
+                Returns:
+                    None
+                Others:
+                    - 需要在Permute之后使用(根据CHW格式的image获取输入尺寸)
+                    - 输出各层级的labels{i}: [h, w, 1](0为背景，前景为gt_class+1)，
+                      reg_target{i}: [h, w, 4](l, t, r, b)，centerness{i}: [h, w, 1]
+                    - 一个位置点落在多个满足条件的边界框内时，分配给面积最小的边界框
+                      (面积相同时取序号最小者)
+        """
+        super(FCOSTarget, self).__init__()
+        if len(object_sizes_boundary) != len(fpn_strides) - 1:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The length of object_sizes_boundary should be len(fpn_strides) - 1."
+                    "(fpn_strides: {0}, object_sizes_boundary: {1})".format(fpn_strides, object_sizes_boundary))
+                sys.exit(1)
+        self.fpn_strides = fpn_strides
+        self.object_sizes_boundary = object_sizes_boundary
+        self.center_sampling_radius = center_sampling_radius
+        self.norm_reg_targets = norm_reg_targets
+        self.chunk_bytes = chunk_bytes
+        self.location_cache = location_cache
+        bounds = [-1.] + list(object_sizes_boundary) + [INF]
+        self.scale_ranges = np.asarray([[bounds[i], bounds[i + 1]]
+                                        for i in range(len(fpn_strides))], dtype=np.float32)
+
+    def get_locations(self,
+                      im_h: int,
+                      im_w: int) -> Tuple[np.ndarray, np.ndarray,
+                                          np.ndarray, Tuple[Tuple[int, int], ...]]:
+        """获取输入尺寸对应的位置点(从位置点缓存中读取)
+            desc:
+                Parameters:
+                    im_h: 输入图像高(int)
+                    im_w: 输入图像宽(int)
+                Returns:
+                    (Tuple)只读的位置点坐标[P, 2], 步长[P], 回归范围[P, 2], 特征图尺寸
+        """
+        cache = self.location_cache if self.location_cache is not None else fcos_location_cache
+        feature_sizes = fcos_feature_sizes(im_h, im_w, self.fpn_strides)
+        locations, strides, ranges = cache.get(feature_sizes, self.fpn_strides, self.scale_ranges)
+        return locations, strides, ranges, feature_sizes
+
+    def _assign_chunk(self,
+                      locations: np.ndarray,
+                      strides: np.ndarray,
+                      ranges: np.ndarray,
+                      gt_bbox: np.ndarray,
+                      areas: np.ndarray) -> np.ndarray:
+        """分配一块位置点
+            desc:
+                Parameters:
+                    locations: 位置点坐标(np.ndarray)——[p, 2]
+                    strides: 位置点步长(np.ndarray)——[p]
+                    ranges: 位置点回归范围(np.ndarray)——[p, 2]
+                    gt_bbox: 边界框(np.ndarray)——[M, 4]
+                    areas: 边界框面积(np.ndarray)——[M]
+                Returns:
+                    (np.ndarray)分配的边界框序号——[p]，-1为背景
+        """
+        xs, ys = locations[:, 0:1], locations[:, 1:2] # [p, 1]
+        x1, y1, x2, y2 = gt_bbox[:, 0], gt_bbox[:, 1], gt_bbox[:, 2], gt_bbox[:, 3]
+        # [p, M]的距离张量l, t, r, b(分别保存，避免在长度为4的最内层维度上归约)
+        l, t, r, b = xs - x1, ys - y1, x2 - xs, y2 - ys
+        max_reg = np.maximum(np.maximum(l, r), np.maximum(t, b))
+        if self.center_sampling_radius > 0:
+            # 中心采样: 位置点需要落在以边界框中心为中心、半径为radius*stride的区域内(与边界框求交)
+            radius = (strides * self.center_sampling_radius)[:, None] # [p, 1]
+            cx, cy = (x1 + x2) / 2., (y1 + y2) / 2.
+            valid = (xs > np.maximum(cx - radius, x1)) & (ys > np.maximum(cy - radius, y1)) & \
+                    (xs < np.minimum(cx + radius, x2)) & (ys < np.minimum(cy + radius, y2))
+        else:
+            valid = np.minimum(np.minimum(l, r), np.minimum(t, b)) > 0
+        valid &= (max_reg >= ranges[:, 0:1]) & (max_reg <= ranges[:, 1:2])
+        # 不满足条件的边界框面积记为INF，argmin得到最小面积(序号最小)的边界框
+        masked_areas = np.where(valid, areas[None, :], np.float32(INF))
+        gt_index = masked_areas.argmin(axis=1)
+        gt_index[~valid[np.arange(len(locations)), gt_index]] = -1
+        return gt_index
+
+    def assign(self,
+               locations: np.ndarray,
+               strides: np.ndarray,
+               ranges: np.ndarray,
+               gt_bbox: np.ndarray,
+               gt_class: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """为所有位置点分配训练目标(按chunk_bytes分块限制内存)
+            desc:
+                Parameters:
+                    locations: 位置点坐标(np.ndarray)——[P, 2]
+                    strides: 位置点步长(np.ndarray)——[P]
+                    ranges: 位置点回归范围(np.ndarray)——[P, 2]
+                    gt_bbox: 边界框(np.ndarray)——[M, 4]
+                    gt_class: 边界框类别(np.ndarray)——[M, 1]
+                Returns:
+                    (Tuple[np.ndarray, np.ndarray, np.ndarray])
+                        labels[P](0为背景), reg_target[P, 4], centerness[P]
+        """
+        num_points, num_bbox = len(locations), len(gt_bbox)
+        labels = np.zeros((num_points, ), dtype=np.int32)
+        reg_target = np.zeros((num_points, 4), dtype=np.float32)
+        centerness = np.zeros((num_points, ), dtype=np.float32)
+        if num_bbox == 0:
+            return labels, reg_target, centerness
+
+        gt_bbox = gt_bbox.astype(np.float32)
+        areas = (gt_bbox[:, 2] - gt_bbox[:, 0]) * (gt_bbox[:, 3] - gt_bbox[:, 1])
+        gt_class = gt_class.reshape(-1).astype(np.int32)
+        # 每块位置点数: 同时存在的[p, M]中间张量约为4个float32
+        chunk = max(1, self.chunk_bytes // (num_bbox * 4 * 4))
+        gt_index = np.empty((num_points, ), dtype=np.int64)
+        for start in range(0, num_points, chunk):
+            end = min(start + chunk, num_points)
+            gt_index[start:end] = self._assign_chunk(locations[start:end], strides[start:end],
+                                                     ranges[start:end], gt_bbox, areas)
+
+        # 只对正样本点取出对应边界框计算回归目标与中心度
+        positive = np.flatnonzero(gt_index >= 0)
+        matched = gt_bbox[gt_index[positive]]
+        points = locations[positive]
+        ltrb = np.concatenate([points - matched[:, :2], matched[:, 2:] - points], axis=1)
+        lr, tb = ltrb[:, 0::2], ltrb[:, 1::2]
+        labels[positive] = gt_class[gt_index[positive]] + 1
+        centerness[positive] = np.sqrt(
+            (lr.min(axis=1) / lr.max(axis=1)) * (tb.min(axis=1) / tb.max(axis=1)))
+        if self.norm_reg_targets:
+            ltrb /= strides[positive, None]
+        reg_target[positive] = ltrb
+        return labels, reg_target, centerness
+
+    def _split_levels(self,
+                      sample: Dict[str, Any],
+                      labels: np.ndarray,
+                      reg_target: np.ndarray,
+                      centerness: np.ndarray,
+                      feature_sizes: List[Tuple[int, int]]) -> Dict[str, Any]:
+        """按层级拆分训练目标(支持批量维度)
+            desc:
+                Parameters:
+                    sample: 样本/批量数据(dict)
+                    labels: 类别目标(np.ndarray)——[..., P]
+                    reg_target: 回归目标(np.ndarray)——[..., P, 4]
+                    centerness: 中心度目标(np.ndarray)——[..., P]
+                    feature_sizes: 各层级特征图尺寸(list(tuple(int)))
+                Returns:
+                    (Dict[str, Any])写入各层级目标后的数据——[..., h, w, 1/4]
+        """
+        lead = labels.shape[:-1]
+        start = 0
+        for level, (feat_h, feat_w) in enumerate(feature_sizes):
+            end = start + feat_h * feat_w
+            sample['labels{0}'.format(level)] = \
+                labels[..., start:end].reshape(lead + (feat_h, feat_w, 1))
+            sample['reg_target{0}'.format(level)] = \
+                reg_target[..., start:end, :].reshape(lead + (feat_h, feat_w, 4))
+            sample['centerness{0}'.format(level)] = \
+                centerness[..., start:end].reshape(lead + (feat_h, feat_w, 1))
+            start = end
+        return sample
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """分配单样本的训练目标
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [C, H, W], gt_bbox: [M, 4], gt_class: [M, 1]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        im_h, im_w = sample['image'].shape[1:3]
+        locations, strides, ranges, feature_sizes = self.get_locations(im_h, im_w)
+        labels, reg_target, centerness = self.assign(locations, strides, ranges,
+                                                     sample['gt_bbox'], sample['gt_class'])
+        return self._split_levels(sample, labels, reg_target, centerness, feature_sizes)
+
+    def apply_batch(self,
+                    batch: Dict[str, Any]) -> Dict[str, Any]:
+        """分配批量数据的训练目标(批内共用一份位置点)
+            desc:
+                Parameters:
+                    batch: 批量数据(dict)——image: [N, C, H, W], gt_bbox: [N, M, 4], gt_num: [N]
+                Returns:
+                    (Dict[str, Any])处理后的批量数据——各层级目标为[N, h, w, ...]
+        """
+        im_h, im_w = batch['image'].shape[2:4]
+        locations, strides, ranges, feature_sizes = self.get_locations(im_h, im_w)
+        results = []
+        for idx, num in enumerate(batch['gt_num']):
+            results.append(self.assign(locations, strides, ranges,
+                                       batch['gt_bbox'][idx, :num],
+                                       batch['gt_class'][idx, :num]))
+        labels, reg_target, centerness = [np.stack(items, axis=0) for items in zip(*results)]
+        return self._split_levels(batch, labels, reg_target, centerness, feature_sizes)
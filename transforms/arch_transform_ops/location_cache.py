@@ -0,0 +1,150 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: fcos location cache
+# FPN位置点缓存:
+# 位置点坐标、每点步长与每点回归范围只与各层级特征图尺寸有关，
+# 按尺寸缓存后由FCOS head、训练目标分配与后处理共用(只读共享，不重复计算)
+import numpy as np
+from collections import OrderedDict
+
+from typing import Dict, List, Sequence, Tuple
+
+__all__ = ['fcos_feature_sizes', 'fcos_locations',
+           'FCOSLocationCache', 'fcos_location_cache']
+
+
+def fcos_feature_sizes(im_h: int,
+                       im_w: int,
+                       fpn_strides: Sequence[int]) -> Tuple[Tuple[int, int], ...]:
+    """根据输入尺寸计算各层级特征图尺寸(向上取整)
+        desc:
+            Parameters:
+                im_h: 输入图像高(int)
+                im_w: 输入图像宽(int)
+                fpn_strides: 各层级的步长(list(int))
+            Returns:
+                (Tuple[Tuple[int, int], ...])各层级特征图尺寸(h, w)
+    """
+    return tuple([(int(np.ceil(im_h / stride)), int(np.ceil(im_w / stride)))
+                  for stride in fpn_strides])
+
+
+def fcos_locations(feature_sizes: Sequence[Tuple[int, int]],
+                   fpn_strides: Sequence[int],
+                   scale_ranges: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """计算所有FPN层级拼接后的位置点
+        desc:
+            Parameters:
+                feature_sizes: 各层级特征图尺寸(list(tuple(int)))——[(h, w)]
+                fpn_strides: 各层级的步长(list(int))
+                scale_ranges: 各层级的回归范围(np.ndarray)——[L, 2]
+            Returns:
+                (Tuple[np.ndarray, np.ndarray, np.ndarray])
+                    - locations: 位置点坐标——[P, 2]: x, y
+                    - strides: 每个位置点的步长——[P]
+                    - ranges: 每个位置点所在层级的回归范围——[P, 2]
+    """
+    locations, strides, ranges = [], [], []
+    for level, ((feat_h, feat_w), stride) in enumerate(zip(feature_sizes, fpn_strides)):
+        shift_x = np.arange(feat_w, dtype=np.float32) * stride + stride // 2
+        shift_y = np.arange(feat_h, dtype=np.float32) * stride + stride // 2
+        xs, ys = np.meshgrid(shift_x, shift_y)
+        locations.append(np.stack([xs.reshape(-1), ys.reshape(-1)], axis=1))
+        strides.append(np.full((feat_h * feat_w, ), stride, dtype=np.float32))
+        ranges.append(np.tile(scale_ranges[level:level + 1], (feat_h * feat_w, 1)))
+    return (np.concatenate(locations, axis=0),
+            np.concatenate(strides, axis=0),
+            np.concatenate(ranges, axis=0).astype(np.float32))
+
+
+class FCOSLocationCache(object):
+    def __init__(self,
+                 max_entries: int=32) -> None:
+        """按特征图尺寸缓存位置点的LRU缓存
+            desc:
+                Parameters:
+                    max_entries: 最多缓存的尺寸数(int)——多尺度训练时超出后淘汰最久未使用的尺寸
+                Returns:
+                    None
+                Others:
+                    - 返回的数组为只读的共享数组，使用方不能原地修改
+                    - 每个进程各自缓存
+        """
+        super(FCOSLocationCache, self).__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # (特征图尺寸, 步长, 回归范围) --> (locations, strides, ranges)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self,
+            feature_sizes: Sequence[Tuple[int, int]],
+            fpn_strides: Sequence[int],
+            scale_ranges: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """获取位置点(未命中时计算并缓存)
+            desc:
+                Parameters:
+                    feature_sizes: 各层级特征图尺寸(list(tuple(int)))
+                    fpn_strides: 各层级的步长(list(int))
+                    scale_ranges: 各层级的回归范围(np.ndarray)——[L, 2]
+                Returns:
+                    (Tuple[np.ndarray, np.ndarray, np.ndarray])只读的位置点坐标, 步长, 回归范围
+        """
+        scale_ranges = np.asarray(scale_ranges, dtype=np.float32)
+        key = (tuple([(int(h), int(w)) for h, w in feature_sizes]),
+               tuple([int(s) for s in fpn_strides]),
+               scale_ranges.tobytes())
+        entry = self._entries.get(key, None)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = fcos_locations(key[0], key[1], scale_ranges)
+        for array in entry:
+            array.flags.writeable = False
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> Dict[str, float]:
+        """统计缓存使用情况
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (Dict[str, float])统计项: entries, hits, misses, evictions, hit_rate
+        """
+        total = self.hits + self.misses
+        return {'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total > 0 else 0.}
+
+
+# 全局位置点缓存: FCOS head、训练目标分配与后处理默认共用
+fcos_location_cache = FCOSLocationCache()
@@ -0,0 +1,273 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: transform prefix cache
+# 预处理确定性前缀的结果缓存:
+# Compose中CacheBoundary之前的预处理(解码、固定尺寸缩放等)结果按图像路径(im_file)缓存，
+# 之后的epoch直接从缓存读取，只执行CacheBoundary之后的随机预处理
+import os
+import sys
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+from typing import Dict, List, Union, Any
+
+from .operator import Transform
+from .registry import transform_fingerprint
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['SampleCache', 'CacheBoundary']
+
+
+def _cache_key(sample: Dict[str, Any]) -> Union[str, None]:
+    """获取样本的缓存键
+        desc:
+            Parameters:
+                sample: 样本数据(dict)
+            Returns:
+                (str or None)缓存键——样本没有im_file与im_id时返回None(不缓存)
+            Others:
+                - 优先使用图像绝对路径的sha1: 不同数据集/分片的im_id可能重复，图像路径不会
+                - 没有im_file时退化为im_id，此时共用磁盘缓存目录的数据集需要设置不同的dataset_id
+    """
+    im_file = sample.get('im_file', None)
+    if im_file is not None:
+        return hashlib.sha1(os.path.abspath(im_file).encode('utf-8')).hexdigest()
+    im_id = sample.get('im_id', None)
+    if im_id is None:
+        return None
+    if isinstance(im_id, np.ndarray):
+        im_id = im_id.reshape(-1)[0]
+    return str(int(im_id))
+
+
+def _arrays_nbytes(arrays: Dict[str, np.ndarray]) -> int:
+    return sum([v.nbytes for v in arrays.values()])
+
+
+class SampleCache(object):
+    def __init__(self,
+                 max_bytes: int=1 << 30,
+                 cache_dir: Union[str, None]=None,
+                 namespace: str='default') -> None:
+        """按缓存键(图像路径或im_id)缓存样本数组字段的容量受限缓存
+            desc:
+                Parameters:
+                    max_bytes: 缓存容量(int, 字节)——内存缓存按数组字节数，
+                               磁盘缓存按压缩后的文件大小
+                    cache_dir: 磁盘缓存目录(str)——None表示缓存在内存中
+                    namespace: 缓存命名空间(str)——磁盘缓存的子目录名，
+                               不同的前缀预处理配置使用不同的子目录
+                Returns:
+                    None
+                Others:
+                    - 内存缓存: LRU淘汰，每个进程(DataLoader的worker进程)各自缓存
+                    - 磁盘缓存: 每个样本保存为np.savez_compressed的.npz文件，
+                      多个进程共享同一目录；容量与LRU淘汰按进程统计，
+                      每个进程只淘汰自己写入的文件
+                    - 只缓存数组字段，非数组字段(im_file等)由输入样本保留
+        """
+        super(SampleCache, self).__init__()
+        self.max_bytes = max_bytes
+        self.cache_dir = None
+        if cache_dir is not None:
+            self.cache_dir = os.path.join(cache_dir, namespace)
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir, exist_ok=True)
+        self._entries = OrderedDict() # 缓存键 --> 数组字段(内存) / 文件字节数(磁盘)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def get(self,
+            key: str) -> Union[Dict[str, np.ndarray], None]:
+        """读取缓存
+            desc:
+                Parameters:
+                    key: 缓存键(str)
+                Returns:
+                    (Dict[str, np.ndarray] or None)数组字段——未命中时返回None
+                Others:
+                    - 内存缓存返回的image与缓存共享且只读，其余字段返回副本
+        """
+        if self.cache_dir is None:
+            arrays = self._entries.get(key, None)
+            if arrays is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {k: (v if k == 'image' else v.copy()) for k, v in arrays.items()}
+
+        path = self._path(key)
+        if not os.path.exists(path): # 也可能由其它进程写入
+            self.misses += 1
+            return None
+        try:
+            with np.load(path) as data:
+                arrays = {k: data[k] for k in data.files}
+        except (OSError, ValueError, EOFError):
+            self.misses += 1
+            return None
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self.hits += 1
+        return arrays
+
+    def put(self,
+            key: str,
+            arrays: Dict[str, np.ndarray]) -> None:
+        """写入缓存(超出容量时淘汰最久未使用的样本)
+            desc:
+                Parameters:
+                    key: 缓存键(str)
+                    arrays: 数组字段(dict)
+                Returns:
+                    None
+        """
+        if key in self._entries:
+            return
+        if self.cache_dir is None:
+            nbytes = _arrays_nbytes(arrays)
+            if nbytes > self.max_bytes:
+                return
+            # image与样本共享并设为只读，其余字段(可能被原地修改)保存副本
+            entry = {k: (v if k == 'image' else v.copy()) for k, v in arrays.items()}
+            if 'image' in entry:
+                entry['image'].flags.writeable = False
+        else:
+            path = self._path(key)
+            tmp_path = '{0}.{1}.tmp.npz'.format(path[:-4], os.getpid())
+            np.savez_compressed(tmp_path, **arrays)
+            os.replace(tmp_path, path) # 原子替换: 其它进程不会读到写了一半的文件
+            nbytes = os.path.getsize(path)
+            entry = nbytes
+        self._entries[key] = entry
+        self.nbytes += nbytes
+        self._evict()
+
+    def _evict(self) -> None:
+        # 按LRU顺序淘汰，直到满足容量限制
+        while self.nbytes > self.max_bytes and len(self._entries) > 0:
+            key, entry = self._entries.popitem(last=False)
+            if self.cache_dir is None:
+                self.nbytes -= _arrays_nbytes(entry)
+            else:
+                self.nbytes -= entry
+                if os.path.exists(self._path(key)):
+                    os.remove(self._path(key))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """清空缓存(磁盘缓存删除当前进程写入的文件)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        self.max_bytes, max_bytes = 0, self.max_bytes
+        self._evict()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """统计缓存使用情况
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (Dict[str, float])统计项: entries, nbytes, hits, misses, hit_rate
+        """
+        total = self.hits + self.misses
+        return {'entries': len(self._entries),
+                'nbytes': self.nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total > 0 else 0.}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # 传递到worker进程时不携带内存缓存内容
+        state = self.__dict__.copy()
+        if self.cache_dir is None:
+            state['_entries'] = OrderedDict()
+            state['nbytes'] = 0
+        return state
+
+
+class CacheBoundary(Transform):
+    def __init__(self,
+                 max_bytes: int=1 << 30,
+                 cache_dir: Union[str, None]=None,
+                 dataset_id: str='') -> None:
+        """缓存边界标记: 放在Compose的预处理列表中，
+           之前的预处理须为确定性预处理，其输出按图像路径(没有时按im_id)缓存
+            desc:
+                Parameters:
+                    max_bytes: 缓存容量(int, 字节)
+                    cache_dir: 磁盘缓存目录(str)——None表示缓存在内存中
+                    dataset_id: 数据集标识(str)——参与磁盘缓存子目录的命名，
+                                多个数据集共用cache_dir时用于隔离(如标注不同的同一批图像)
+                Returns:
+                    None
+                Others:
+                    - 单独调用时不做任何处理
+                    - 磁盘缓存的子目录由前缀预处理的指纹(transform_fingerprint)与dataset_id决定，
+                      修改前缀预处理的参数后不会读到旧的缓存
+        """
+        super(CacheBoundary, self).__init__()
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.dataset_id = dataset_id
+        self.cache = None
+
+    def build_cache(self,
+                    prefix: List[Transform]) -> SampleCache:
+        """根据前缀预处理创建缓存
+            desc:
+                Parameters:
+                    prefix: 缓存边界之前的预处理(list(Transform))
+                Returns:
+                    (SampleCache)样本缓存
+        """
+        if len(prefix) == 0:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The CacheBoundary should be placed after at least one transform.")
+                sys.exit(1)
+        # 磁盘缓存按前缀预处理的配置与数据集标识区分目录，内存缓存不需要
+        namespace = 'default'
+        if self.cache_dir is not None:
+            namespace = transform_fingerprint(prefix)
+            if self.dataset_id:
+                namespace += '_' + hashlib.sha1(self.dataset_id.encode('utf-8')).hexdigest()[:16]
+        self.cache = SampleCache(max_bytes=self.max_bytes,
+                                 cache_dir=self.cache_dir,
+                                 namespace=namespace)
+        return self.cache
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        return sample
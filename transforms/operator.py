@@ -12,16 +12,193 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import sys
+import time
+import cv2
+import numpy as np
 
-from typing import Dict, List, Union, Sequence, Any
+from typing import Dict, List, Union, Sequence, Tuple, Any
 
+from .profiler import transform_profiler, sample_nbytes
+from .registry import register_transform, capture_init_params
 from loggers import create_logger, error_traceback
 logger = create_logger(logger_name=__name__)
 
-__all__ = ['Transform']
+__all__ = ['Transform', 'AffineTransform', 'BOX_FIELDS',
+           'can_stack', 'stack_samples', 'unstack_batch', 'warp_affine', 'bbox_affine',
+           'clip_bbox']
+
+# 与目标数量相关的样本字段: 批量化时按批内最大目标数进行补零
+BOX_FIELDS = ['gt_bbox', 'gt_class', 'gt_score', 'difficult']
+
+
+def can_stack(samples: List[Dict[str, Any]]) -> bool:
+    """判断样本列表能否无损地堆叠为批量数据
+        desc:
+            Parameters:
+                samples: 样本数据列表(list(dict))
+            Returns:
+                (bool)能否堆叠——字段相同，数组字段的类型一致且形状一致
+                      (BOX_FIELDS中的字段只要求除目标数外的形状一致)
+    """
+    if len(samples) == 0 or 'gt_num' in samples[0]:
+        return False
+    first = samples[0]
+    for sample in samples[1:]:
+        if sample.keys() != first.keys():
+            return False
+        for key, value in first.items():
+            other = sample[key]
+            if not isinstance(value, np.ndarray):
+                if key in BOX_FIELDS or isinstance(other, np.ndarray):
+                    return False
+                continue
+            if not isinstance(other, np.ndarray) or other.dtype != value.dtype:
+                return False
+            if key in BOX_FIELDS:
+                if other.shape[1:] != value.shape[1:]:
+                    return False
+            elif other.shape != value.shape:
+                return False
+    return True
+
+
+def stack_samples(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """将样本列表堆叠为批量数据(apply_batch的输入格式)
+        desc:
+            Parameters:
+                samples: 样本数据列表(list(dict))——图像尺寸需要一致
+            Returns:
+                (Dict[str, Any])批量数据:
+                    - image: [N, H, W, C]的图像数组
+                    - BOX_FIELDS中的字段: [N, M, ...]的补零数组，M为批内最大目标数
+                    - gt_num: [N]的int32数组，记录每个样本的实际目标数
+                    - 其它数组字段: np.stack堆叠
+                    - 其它非数组字段: 保存为list
+    """
+    batch = {}
+    for key in samples[0].keys():
+        values = [sample[key] for sample in samples]
+        if key in BOX_FIELDS:
+            # 按批内最大目标数补零
+            nums = np.asarray([len(v) for v in values], dtype=np.int32)
+            padded = np.zeros((len(values), int(nums.max(initial=0))) + values[0].shape[1:],
+                              dtype=values[0].dtype)
+            for idx, v in enumerate(values):
+                padded[idx, :len(v)] = v
+            batch[key] = padded
+            batch['gt_num'] = nums
+        elif isinstance(values[0], np.ndarray):
+            batch[key] = np.stack(values, axis=0)
+        else:
+            batch[key] = values
+    return batch
+
+
+def unstack_batch(batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """将批量数据拆分为样本列表(stack_samples的逆过程)
+        desc:
+            Parameters:
+                batch: 批量数据(dict)
+            Returns:
+                (List[Dict[str, Any]])样本数据列表——目标字段按gt_num截取
+    """
+    nums = batch.get('gt_num', None)
+    batch_size = len(nums) if nums is not None else \
+        len(next(iter(batch.values())))
+    samples = []
+    for idx in range(batch_size):
+        sample = {}
+        for key, value in batch.items():
+            if key == 'gt_num':
+                continue
+            if key in BOX_FIELDS:
+                sample[key] = value[idx, :nums[idx]]
+            else:
+                sample[key] = value[idx]
+        samples.append(sample)
+    return samples
+
+
+def warp_affine(image: np.ndarray,
+                matrix: np.ndarray,
+                out_size: Sequence[int],
+                interp: int=cv2.INTER_LINEAR,
+                border_value: float=0.) -> np.ndarray:
+    """按连续坐标系下的仿射矩阵变换图像
+        desc:
+            Parameters:
+                image: 图像数据(np.ndarray)——[H, W, C]
+                matrix: 3x3仿射矩阵(np.ndarray)——连续坐标: 像素i覆盖[i, i+1)
+                out_size: 输出尺寸(Sequence[int])——[out_h, out_w]
+                interp: 插值方式(int)——cv2.INTER_*
+                border_value: 越界区域的填充值(float)
+            Returns:
+                (np.ndarray)变换后的图像
+            Others:
+                - 边界框使用连续坐标直接乘矩阵，
+                  图像采样使用像素中心坐标(x+0.5)，与cv2.resize的对齐方式一致
+    """
+    shift = np.array([[1., 0., 0.5], [0., 1., 0.5], [0., 0., 1.]])
+    unshift = np.array([[1., 0., -0.5], [0., 1., -0.5], [0., 0., 1.]])
+    pixel_matrix = unshift @ matrix @ shift
+    out_h, out_w = int(out_size[0]), int(out_size[1])
+    return cv2.warpAffine(image, pixel_matrix[:2], (out_w, out_h),
+                          flags=interp,
+                          borderMode=cv2.BORDER_CONSTANT,
+                          borderValue=border_value)
+
+
+def bbox_affine(gt_bbox: np.ndarray,
+                matrix: np.ndarray) -> np.ndarray:
+    """按仿射矩阵变换边界框(变换四个角点后取外接框)
+        desc:
+            Parameters:
+                gt_bbox: 边界框(np.ndarray)——[M, 4]: x1, y1, x2, y2
+                matrix: 3x3仿射矩阵(np.ndarray)
+            Returns:
+                (np.ndarray)变换后的边界框——[M, 4]，dtype与输入一致
+    """
+    if len(gt_bbox) == 0:
+        return gt_bbox
+    x1, y1, x2, y2 = [gt_bbox[:, i:i + 1].astype(np.float64) for i in range(4)]
+    xs = np.concatenate([x1, x2, x1, x2], axis=1) # [M, 4]角点x
+    ys = np.concatenate([y1, y1, y2, y2], axis=1) # [M, 4]角点y
+    new_xs = matrix[0, 0] * xs + matrix[0, 1] * ys + matrix[0, 2]
+    new_ys = matrix[1, 0] * xs + matrix[1, 1] * ys + matrix[1, 2]
+    new_bbox = np.stack([new_xs.min(axis=1), new_ys.min(axis=1),
+                         new_xs.max(axis=1), new_ys.max(axis=1)], axis=1)
+    return new_bbox.astype(gt_bbox.dtype)
+
+
+def clip_bbox(gt_bbox: np.ndarray,
+              im_h: int,
+              im_w: int) -> np.ndarray:
+    """将边界框坐标原地裁剪到图像范围内: x: [0, w-1], y: [0, h-1](与VOC标注解析一致)
+        desc:
+            Parameters:
+                gt_bbox: 边界框(np.ndarray)——[..., 4]: x1, y1, x2, y2
+                im_h: 图像高(int)
+                im_w: 图像宽(int)
+            Returns:
+                (np.ndarray)裁剪后的边界框(即gt_bbox)
+    """
+    np.clip(gt_bbox[..., 0::2], 0, im_w - 1, out=gt_bbox[..., 0::2])
+    np.clip(gt_bbox[..., 1::2], 0, im_h - 1, out=gt_bbox[..., 1::2])
+    return gt_bbox
 
 
 class Transform(object):
+    def __init_subclass__(cls, **kwargs) -> None:
+        # 子类定义时自动注册(用于按配置重建预处理)
+        super(Transform, cls).__init_subclass__(**kwargs)
+        register_transform(cls)
+
+    def __new__(cls, *args, **kwargs) -> 'Transform':
+        # 记录构造参数: 按配置序列化(dumps_transform)时只保存类名与构造参数
+        obj = super(Transform, cls).__new__(cls)
+        obj._params = capture_init_params(cls, args, kwargs)
+        return obj
+
     def __init__(self) -> None:
         """预处理继承基类
             desc:
@@ -38,7 +215,7 @@ class Transform(object):
     
     def __str__(self) -> str:
         return self.name
-    
+
     def __repr__(self) -> str:
         return self.name
 
@@ -60,6 +237,41 @@ class Transform(object):
             logger.error("Summary: The apply function of"
             "'{0}' class should be reload or implement.".format(self.name))
             sys.exit(1)
+
+    def apply_batch(self,
+                    batch: Dict[str, Any]) -> Dict[str, Any]:
+        """批量预处理实现接口(可向量化的预处理继承后重载)
+            desc:
+                Parameters:
+                    batch: 堆叠后的批量数据(dict)——格式见stack_samples
+                           image: [N, H, W, C]
+                           gt_bbox等目标字段: [N, M, ...]补零数组
+                           gt_num: [N]实际目标数
+                Returns:
+                    (Dict[str, Any])处理后的批量数据
+                Others:
+                    默认实现拆分为单样本后逐个调用apply，再重新堆叠
+        """
+        samples = [self.apply(sample) for sample in unstack_batch(batch)]
+        return stack_samples(samples)
+
+    def apply_samples(self,
+                      samples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量样本(列表)的预处理接口
+            desc:
+                Parameters:
+                    samples: 批量样本数据(list(dict))
+                Returns:
+                    (List[Dict[str, Any]])处理后的样本数据列表
+                Others:
+                    - 子类重载了apply_batch且样本可以堆叠(见can_stack)时，
+                      堆叠后调用apply_batch，再拆分为样本(样本数组为批量数组的视图)
+                    - 否则逐个调用apply
+        """
+        if len(samples) > 1 and type(self).apply_batch is not Transform.apply_batch and \
+                can_stack(samples):
+            return unstack_batch(self.apply_batch(stack_samples(samples)))
+        return [self.apply(sample) for sample in samples]
     
     def __call__(self,
                  samples: Union[Dict[str, Any],
@@ -71,14 +283,144 @@ class Transform(object):
                     samples: 采样的样本数据/批量样本数据[dict, list(dict)]
                 Returns:
                     None
+                Others:
+                    批量样本通过apply_samples处理(可以使用向量化的apply_batch)，
+                    结果原地写回输入列表
         """
-        # 当输入为批量样本时，进行遍历
+        # 开启统计时记录耗时与输出大小(关闭时只有这一次判断)
+        if transform_profiler.enabled:
+            return self._profile_call(samples)
+
+        # 当输入为批量样本时，整体处理
         if isinstance(samples, Sequence):
-            for idx, sample in enumerate(samples):
-                samples[idx] = self.apply(sample)
+            samples[:] = self.apply_samples(samples)
             return samples
         
         # 单样本处理
         samples = self.apply(samples)
         return samples
 
+    def _profile_call(self,
+                      samples: Union[Dict[str, Any],
+                      List[Dict[str, Any]]]) -> Union[Dict[str, Any],
+                                                List[Dict[str, Any]]]:
+        """记录耗时与输出大小的预处理调用(统计开启时使用)
+            desc:
+                Parameters:
+                    samples: 采样的样本数据/批量样本数据[dict, list(dict)]
+                Returns:
+                    None
+                Others:
+                    批量样本整体计时，按样本数均摊后逐个样本记录
+        """
+        if isinstance(samples, Sequence):
+            start = time.perf_counter()
+            samples[:] = self.apply_samples(samples)
+            elapsed = (time.perf_counter() - start) / max(len(samples), 1)
+            for sample in samples:
+                transform_profiler.record(self.name, elapsed, sample_nbytes(sample))
+            return samples
+
+        start = time.perf_counter()
+        samples = self.apply(samples)
+        transform_profiler.record(self.name,
+                                  time.perf_counter() - start,
+                                  sample_nbytes(samples))
+        return samples
+
+
+class AffineTransform(Transform):
+    def __init__(self,
+                 interp: int=cv2.INTER_LINEAR,
+                 border_value: float=0.) -> None:
+        """几何预处理继承基类: 可以表示为仿射矩阵的预处理
+            desc:
+                Parameters:
+                    interp: 插值方式(int)——cv2.INTER_*
+                    border_value: 越界区域的填充值(float)
+                Returns:
+                    None
+                other:
+                    - 通过继承后实现get_affine方法，返回连续坐标系下的仿射矩阵
+                    - 连续的多个AffineTransform可以被Compose折叠为一次warpAffine
+        """
+        super(AffineTransform, self).__init__()
+        self.interp = interp
+        self.border_value = border_value
+
+    def get_affine(self,
+                   im_h: int,
+                   im_w: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """获取仿射矩阵与输出尺寸(需要继承后实现，随机变换在此处采样)
+            desc:
+                Parameters:
+                    im_h: 输入图像高(int)
+                    im_w: 输入图像宽(int)
+                Returns:
+                    (Tuple[np.ndarray, Tuple[int, int]])3x3仿射矩阵, (out_h, out_w)
+        """
+        try:
+            raise NotImplementedError()
+        except:
+            error_traceback(logger=logger,
+                            lasterrorline_offset=14,
+                            num_lines=11)
+            logger.error("Summary: The get_affine function of"
+            "'{0}' class should be reload or implement.".format(self.name))
+            sys.exit(1)
+
+    def warp_image(self,
+                   image: np.ndarray,
+                   matrix: np.ndarray,
+                   out_size: Tuple[int, int]) -> np.ndarray:
+        """按仿射矩阵变换图像(子类可以使用更快的专用实现重载)
+            desc:
+                Parameters:
+                    image: 图像数据(np.ndarray)——[H, W, C]
+                    matrix: 3x3仿射矩阵(np.ndarray)
+                    out_size: 输出尺寸(Tuple[int, int])
+                Returns:
+                    (np.ndarray)变换后的图像
+        """
+        return warp_affine(image, matrix, out_size,
+                           interp=self.interp,
+                           border_value=self.border_value)
+
+    def update_sample(self,
+                      sample: Dict[str, Any],
+                      matrix: np.ndarray,
+                      out_size: Tuple[int, int]) -> Dict[str, Any]:
+        """更新图像/边界框以外的样本信息(需要时重载)
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)
+                    matrix: 3x3仿射矩阵(np.ndarray)
+                    out_size: 输出尺寸(Tuple[int, int])
+                Returns:
+                    (Dict[str, Any])更新后的样本数据
+                Others:
+                    - im_shape: 更新为输出尺寸[out_h, out_w]
+                    - scale_factor: 累乘矩阵的缩放系数[scale_y, scale_x]，
+                                    用于将预测结果还原到原图尺度
+        """
+        sample['im_shape'] = np.asarray(out_size, dtype=np.float32)
+        scale = np.abs(np.array([matrix[1, 1], matrix[0, 0]], dtype=np.float32))
+        sample['scale_factor'] = sample.get(
+            'scale_factor', np.ones((2,), dtype=np.float32)) * scale
+        return sample
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """几何预处理: 变换图像与边界框
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        im_h, im_w = sample['image'].shape[:2]
+        matrix, out_size = self.get_affine(im_h, im_w)
+        sample['image'] = self.warp_image(sample['image'], matrix, out_size)
+        if 'gt_bbox' in sample:
+            sample['gt_bbox'] = bbox_affine(sample['gt_bbox'], matrix)
+        return self.update_sample(sample, matrix, out_size)
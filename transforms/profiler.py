@@ -0,0 +1,272 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: transform profiler
+# 预处理耗时/输出大小统计:
+# 每个进程在内存中按预处理名称累计[调用次数, 总耗时, 总输出字节数]，
+# 设置dump_dir时定期写入dump_dir/transform_profile.进程号.json，
+# 主进程汇总目录下所有进程(含DataLoader的worker进程)的统计结果
+import os
+import json
+import atexit
+import numpy as np
+from multiprocessing import util
+
+from typing import Dict, Any, Union
+
+from loggers import create_logger
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['TransformProfiler', 'transform_profiler']
+
+# 通过环境变量开启时，spawn启动的worker进程也会自动开启统计
+PROFILE_ENV = 'KFPDET_TRANSFORM_PROFILE'
+DUMP_PREFIX = 'transform_profile.'
+
+
+def sample_nbytes(sample: Any) -> int:
+    """统计样本(或样本列表)中数组数据的字节数
+        desc:
+            Parameters:
+                sample: 样本数据(dict or list(dict))
+            Returns:
+                (int)字节数
+    """
+    if isinstance(sample, dict):
+        return sum([v.nbytes for v in sample.values() if isinstance(v, np.ndarray)])
+    if isinstance(sample, (list, tuple)):
+        return sum([sample_nbytes(s) for s in sample])
+    return 0
+
+
+class TransformProfiler(object):
+    def __init__(self) -> None:
+        """预处理性能统计器
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+                Others:
+                    - 关闭时Transform只多一次属性判断，开销可以忽略
+                    - fork出的子进程首次记录时清空从父进程继承的统计，
+                      避免重复计数
+        """
+        super(TransformProfiler, self).__init__()
+        self.enabled = False
+        self.dump_dir = None
+        self.dump_every = 1000
+        self.stats = {} # 预处理名称 --> [调用次数, 总耗时(s), 总输出字节数]
+        self._pid = os.getpid()
+        self._num_records = 0
+        self._register_exit_dump()
+
+    def _register_exit_dump(self) -> None:
+        # 普通进程退出时通过atexit写入，
+        # multiprocessing的子进程以os._exit退出，需要通过util.Finalize写入
+        atexit.register(self._dump_at_exit)
+        util.Finalize(None, self._dump_at_exit, exitpriority=100)
+
+    def enable(self,
+               dump_dir: Union[str, None]=None,
+               dump_every: int=1000) -> None:
+        """开启统计
+            desc:
+                Parameters:
+                    dump_dir: 多进程汇总时统计结果的写入目录(str)——None表示仅统计当前进程
+                    dump_every: 每记录多少次写入一次统计结果(int)
+                Returns:
+                    None
+        """
+        if dump_dir is not None:
+            if not os.path.isdir(dump_dir):
+                os.makedirs(dump_dir)
+            # 让之后spawn启动的子进程继承统计配置
+            os.environ[PROFILE_ENV] = dump_dir
+        self.dump_dir = dump_dir
+        self.dump_every = dump_every
+        self.enabled = True
+
+    def disable(self) -> None:
+        """关闭统计(已有统计结果保留)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        if self.enabled and self.dump_dir is not None:
+            self.dump()
+        os.environ.pop(PROFILE_ENV, None)
+        self.enabled = False
+
+    def reset(self) -> None:
+        """清空统计结果(包括dump_dir下已写入的结果)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        self.stats = {}
+        self._num_records = 0
+        if self.dump_dir is not None and os.path.isdir(self.dump_dir):
+            for _f in os.listdir(self.dump_dir):
+                if _f.startswith(DUMP_PREFIX):
+                    os.remove(os.path.join(self.dump_dir, _f))
+
+    def record(self,
+               name: str,
+               elapsed: float,
+               nbytes: int) -> None:
+        """记录一次预处理调用
+            desc:
+                Parameters:
+                    name: 预处理名称(str)
+                    elapsed: 耗时(float, s)
+                    nbytes: 输出数据的字节数(int)
+                Returns:
+                    None
+        """
+        pid = os.getpid()
+        if pid != self._pid: # fork出的子进程: 丢弃继承自父进程的统计
+            self._pid = pid
+            self.stats = {}
+            self._num_records = 0
+            self._register_exit_dump()
+        stat = self.stats.get(name, None)
+        if stat is None:
+            stat = self.stats[name] = [0, 0., 0]
+        stat[0] += 1
+        stat[1] += elapsed
+        stat[2] += nbytes
+        self._num_records += 1
+        if self.dump_dir is not None and self._num_records % self.dump_every == 0:
+            self.dump()
+
+    def dump(self) -> None:
+        """将当前进程的统计结果写入dump_dir(原子替换)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        if self.dump_dir is None or len(self.stats) == 0:
+            return
+        dump_path = os.path.join(self.dump_dir, DUMP_PREFIX + '{0}.json'.format(os.getpid()))
+        with open(dump_path + '.tmp', 'w') as f:
+            json.dump(self.stats, f)
+        os.replace(dump_path + '.tmp', dump_path)
+
+    def _dump_at_exit(self) -> None:
+        if self.enabled:
+            self.dump()
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """汇总统计结果
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (Dict[str, Dict[str, float]])预处理名称 --> 统计项:
+                        - calls: 调用次数
+                        - total_ms: 总耗时(ms)
+                        - avg_ms: 平均耗时(ms)
+                        - avg_kb: 平均输出大小(KB)
+                        - time_ratio: 耗时占所有预处理总耗时的比例
+                                      (Compose自身的耗时不参与计算)
+        """
+        merged = {}
+        sources = [self.stats]
+        if self.dump_dir is not None and os.path.isdir(self.dump_dir):
+            self.dump()
+            sources = []
+            for _f in os.listdir(self.dump_dir):
+                if _f.startswith(DUMP_PREFIX) and _f.endswith('.json'):
+                    with open(os.path.join(self.dump_dir, _f), 'r') as f:
+                        sources.append(json.load(f))
+        for stats in sources:
+            for name, (calls, elapsed, nbytes) in stats.items():
+                stat = merged.setdefault(name, [0, 0., 0])
+                stat[0] += calls
+                stat[1] += elapsed
+                stat[2] += nbytes
+
+        total = sum([v[1] for k, v in merged.items() if k != 'Compose'])
+        report = {}
+        for name, (calls, elapsed, nbytes) in merged.items():
+            report[name] = {
+                'calls': calls,
+                'total_ms': elapsed * 1e3,
+                'avg_ms': elapsed * 1e3 / max(calls, 1),
+                'avg_kb': nbytes / 1024. / max(calls, 1),
+                'time_ratio': elapsed / total if total > 0 and name != 'Compose' else 0.
+            }
+        return report
+
+    def summary(self) -> str:
+        """生成按总耗时降序排列的统计表
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (str)统计表文本
+        """
+        report = self.report()
+        lines = ['{0:<40s}{1:>10s}{2:>12s}{3:>10s}{4:>12s}{5:>8s}'.format(
+            'transform', 'calls', 'total(ms)', 'avg(ms)', 'avg(KB)', 'ratio')]
+        for name, stat in sorted(report.items(), key=lambda x: -x[1]['total_ms']):
+            lines.append('{0:<40s}{1:>10d}{2:>12.2f}{3:>10.3f}{4:>12.1f}{5:>7.1f}%'.format(
+                name, stat['calls'], stat['total_ms'], stat['avg_ms'],
+                stat['avg_kb'], stat['time_ratio'] * 100))
+        return '\n'.join(lines)
+
+    def to_vdl(self,
+               logdir: str='vlogs',
+               file_name: str='transform_profile.log',
+               step: int=0) -> None:
+        """将统计结果写入vdl标量日志(每个预处理记录avg_ms/avg_kb/calls)
+            desc:
+                Parameters:
+                    logdir: 日志保存的目录(str)
+                    file_name: 日志文件名(str)——xxxx.log
+                    step: 写入的step(int)
+                Returns:
+                    None
+        """
+        from vdlrecords import ScalarVDL # 只在导出时依赖visualdl
+        report = self.report()
+        items = ['avg_ms', 'avg_kb', 'calls']
+        tags = ['transform/{0}/{1}'.format(name, item) for name in report for item in items]
+        if len(tags) == 0:
+            logger.warning("The transform profiler hasn't any record to export.")
+            return
+        recorder = ScalarVDL(logdir=logdir,
+                             file_name=file_name,
+                             vdl_kind='scalar',
+                             tags=tags,
+                             display_name='transform_profile',
+                             resume_log=True)
+        for name, stat in report.items():
+            for item in items:
+                recorder(tag='transform/{0}/{1}'.format(name, item),
+                         data=float(stat[item]),
+                         step=step)
+        recorder.release()
+
+
+# 全局统计器: Transform.__call__中使用
+transform_profiler = TransformProfiler()
+if os.environ.get(PROFILE_ENV, None):
+    transform_profiler.enable(dump_dir=os.environ[PROFILE_ENV])
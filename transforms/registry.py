@@ -0,0 +1,235 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: transform registry and serialization
+# 预处理序列化:
+# 预处理只按"模块:类名 + 构造参数"序列化为紧凑的json配置，
+# worker进程中通过注册表重建(按需导入类所在模块)，不传递预处理运行时积累的状态；
+# 配置的哈希值可以作为缓存键(预处理指纹)
+import sys
+import json
+import hashlib
+import inspect
+import importlib
+import numpy as np
+
+from typing import Dict, Union, Any
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['TRANSFORM_REGISTRY', 'register_transform', 'transform_key', 'transform_to_config',
+           'transform_from_config', 'dumps_transform', 'loads_transform',
+           'transform_fingerprint']
+
+# 预处理注册表: "模块:类名" --> 类(Transform的子类定义时自动注册)
+TRANSFORM_REGISTRY = {}
+
+
+def transform_key(cls: type) -> str:
+    """预处理类在注册表与配置中的键
+        desc:
+            Parameters:
+                cls: 预处理类(type)
+            Returns:
+                (str)"模块:类名"——类名为__qualname__，不同模块中的同名类互不覆盖
+    """
+    return '{0}:{1}'.format(cls.__module__, cls.__qualname__)
+
+
+def register_transform(cls: type) -> type:
+    """注册预处理类(Transform的子类会自动注册，也可以作为装饰器使用)
+        desc:
+            Parameters:
+                cls: 预处理类(type)
+            Returns:
+                (type)预处理类
+            Others:
+                - 以下划线开头的类(如Compose内部的折叠预处理)不注册
+                - 同一模块中重新定义(如重新加载模块)时替换原有的类
+    """
+    if cls.__name__.startswith('_'):
+        return cls
+    TRANSFORM_REGISTRY[transform_key(cls)] = cls
+    return cls
+
+
+def _lookup_transform(name: str) -> type:
+    """按配置中的类型名查找预处理类
+        desc:
+            Parameters:
+                name: 类型名(str)——"模块:类名"，或不含模块的类名(唯一匹配时可用)
+            Returns:
+                (type)预处理类
+            Others:
+                - 类所在模块尚未导入时(如spawn启动的worker进程)先导入该模块
+                - 找不到或类名不唯一时抛出KeyError，模块导入失败时抛出ImportError
+    """
+    if name in TRANSFORM_REGISTRY:
+        return TRANSFORM_REGISTRY[name]
+    if ':' not in name:
+        matches = [cls for cls in TRANSFORM_REGISTRY.values() if cls.__name__ == name]
+        if len(matches) != 1:
+            raise KeyError("the transform '{0}' {1}".format(
+                name, "isn't registered" if len(matches) == 0 else
+                "is ambiguous({0})".format(sorted([transform_key(cls) for cls in matches]))))
+        return matches[0]
+    module_name, qualname = name.split(':', 1)
+    obj = importlib.import_module(module_name)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr, None)
+    # 作为主模块运行的脚本在spawn进程中的模块名为__mp_main__，按导入得到的类查找
+    if not isinstance(obj, type) or TRANSFORM_REGISTRY.get(transform_key(obj), None) is not obj:
+        raise KeyError("the transform '{0}' isn't registered".format(name))
+    return obj
+
+
+def capture_init_params(cls: type,
+                        args: tuple,
+                        kwargs: dict) -> Union[Dict[str, Any], None]:
+    """记录构造参数(含默认值)
+        desc:
+            Parameters:
+                cls: 预处理类(type)
+                args: 位置参数(tuple)
+                kwargs: 关键字参数(dict)
+            Returns:
+                (Dict[str, Any] or None)参数名 --> 参数值——无法按参数名记录时返回None
+    """
+    try:
+        bound = inspect.signature(cls.__init__).bind(None, *args, **kwargs)
+    except TypeError:
+        return None
+    bound.apply_defaults()
+    params = {}
+    for idx, (name, value) in enumerate(bound.arguments.items()):
+        if idx == 0: # self
+            continue
+        kind = bound.signature.parameters[name].kind
+        if kind == inspect.Parameter.VAR_POSITIONAL:
+            if len(value) > 0:
+                return None
+        elif kind == inspect.Parameter.VAR_KEYWORD:
+            params.update(value)
+        else:
+            params[name] = value
+    return params
+
+
+def _is_transform(value: Any) -> bool:
+    return TRANSFORM_REGISTRY.get(transform_key(type(value)), None) is type(value) and \
+        hasattr(value, '_params')
+
+
+def _to_plain(value: Any) -> Any:
+    """将参数值转换为json可表示的数据(预处理递归转换为配置)"""
+    if _is_transform(value):
+        if value._params is None:
+            raise TypeError("the init params of '{0}' are not recorded".format(type(value).__name__))
+        return {'type': transform_key(type(value)),
+                'params': dict([(k, _to_plain(v)) for k, v in value._params.items()])}
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(v) for v in value]
+    if isinstance(value, dict):
+        return dict([(str(k), _to_plain(v)) for k, v in value.items()])
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError("the value of type '{0}' can't be serialized".format(type(value).__name__))
+
+
+def _from_plain(value: Any) -> Any:
+    """将json数据还原为参数值(预处理配置递归重建)"""
+    if isinstance(value, dict):
+        if set(value.keys()) == {'type', 'params'} and isinstance(value['type'], str):
+            params = dict([(k, _from_plain(v)) for k, v in value['params'].items()])
+            return _lookup_transform(value['type'])(**params)
+        return dict([(k, _from_plain(v)) for k, v in value.items()])
+    if isinstance(value, list):
+        return [_from_plain(v) for v in value]
+    return value
+
+
+def transform_to_config(transform: Any) -> Any:
+    """将预处理(或预处理列表)转换为配置
+        desc:
+            Parameters:
+                transform: 预处理(Transform or list(Transform))
+            Returns:
+                (Any)配置——预处理: {'type': "模块:类名", 'params': {参数名: 参数值}}
+    """
+    try:
+        config = _to_plain(transform)
+    except TypeError as e:
+        error_traceback(logger=logger,
+                        lasterrorline_offset=2,
+                        num_lines=1)
+        logger.error("Summary: The transform can't be serialized, {0}.".format(e))
+        sys.exit(1)
+    return config
+
+
+def transform_from_config(config: Any) -> Any:
+    """根据配置重建预处理(或预处理列表)
+        desc:
+            Parameters:
+                config: 配置(transform_to_config的输出)
+            Returns:
+                (Any)预处理(Transform or list(Transform))
+            Others:
+                - 预处理类所在的模块未导入时按配置中的模块名导入
+                - 找不到预处理类时抛出KeyError/ImportError而不是退出进程:
+                  在进程池的worker中重建时，异常会返回给主进程，退出则会使任务挂起
+    """
+    try:
+        return _from_plain(config)
+    except (KeyError, ImportError) as e:
+        logger.error("Summary: The transform can't be rebuilt from config, {0}.".format(e))
+        raise
+
+
+def dumps_transform(transform: Any) -> str:
+    """将预处理序列化为紧凑的json字符串(键有序，相同配置得到相同字符串)
+        desc:
+            Parameters:
+                transform: 预处理(Transform or list(Transform))
+            Returns:
+                (str)json字符串
+    """
+    return json.dumps(transform_to_config(transform), sort_keys=True, separators=(',', ':'))
+
+
+def loads_transform(text: str) -> Any:
+    """根据json字符串重建预处理
+        desc:
+            Parameters:
+                text: dumps_transform的输出(str)
+            Returns:
+                (Any)预处理(Transform or list(Transform))
+    """
+    return transform_from_config(json.loads(text))
+
+
+def transform_fingerprint(transform: Any,
+                          length: int=16) -> str:
+    """预处理指纹: 序列化配置的sha1
+        desc:
+            Parameters:
+                transform: 预处理(Transform or list(Transform))
+                length: 指纹长度(int)
+            Returns:
+                (str)十六进制指纹
+    """
+    return hashlib.sha1(dumps_transform(transform).encode('utf-8')).hexdigest()[:length]
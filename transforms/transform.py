@@ -11,3 +11,243 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# includes: transform compose
+import sys
+import copy
+import numpy as np
+
+from typing import Dict, List, Tuple, Any
+
+from .operator import Transform, AffineTransform
+from .transform_ops import NormalizeImage, LUTNormalizeImage, Permute
+from .cache import CacheBoundary, _cache_key
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['Compose']
+
+
+class _FusedAffine(AffineTransform):
+    def __init__(self,
+                 transforms: List[AffineTransform]) -> None:
+        """连续几何预处理的折叠: 仿射矩阵相乘后只做一次warpAffine
+            desc:
+                Parameters:
+                    transforms: 连续的几何预处理(list(AffineTransform))
+                Returns:
+                    None
+        """
+        super(_FusedAffine, self).__init__(interp=transforms[0].interp,
+                                           border_value=transforms[0].border_value)
+        self.transforms = transforms
+        self.name = 'Fused[{0}]'.format('+'.join([op.name for op in transforms]))
+
+    def get_affine(self,
+                   im_h: int,
+                   im_w: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """依次采样各预处理的仿射矩阵并相乘
+            desc:
+                Parameters:
+                    im_h: 输入图像高(int)
+                    im_w: 输入图像宽(int)
+                Returns:
+                    (Tuple[np.ndarray, Tuple[int, int]])3x3仿射矩阵, (out_h, out_w)
+        """
+        matrix = np.eye(3)
+        out_size = (im_h, im_w)
+        for op in self.transforms:
+            _matrix, out_size = op.get_affine(*out_size)
+            matrix = _matrix @ matrix
+        return matrix, out_size
+
+
+class _FusedNormalizePermute(Transform):
+    def __init__(self,
+                 normalize: NormalizeImage,
+                 block_bytes: int=1 << 18) -> None:
+        """归一化+float32转换+HWC转CHW的折叠: 对图像数据只做一次遍历
+            desc:
+                Parameters:
+                    normalize: 被折叠的归一化预处理(NormalizeImage)
+                    block_bytes: 分块计算时每块的字节数(int)
+                Returns:
+                    None
+        """
+        super(_FusedNormalizePermute, self).__init__()
+        self.normalize = normalize
+        self.block_bytes = block_bytes
+        self.name = 'Fused[{0}+Permute]'.format(normalize.name)
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """按行分块: 乘加在缓存中完成后直接写入CHW输出
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据——image: [C, H, W] float32
+        """
+        image = sample['image']
+        im_h, im_w, im_c = image.shape
+        scale, bias = self.normalize._get_row_coeffs(im_w)
+        out = np.empty((im_c, im_h, im_w), dtype=np.float32)
+        block = max(1, self.block_bytes // (im_w * im_c * 4))
+        buffer = np.empty((block, im_w * im_c), dtype=np.float32)
+        for start in range(0, im_h, block):
+            rows = image[start:start + block].reshape(-1, im_w * im_c)
+            _buffer = buffer[:len(rows)]
+            np.multiply(rows, scale, out=_buffer)
+            np.add(_buffer, bias, out=_buffer)
+            out[:, start:start + len(rows)] = \
+                _buffer.reshape(-1, im_w, im_c).transpose((2, 0, 1))
+        sample['image'] = out
+        return sample
+
+
+class Compose(Transform):
+    def __init__(self,
+                 transforms: List[Transform],
+                 fuse: bool=True) -> None:
+        """预处理组合: 依次执行transforms，支持预处理折叠
+            desc:
+                Parameters:
+                    transforms: 预处理列表(list(Transform))
+                    fuse: 是否折叠预处理(bool)
+                Returns:
+                    None
+                Others:
+                    折叠规则(输出与逐个执行一致，插值误差在容差内):
+                    - 连续的AffineTransform(插值方式与填充值相同)折叠为一次warpAffine，
+                      边界框使用同一个仿射矩阵变换
+                    - NormalizeImage+Permute折叠为一次遍历，直接输出CHW的float32图像
+                    - LUTNormalizeImage+Permute折叠为逐通道查表，直接输出CHW的float32图像
+                    前缀缓存:
+                    - transforms中包含CacheBoundary时，其之前的(确定性)预处理结果按图像路径(没有时按im_id)缓存，
+                      命中缓存的样本只执行之后的预处理；折叠不跨越缓存边界
+        """
+        super(Compose, self).__init__()
+        self.transforms = transforms
+        self.fuse = fuse
+        boundaries = [idx for idx, op in enumerate(transforms) if isinstance(op, CacheBoundary)]
+        if len(boundaries) > 1:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The Compose only supports one CacheBoundary.(got {0})".format(len(boundaries)))
+                sys.exit(1)
+        self.cache = None
+        if len(boundaries) == 1:
+            prefix = transforms[:boundaries[0]]
+            suffix = transforms[boundaries[0] + 1:]
+            self.cache = transforms[boundaries[0]].build_cache(prefix)
+        else:
+            prefix, suffix = [], list(transforms)
+        self.prefix_ops = self._build_ops(prefix) if fuse else list(prefix)
+        self.suffix_ops = self._build_ops(suffix) if fuse else list(suffix)
+        self.ops = self.prefix_ops + self.suffix_ops
+        if fuse:
+            logger.info("Compose transforms: {0}".format(self.ops))
+
+    @staticmethod
+    def _build_ops(transforms: List[Transform]) -> List[Transform]:
+        """分析预处理列表，生成折叠后的执行序列
+            desc:
+                Parameters:
+                    transforms: 预处理列表(list(Transform))
+                Returns:
+                    (List[Transform])折叠后的预处理列表
+        """
+        ops = []
+        idx = 0
+        while idx < len(transforms):
+            op = transforms[idx]
+            # 1.连续几何预处理折叠
+            if isinstance(op, AffineTransform):
+                end = idx + 1
+                while end < len(transforms) and \
+                        isinstance(transforms[end], AffineTransform) and \
+                        transforms[end].interp == op.interp and \
+                        transforms[end].border_value == op.border_value:
+                    end += 1
+                if end - idx > 1:
+                    ops.append(_FusedAffine(transforms[idx:end]))
+                else: # 单个几何预处理使用自身的专用实现
+                    ops.append(op)
+                idx = end
+                continue
+            # 2.归一化+通道重排折叠
+            if isinstance(op, NormalizeImage) and idx + 1 < len(transforms) and \
+                    isinstance(transforms[idx + 1], Permute):
+                ops.append(_FusedNormalizePermute(op))
+                idx += 2
+                continue
+            # 3.查找表归一化+通道重排折叠: 查表结果直接写入CHW输出
+            if isinstance(op, LUTNormalizeImage) and idx + 1 < len(transforms) and \
+                    isinstance(transforms[idx + 1], Permute):
+                fused = copy.copy(op)
+                fused.to_chw = True
+                fused.name = 'Fused[{0}+Permute]'.format(op.name)
+                ops.append(fused)
+                idx += 2
+                continue
+            ops.append(op)
+            idx += 1
+        return ops
+
+    def _apply_prefix(self,
+                      sample: Dict[str, Any]) -> Dict[str, Any]:
+        """执行缓存边界之前的预处理(命中缓存时直接读取)
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        if self.cache is None:
+            return sample
+
+        key = _cache_key(sample)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            sample.update(cached)
+        else:
+            for op in self.prefix_ops:
+                sample = op(sample)
+            if key is not None:
+                self.cache.put(key, {k: v for k, v in sample.items()
+                                     if isinstance(v, np.ndarray)})
+        return sample
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """依次执行预处理
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        sample = self._apply_prefix(sample)
+        for op in self.suffix_ops:
+            sample = op(sample)
+        return sample
+
+    def apply_samples(self,
+                      samples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """依次执行预处理(批量样本)
+            desc:
+                Parameters:
+                    samples: 批量样本数据(list(dict))
+                Returns:
+                    (List[Dict[str, Any]])处理后的样本数据列表
+                Others:
+                    - 缓存前缀逐个样本执行，之后的预处理以整个列表调用，
+                      重载了apply_batch的预处理在样本可堆叠时按批量执行
+        """
+        samples = [self._apply_prefix(sample) for sample in samples]
+        for op in self.suffix_ops:
+            samples = op(samples)
+        return samples
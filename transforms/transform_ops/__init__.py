@@ -11,3 +11,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# includes: transform ops init module
+from .basic_ops import *
+from .augment_ops import *
+from .mix_ops import *
+
+__all__ = ['DecodeImage', 'Resize', 'NormalizeImage', 'LUTNormalizeImage', 'Permute', 'ClipBox',
+           'RandomFlip', 'RandomResize', 'RandomExpand', 'RandomCrop',
+           'SampleRingBuffer', 'CanvasPool', 'Mosaic', 'MixUp']
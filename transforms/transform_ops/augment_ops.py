@@ -0,0 +1,338 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: geometric augment ops
+# 所有边界框相关字段(gt_bbox/gt_class/gt_score/difficult)的更新均为整体数组运算，
+# 不存在逐个边界框的python循环
+import sys
+import cv2
+import numpy as np
+
+from typing import Dict, List, Tuple, Union, Any
+
+from ..operator import Transform, AffineTransform, BOX_FIELDS, clip_bbox
+from .basic_ops import Resize
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['RandomFlip', 'RandomResize', 'RandomExpand', 'RandomCrop']
+
+
+def _bbox_iou(boxes1: np.ndarray,
+              boxes2: np.ndarray) -> np.ndarray:
+    """计算两组边界框两两之间的IoU
+        desc:
+            Parameters:
+                boxes1: 边界框(np.ndarray)——[N, 4]
+                boxes2: 边界框(np.ndarray)——[M, 4]
+            Returns:
+                (np.ndarray)IoU矩阵——[N, M]
+    """
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    union = area1[:, None] + area2[None, :] - inter
+    return inter / np.maximum(union, 1e-10)
+
+
+def _filter_boxes(sample: Dict[str, Any],
+                  keep: np.ndarray) -> Dict[str, Any]:
+    """按掩码同时筛选所有边界框相关字段
+        desc:
+            Parameters:
+                sample: 样本数据(dict)
+                keep: 保留掩码/序号(np.ndarray)
+            Returns:
+                (Dict[str, Any])筛选后的样本数据
+    """
+    for key in BOX_FIELDS:
+        if key in sample:
+            sample[key] = sample[key][keep]
+    return sample
+
+
+class RandomFlip(AffineTransform):
+    def __init__(self,
+                 prob: float=0.5) -> None:
+        """随机水平翻转
+            desc:
+                Parameters:
+                    prob: 翻转概率(float: [0., 1.])
+                Returns:
+                    None
+        """
+        super(RandomFlip, self).__init__()
+        self.prob = prob
+
+    def get_affine(self,
+                   im_h: int,
+                   im_w: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """采样是否翻转，返回对应的仿射矩阵: x' = w - x
+            desc:
+                Parameters:
+                    im_h: 输入图像高(int)
+                    im_w: 输入图像宽(int)
+                Returns:
+                    (Tuple[np.ndarray, Tuple[int, int]])3x3仿射矩阵, (out_h, out_w)
+        """
+        if np.random.uniform(0., 1.) < self.prob:
+            matrix = np.array([[-1., 0., im_w], [0., 1., 0.], [0., 0., 1.]])
+        else:
+            matrix = np.eye(3)
+        return matrix, (im_h, im_w)
+
+    def warp_image(self,
+                   image: np.ndarray,
+                   matrix: np.ndarray,
+                   out_size: Tuple[int, int]) -> np.ndarray:
+        # 单独翻转时直接使用数组翻转
+        if matrix[0, 0] < 0:
+            return cv2.flip(image, 1)
+        return image
+
+
+class RandomResize(Resize):
+    def __init__(self,
+                 target_sizes: List[Union[int, List[int]]],
+                 keep_ratio: bool=True,
+                 interp: int=cv2.INTER_LINEAR) -> None:
+        """多尺度随机缩放: 每次从target_sizes中随机选择一个目标尺寸
+            desc:
+                Parameters:
+                    target_sizes: 候选目标尺寸(list(int or list(int)))
+                    keep_ratio: 是否保持宽高比(bool)
+                    interp: 插值方式(int)——cv2.INTER_*
+                Returns:
+                    None
+        """
+        target_sizes = [[size, size] if isinstance(size, int) else size
+                        for size in target_sizes]
+        super(RandomResize, self).__init__(target_size=target_sizes[0],
+                                           keep_ratio=keep_ratio,
+                                           interp=interp)
+        self.target_sizes = target_sizes
+
+    def get_target_size(self) -> List[int]:
+        """随机选择本次缩放的目标尺寸
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (List[int])目标尺寸[h, w]
+        """
+        return self.target_sizes[np.random.randint(len(self.target_sizes))]
+
+
+class RandomExpand(AffineTransform):
+    def __init__(self,
+                 ratio: float=4.,
+                 prob: float=0.5,
+                 fill_value: Union[float, Tuple[float, ...]]=(127.5, 127.5, 127.5)) -> None:
+        """随机扩张: 将图像随机放置在更大的填充画布上
+            desc:
+                Parameters:
+                    ratio: 画布边长相对原图的最大倍数(float, > 1.)
+                    prob: 扩张概率(float: [0., 1.])
+                    fill_value: 画布填充值(float or tuple(float))
+                Returns:
+                    None
+        """
+        if isinstance(fill_value, (int, float)):
+            fill_value = (fill_value, ) * 3
+        super(RandomExpand, self).__init__(border_value=tuple(fill_value))
+        if ratio <= 1.:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The ratio should be more than 1.(ratio: {0})".format(ratio))
+                sys.exit(1)
+        self.ratio = ratio
+        self.prob = prob
+        self.fill_value = fill_value
+
+    def get_affine(self,
+                   im_h: int,
+                   im_w: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """采样画布尺寸与放置位置，返回平移矩阵
+            desc:
+                Parameters:
+                    im_h: 输入图像高(int)
+                    im_w: 输入图像宽(int)
+                Returns:
+                    (Tuple[np.ndarray, Tuple[int, int]])3x3仿射矩阵, (out_h, out_w)
+        """
+        if np.random.uniform(0., 1.) >= self.prob:
+            return np.eye(3), (im_h, im_w)
+        ratio = np.random.uniform(1., self.ratio)
+        out_h, out_w = int(im_h * ratio), int(im_w * ratio)
+        y = np.random.randint(0, out_h - im_h + 1)
+        x = np.random.randint(0, out_w - im_w + 1)
+        matrix = np.array([[1., 0., x], [0., 1., y], [0., 0., 1.]])
+        return matrix, (out_h, out_w)
+
+    def warp_image(self,
+                   image: np.ndarray,
+                   matrix: np.ndarray,
+                   out_size: Tuple[int, int]) -> np.ndarray:
+        # 单独扩张时直接在图像四周填充
+        if out_size == image.shape[:2]:
+            return image
+        x, y = int(matrix[0, 2]), int(matrix[1, 2])
+        bottom = out_size[0] - image.shape[0] - y
+        right = out_size[1] - image.shape[1] - x
+        return cv2.copyMakeBorder(image, y, bottom, x, right,
+                                  cv2.BORDER_CONSTANT, value=self.fill_value)
+
+
+class RandomCrop(Transform):
+    def __init__(self,
+                 thresholds: List[float]=[.1, .3, .5, .7, .9],
+                 scaling: List[float]=[.3, 1.],
+                 aspect_ratio: List[float]=[.5, 2.],
+                 num_attempts: int=50,
+                 allow_no_crop: bool=True,
+                 cover_all_box: bool=False) -> None:
+        """带IoU约束的随机裁剪(SSD风格)
+            desc:
+                Parameters:
+                    thresholds: 裁剪框与边界框的最小IoU约束候选(list(float))
+                    scaling: 裁剪框边长相对原图的比例范围(list(float))
+                    aspect_ratio: 裁剪框宽高比范围(list(float))
+                    num_attempts: 每个IoU约束下的候选裁剪框数量(int)
+                    allow_no_crop: 是否允许不裁剪(bool)
+                    cover_all_box: 是否要求裁剪框与所有边界框都满足IoU约束(bool)
+                Returns:
+                    None
+                Others:
+                    - 所有约束下的全部候选裁剪框与所有边界框在一次向量化调用中计算IoU
+                    - 按随机打乱后的约束顺序，选择第一个满足约束的候选
+                    - 只保留中心点落在裁剪框内的边界框，
+                      坐标裁剪到[0, w-1], [0, h-1](与ClipBox、VOC标注解析一致)
+        """
+        super(RandomCrop, self).__init__()
+        self.thresholds = thresholds
+        self.scaling = scaling
+        self.aspect_ratio = aspect_ratio
+        self.num_attempts = num_attempts
+        self.allow_no_crop = allow_no_crop
+        self.cover_all_box = cover_all_box
+
+    def _sample_crops(self,
+                      num: int,
+                      im_h: int,
+                      im_w: int) -> np.ndarray:
+        """一次采样num个候选裁剪框
+            desc:
+                Parameters:
+                    num: 候选数量(int)
+                    im_h: 图像高(int)
+                    im_w: 图像宽(int)
+                Returns:
+                    (np.ndarray)候选裁剪框——[num, 4]: x1, y1, x2, y2
+        """
+        scale = np.random.uniform(self.scaling[0], self.scaling[1], num)
+        # 宽高比范围受scale限制，保证裁剪框不超出原图
+        min_ar = np.maximum(self.aspect_ratio[0], scale ** 2)
+        max_ar = np.minimum(self.aspect_ratio[1], 1. / scale ** 2)
+        ar = np.random.uniform(min_ar, max_ar)
+        crop_h = (im_h * scale / np.sqrt(ar)).astype(np.int64)
+        crop_w = (im_w * scale * np.sqrt(ar)).astype(np.int64)
+        crop_h = np.clip(crop_h, 1, im_h)
+        crop_w = np.clip(crop_w, 1, im_w)
+        crop_y = (np.random.uniform(0., 1., num) * (im_h - crop_h + 1)).astype(np.int64)
+        crop_x = (np.random.uniform(0., 1., num) * (im_w - crop_w + 1)).astype(np.int64)
+        return np.stack([crop_x, crop_y, crop_x + crop_w, crop_y + crop_h], axis=1)
+
+    def _select_crop(self,
+                     gt_bbox: np.ndarray,
+                     im_h: int,
+                     im_w: int) -> Union[np.ndarray, None]:
+        """向量化评估所有候选裁剪框，选择满足约束的裁剪框
+            desc:
+                Parameters:
+                    gt_bbox: 边界框(np.ndarray)——[M, 4]
+                    im_h: 图像高(int)
+                    im_w: 图像宽(int)
+                Returns:
+                    (np.ndarray or None)裁剪框[4]——None表示不裁剪
+        """
+        thresholds = list(self.thresholds)
+        if self.allow_no_crop:
+            thresholds.append('no_crop')
+        np.random.shuffle(thresholds)
+        # 约束顺序: 遇到no_crop之前都没有合适的候选时不裁剪
+        if thresholds[0] == 'no_crop':
+            return None
+        if 'no_crop' in thresholds:
+            thresholds = thresholds[:thresholds.index('no_crop')]
+        thresholds = np.asarray(thresholds, dtype=np.float32)
+
+        num_attempts = self.num_attempts
+        crops = self._sample_crops(len(thresholds) * num_attempts, im_h, im_w)
+        # [K*T, M]: 全部候选与全部边界框的IoU
+        iou = _bbox_iou(crops.astype(np.float32), gt_bbox)
+        crop_thresh = np.repeat(thresholds, num_attempts)[:, None]
+        if self.cover_all_box:
+            valid = (iou >= crop_thresh).all(axis=1)
+        else:
+            valid = (iou >= crop_thresh).any(axis=1)
+        # 至少有一个边界框中心落在裁剪框内
+        centers = (gt_bbox[:, :2] + gt_bbox[:, 2:]) / 2.
+        inside = (centers[None, :, 0] >= crops[:, None, 0]) & \
+                 (centers[None, :, 0] < crops[:, None, 2]) & \
+                 (centers[None, :, 1] >= crops[:, None, 1]) & \
+                 (centers[None, :, 1] < crops[:, None, 3])
+        valid &= inside.any(axis=1)
+        if not valid.any():
+            return None
+        return crops[np.argmax(valid)]
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """随机裁剪单样本
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        gt_bbox = sample.get('gt_bbox', None)
+        if gt_bbox is None or len(gt_bbox) == 0:
+            return sample
+        im_h, im_w = sample['image'].shape[:2]
+        crop = self._select_crop(gt_bbox, im_h, im_w)
+        if crop is None:
+            return sample
+        x1, y1, x2, y2 = [int(v) for v in crop]
+        # 1.保留中心点在裁剪框内的边界框，并同步筛选类别/困难标记等字段
+        centers = (gt_bbox[:, :2] + gt_bbox[:, 2:]) / 2.
+        keep = (centers[:, 0] >= x1) & (centers[:, 0] < x2) & \
+               (centers[:, 1] >= y1) & (centers[:, 1] < y2)
+        sample = _filter_boxes(sample, keep)
+        # 2.平移到裁剪框坐标系并裁剪到新图像范围内(与ClipBox一致: [0, w-1], [0, h-1])，
+        #   去除裁剪后退化为空的边界框
+        gt_bbox = sample['gt_bbox'] - np.array([x1, y1, x1, y1], dtype=gt_bbox.dtype)
+        clip_bbox(gt_bbox, y2 - y1, x2 - x1)
+        sample['gt_bbox'] = gt_bbox
+        sample = _filter_boxes(sample, (gt_bbox[:, 2] > gt_bbox[:, 0]) &
+                                       (gt_bbox[:, 3] > gt_bbox[:, 1]))
+        sample['image'] = sample['image'][y1:y2, x1:x2]
+        if 'im_shape' in sample:
+            sample['im_shape'] = np.asarray([y2 - y1, x2 - x1], dtype=np.float32)
+        return sample
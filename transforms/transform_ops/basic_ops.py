@@ -0,0 +1,470 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: basic image/bbox transform ops
+import sys
+import cv2
+import numpy as np
+from collections import OrderedDict
+
+from typing import Dict, List, Tuple, Union, Any
+
+from ..operator import Transform, AffineTransform, clip_bbox
+from .mix_ops import CanvasPool
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['DecodeImage', 'Resize', 'NormalizeImage', 'LUTNormalizeImage', 'Permute', 'ClipBox']
+
+
+class DecodeImage(Transform):
+    def __init__(self,
+                 to_rgb: bool=True) -> None:
+        """读取并解码样本图像
+            desc:
+                Parameters:
+                    to_rgb: 是否将opencv解码的BGR格式转为RGB格式(bool)
+                Returns:
+                    None
+                Others:
+                    - 读取sample['im_file']，输出image: [H, W, 3] uint8
+                    - 同时记录im_shape与scale_factor(初始为[1., 1.])
+                    - num_decodes记录当前进程内实际解码的图像数
+        """
+        super(DecodeImage, self).__init__()
+        self.to_rgb = to_rgb
+        self.num_decodes = 0
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """解码单样本图像
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——im_file: 图像路径
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        if 'image' not in sample:
+            with open(sample['im_file'], 'rb') as f:
+                sample['image'] = f.read()
+        image = sample['image']
+        if isinstance(image, bytes): # 原始字节流需要解码
+            image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+            self.num_decodes += 1
+            if image is None:
+                try:
+                    raise ValueError()
+                except:
+                    error_traceback(logger=logger,
+                                    lasterrorline_offset=6,
+                                    num_lines=1)
+                    logger.error("Summary: The image file can't be decoded.(path at: {0})".format(
+                        sample.get('im_file', None)))
+                    sys.exit(1)
+            if self.to_rgb:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        sample['image'] = image
+        sample['im_shape'] = np.asarray(image.shape[:2], dtype=np.float32)
+        sample['scale_factor'] = np.ones((2,), dtype=np.float32)
+        return sample
+
+
+class Resize(AffineTransform):
+    def __init__(self,
+                 target_size: Union[int, List[int]],
+                 keep_ratio: bool=True,
+                 interp: int=cv2.INTER_LINEAR) -> None:
+        """图像缩放
+            desc:
+                Parameters:
+                    target_size: 目标尺寸(int or list(int))——[h, w]
+                    keep_ratio: 是否保持宽高比(bool)
+                                True: 短边不超过min(target_size)，
+                                      长边不超过max(target_size)
+                    interp: 插值方式(int)——cv2.INTER_*
+                Returns:
+                    None
+        """
+        super(Resize, self).__init__(interp=interp)
+        if isinstance(target_size, int):
+            target_size = [target_size, target_size]
+        self.target_size = target_size
+        self.keep_ratio = keep_ratio
+
+    def get_target_size(self) -> List[int]:
+        """获取本次缩放的目标尺寸(多尺度缩放时重载)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (List[int])目标尺寸[h, w]
+        """
+        return self.target_size
+
+    def get_output_size(self,
+                        im_h: int,
+                        im_w: int,
+                        target_size: Union[List[int], None]=None) -> Tuple[int, int]:
+        """计算缩放后的输出尺寸
+            desc:
+                Parameters:
+                    im_h: 输入图像高(int)
+                    im_w: 输入图像宽(int)
+                    target_size: 目标尺寸(list(int))——None则使用self.target_size
+                Returns:
+                    (Tuple[int, int])输出尺寸(out_h, out_w)
+        """
+        if target_size is None:
+            target_size = self.target_size
+        if not self.keep_ratio:
+            return int(target_size[0]), int(target_size[1])
+        size_min, size_max = min(target_size), max(target_size)
+        scale = min(size_min / min(im_h, im_w), size_max / max(im_h, im_w))
+        return int(round(im_h * scale)), int(round(im_w * scale))
+
+    def get_affine(self,
+                   im_h: int,
+                   im_w: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """获取缩放矩阵与输出尺寸
+            desc:
+                Parameters:
+                    im_h: 输入图像高(int)
+                    im_w: 输入图像宽(int)
+                Returns:
+                    (Tuple[np.ndarray, Tuple[int, int]])3x3仿射矩阵, (out_h, out_w)
+        """
+        out_h, out_w = self.get_output_size(im_h, im_w, self.get_target_size())
+        matrix = np.diag([out_w / im_w, out_h / im_h, 1.])
+        return matrix, (out_h, out_w)
+
+    def warp_image(self,
+                   image: np.ndarray,
+                   matrix: np.ndarray,
+                   out_size: Tuple[int, int]) -> np.ndarray:
+        # 单独缩放时使用cv2.resize
+        return cv2.resize(image, (out_size[1], out_size[0]),
+                          interpolation=self.interp)
+
+
+class NormalizeImage(Transform):
+    def __init__(self,
+                 mean: List[float]=[0.485, 0.456, 0.406],
+                 std: List[float]=[0.229, 0.224, 0.225],
+                 is_scale: bool=True,
+                 max_row_coeffs: int=32) -> None:
+        """图像归一化: (image / 255. - mean) / std
+            desc:
+                Parameters:
+                    mean: 各通道均值(list(float))
+                    std: 各通道标准差(list(float))
+                    is_scale: 是否先将像素值缩放到[0, 1](bool)
+                    max_row_coeffs: 按图像宽度平铺的系数最多缓存的宽度数(int)
+                Returns:
+                    None
+                Others:
+                    - 输出图像为float32
+                    - 归一化折叠为一次乘法与一次加法: image * scale + bias
+                    - 平铺系数按宽度LRU缓存，多尺度训练时超出后淘汰最久未使用的宽度
+        """
+        super(NormalizeImage, self).__init__()
+        if len(mean) != len(std) or 0 in std:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The mean and std should have the same length,"
+                    " and std can't be 0.(mean: {0}, std: {1})".format(mean, std))
+                sys.exit(1)
+        self.mean = mean
+        self.std = std
+        self.is_scale = is_scale
+        # 预先计算折叠后的系数
+        std = np.asarray(std, dtype=np.float32)
+        self.scale = (1. / std) / (255. if is_scale else 1.)
+        self.bias = -np.asarray(mean, dtype=np.float32) / std
+        self.max_row_coeffs = max_row_coeffs
+        self._row_coeffs = OrderedDict() # 图像宽度 --> 平铺后的(scale, bias)
+        self.block_bytes = 1 << 18 # 分块计算时每块输出的字节数
+
+    def _get_row_coeffs(self, width: int) -> tuple:
+        # 按图像宽度平铺系数: 最内层循环长度由C变为W*C
+        coeffs = self._row_coeffs.get(width, None)
+        if coeffs is not None:
+            self._row_coeffs.move_to_end(width)
+            return coeffs
+        coeffs = (np.tile(self.scale, width), np.tile(self.bias, width))
+        self._row_coeffs[width] = coeffs
+        while len(self._row_coeffs) > self.max_row_coeffs:
+            self._row_coeffs.popitem(last=False)
+        return coeffs
+
+    def _normalize(self, image: np.ndarray) -> np.ndarray:
+        # 通道位于最后一维: HWC与NHWC均按[-1, W*C]的行进行计算
+        shape = image.shape
+        scale, bias = self._get_row_coeffs(shape[-2])
+        rows = image.reshape(-1, shape[-2] * shape[-1])
+        out = np.empty(rows.shape, dtype=np.float32)
+        # 按行分块计算，乘加在缓存中完成，避免整图多次往返内存
+        block = max(1, self.block_bytes // (rows.shape[1] * 4))
+        for start in range(0, rows.shape[0], block):
+            _out = out[start:start + block]
+            np.multiply(rows[start:start + block], scale, out=_out)
+            np.add(_out, bias, out=_out)
+        return out.reshape(shape)
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """归一化单样本图像
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        sample['image'] = self._normalize(sample['image'])
+        return sample
+
+    def apply_batch(self,
+                    batch: Dict[str, Any]) -> Dict[str, Any]:
+        """归一化批量图像
+            desc:
+                Parameters:
+                    batch: 批量数据(dict)——image: [N, H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的批量数据
+        """
+        batch['image'] = self._normalize(batch['image'])
+        return batch
+
+
+class LUTNormalizeImage(Transform):
+    def __init__(self,
+                 mean: List[float]=[0.485, 0.456, 0.406],
+                 std: List[float]=[0.229, 0.224, 0.225],
+                 is_scale: bool=True,
+                 to_chw: bool=False,
+                 inplace: bool=False,
+                 pool_size: int=4) -> None:
+        """查找表归一化: uint8图像按通道查表，一次gather直接得到float32结果
+            desc:
+                Parameters:
+                    mean: 各通道均值(list(float))
+                    std: 各通道标准差(list(float))
+                    is_scale: 是否先将像素值缩放到[0, 1](bool)
+                    to_chw: 是否同时完成HWC --> CHW的通道重排(bool)
+                    inplace: 是否写入预先申请、循环复用的输出缓冲区(bool)
+                    pool_size: 输出缓冲区个数(int)——inplace时有效
+                Returns:
+                    None
+                Others:
+                    - uint8输入: 每个通道256项的float32查找表(cv2.LUT)，
+                      to_chw时逐通道查表后直接写入CHW输出的对应平面
+                    - 其它类型输入: 退化为折叠后的一次乘法与一次加法
+                    - 输出缓冲区通过弱引用判断是否空闲(见CanvasPool)，
+                      仍被样本或批量数据引用的缓冲区不会被覆盖
+                    - 与Permute相邻时可以被Compose折叠为to_chw=True
+        """
+        super(LUTNormalizeImage, self).__init__()
+        if len(mean) != len(std) or 0 in std:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The mean and std should have the same length,"
+                    " and std can't be 0.(mean: {0}, std: {1})".format(mean, std))
+                sys.exit(1)
+        self.mean = mean
+        self.std = std
+        self.is_scale = is_scale
+        self.to_chw = to_chw
+        self.inplace = inplace
+        # 折叠后的系数与查找表: lut[v, c] = v * scale[c] + bias[c]
+        std = np.asarray(std, dtype=np.float32)
+        self.scale = (1. / std) / (255. if is_scale else 1.)
+        self.bias = -np.asarray(mean, dtype=np.float32) / std
+        self.lut = (np.arange(256, dtype=np.float32)[:, None] * self.scale +
+                    self.bias).astype(np.float32) # [256, C]
+        self._image_lut = np.ascontiguousarray(self.lut[None]) # [1, 256, C]: 各通道同时查表
+        self._channel_luts = [np.ascontiguousarray(self.lut[:, c]) for c in range(len(mean))]
+        self.pool = CanvasPool(max_size=pool_size)
+
+    def _get_output(self,
+                    shape: Tuple[int, ...]) -> np.ndarray:
+        # inplace时从缓冲池中获取输出，否则重新申请
+        if self.inplace:
+            return self.pool.acquire(shape, np.float32)
+        return np.empty(shape, dtype=np.float32)
+
+    def _normalize_hwc(self,
+                       image: np.ndarray,
+                       out: np.ndarray) -> np.ndarray:
+        """归一化单张图像，输出HWC
+            desc:
+                Parameters:
+                    image: 图像数据(np.ndarray)——[H, W, C]
+                    out: 输出(np.ndarray)——[H, W, C] float32
+                Returns:
+                    (np.ndarray)归一化后的图像(即out)
+        """
+        if image.dtype == np.uint8:
+            result = cv2.LUT(image, self._image_lut, dst=out)
+            if not np.may_share_memory(result, out): # 输出无法直接写入时复制
+                out[...] = result
+            return out
+        np.multiply(image, self.scale, out=out)
+        np.add(out, self.bias, out=out)
+        return out
+
+    def _normalize_chw(self,
+                       image: np.ndarray,
+                       out: np.ndarray) -> np.ndarray:
+        """归一化单张图像，输出CHW
+            desc:
+                Parameters:
+                    image: 图像数据(np.ndarray)——[H, W, C]
+                    out: 输出(np.ndarray)——[C, H, W] float32
+                Returns:
+                    (np.ndarray)归一化后的图像(即out)
+        """
+        if image.dtype == np.uint8:
+            # 先拆分为连续的通道平面，再逐通道查表写入输出平面
+            for c, plane in enumerate(cv2.split(image)):
+                result = cv2.LUT(plane, self._channel_luts[c], dst=out[c])
+                if not np.may_share_memory(result, out):
+                    out[c] = result.reshape(out[c].shape)
+            return out
+        for c in range(image.shape[2]):
+            np.multiply(image[..., c], self.scale[c], out=out[c])
+            np.add(out[c], self.bias[c], out=out[c])
+        return out
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """归一化单样本图像
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据——image: [H, W, C]或[C, H, W] float32
+        """
+        image = sample['image']
+        im_h, im_w, im_c = image.shape
+        if self.to_chw:
+            out = self._normalize_chw(image, self._get_output((im_c, im_h, im_w)))
+        else:
+            out = self._normalize_hwc(image, self._get_output(image.shape))
+        sample['image'] = out
+        return sample
+
+    def apply_batch(self,
+                    batch: Dict[str, Any]) -> Dict[str, Any]:
+        """归一化批量图像
+            desc:
+                Parameters:
+                    batch: 批量数据(dict)——image: [N, H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的批量数据——image: [N, H, W, C]或[N, C, H, W] float32
+        """
+        image = batch['image']
+        num, im_h, im_w, im_c = image.shape
+        if self.to_chw:
+            out = self._get_output((num, im_c, im_h, im_w))
+            for idx in range(num):
+                self._normalize_chw(image[idx], out[idx])
+        else:
+            # NHWC按[N*H, W, C]的一张图像处理
+            out = self._get_output(image.shape)
+            self._normalize_hwc(image.reshape(num * im_h, im_w, im_c),
+                                out.reshape(num * im_h, im_w, im_c))
+        batch['image'] = out
+        return batch
+
+
+class Permute(Transform):
+    def __init__(self) -> None:
+        """图像通道重排: HWC --> CHW(批量时NHWC --> NCHW)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+        """
+        super(Permute, self).__init__()
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """重排单样本图像通道
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据——image: [C, H, W]
+        """
+        sample['image'] = np.ascontiguousarray(sample['image'].transpose((2, 0, 1)))
+        return sample
+
+    def apply_batch(self,
+                    batch: Dict[str, Any]) -> Dict[str, Any]:
+        """重排批量图像通道
+            desc:
+                Parameters:
+                    batch: 批量数据(dict)——image: [N, H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的批量数据——image: [N, C, H, W]
+        """
+        batch['image'] = np.ascontiguousarray(batch['image'].transpose((0, 3, 1, 2)))
+        return batch
+
+
+class ClipBox(Transform):
+    def __init__(self) -> None:
+        """将边界框坐标裁剪到图像范围内: x: [0, w-1], y: [0, h-1]
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    None
+                Others:
+                    - 需要在Permute之前使用(根据HWC格式的image获取宽高)
+        """
+        super(ClipBox, self).__init__()
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """裁剪单样本的边界框
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——gt_bbox: [M, 4]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        im_h, im_w = sample['image'].shape[:2]
+        clip_bbox(sample['gt_bbox'], im_h, im_w)
+        return sample
+
+    def apply_batch(self,
+                    batch: Dict[str, Any]) -> Dict[str, Any]:
+        """裁剪批量数据的边界框(补零的边界框裁剪后仍为0)
+            desc:
+                Parameters:
+                    batch: 批量数据(dict)——gt_bbox: [N, M, 4]
+                Returns:
+                    (Dict[str, Any])处理后的批量数据
+        """
+        im_h, im_w = batch['image'].shape[1:3]
+        clip_bbox(batch['gt_bbox'], im_h, im_w)
+        return batch
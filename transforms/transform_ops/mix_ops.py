@@ -0,0 +1,467 @@
+# Copyright (c) 2022 Jinghui Cai. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# includes: multi-sample mix ops
+# 多样本混合增强(Mosaic/MixUp):
+# 混合对象取自当前进程(DataLoader的worker进程)内最近解码样本的环形缓冲区，
+# 不额外读取与解码图像；输出画布从缓冲池中复用，不在每次调用时重新申请
+import sys
+import cv2
+import weakref
+import numpy as np
+
+from typing import Dict, List, Tuple, Union, Any
+
+from ..operator import Transform, BOX_FIELDS, clip_bbox
+from loggers import create_logger, error_traceback
+logger = create_logger(logger_name=__name__)
+
+__all__ = ['SampleRingBuffer', 'CanvasPool', 'Mosaic', 'MixUp']
+
+
+class SampleRingBuffer(object):
+    def __init__(self,
+                 capacity: int=16) -> None:
+        """最近解码样本的环形缓冲区
+            desc:
+                Parameters:
+                    capacity: 缓冲的样本数(int)
+                Returns:
+                    None
+                Others:
+                    - 图像只保存引用(后续预处理均生成新数组，不会原地修改图像)
+                    - 边界框相关字段保存副本，避免被ClipBox等原地操作修改
+        """
+        super(SampleRingBuffer, self).__init__()
+        if capacity < 1:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The capacity of ring buffer should be more than 0.(capacity: {0})".format(capacity))
+                sys.exit(1)
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self) -> None:
+        self._slots = [None] * self.capacity
+        self._index = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self,
+             sample: Dict[str, Any]) -> None:
+        """写入一个样本(缓冲区满时覆盖最早的样本)
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    None
+        """
+        entry = {'image': sample['image']}
+        for key in BOX_FIELDS:
+            if key in sample:
+                entry[key] = sample[key].copy()
+        self._slots[self._index] = entry
+        self._index = (self._index + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def draw(self,
+             num: int) -> List[Dict[str, Any]]:
+        """随机抽取num个缓冲样本
+            desc:
+                Parameters:
+                    num: 抽取的样本数(int)
+                Returns:
+                    (List[Dict[str, Any]])样本列表——只读，不要原地修改
+                Others:
+                    - 缓冲样本数不少于num时不放回抽取(样本互不相同)，否则有放回抽取
+        """
+        if self._size >= num:
+            indexes = np.random.choice(self._size, size=num, replace=False)
+        else:
+            indexes = np.random.randint(0, self._size, size=num)
+        return [self._slots[idx] for idx in indexes]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # 传递到worker进程时不携带缓冲的图像
+        state = self.__dict__.copy()
+        state['_slots'] = [None] * self.capacity
+        state['_index'] = 0
+        state['_size'] = 0
+        return state
+
+
+class _CanvasStorage(np.ndarray):
+    # 缓冲池持有的画布存储: 类型与返回的画布(np.ndarray视图)不同，
+    # numpy不会把画布的切片视图的base折叠到存储本身，
+    # 因此画布对象存活 <=> 画布或其任意视图仍在使用
+    pass
+
+
+class CanvasPool(object):
+    def __init__(self,
+                 max_size: int=8) -> None:
+        """输出画布缓冲池
+            desc:
+                Parameters:
+                    max_size: 每种形状/类型最多缓存的画布数(int)
+                Returns:
+                    None
+                Others:
+                    - 缓冲池持有画布的存储，返回的画布为存储的视图，并对其保留弱引用:
+                      画布及其切片视图均被释放后(弱引用失效)存储才会被复用，
+                      仍被样本、批量数据或其切片视图引用的画布不会被覆盖
+                    - 池满且没有空闲画布时临时申请(不加入池中)
+        """
+        super(CanvasPool, self).__init__()
+        self.max_size = max_size
+        self._pools = {} # (shape, dtype) --> [[存储, 返回画布的弱引用], ...]
+        self.num_allocs = 0
+        self.num_reuses = 0
+
+    def acquire(self,
+                shape: Tuple[int, ...],
+                dtype: Any=np.uint8) -> np.ndarray:
+        """获取一块画布(内容未初始化)
+            desc:
+                Parameters:
+                    shape: 画布形状(tuple(int))
+                    dtype: 画布数据类型
+                Returns:
+                    (np.ndarray)画布
+        """
+        key = (tuple(shape), np.dtype(dtype).str)
+        pool = self._pools.setdefault(key, [])
+        for slot in pool:
+            if slot[1]() is None: # 上一次返回的画布及其视图均已释放
+                canvas = slot[0].view(np.ndarray)
+                slot[1] = weakref.ref(canvas)
+                self.num_reuses += 1
+                return canvas
+        self.num_allocs += 1
+        if len(pool) >= self.max_size:
+            return np.empty(shape, dtype=dtype)
+        storage = _CanvasStorage(shape, dtype=dtype)
+        canvas = storage.view(np.ndarray)
+        pool.append([storage, weakref.ref(canvas)])
+        return canvas
+
+    def clear(self) -> None:
+        self._pools = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state['_pools'] = {}
+        return state
+
+
+def _merge_boxes(entries: List[Dict[str, Any]],
+                 scales: np.ndarray,
+                 offsets: np.ndarray) -> Dict[str, np.ndarray]:
+    """合并多个样本的边界框相关字段(整体拼接后统一缩放、平移)
+        desc:
+            Parameters:
+                entries: 样本列表(list(dict))
+                scales: 每个样本的缩放系数(np.ndarray)——[K, 2]: sx, sy
+                offsets: 每个样本的平移量(np.ndarray)——[K, 2]: dx, dy
+            Returns:
+                (Dict[str, np.ndarray])合并后的字段
+    """
+    merged = {}
+    for key in BOX_FIELDS:
+        if all([key in entry for entry in entries]):
+            merged[key] = np.concatenate([entry[key] for entry in entries], axis=0)
+    if 'gt_bbox' not in merged:
+        return merged
+    nums = [len(entry['gt_bbox']) for entry in entries]
+    # 每个边界框对应的[sx, sy, sx, sy]与[dx, dy, dx, dy]
+    box_scales = np.repeat(np.tile(scales, (1, 2)), nums, axis=0)
+    box_offsets = np.repeat(np.tile(offsets, (1, 2)), nums, axis=0)
+    merged['gt_bbox'] = (merged['gt_bbox'] * box_scales + box_offsets).astype(np.float32)
+    return merged
+
+
+def _clip_and_filter(merged: Dict[str, np.ndarray],
+                     out_h: int,
+                     out_w: int,
+                     min_size: float) -> Dict[str, np.ndarray]:
+    """将边界框裁剪到画布内(与ClipBox一致: [0, w-1], [0, h-1])，并去除过小的边界框
+        desc:
+            Parameters:
+                merged: 合并后的字段(dict)
+                out_h: 画布高(int)
+                out_w: 画布宽(int)
+                min_size: 保留边界框的最小宽高(float)
+            Returns:
+                (Dict[str, np.ndarray])筛选后的字段
+    """
+    if 'gt_bbox' not in merged:
+        return merged
+    gt_bbox = clip_bbox(merged['gt_bbox'], out_h, out_w)
+    keep = np.logical_and(gt_bbox[:, 2] - gt_bbox[:, 0] > min_size,
+                          gt_bbox[:, 3] - gt_bbox[:, 1] > min_size)
+    for key in merged:
+        merged[key] = merged[key][keep]
+    return merged
+
+
+class Mosaic(Transform):
+    def __init__(self,
+                 target_size: Union[int, List[int]]=640,
+                 center_range: List[float]=[0.25, 0.75],
+                 prob: float=1.0,
+                 buffer_size: int=16,
+                 pool_size: int=8,
+                 fill_value: int=114,
+                 min_size: float=1.,
+                 interp: int=cv2.INTER_LINEAR) -> None:
+        """Mosaic增强: 当前样本与缓冲区中的3个样本拼接为一张图像
+            desc:
+                Parameters:
+                    target_size: 输出画布尺寸(int or list(int))——[h, w]
+                    center_range: 拼接中心相对画布尺寸的采样范围(list(float))
+                    prob: 进行拼接的概率(float: [0., 1.])
+                    buffer_size: 最近解码样本的缓冲数(int)
+                    pool_size: 画布缓冲池大小(int)
+                    fill_value: 画布填充值(int)
+                    min_size: 保留边界框的最小宽高(float)
+                    interp: 插值方式(int)——cv2.INTER_*
+                Returns:
+                    None
+                Others:
+                    - 每张图像保持宽高比缩放到画布的一半大小，
+                      分别以左上/右上/左下/右下的方式贴靠拼接中心
+                    - 需要放在DecodeImage之后，
+                      每个输出样本只需要解码当前这一张图像
+                    - 混合对象在当前样本写入缓冲区之前抽取(不与自身拼接)，
+                      缓冲区为空时不拼接；缓冲样本不少于3个时3个混合对象互不相同
+                    - 输出的scale_factor重置为[1., 1.]
+        """
+        super(Mosaic, self).__init__()
+        if isinstance(target_size, int):
+            target_size = [target_size, target_size]
+        self.target_size = target_size
+        self.center_range = center_range
+        self.prob = prob
+        self.fill_value = fill_value
+        self.min_size = min_size
+        self.interp = interp
+        self.buffer = SampleRingBuffer(capacity=buffer_size)
+        self.pool = CanvasPool(max_size=pool_size)
+        self.num_outputs = 0 # 输出样本数
+        self.num_mixed = 0 # 进行拼接的输出样本数
+        self.num_partners = 0 # 取自缓冲区的混合对象数
+
+    def _paste(self,
+               canvas: np.ndarray,
+               image: np.ndarray,
+               position: int,
+               xc: int,
+               yc: int) -> Tuple[float, float, int, int]:
+        """缩放图像并贴入画布的一个象限
+            desc:
+                Parameters:
+                    canvas: 画布(np.ndarray)——[out_h, out_w, C]
+                    image: 图像(np.ndarray)——[H, W, C]
+                    position: 象限序号(int)——0: 左上, 1: 右上, 2: 左下, 3: 右下
+                    xc: 拼接中心x(int)
+                    yc: 拼接中心y(int)
+                Returns:
+                    (Tuple[float, float, int, int])缩放系数sx, sy与平移量dx, dy
+        """
+        out_h, out_w = canvas.shape[:2]
+        im_h, im_w = image.shape[:2]
+        scale = min(out_h / 2. / im_h, out_w / 2. / im_w)
+        new_h, new_w = max(1, int(round(im_h * scale))), max(1, int(round(im_w * scale)))
+        # 缩放后图像在画布中的位置(可能超出画布)
+        x1 = xc - new_w if position in (0, 2) else xc
+        y1 = yc - new_h if position in (0, 1) else yc
+        # 与画布的交集
+        cx1, cy1 = max(x1, 0), max(y1, 0)
+        cx2, cy2 = min(x1 + new_w, out_w), min(y1 + new_h, out_h)
+        if cx2 > cx1 and cy2 > cy1:
+            resized = cv2.resize(image, (new_w, new_h), interpolation=self.interp)
+            canvas[cy1:cy2, cx1:cx2] = resized[cy1 - y1:cy2 - y1, cx1 - x1:cx2 - x1]
+        return new_w / im_w, new_h / im_h, x1, y1
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """拼接单样本
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        # 先抽取混合对象再写入缓冲区，避免与自身拼接
+        others = self.buffer.draw(3) if len(self.buffer) > 0 else []
+        self.buffer.push(sample)
+        self.num_outputs += 1
+        if len(others) == 0 or np.random.uniform(0., 1.) >= self.prob:
+            return sample
+        self.num_mixed += 1
+
+        out_h, out_w = self.target_size
+        image = sample['image']
+        canvas = self.pool.acquire((out_h, out_w) + image.shape[2:], image.dtype)
+        canvas.fill(self.fill_value)
+        xc = int(np.random.uniform(*self.center_range) * out_w)
+        yc = int(np.random.uniform(*self.center_range) * out_h)
+
+        entries = [sample] + others
+        self.num_partners += 3
+        params = np.asarray([self._paste(canvas, entry['image'], position, xc, yc)
+                             for position, entry in enumerate(entries)],
+                            dtype=np.float32)
+        merged = _merge_boxes(entries, params[:, :2], params[:, 2:])
+        merged = _clip_and_filter(merged, out_h, out_w, self.min_size)
+
+        sample.update(merged)
+        sample['image'] = canvas
+        sample['im_shape'] = np.asarray([out_h, out_w], dtype=np.float32)
+        sample['scale_factor'] = np.ones((2,), dtype=np.float32)
+        return sample
+
+    def stats(self) -> Dict[str, float]:
+        """统计当前进程内的拼接情况
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (Dict[str, float])统计项:
+                        - outputs: 输出样本数
+                        - mixed: 进行拼接的输出样本数
+                        - images_per_output: 每个输出样本平均使用的图像数
+                                             (混合对象均来自缓冲区，实际解码数见DecodeImage.num_decodes)
+                        - canvas_allocs: 画布申请次数
+                        - canvas_reuses: 画布复用次数
+        """
+        num_outputs = max(self.num_outputs, 1)
+        return {'outputs': self.num_outputs,
+                'mixed': self.num_mixed,
+                'images_per_output': (self.num_outputs + self.num_partners) / num_outputs,
+                'canvas_allocs': self.pool.num_allocs,
+                'canvas_reuses': self.pool.num_reuses}
+
+
+class MixUp(Transform):
+    def __init__(self,
+                 alpha: float=1.5,
+                 beta: float=1.5,
+                 prob: float=0.5,
+                 buffer_size: int=16,
+                 pool_size: int=8) -> None:
+        """MixUp增强: 当前样本与缓冲区中的1个样本按权重混合
+            desc:
+                Parameters:
+                    alpha: beta分布参数alpha(float)
+                    beta: beta分布参数beta(float)
+                    prob: 进行混合的概率(float: [0., 1.])
+                    buffer_size: 最近解码样本的缓冲数(int)
+                    pool_size: 画布缓冲池大小(int)
+                Returns:
+                    None
+                Others:
+                    - 混合后的图像为float32，尺寸取两张图像的最大高宽(左上角对齐)
+                    - 边界框直接拼接，gt_score分别乘以各自的混合权重
+        """
+        super(MixUp, self).__init__()
+        if alpha <= 0. or beta <= 0.:
+            try:
+                raise ValueError()
+            except:
+                error_traceback(logger=logger,
+                                lasterrorline_offset=6,
+                                num_lines=1)
+                logger.error("Summary: The alpha and beta should be more than 0.(alpha: {0}, beta: {1})".format(alpha, beta))
+                sys.exit(1)
+        self.alpha = alpha
+        self.beta = beta
+        self.prob = prob
+        self.buffer = SampleRingBuffer(capacity=buffer_size)
+        self.pool = CanvasPool(max_size=pool_size)
+        self.num_outputs = 0
+        self.num_mixed = 0
+        self.num_partners = 0
+
+    def apply(self,
+              sample: Dict[str, Any]) -> Dict[str, Any]:
+        """混合单样本
+            desc:
+                Parameters:
+                    sample: 样本数据(dict)——image: [H, W, C]
+                Returns:
+                    (Dict[str, Any])处理后的样本数据
+        """
+        # 先抽取混合对象再写入缓冲区，避免与自身混合
+        others = self.buffer.draw(1) if len(self.buffer) > 0 else []
+        self.buffer.push(sample)
+        self.num_outputs += 1
+        if len(others) == 0 or np.random.uniform(0., 1.) >= self.prob:
+            return sample
+        factor = float(np.clip(np.random.beta(self.alpha, self.beta), 0., 1.))
+        if factor >= 1.:
+            return sample
+        self.num_mixed += 1
+        self.num_partners += 1
+
+        other = others[0]
+        im1, im2 = sample['image'], other['image']
+        out_h = max(im1.shape[0], im2.shape[0])
+        out_w = max(im1.shape[1], im2.shape[1])
+        canvas = self.pool.acquire((out_h, out_w) + im1.shape[2:], np.float32)
+        if im1.shape != canvas.shape or im2.shape != canvas.shape:
+            canvas.fill(0.)
+        h1, w1 = im1.shape[:2]
+        h2, w2 = im2.shape[:2]
+        np.multiply(im1, np.float32(factor), out=canvas[:h1, :w1])
+        region = canvas[:h2, :w2]
+        region += im2 * np.float32(1. - factor)
+
+        entries = [dict(sample), dict(other)] # 浅拷贝: 不修改缓冲区中的样本
+        for entry in entries:
+            if 'gt_bbox' in entry and 'gt_score' not in entry:
+                entry['gt_score'] = np.ones((len(entry['gt_bbox']), 1), dtype=np.float32)
+        merged = _merge_boxes(entries,
+                              np.ones((2, 2), dtype=np.float32),
+                              np.zeros((2, 2), dtype=np.float32))
+        if 'gt_score' in merged:
+            weights = np.repeat(np.asarray([factor, 1. - factor], dtype=np.float32),
+                                [len(entry['gt_score']) for entry in entries])
+            merged['gt_score'] = merged['gt_score'] * weights.reshape(
+                (-1, ) + (1, ) * (merged['gt_score'].ndim - 1))
+
+        sample.update(merged)
+        sample['image'] = canvas
+        sample['im_shape'] = np.asarray([out_h, out_w], dtype=np.float32)
+        return sample
+
+    def stats(self) -> Dict[str, float]:
+        """统计当前进程内的混合情况(统计项同Mosaic.stats)
+            desc:
+                Parameters:
+                    None
+                Returns:
+                    (Dict[str, float])统计项
+        """
+        num_outputs = max(self.num_outputs, 1)
+        return {'outputs': self.num_outputs,
+                'mixed': self.num_mixed,
+                'images_per_output': (self.num_outputs + self.num_partners) / num_outputs,
+                'canvas_allocs': self.pool.num_allocs,
+                'canvas_reuses': self.pool.num_reuses}
@@ -12,6 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # includes: vdlrecord init module
-from .vdlrecord import *
+# 按需导入: 首次访问导出名称时才导入vdlrecord(visualdl在创建日志记录器时才导入)
+import importlib
 
-__all__ = ['clear_vdlrecord_dir', 'VDLCallback', 'ScalarVDL']
\ No newline at end of file
+from typing import Any, List
+
+__all__ = ['clear_vdlrecord_dir', 'VDLCallback', 'ScalarVDL']
+
+
+def __getattr__(name: str) -> Any:
+    if name in __all__ or name == 'vdlrecord':
+        module = importlib.import_module('.vdlrecord', __name__)
+        if name == 'vdlrecord':
+            return module
+        value = getattr(module, name)
+        globals()[name] = value # 之后直接从模块字典读取
+        return value
+    raise AttributeError("module '{0}' has no attribute '{1}'".format(__name__, name))
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -17,22 +17,35 @@
 # 或者: vdlrecords.自定义日志文件名(vdlrecords.train_fcos.log)
 import os
 import sys
+import importlib
 import numpy as np
 
 from typing import Union, List, Any
 
 from loggers import create_logger, error_traceback
 logger = create_logger(logger_name='vdlrecord')
-try:
-    from visualdl import LogWriter, LogReader
-    from visualdl.server import app
-except :
-    logger.warning("The visualdl can't import LogWriter.")
-    raise ImportError()
 
 __all__ = ['clear_vdlrecord_dir', 'VDLCallback', 'ScalarVDL']
 
 
+def _import_visualdl(name: str='visualdl') -> Any:
+    """首次使用时才导入visualdl(可选依赖，导入耗时较长)
+        desc:
+            Parameters:
+                name: 模块名(str)——'visualdl'或'visualdl.server.app'
+            Returns:
+                (module)visualdl模块
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        error_traceback(logger=logger,
+                        lasterrorline_offset=4,
+                        num_lines=1)
+        logger.error("Summary: The vdlrecords requires visualdl, please install it: pip install visualdl.")
+        sys.exit(1)
+
+
 def clear_vdlrecord_dir(log_dir: str='vlogs',
                         split_content: str='.',
                         file_content: str='vdlrecords',
@@ -156,7 +169,7 @@ class VDLCallback(object):
         self._reload_vdllog()
         
         # 4.创建vdl日志记录器
-        self._writer = LogWriter(
+        self._writer = _import_visualdl().LogWriter(
             logdir=logdir,
             file_name=self.log_filename,
             display_name=display_name
@@ -182,7 +195,7 @@ class VDLCallback(object):
         else:
             log_path = os.path.join(self.logdir, self.log_filename)
             if os.path.isfile(log_path): # 日志存在
-                reader = LogReader(file_path=log_path)
+                reader = _import_visualdl().LogReader(file_path=log_path)
                 _kinds = reader.get_tags()
                 if len(_kinds) <= 1:
                     try:
@@ -309,6 +322,7 @@ class VDLCallback(object):
                 Others:
                     - 需要在__name__=="__main__"中运行
         """
+        app = _import_visualdl('visualdl.server.app')
         app.run(logdir=self.logdir,
                 port=port,
                 open_browser=open_browser)
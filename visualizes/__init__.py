@@ -12,6 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # includes: visualize init module
-from .det_visualize import *
+# 按需导入: 首次访问导出名称时才导入det_visualize(cv2, PIL)
+import importlib
+
+from typing import Any, List
 
 __all__ = ['visualize_img', 'visualize_bbox', 'visualize_det', 'colormap']
+
+
+def __getattr__(name: str) -> Any:
+    if name in __all__ or name == 'det_visualize':
+        module = importlib.import_module('.det_visualize', __name__)
+        if name == 'det_visualize':
+            return module
+        value = getattr(module, name)
+        globals()[name] = value # 之后直接从模块字典读取
+        return value
+    raise AttributeError("module '{0}' has no attribute '{1}'".format(__name__, name))
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
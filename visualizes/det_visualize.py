@@ -17,7 +17,6 @@ import sys
 import numpy as np
 import cv2
 from PIL import Image
-from matplotlib import pyplot as plt
 
 from typing import Dict, Union, Sequence
 from loggers import create_logger, error_traceback
@@ -127,7 +126,16 @@ def visualize_img(img: Union[np.ndarray, str],
             # 三通道图像时，则将opencv的BGR转为RGB格式
             if len(img.shape)==3 and img.shape[2]==3:
                 img = img[:, :, ::-1]
-        # 可视化窗口显示图像
+        # 可视化窗口显示图像(matplotlib为可选依赖，显示时才导入)
+        try:
+            from matplotlib import pyplot as plt
+        except ImportError:
+            error_traceback(logger=logger,
+                            lasterrorline_offset=4,
+                            num_lines=1)
+            logger.error("Summary: Showing images requires matplotlib, please install it "
+                         "or use save_path instead.")
+            sys.exit(1)
         plt.figure("visualize result") # 图像窗口命令
         plt.imshow(img) # 显示图像
         plt.axis("off") # 关闭坐标轴显示